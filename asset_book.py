@@ -0,0 +1,136 @@
+"""
+用户资产聚合 - 按增量维护每个用户的余额、持仓和基金市值
+"""
+import threading
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from fixed_point import from_fixed, round_product, to_fixed
+
+
+class UserAssetBook:
+    """用户资产聚合
+    
+    余额、份额、净值变化时按差额更新，交易确认时为 O(1)；
+    净值变化只影响持有该产品的用户。读取资产时直接使用已维护的结果。
+    各方法内部加锁，可在多个请求线程间共用。
+    
+    内部全部为定点整数（见 fixed_point.py）：余额、份额、净值为 4 位小数，
+    基金市值为 份额 × 净值 的 8 位小数精确和，读取时才舍入为 4 位小数并转为 Decimal。
+    """
+    
+    def __init__(self):
+        """初始化资产聚合"""
+        # 用户ID -> 总余额
+        self._balances: Dict[str, int] = {}
+        # 用户ID -> {(基金账户ID, 产品ID): 总份额}
+        self._positions: Dict[str, Dict[Tuple[str, str], int]] = {}
+        # 产品ID -> {用户ID: 该用户持有的总份额}
+        self._product_holders: Dict[str, Dict[str, int]] = {}
+        # 产品ID -> 最新单位净值
+        self._navs: Dict[str, int] = {}
+        # 用户ID -> 基金总市值（8 位小数）
+        self._fund_values: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def set_balance(self, user_id: str, total_balance: Decimal) -> None:
+        """更新用户总余额"""
+        total_balance = to_fixed(total_balance)
+        with self._lock:
+            self._balances[user_id] = total_balance
+            self._fund_values.setdefault(user_id, 0)
+    
+    def set_position(self, user_id: str, fund_account_id: str, product_id: str,
+                     total_share: Decimal) -> None:
+        """更新持仓份额，按与原份额的差额调整基金市值"""
+        total_share = to_fixed(total_share)
+        with self._lock:
+            positions = self._positions.setdefault(user_id, {})
+            key = (fund_account_id, product_id)
+            delta = total_share - positions.get(key, 0)
+            positions[key] = total_share
+            if not delta:
+                return
+            
+            holders = self._product_holders.setdefault(product_id, {})
+            holders[user_id] = holders.get(user_id, 0) + delta
+            nav = self._navs.get(product_id)
+            if nav is not None:
+                self._fund_values[user_id] = self._fund_values.get(user_id, 0) + delta * nav
+    
+    def set_nav(self, product_id: str, net_value: Decimal) -> None:
+        """更新产品最新净值，重估持有该产品的用户市值"""
+        net_value = to_fixed(net_value)
+        with self._lock:
+            old_nav = self._navs.get(product_id, 0)
+            self._navs[product_id] = net_value
+            change = net_value - old_nav
+            if not change:
+                return
+            fund_values = self._fund_values
+            for user_id, share in self._product_holders.get(product_id, {}).items():
+                fund_values[user_id] = fund_values.get(user_id, 0) + share * change
+    
+    def get_nav(self, product_id: str) -> Optional[Decimal]:
+        """获取产品最新净值"""
+        nav = self._navs.get(product_id)
+        return None if nav is None else from_fixed(nav)
+    
+    def get_balance(self, user_id: str) -> Optional[Decimal]:
+        """获取用户总余额"""
+        balance = self._balances.get(user_id)
+        return None if balance is None else from_fixed(balance)
+    
+    def product_holders(self, product_id: str) -> Dict[str, Decimal]:
+        """获取产品的持有人及各自持有的总份额（副本）"""
+        with self._lock:
+            holders = list(self._product_holders.get(product_id, {}).items())
+        return {user_id: from_fixed(share) for user_id, share in holders}
+    
+    def user_holdings(self, user_id: str) -> Dict[str, Decimal]:
+        """获取用户按产品汇总的持有份额（合并多个基金账户）"""
+        return {product_id: from_fixed(share) for product_id, share in self.user_holdings_fixed(user_id).items()}
+    
+    def user_holdings_fixed(self, user_id: str) -> Dict[str, int]:
+        """获取用户按产品汇总的持有份额（4 位小数定点整数）"""
+        holdings: Dict[str, int] = {}
+        with self._lock:
+            for (_, product_id), share in self._positions.get(user_id, {}).items():
+                holdings[product_id] = holdings.get(product_id, 0) + share
+        return holdings
+    
+    def user_ids(self) -> List[str]:
+        """列出所有有余额记录的用户"""
+        with self._lock:
+            return list(self._balances)
+    
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取用户资产汇总（Decimal 精度），用户不存在时返回 None"""
+        with self._lock:
+            if user_id not in self._balances:
+                return None
+            
+            fund_assets = []
+            for (fund_account_id, product_id), share in self._positions.get(user_id, {}).items():
+                nav = self._navs.get(product_id)
+                if nav is None:
+                    continue
+                fund_assets.append({
+                    'fund_account_id': fund_account_id,
+                    'product_id': product_id,
+                    'share': from_fixed(share),
+                    'nav': from_fixed(nav),
+                    'value': from_fixed(round_product(share * nav))
+                })
+            
+            total_balance = from_fixed(self._balances[user_id])
+            total_fund_value = from_fixed(round_product(self._fund_values.get(user_id, 0)))
+        return {
+            'user_id': user_id,
+            'total_asset': total_balance + total_fund_value,
+            'total_fund_asset': total_fund_value,
+            'total_balance': total_balance,
+            'fund_assets': fund_assets,
+            'calc_date': date.today()
+        }
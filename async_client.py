@@ -0,0 +1,191 @@
+"""
+异步客户端 - 与 FundClient 相同的业务方法，供 asyncio 调用方高并发使用
+"""
+import asyncio
+import importlib.util
+import logging
+from typing import Any, Awaitable, Dict, Iterable, List, Optional
+
+import httpx
+
+from client import parse_response
+from idempotency import IDEMPOTENCY_HEADER
+
+logger = logging.getLogger(__name__)
+
+# 安装了 h2 时启用 HTTP/2（单个连接上多路复用并发请求）
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
+class AsyncFundClient:
+    """异步基金交易客户端
+    
+    所有请求经同一个 httpx.AsyncClient（连接池、保持连接，可用时走 HTTP/2），
+    同时在途的请求数由信号量限制在 max_concurrency 以内，超出的请求排队等待，
+    因此可以一次提交成千上万个调用（见 gather()）。
+    
+    用法:
+        async with AsyncFundClient("http://localhost:8000") as client:
+            results = await client.gather(
+                client.subscribe_fund(account_id, product_id, 100) for account_id in account_ids
+            )
+    """
+    
+    def __init__(self, base_url: str = "http://localhost:8000", token: str = "demo_token_2025",
+                 max_concurrency: int = 1000, max_connections: int = 100, timeout: float = 30,
+                 http_client: Optional[httpx.AsyncClient] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        初始化客户端
+        
+        Args:
+            base_url: 微服务基础URL
+            token: 认证令牌
+            max_concurrency: 同时在途的最大请求数
+            max_connections: 连接池大小（HTTP/2 时每个连接可承载多个并发请求）
+            timeout: 连接、读取、写入超时（秒）；等待空闲连接不超时，由 max_concurrency 控制排队
+            http_client: 共用的 httpx.AsyncClient（多个客户端共用连接池），提供时由调用方负责关闭
+            transport: 自定义传输（如 Unix 套接字、ASGI 应用），仅在未提供 http_client 时使用
+        """
+        if max_concurrency <= 0:
+            raise ValueError(f"最大并发数必须大于0: {max_concurrency}")
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        self._owns_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE and transport is None,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, pool=None),
+            transport=transport
+        )
+        self._limiter = asyncio.Semaphore(max_concurrency)
+    
+    async def __aenter__(self) -> "AsyncFundClient":
+        return self
+    
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+    
+    async def aclose(self) -> None:
+        """关闭连接池（共用的 http_client 由调用方关闭）"""
+        if self._owns_client:
+            await self.http_client.aclose()
+    
+    async def _request(self, method: str, endpoint: str, idempotency_key: Optional[str] = None,
+                       **kwargs: Any) -> Any:
+        """发送HTTP请求（受并发数限制；提供 idempotency_key 时附带 Idempotency-Key 请求头）"""
+        headers = self.headers
+        if idempotency_key is not None:
+            headers = {**headers, IDEMPOTENCY_HEADER: idempotency_key}
+        async with self._limiter:
+            response = await self.http_client.request(
+                method, f"{self.base_url}{endpoint}", headers=headers, **kwargs
+            )
+        return parse_response(response)
+    
+    async def gather(self, calls: Iterable[Awaitable[Any]], return_exceptions: bool = False) -> List[Any]:
+        """
+        并发执行一批调用，按提交顺序返回结果
+        
+        Args:
+            calls: 本客户端方法返回的协程，如 (client.get_user_assets(u) for u in user_ids)
+            return_exceptions: 为 True 时失败的调用以异常对象返回，不影响其他调用
+        """
+        return list(await asyncio.gather(*calls, return_exceptions=return_exceptions))
+    
+    # ==================== 业务方法（与 FundClient 一致） ====================
+    
+    async def create_user(self, user_name: str, identity_no: str, **kwargs: Any) -> str:
+        """创建用户，返回用户ID"""
+        result = await self._request("POST", "/api/v1/users", json={
+            "user_name": user_name,
+            "identity_no": identity_no,
+            **kwargs
+        })
+        return result.get('user_id')
+    
+    async def get_user(self, user_id: str) -> Dict[str, Any]:
+        """获取用户信息"""
+        return await self._request("GET", f"/api/v1/users/{user_id}")
+    
+    async def open_fund_account(self, user_id: str, account_type: str = "INDIVIDUAL",
+                                idempotency_key: Optional[str] = None) -> str:
+        """开通基金账户，返回基金账户ID（重试时传入相同的 idempotency_key）"""
+        result = await self._request("POST", "/api/v1/accounts/open", idempotency_key, json={
+            "user_id": user_id,
+            "account_type": account_type
+        })
+        return result.get('fund_account_id')
+    
+    async def subscribe_fund(self, fund_account_id: str, product_id: str, amount: float,
+                             idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """申购基金（重试时传入相同的 idempotency_key）"""
+        return await self._request("POST", "/api/v1/funds/subscribe", idempotency_key, json={
+            "fund_account_id": fund_account_id,
+            "product_id": product_id,
+            "amount": amount
+        })
+    
+    async def redeem_fund(self, fund_account_id: str, product_id: str, share: float,
+                          idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """赎回基金（重试时传入相同的 idempotency_key）"""
+        return await self._request("POST", "/api/v1/funds/redeem", idempotency_key, json={
+            "fund_account_id": fund_account_id,
+            "product_id": product_id,
+            "share": share
+        })
+    
+    async def get_user_assets(self, user_id: str) -> Dict[str, Any]:
+        """获取用户资产"""
+        return await self._request("GET", f"/api/v1/assets/{user_id}")
+    
+    async def list_user_entrusts(self, user_id: str, cursor: Optional[str] = None, limit: int = 50,
+                                 **filters: Any) -> Dict[str, Any]:
+        """分页查询用户委托历史，filters 为 status、business_type、product_id、start_time、end_time"""
+        params = {'limit': limit, **{key: value for key, value in filters.items() if value is not None}}
+        if cursor:
+            params['cursor'] = cursor
+        return await self._request("GET", f"/api/v1/users/{user_id}/entrusts", params=params)
+    
+    async def list_user_confirms(self, user_id: str, cursor: Optional[str] = None, limit: int = 50,
+                                 **filters: Any) -> Dict[str, Any]:
+        """分页查询用户确认记录，filters 为 start_time、end_time"""
+        params = {'limit': limit, **{key: value for key, value in filters.items() if value is not None}}
+        if cursor:
+            params['cursor'] = cursor
+        return await self._request("GET", f"/api/v1/users/{user_id}/confirms", params=params)
+    
+    async def get_products(self, product_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """获取基金产品列表"""
+        params = {'product_type': product_type} if product_type else {}
+        return await self._request("GET", "/api/v1/products", params=params)
+    
+    async def create_product(self, product_code: str, product_name: str, **kwargs: Any) -> str:
+        """创建基金产品，返回产品ID"""
+        result = await self._request("POST", "/api/v1/products", json={
+            "product_code": product_code,
+            "product_name": product_name,
+            **kwargs
+        })
+        return result.get('product_id')
+    
+    async def create_nav(self, product_id: str, net_value: float, **kwargs: Any) -> str:
+        """创建基金净值，返回净值ID"""
+        result = await self._request("POST", "/api/v1/nav", json={
+            "product_id": product_id,
+            "net_value": net_value,
+            **kwargs
+        })
+        return result.get('nav_id')
+    
+    async def health_check(self) -> Dict[str, Any]:
+        """健康检查"""
+        try:
+            response = await self.http_client.get(f"{self.base_url}/api/v1/health")
+            return response.json()
+        except Exception as e:
+            return {"status": "unhealthy", "error": str(e)}
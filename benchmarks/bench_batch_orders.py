@@ -0,0 +1,88 @@
+"""
+批量交易基准 - 对比逐笔调用单笔接口与一次调用批量接口的吞吐
+
+通过 TestClient 调用 main_v2 应用（不经过网络），每笔订单为一次申购；
+逐笔方式循环调用 /api/v1/funds/subscribe，批量方式一次调用 /api/v1/funds/batch。
+
+用法:
+    python benchmarks/bench_batch_orders.py [--orders 2000] [--users 50]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from main_v2 import app, fund_service
+from models import FundAccount
+
+HEADERS = {"Authorization": "Bearer demo_token_2025"}
+
+
+def _setup(users: int):
+    """准备用户、账户与一个有净值的产品"""
+    product = fund_service.create_fund_product(product_code="000001", product_name="基准基金")
+    fund_service.create_fund_nav(product_id=product.product_id, net_value=Decimal("1.2345"))
+    account_ids = []
+    for _ in range(users):
+        user = fund_service.create_user(user_name="基准用户")
+        balance = fund_service.repo.get_user_balance(user.user_id)
+        balance.available_balance = Decimal("1000000000")
+        fund_service.repo.update_user_balance(balance)
+        # open_fund_account 经适配器从 common_repo 读取用户，这里直接创建账户
+        account = fund_service.repo.create_fund_account(FundAccount(
+            fund_account_id=fund_service._generate_id('ACC_'),
+            user_id=user.user_id,
+            account_no=fund_service._generate_id('F'),
+            open_date=date.today()
+        ))
+        account_ids.append(account.fund_account_id)
+    return account_ids, product.product_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量交易基准")
+    parser.add_argument("--orders", type=int, default=2000, help="订单笔数")
+    parser.add_argument("--users", type=int, default=50, help="用户数")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    client = TestClient(app)
+    account_ids, product_id = _setup(args.users)
+    orders = [
+        {"fund_account_id": account_ids[i % len(account_ids)], "product_id": product_id, "amount": "100"}
+        for i in range(args.orders)
+    ]
+
+    start = time.perf_counter()
+    for order in orders:
+        response = client.post("/api/v1/funds/subscribe", json=order, headers=HEADERS)
+        assert response.status_code == 200, response.text
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.post(
+        "/api/v1/funds/batch",
+        json={"orders": [dict(order, transaction_type="SUBSCRIBE") for order in orders]},
+        headers=HEADERS
+    )
+    lines = response.text.splitlines()
+    batch_s = time.perf_counter() - start
+    assert response.status_code == 200 and len(lines) == len(orders), response.text[:200]
+
+    print(f"订单数: {args.orders}  用户数: {args.users}")
+    print(f"{'方式':<10}{'耗时(s)':>10}{'笔/秒':>12}")
+    print(f"{'逐笔接口':<10}{single_s:>10.2f}{args.orders / single_s:>12.0f}")
+    print(f"{'批量接口':<10}{batch_s:>10.2f}{args.orders / batch_s:>12.0f}")
+    print(f"\n批量接口吞吐提升: {single_s / batch_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
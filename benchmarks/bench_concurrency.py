@@ -0,0 +1,114 @@
+"""
+并发交易基准 - 测量吞吐随线程数的变化，并校验并发下单后余额与份额守恒
+
+每个线程循环执行申购加赎回。对比三种负载：
+  分段锁/不同用户：每个线程交易自己的用户，只竞争落到同一分段的锁
+  分段锁/同一用户：所有线程交易同一个用户，按用户串行
+  全局锁：每笔交易外层再套一把全局锁，相当于改造前整个服务串行执行
+交易路径主要是持有 GIL 的 Python 代码，两种后端的吞吐随线程数基本持平；
+分段锁带来的是并发下的正确性，以及一个用户的交易阻塞（如等待 I/O）时不拖住其他用户。
+
+用法:
+    python benchmarks/bench_concurrency.py [--backend memory|sqlite] [--threads 1,2,4,8,16] [--trades 400]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repository import Repository
+from service import FundService
+from sqlite_repository import SqliteRepository
+
+_BALANCE = Decimal("1000000")
+_SCENARIOS = ('distinct', 'hot', 'global')
+_SCENARIO_NAMES = {'distinct': "分段锁/不同用户", 'hot': "分段锁/同一用户", 'global': "全局锁"}
+
+
+def _setup(repo, users: int):
+    """准备用户、账户和一个净值为 1 的产品"""
+    service = FundService(repo)
+    product = service.create_fund_product(product_code="000001", product_name="基准基金")
+    service.create_fund_nav(product_id=product.product_id, net_value=Decimal("1"),
+                            nav_date=date(2025, 1, 1))
+    accounts = []
+    for i in range(users):
+        user = service.create_user(user_name=f"基准用户{i}")
+        balance = repo.get_user_balance(user.user_id)
+        balance.available_balance = _BALANCE
+        repo.update_user_balance(balance)
+        accounts.append((user.user_id, service.open_fund_account(user.user_id).fund_account_id))
+    return service, accounts, product.product_id
+
+
+def run(backend: str, scenario: str, threads: int, trades: int, directory: str) -> dict:
+    """运行一组负载，返回吞吐与守恒校验结果"""
+    if backend == 'sqlite':
+        repo = SqliteRepository(os.path.join(directory, f"bench-{scenario}-{threads}.db"), pool_size=threads)
+    else:
+        repo = Repository()
+    users = 1 if scenario == 'hot' else threads
+    service, accounts, product_id = _setup(repo, users)
+    global_lock = threading.Lock() if scenario == 'global' else None
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index: int):
+        _, account_id = accounts[index % users]
+        barrier.wait()
+        for _ in range(trades):
+            with global_lock or nullcontext():
+                service.subscribe_fund(account_id, product_id, Decimal("10"))
+            with global_lock or nullcontext():
+                service.redeem_fund(account_id, product_id, Decimal("4"))
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    # 净值为 1：每个用户的可用余额加总份额应等于初始余额，且无残留冻结
+    conserved = all(
+        repo.get_user_balance(user_id).available_balance
+        + repo.get_fund_share(account_id, product_id).total_share == _BALANCE
+        and repo.get_user_balance(user_id).frozen_balance == 0
+        for user_id, account_id in accounts
+    )
+    repo.close()
+    return {'trades_per_s': round(threads * trades * 2 / seconds), 'conserved': conserved}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发交易基准")
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory", help="存储后端")
+    parser.add_argument("--threads", default="1,2,4,8,16", help="线程数列表，逗号分隔")
+    parser.add_argument("--trades", type=int, default=400, help="每个线程的申购加赎回轮数")
+    args = parser.parse_args()
+    thread_counts = [int(n) for n in args.threads.split(",")]
+
+    directory = tempfile.mkdtemp(prefix="bench-concurrency-")
+    try:
+        print(f"后端: {args.backend}，每线程 {args.trades} 轮申购加赎回，单位: 笔/s")
+        print(f"{'线程数':<8}" + "".join(f"{_SCENARIO_NAMES[s]:>16}" for s in _SCENARIOS) + f"{'守恒':>8}")
+        for threads in thread_counts:
+            results = [run(args.backend, scenario, threads, args.trades, directory) for scenario in _SCENARIOS]
+            conserved = "是" if all(r['conserved'] for r in results) else "否"
+            print(f"{threads:<8}" + "".join(f"{r['trades_per_s']:>16}" for r in results) + f"{conserved:>8}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
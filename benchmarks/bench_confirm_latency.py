@@ -0,0 +1,75 @@
+"""
+确认延迟基准 - 对比立即确认与异步队列确认下申购请求的延迟分布
+
+立即确认时请求线程完成委托更新、确认记录、份额与余额变更后才返回；
+异步确认时请求只冻结资金并入队，由后台线程按批确认。
+
+用法:
+    python benchmarks/bench_confirm_latency.py [--orders 5000] [--batch-size 500] [--linger-ms 50]
+"""
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from confirm_queue import ConfirmationQueue
+from repository import Repository
+from service import FundService
+
+
+def _setup(confirm_queue):
+    """准备一个用户、一个账户和一个有净值的产品"""
+    service = FundService(Repository(), confirm_queue)
+    user = service.create_user(user_name="基准用户")
+    balance = service.repo.get_user_balance(user.user_id)
+    balance.available_balance = Decimal("1000000000")
+    service.repo.update_user_balance(balance)
+    account = service.open_fund_account(user.user_id)
+    product = service.create_fund_product(product_code="000001", product_name="基准基金")
+    service.create_fund_nav(product_id=product.product_id, net_value=Decimal("1.2345"))
+    return service, account.fund_account_id, product.product_id
+
+
+def run(confirm_queue, orders: int) -> dict:
+    """运行基准，返回请求延迟分位数（微秒）与全部确认完成的总耗时"""
+    service, account_id, product_id = _setup(confirm_queue)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(orders):
+        t0 = time.perf_counter()
+        service.subscribe_fund(account_id, product_id, Decimal("100"))
+        latencies.append(time.perf_counter() - t0)
+    if confirm_queue is not None:
+        confirm_queue.stop(drain=True)
+    total_s = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'p50_us': round(latencies[len(latencies) // 2] * 1e6, 1),
+        'p99_us': round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+        'total_s': round(total_s, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="确认延迟基准")
+    parser.add_argument("--orders", type=int, default=5000, help="申购笔数")
+    parser.add_argument("--batch-size", type=int, default=500, help="确认批次大小")
+    parser.add_argument("--linger-ms", type=float, default=50, help="凑批等待时间（毫秒）")
+    args = parser.parse_args()
+
+    results = [
+        ("立即确认", run(None, args.orders)),
+        ("异步确认", run(ConfirmationQueue(args.batch_size, args.linger_ms), args.orders)),
+    ]
+    print(f"{'方式':<10}{'p50(us)':>10}{'p99(us)':>10}{'总耗时(s)':>12}")
+    for name, r in results:
+        print(f"{name:<10}{r['p50_us']:>10}{r['p99_us']:>10}{r['total_s']:>12}")
+
+
+if __name__ == "__main__":
+    main()
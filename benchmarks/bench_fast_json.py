@@ -0,0 +1,109 @@
+"""
+快速响应基准 - 比较默认响应流程与 FAST_JSON=1 时的接口吞吐
+
+在数据目录中预置若干产品（各有净值）和一个持有全部产品的用户，
+分别以两种模式启动 main:app（Unix 套接字，日志级别 WARNING），
+并发客户端循环请求 /api/v1/products 与 /api/v1/assets/{user_id}，统计每秒请求数。
+
+用法:
+    python benchmarks/bench_fast_json.py [--products 50] [--concurrency 16] [--seconds 5]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from common.persistence import Persistence
+from repository import Repository
+from service import FundService
+from sharding import socket_path, start_shards, stop_shards
+
+HEADERS = {"Authorization": "Bearer demo_token_2025"}
+
+
+def _seed(data_dir: str, products: int) -> str:
+    """预置产品、净值和持有全部产品的用户，返回用户ID"""
+    repo = Repository(persistence=Persistence(os.path.join(data_dir, "repository"), fsync=False))
+    service = FundService(repo)
+    user = service.create_user(user_name="基准用户")
+    balance = repo.get_user_balance(user.user_id)
+    balance.available_balance = Decimal("1000000000")
+    repo.update_user_balance(balance)
+    account_id = service.open_fund_account(user.user_id).fund_account_id
+    for i in range(products):
+        product = service.create_fund_product(product_code=f"{i:06d}", product_name=f"基准基金{i}",
+                                              fund_company="基准基金公司")
+        service.create_fund_nav(product.product_id, Decimal("1.2345"), accumulated_nav=Decimal("1.5678"),
+                                nav_date=date(2025, 1, 1))
+        service.subscribe_fund(account_id, product.product_id, Decimal("1000"))
+    repo.close()
+    return user.user_id
+
+
+async def _drive(socket: str, path: str, concurrency: int, seconds: float) -> int:
+    """并发客户端循环请求同一接口，返回成功次数"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    transport = httpx.AsyncHTTPTransport(uds=socket, limits=limits)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=HEADERS) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def worker() -> int:
+            done = 0
+            while time.perf_counter() < deadline:
+                response = await client.get(path)
+                response.raise_for_status()
+                done += 1
+            return done
+
+        return sum(await asyncio.gather(*[worker() for _ in range(concurrency)]))
+
+
+def run(fast: bool, data_dir: str, paths: list, concurrency: int, seconds: float) -> dict:
+    """以一种模式启动服务并压测各接口，返回 {接口: 每秒请求数}"""
+    socket_dir = tempfile.mkdtemp(prefix="bench-fast-json-")
+    processes = []
+    try:
+        processes = start_shards(1, socket_dir, env={
+            'DATA_DIR': data_dir, 'DATA_FSYNC': '0', 'LOG_LEVEL': 'WARNING', 'FAST_JSON': '1' if fast else '0'
+        })
+        socket = socket_path(socket_dir, 0)
+        return {path: round(asyncio.run(_drive(socket, path, concurrency, seconds)) / seconds) for path in paths}
+    finally:
+        stop_shards(processes)
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="快速响应基准")
+    parser.add_argument("--products", type=int, default=50, help="产品数（用户持有全部产品）")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发客户端数")
+    parser.add_argument("--seconds", type=float, default=5, help="每个接口的压测时长（秒）")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-fast-json-data-")
+    try:
+        user_id = _seed(work_dir, args.products)
+        paths = ["/api/v1/products", f"/api/v1/assets/{user_id}"]
+        default = run(False, work_dir, paths, args.concurrency, args.seconds)
+        fast = run(True, work_dir, paths, args.concurrency, args.seconds)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"产品数: {args.products}，并发客户端: {args.concurrency}")
+    print(f"{'接口':<22}{'默认(次/s)':>12}{'快速(次/s)':>12}{'提升':>8}")
+    for path, label in zip(paths, ["/api/v1/products", "/api/v1/assets/{id}"]):
+        print(f"{label:<22}{default[path]:>12}{fast[path]:>12}{fast[path] / default[path]:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
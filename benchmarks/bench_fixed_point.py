@@ -0,0 +1,118 @@
+"""
+定点数运算基准 - 比较交易路径与净值重估中 Decimal 运算和定点整数运算的耗时
+
+1. 单笔运算：申购份额（金额 / 净值）与赎回金额（份额 × 净值）
+   Decimal 直接运算（不舍入）、定点整数运算（输入已是定点整数）、
+   以及交易路径的实际做法（Decimal 运算后舍入到 4 位小数）。
+2. 净值重估：一个产品有 --holders 个持有人时更新一次净值，
+   用户资产聚合（UserAssetBook.set_nav，定点整数）与等价的 Decimal 字典循环对比。
+3. 端到端：FundService.subscribe_fund（请求内立即确认）的单次耗时。
+
+用法:
+    python benchmarks/bench_fixed_point.py [--number 200000] [--holders 100000] [--trades 5000]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import timeit
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asset_book import UserAssetBook
+from fixed_point import amount_for_share, quantized_amount, quantized_share, share_for_amount, to_fixed
+from repository import Repository
+from service import FundService
+
+
+def _best_us(func, number: int, repeat: int = 5) -> float:
+    """最快一轮的单次耗时（微秒）"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def bench_arithmetic(number: int) -> list:
+    """单笔申购份额、赎回金额的耗时"""
+    amount, share, nav = Decimal("10000"), Decimal("8100.4455"), Decimal("1.2345")
+    amount_fixed, share_fixed, nav_fixed = to_fixed(amount), to_fixed(share), to_fixed(nav)
+    return [
+        ("申购份额", _best_us(lambda: amount / nav, number),
+         _best_us(lambda: share_for_amount(amount_fixed, nav_fixed), number),
+         _best_us(lambda: quantized_share(amount, nav), number)),
+        ("赎回金额", _best_us(lambda: share * nav, number),
+         _best_us(lambda: amount_for_share(share_fixed, nav_fixed), number),
+         _best_us(lambda: quantized_amount(share, nav), number)),
+    ]
+
+
+def bench_revaluation(holders: int) -> tuple:
+    """一个产品有 holders 个持有人时更新一次净值的耗时（毫秒）：(定点整数, Decimal)"""
+    book = UserAssetBook()
+    shares = {f"U{i}": Decimal(100 + i % 9000).scaleb(-2) for i in range(holders)}
+    for user_id, share in shares.items():
+        book.set_balance(user_id, Decimal("0"))
+        book.set_position(user_id, "A", "P", share)
+    # 等价的 Decimal 实现：持有人份额、市值均为 Decimal
+    fund_values = {user_id: Decimal("0") for user_id in shares}
+
+    def decimal_set_nav(change: Decimal):
+        for user_id, share in shares.items():
+            fund_values[user_id] = fund_values.get(user_id, Decimal("0")) + share * change
+
+    navs = [Decimal(10000 + i).scaleb(-4) for i in range(1, 6)]
+    fixed_ms, decimal_ms = [], []
+    gc.disable()
+    try:
+        for nav in navs:
+            start = time.perf_counter()
+            book.set_nav("P", nav)
+            fixed_ms.append((time.perf_counter() - start) * 1e3)
+            start = time.perf_counter()
+            decimal_set_nav(Decimal("0.0001"))
+            decimal_ms.append((time.perf_counter() - start) * 1e3)
+    finally:
+        gc.enable()
+    return min(fixed_ms), min(decimal_ms)
+
+
+def bench_subscribe(trades: int) -> float:
+    """端到端申购（立即确认）的单次耗时（微秒）"""
+    service = FundService(Repository())
+    user = service.create_user(user_name="基准用户")
+    service.deposit(user.user_id, Decimal(trades * 100))
+    account_id = service.open_fund_account(user.user_id).fund_account_id
+    product = service.create_fund_product(product_code="000001", product_name="基准基金")
+    service.create_fund_nav(product.product_id, Decimal("1.2345"), nav_date=date(2025, 1, 1))
+    amount = Decimal("99.99")
+    start = time.perf_counter()
+    for _ in range(trades):
+        service.subscribe_fund(account_id, product.product_id, amount)
+    return (time.perf_counter() - start) / trades * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="定点数运算基准")
+    parser.add_argument("--number", type=int, default=200000, help="单笔运算的调用次数")
+    parser.add_argument("--holders", type=int, default=100000, help="净值重估的持有人数")
+    parser.add_argument("--trades", type=int, default=5000, help="端到端申购笔数")
+    args = parser.parse_args()
+
+    print("单笔运算（us/次）")
+    print(f"{'运算':<10}{'Decimal':>10}{'定点整数':>10}{'含舍入':>10}")
+    for name, decimal_us, fixed_us, rounded_us in bench_arithmetic(args.number):
+        print(f"{name:<10}{decimal_us:>10.3f}{fixed_us:>10.3f}{rounded_us:>10.3f}")
+
+    fixed_ms, decimal_ms = bench_revaluation(args.holders)
+    print(f"\n净值重估（{args.holders} 个持有人，ms/次）")
+    print(f"{'定点整数':<10}{fixed_ms:>10.2f}")
+    print(f"{'Decimal':<10}{decimal_ms:>10.2f}")
+    print(f"加速: {decimal_ms / fixed_ms:.2f}x")
+
+    print(f"\n端到端申购: {bench_subscribe(args.trades):.1f} us/笔")
+
+
+if __name__ == "__main__":
+    main()
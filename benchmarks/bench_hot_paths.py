@@ -0,0 +1,249 @@
+"""
+热点路径基准 - 不同数据规模下仓库与服务热点路径的单次耗时、内存分配与回归检查
+
+对每个规模 N 新建内存仓库并预置：20 个产品共 N 条净值、N 个用户（各有余额、基金账户和 2 个产品的持仓），
+然后测量以下路径（每次调用随机选择用户/产品）：
+    repo.get_latest_nav        Repository.get_latest_nav
+    repo.get_user_balance      Repository.get_user_balance
+    service.subscribe_fund     FundService.subscribe_fund（请求内立即确认）
+    service.calculate_user_assets  FundService.calculate_user_assets
+
+耗时取 --repeat 轮中最快一轮的每次调用平均值（与 timeit 相同，测量期间关闭垃圾回收）；
+内存分配用 tracemalloc 单独测量：每次调用的峰值分配字节数，以及调用结束后仍保留的内存块数。
+输出各路径随规模变化的曲线（以及按最小、最大规模估算的增长阶数，0 表示与规模无关）。
+
+基线：--save-baseline 将本次结果写入 --baseline 文件；否则与基线文件逐项比较，
+任一路径的耗时或峰值分配比基线高出 --threshold 以上即报告回归并以退出码 1 结束。
+基线文件不存在时以退出码 2 结束，避免回归检查被悄悄跳过；只看报告时加 --no-check。
+基线与机器相关，应在同一台机器上生成和比较。
+
+用法:
+    python benchmarks/bench_hot_paths.py [--sizes 1000,10000,100000] [--number 2000] [--repeat 5]
+                                         [--baseline benchmarks/baselines/hot_paths.json] [--save-baseline | --no-check]
+                                         [--threshold 0.25] [--output result.json]
+    完整规模（约需数分钟和数 GB 内存）: --sizes 1000,10000,100000,1000000
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import FundShare
+from repository import Repository
+from service import FundService
+
+PRODUCTS = 20
+HOLDINGS = 2
+DEFAULT_SIZES = "1000,10000,100000"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "hot_paths.json")
+# 峰值分配低于该字节数的变化不视为回归（避免小对象的噪声）
+ALLOC_TOLERANCE_BYTES = 1024
+
+
+def seed(size: int, rng: random.Random) -> Tuple[FundService, List[str], List[Tuple[str, str]]]:
+    """预置规模为 size 的数据，返回 (服务, 产品ID列表, [(用户ID, 基金账户ID)])"""
+    service = FundService(Repository())
+    product_ids = [
+        service.create_fund_product(product_code=f"{i:06d}", product_name=f"基准基金{i}").product_id
+        for i in range(PRODUCTS)
+    ]
+    # 先写净值再建持仓，避免每条最新净值都重估全部持有人
+    start = date(2000, 1, 1)
+    for i in range(size):
+        service.create_fund_nav(product_ids[i % PRODUCTS], Decimal(1000 + i % 500).scaleb(-3),
+                                nav_date=start + timedelta(days=i // PRODUCTS))
+    users = []
+    for _ in range(size):
+        user = service.create_user(user_name="基准用户")
+        service.deposit(user.user_id, Decimal("100000000"))
+        account_id = service.open_fund_account(user.user_id).fund_account_id
+        for product_id in rng.sample(product_ids, HOLDINGS):
+            share = Decimal(rng.randint(100, 1000000)).scaleb(-2)
+            service.repo.create_or_update_fund_share(FundShare(
+                share_id=service._generate_id('SHARE_'),
+                fund_account_id=account_id,
+                product_id=product_id,
+                total_share=share,
+                available_share=share
+            ))
+        users.append((user.user_id, account_id))
+    return service, product_ids, users
+
+
+def hot_paths(service: FundService, product_ids: List[str], users: List[Tuple[str, str]],
+              rng: random.Random) -> Dict[str, Tuple[Callable[..., Any], Callable[[], tuple]]]:
+    """路径名 -> (被测函数, 生成一次调用参数的函数)"""
+    amount = Decimal("100")
+    return {
+        "repo.get_latest_nav": (service.repo.get_latest_nav, lambda: (rng.choice(product_ids),)),
+        "repo.get_user_balance": (service.repo.get_user_balance, lambda: (rng.choice(users)[0],)),
+        "service.subscribe_fund": (
+            service.subscribe_fund, lambda: (rng.choice(users)[1], rng.choice(product_ids), amount)
+        ),
+        "service.calculate_user_assets": (service.calculate_user_assets, lambda: (rng.choice(users)[0],)),
+    }
+
+
+def time_path(fn: Callable[..., Any], calls: Sequence[tuple], repeat: int) -> Tuple[float, float]:
+    """每轮依次执行全部调用，返回 (最快一轮, 中位数一轮) 的每次调用耗时（微秒）"""
+    rounds = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for args in calls:
+                fn(*args)
+            rounds.append((time.perf_counter() - start) / len(calls) * 1e6)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    rounds.sort()
+    return rounds[0], rounds[len(rounds) // 2]
+
+
+def measure_allocations(fn: Callable[..., Any], calls: Sequence[tuple]) -> Tuple[float, float]:
+    """返回每次调用的 (平均峰值分配字节数, 平均保留内存块数)"""
+    tracemalloc.start()
+    try:
+        before = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+        peak_total = 0
+        for args in calls:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(*args)
+            peak_total += tracemalloc.get_traced_memory()[1] - current
+        after = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    finally:
+        tracemalloc.stop()
+    return peak_total / len(calls), (after - before) / len(calls)
+
+
+def run(sizes: Sequence[int], number: int = 2000, repeat: int = 5, alloc_calls: int = 200,
+        seed_value: int = 42) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """按规模依次预置数据并测量，返回 {路径: {规模: 指标}}"""
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for size in sizes:
+        rng = random.Random(seed_value)
+        start = time.perf_counter()
+        service, product_ids, users = seed(size, rng)
+        print(f"规模 {size}: 预置数据 {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        for name, (fn, make_args) in hot_paths(service, product_ids, users, rng).items():
+            best, median = time_path(fn, [make_args() for _ in range(number)], repeat)
+            peak_bytes, retained_blocks = measure_allocations(fn, [make_args() for _ in range(alloc_calls)])
+            results.setdefault(name, {})[str(size)] = {
+                "us_per_call": round(best, 3),
+                "median_us": round(median, 3),
+                "peak_bytes": round(peak_bytes, 1),
+                "retained_blocks": round(retained_blocks, 2),
+            }
+        del service, product_ids, users
+        gc.collect()
+    return results
+
+
+def growth_order(points: Dict[str, Dict[str, float]]) -> float:
+    """按最小、最大规模估算的增长阶数 k（耗时约为 N^k）"""
+    sizes = sorted(points, key=int)
+    if len(sizes) < 2:
+        return 0.0
+    low, high = sizes[0], sizes[-1]
+    return math.log(points[high]["us_per_call"] / points[low]["us_per_call"]) / math.log(int(high) / int(low))
+
+
+def compare(results: Dict[str, Dict[str, Dict[str, float]]], baseline: Dict[str, Dict[str, Dict[str, float]]],
+            threshold: float) -> List[str]:
+    """与基线比较（只比较两边都有的路径和规模），返回回归说明"""
+    regressions = []
+    for name, points in results.items():
+        for size, current in points.items():
+            base = baseline.get(name, {}).get(size)
+            if base is None:
+                continue
+            if current["us_per_call"] > base["us_per_call"] * (1 + threshold):
+                regressions.append(
+                    f"{name} N={size} 耗时 {current['us_per_call']:.2f}us，基线 {base['us_per_call']:.2f}us"
+                )
+            if current["peak_bytes"] > base["peak_bytes"] * (1 + threshold) + ALLOC_TOLERANCE_BYTES:
+                regressions.append(
+                    f"{name} N={size} 峰值分配 {current['peak_bytes']:.0f}B，基线 {base['peak_bytes']:.0f}B"
+                )
+    return regressions
+
+
+def print_report(results: Dict[str, Dict[str, Dict[str, float]]]) -> None:
+    for name, points in results.items():
+        sizes = sorted(points, key=int)
+        first = points[sizes[0]]["us_per_call"]
+        print(f"\n{name}  （增长阶数 {growth_order(points):.2f}）")
+        print(f"{'规模':>10}{'耗时(us)':>12}{'中位数(us)':>12}{'相对最小规模':>14}{'峰值分配(B)':>14}{'保留块数':>10}")
+        for size in sizes:
+            p = points[size]
+            print(f"{size:>10}{p['us_per_call']:>12.2f}{p['median_us']:>12.2f}{p['us_per_call'] / first:>14.2f}x"
+                  f"{p['peak_bytes']:>14.0f}{p['retained_blocks']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点路径基准")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="数据规模，逗号分隔")
+    parser.add_argument("--number", type=int, default=2000, help="每轮调用次数")
+    parser.add_argument("--repeat", type=int, default=5, help="轮数")
+    parser.add_argument("--alloc-calls", type=int, default=200, help="测量内存分配的调用次数")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--no-check", action="store_true", help="只输出报告，不做基线回归检查")
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许比基线高出的比例")
+    parser.add_argument("--output", default=None, help="将本次结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    try:
+        sizes = [int(size) for size in args.sizes.split(",")]
+    except ValueError:
+        parser.error(f"规模必须是整数: {args.sizes}")
+    if any(size < PRODUCTS for size in sizes):
+        parser.error(f"规模不能小于产品数 {PRODUCTS}")
+
+    results = run(sizes, args.number, args.repeat, args.alloc_calls)
+    print(f"Python {platform.python_version()}  每轮 {args.number} 次 × {args.repeat} 轮")
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存: {args.baseline}")
+        return
+    if args.no_check:
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\n没有基线文件，无法做回归检查（用 --save-baseline 生成，或用 --no-check 只看报告）: {args.baseline}",
+              file=sys.stderr)
+        sys.exit(2)
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    if regressions:
+        print(f"\n超出基线 {args.threshold:.0%} 的回归:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\n与基线相比没有超过 {args.threshold:.0%} 的回归")
+
+
+if __name__ == "__main__":
+    main()
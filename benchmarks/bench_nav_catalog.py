@@ -0,0 +1,120 @@
+"""
+共享内存产品净值目录基准 - 测量净值查询耗时与跨进程可见延迟
+
+查询：同一组产品分别从仓库本地数据和共享内存目录查询最新净值。
+可见延迟：另一个进程映射目录并轮询某产品的最新净值，本进程发布新净值，
+子进程看到新净值的时刻减去发布时刻即为可见延迟。
+
+用法:
+    python benchmarks/bench_nav_catalog.py [--products 1000] [--lookups 200000] [--rounds 200]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import FundNetValue
+from nav_catalog import NavCatalog, _RECORD_SIZE
+from repository import Repository
+from service import FundService
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程：轮询最新净值，日期变化时输出看到的时刻
+_WATCHER = """
+import sys, time
+from nav_catalog import NavCatalog
+catalog = NavCatalog.attach(sys.argv[1])
+product_id = sys.argv[2]
+last = catalog.get_latest_nav(product_id)['nav_date']
+print('ready', flush=True)
+for _ in range(int(sys.argv[3])):
+    while True:
+        nav_date = catalog.get_latest_nav(product_id)['nav_date']
+        if nav_date != last:
+            break
+    seen = time.time()
+    last = nav_date
+    print(seen, flush=True)
+catalog.close()
+"""
+
+
+def _seed(repository: Repository, products: int) -> list:
+    """创建产品与一条净值，返回产品ID列表"""
+    service = FundService(repository)
+    product_ids = []
+    for i in range(products):
+        product = service.create_fund_product(product_code=f"{i:06d}", product_name=f"基准基金{i}")
+        service.create_fund_nav(product.product_id, Decimal("1.2345"), nav_date=date(2025, 1, 1))
+        product_ids.append(product.product_id)
+    return product_ids
+
+
+def bench_lookup(repository: Repository, product_ids: list, lookups: int) -> float:
+    """返回每次最新净值查询的平均耗时（微秒）"""
+    count = len(product_ids)
+    start = time.perf_counter()
+    for i in range(lookups):
+        repository.get_latest_nav(product_ids[i % count])
+    return (time.perf_counter() - start) / lookups * 1e6
+
+
+def bench_visibility(catalog: NavCatalog, product_id: str, rounds: int) -> list:
+    """返回每轮从发布到子进程看到新净值的延迟（毫秒）"""
+    watcher = subprocess.Popen([sys.executable, "-c", _WATCHER, catalog.name, product_id, str(rounds)],
+                               cwd=PROJECT_ROOT, stdout=subprocess.PIPE, text=True)
+    try:
+        assert watcher.stdout.readline().strip() == "ready"
+        latencies = []
+        for i in range(rounds):
+            published = time.time()
+            catalog.publish_nav(FundNetValue(nav_id=f"NAV_bench_{i}", product_id=product_id,
+                                             net_value=Decimal("1.5"),
+                                             nav_date=date(2025, 1, 2) + timedelta(days=i)))
+            latencies.append((float(watcher.stdout.readline()) - published) * 1000)
+        return latencies
+    finally:
+        watcher.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共享内存产品净值目录基准")
+    parser.add_argument("--products", type=int, default=1000, help="产品数")
+    parser.add_argument("--lookups", type=int, default=200000, help="查询次数")
+    parser.add_argument("--rounds", type=int, default=200, help="可见延迟测量轮数")
+    args = parser.parse_args()
+
+    catalog = NavCatalog.create(capacity=args.products)
+    try:
+        local = Repository()
+        product_ids = _seed(local, args.products)
+        for product_id in product_ids:
+            catalog.publish_product(local.get_fund_product(product_id))
+            catalog.publish_nav(local.get_latest_nav(product_id))
+        shared = Repository()
+        shared.attach_catalog(catalog)
+
+        print(f"产品数: {args.products}，共享内存段: {(64 + args.products * _RECORD_SIZE) / 1024:.0f} KiB"
+              f"（各工作进程共用一份）")
+        print(f"{'查询方式':<16}{'平均耗时(us)':>14}")
+        print(f"{'仓库本地数据':<16}{bench_lookup(local, product_ids, args.lookups):>14.2f}")
+        print(f"{'共享内存目录':<16}{bench_lookup(shared, product_ids, args.lookups):>14.2f}")
+
+        latencies = sorted(bench_visibility(catalog, product_ids[0], args.rounds))
+        print(f"\n跨进程可见延迟（{args.rounds} 轮，毫秒）: "
+              f"中位数 {statistics.median(latencies):.3f}，"
+              f"P99 {latencies[int(len(latencies) * 0.99) - 1]:.3f}，最大 {latencies[-1]:.3f}")
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
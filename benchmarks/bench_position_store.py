@@ -0,0 +1,105 @@
+"""
+列式持仓存储基准 - 比较逐行存储与列式持仓存储的内存占用和读写耗时
+
+分别向 Repository()（FundShare 模型逐行存储）和 Repository(columnar_positions=True)
+写入 N 个持仓（每个账户持有 --holdings 个产品），用 tracemalloc 统计仓库保留的内存，
+换算为每百万持仓的占用；然后随机读取和更新持仓，统计单次耗时。
+
+用法:
+    python benchmarks/bench_position_store.py [--positions 100000] [--holdings 4] [--ops 50000]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import FundShare
+from repository import Repository
+
+
+def _build(columnar: bool, positions: int, holdings: int):
+    """写入持仓，返回 (仓库, 持仓键列表, 仓库保留的字节数)"""
+    rng = random.Random(42)
+    products = [f"PROD_{uuid.uuid4().hex[:16]}" for _ in range(max(holdings * 5, 20))]
+    keys = []
+    gc.collect()
+    tracemalloc.start()
+    repo = Repository(columnar_positions=columnar)
+    for _ in range(positions // holdings):
+        account_id = f"ACC_{uuid.uuid4().hex[:16]}"
+        for product_id in rng.sample(products, holdings):
+            share = Decimal(rng.randint(100, 100000000)).scaleb(-4)
+            repo.create_or_update_fund_share(FundShare(
+                share_id=f"SHARE_{uuid.uuid4().hex[:16]}",
+                fund_account_id=account_id,
+                product_id=product_id,
+                total_share=share,
+                available_share=share
+            ))
+            keys.append((account_id, product_id))
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # 持仓键列表本身不算在仓库内
+    return repo, keys, retained - sys.getsizeof(keys) - sum(sys.getsizeof(key) for key in keys)
+
+
+def run(columnar: bool, positions: int, holdings: int, ops: int) -> dict:
+    repo, keys, retained = _build(columnar, positions, holdings)
+    count = len(keys)
+    rng = random.Random(7)
+    sample = [rng.choice(keys) for _ in range(ops)]
+
+    start = time.perf_counter()
+    for account_id, product_id in sample:
+        repo.get_fund_share(account_id, product_id)
+    get_us = (time.perf_counter() - start) / ops * 1e6
+
+    start = time.perf_counter()
+    for account_id, product_id in sample:
+        share = repo.get_fund_share(account_id, product_id)
+        share.available_share -= Decimal("0.0001")
+        share.frozen_share += Decimal("0.0001")
+        repo.create_or_update_fund_share(share)
+    update_us = (time.perf_counter() - start) / ops * 1e6
+
+    start = time.perf_counter()
+    for account_id, _ in sample:
+        repo.get_account_shares(account_id)
+    account_us = (time.perf_counter() - start) / ops * 1e6
+    return {
+        'name': "列式存储" if columnar else "逐行存储",
+        'bytes_per_position': retained / count,
+        'mb_per_million': retained / count * 1e6 / 2 ** 20,
+        'get_us': get_us,
+        'update_us': update_us,
+        'account_us': account_us,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列式持仓存储基准")
+    parser.add_argument("--positions", type=int, default=100000, help="持仓数")
+    parser.add_argument("--holdings", type=int, default=4, help="每个账户持有的产品数")
+    parser.add_argument("--ops", type=int, default=50000, help="读取/更新次数")
+    args = parser.parse_args()
+
+    results = [run(columnar, args.positions, args.holdings, args.ops) for columnar in (False, True)]
+    print(f"持仓数: {args.positions}  每账户产品数: {args.holdings}")
+    print(f"{'存储':<10}{'字节/持仓':>12}{'MB/百万持仓':>14}{'读取(us)':>12}{'读改写(us)':>12}{'账户持仓(us)':>14}")
+    for r in results:
+        print(f"{r['name']:<10}{r['bytes_per_position']:>12.0f}{r['mb_per_million']:>14.0f}"
+              f"{r['get_us']:>12.2f}{r['update_us']:>12.2f}{r['account_us']:>14.2f}")
+    print(f"\n内存减少: {results[0]['bytes_per_position'] / results[1]['bytes_per_position']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+净值重估基准 - 对比逐用户写快照与 NumPy 批量重估的耗时
+
+先为 N 个用户建立持仓（每人持有若干产品），然后分别用
+snapshot_all_user_assets（逐用户、逐行校验写入）和 RevaluationEngine.revalue
+（向量化计算、批量写入）重估一批净值。
+
+用法:
+    python benchmarks/bench_revaluation.py [--users 20000] [--products 20] [--holdings 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import FundShare
+from repository import Repository
+from revaluation import RevaluationEngine
+from service import FundService
+
+
+def _setup(users: int, products: int, holdings: int):
+    """准备用户、账户、产品净值与持仓"""
+    rng = random.Random(42)
+    service = FundService(Repository())
+    product_ids = [
+        service.create_fund_product(product_code=f"{i:06d}", product_name=f"基准基金{i}").product_id
+        for i in range(products)
+    ]
+    for product_id in product_ids:
+        service.create_fund_nav(product_id=product_id, net_value=Decimal("1.0000"), nav_date=date(2025, 1, 1))
+    for _ in range(users):
+        user = service.create_user(user_name="基准用户")
+        account = service.open_fund_account(user.user_id)
+        for product_id in rng.sample(product_ids, holdings):
+            share = Decimal(rng.randint(100, 1000000)).scaleb(-2)
+            service.repo.create_or_update_fund_share(FundShare(
+                share_id=service._generate_id('SHARE_'),
+                fund_account_id=account.fund_account_id,
+                product_id=product_id,
+                total_share=share,
+                available_share=share
+            ))
+    navs = {product_id: Decimal(rng.randint(5000, 30000)).scaleb(-4) for product_id in product_ids}
+    return service, navs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="净值重估基准")
+    parser.add_argument("--users", type=int, default=20000, help="用户数")
+    parser.add_argument("--products", type=int, default=20, help="产品数")
+    parser.add_argument("--holdings", type=int, default=3, help="每个用户持有的产品数")
+    args = parser.parse_args()
+
+    service, navs = _setup(args.users, args.products, args.holdings)
+    nav_date = date(2025, 1, 2)
+
+    # 逐用户：净值增量维护后逐个写快照
+    start = time.perf_counter()
+    for product_id, net_value in navs.items():
+        service.create_fund_nav(product_id=product_id, net_value=net_value, nav_date=nav_date)
+    service.snapshot_all_user_assets()
+    per_user_ms = (time.perf_counter() - start) * 1000
+
+    # 批量：向量化重估并批量写入
+    stats = RevaluationEngine(service.repo).revalue(nav_date, navs)
+    batch_ms = stats['elapsed_ms']
+
+    print(f"用户数: {args.users}  产品数: {args.products}  持仓数: {stats['positions']}")
+    print(f"{'方式':<10}{'耗时(ms)':>12}")
+    print(f"{'逐用户':<10}{per_user_ms:>12.1f}")
+    print(f"{'批量重估':<10}{batch_ms:>12.1f}")
+    print(f"\n批量重估加速比: {per_user_ms / batch_ms:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+分片部署基准 - 测量经路由的申购吞吐随分片（工作进程）数的变化
+
+每种分片数：先在各分片的数据目录中预置用户（ID落在所属分片）、账户、余额和同一产品，
+再启动分片工作进程（启动时从数据目录恢复，日志不调用 fsync）与路由进程，全部经 Unix 套接字通信；
+并发客户端经路由循环申购，统计总吞吐。每个分片是独立进程、各自持有数据和 GIL，
+吞吐随分片数的增长受 CPU 核数限制（分片数超过核数后不再增长），路由本身也占用一个核。
+
+用法:
+    python benchmarks/bench_sharding.py [--shards 1,2,4] [--users 64] [--concurrency 64] [--seconds 5]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from common.persistence import Persistence
+from repository import Repository
+from service import FundService
+from sharding import ShardIdGenerator, start_shards, stop_shards
+
+HEADERS = {"Authorization": "Bearer demo_token_2025"}
+PRODUCT_ID = "PROD_bench000000000001"
+
+
+def _seed(data_dir: str, shards: int, users: int) -> list:
+    """在各分片的数据目录中预置用户、账户、余额与产品，返回全部基金账户ID"""
+    accounts = []
+    for shard_index in range(shards):
+        suffix = f"-shard-{shard_index}" if shards > 1 else ""
+        repo = Repository(persistence=Persistence(os.path.join(data_dir, f"repository{suffix}"), fsync=False))
+        service = FundService(repo, id_generator=ShardIdGenerator(shard_index, shards))
+        service.create_fund_product(product_code="000001", product_name="基准基金", product_id=PRODUCT_ID)
+        service.create_fund_nav(product_id=PRODUCT_ID, net_value=Decimal("1.2345"), nav_date=date(2025, 1, 1))
+        for i in range(shard_index, users, shards):
+            user = service.create_user(user_name=f"基准用户{i}")
+            balance = repo.get_user_balance(user.user_id)
+            balance.available_balance = Decimal("1000000000")
+            repo.update_user_balance(balance)
+            accounts.append(service.open_fund_account(user.user_id).fund_account_id)
+        repo.close()
+    return accounts
+
+
+async def _drive(router_socket: str, accounts: list, concurrency: int, seconds: float) -> int:
+    """并发客户端经路由循环申购，返回成功笔数"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    transport = httpx.AsyncHTTPTransport(uds=router_socket, limits=limits)
+    async with httpx.AsyncClient(transport=transport, base_url="http://router", headers=HEADERS) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def worker(index: int) -> int:
+            done = 0
+            while time.perf_counter() < deadline:
+                account_id = accounts[(index + done * concurrency) % len(accounts)]
+                response = await client.post("/api/v1/funds/subscribe", json={
+                    "fund_account_id": account_id, "product_id": PRODUCT_ID, "amount": 100
+                })
+                response.raise_for_status()
+                done += 1
+            return done
+
+        return sum(await asyncio.gather(*[worker(i) for i in range(concurrency)]))
+
+
+def run(shards: int, users: int, concurrency: int, seconds: float) -> int:
+    """运行一种分片数的负载，返回每秒申购笔数"""
+    work_dir = tempfile.mkdtemp(prefix="bench-sharding-")
+    data_dir = os.path.join(work_dir, "data")
+    socket_dir = os.path.join(work_dir, "sockets")
+    router = None
+    processes = []
+    try:
+        accounts = _seed(data_dir, shards, users)
+        processes = start_shards(shards, socket_dir, env={
+            'DATA_DIR': data_dir, 'DATA_FSYNC': '0', 'LOG_LEVEL': 'WARNING'
+        })
+        router_socket = os.path.join(socket_dir, "router.sock")
+        router = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "shard_router:app", "--uds", router_socket, "--log-level", "warning"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env={**os.environ, 'SHARD_SOCKET_DIR': socket_dir, 'SHARD_COUNT': str(shards)}
+        )
+        while not os.path.exists(router_socket):
+            time.sleep(0.05)
+        completed = asyncio.run(_drive(router_socket, accounts, concurrency, seconds))
+        return round(completed / seconds)
+    finally:
+        stop_shards(processes + ([router] if router else []))
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片部署基准")
+    parser.add_argument("--shards", default="1,2,4", help="分片数列表，逗号分隔")
+    parser.add_argument("--users", type=int, default=64, help="用户数")
+    parser.add_argument("--concurrency", type=int, default=64, help="并发客户端数")
+    parser.add_argument("--seconds", type=float, default=5, help="每种分片数的压测时长（秒）")
+    args = parser.parse_args()
+
+    print(f"CPU 核数: {os.cpu_count()}，并发客户端: {args.concurrency}")
+    print(f"{'分片数':<8}{'申购(笔/s)':>12}{'加速比':>10}")
+    baseline = None
+    for shards in [int(n) for n in args.shards.split(",")]:
+        rate = run(shards, args.users, args.concurrency, args.seconds)
+        baseline = baseline or rate
+        print(f"{shards:<8}{rate:>12}{rate / baseline:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+存储后端基准 - 对比内存字典与 SQLite 两种后端的交易与查询吞吐
+
+交易负载为单笔申购加赎回、以及 submit_orders 批量下单（批量写入走 executemany）；
+查询负载为按主键读取余额/份额/委托，以及按用户查询最新总资产（走 idx_user_date 索引）。
+SQLite 使用临时目录中的数据库文件（WAL 模式）。
+
+用法:
+    python benchmarks/bench_sqlite_backend.py [--users 200] [--trades 2000] [--lookups 20000]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repository import Repository
+from service import FundService
+from sqlite_repository import SqliteRepository
+
+
+def _setup(repo, users: int):
+    """准备用户、账户和一个有净值的产品"""
+    service = FundService(repo)
+    product = service.create_fund_product(product_code="000001", product_name="基准基金")
+    service.create_fund_nav(product_id=product.product_id, net_value=Decimal("1.2345"),
+                            nav_date=date(2025, 1, 1))
+    accounts = []
+    for i in range(users):
+        user = service.create_user(user_name=f"基准用户{i}")
+        balance = repo.get_user_balance(user.user_id)
+        balance.available_balance = Decimal("1000000000")
+        repo.update_user_balance(balance)
+        accounts.append((user.user_id, service.open_fund_account(user.user_id).fund_account_id))
+    return service, accounts, product.product_id
+
+
+def _rate(count: int, seconds: float) -> int:
+    """每秒操作数"""
+    return round(count / seconds) if seconds else 0
+
+
+def run(backend: str, users: int, trades: int, lookups: int, batch: int, directory: str) -> dict:
+    """运行基准，返回各负载的吞吐"""
+    if backend == 'sqlite':
+        repo = SqliteRepository(os.path.join(directory, "bench.db"))
+    else:
+        repo = Repository()
+    service, accounts, product_id = _setup(repo, users)
+    rng = random.Random(42)
+
+    # 单笔交易：申购加赎回
+    entrust_ids = []
+    start = time.perf_counter()
+    for i in range(trades):
+        _, account_id = accounts[i % users]
+        result = service.subscribe_fund(account_id, product_id, Decimal("100"))
+        service.redeem_fund(account_id, product_id, Decimal(str(result['share'])) / 2)
+        entrust_ids.append(result['entrust_id'])
+    trade_seconds = time.perf_counter() - start
+
+    # 批量下单
+    orders = [
+        {'transaction_type': 'SUBSCRIBE', 'fund_account_id': accounts[i % users][1],
+         'product_id': product_id, 'amount': Decimal("100")}
+        for i in range(trades)
+    ]
+    start = time.perf_counter()
+    for offset in range(0, trades, batch):
+        service.submit_orders(orders[offset:offset + batch])
+    batch_seconds = time.perf_counter() - start
+
+    service.snapshot_all_user_assets()
+
+    # 主键查询：余额、份额、委托
+    start = time.perf_counter()
+    for _ in range(lookups):
+        user_id, account_id = accounts[rng.randrange(users)]
+        repo.get_user_balance(user_id)
+        repo.get_fund_share(account_id, product_id)
+        repo.get_entrust(entrust_ids[rng.randrange(trades)])
+    lookup_seconds = time.perf_counter() - start
+
+    # 索引查询：用户最新总资产
+    asset_lookups = max(lookups // 10, 1)
+    start = time.perf_counter()
+    for _ in range(asset_lookups):
+        repo.get_latest_user_total_asset(accounts[rng.randrange(users)][0])
+    asset_seconds = time.perf_counter() - start
+
+    repo.close()
+    return {
+        'backend': backend,
+        'trades_per_s': _rate(trades, trade_seconds),
+        'batch_orders_per_s': _rate(trades, batch_seconds),
+        'lookups_per_s': _rate(lookups * 3, lookup_seconds),
+        'asset_lookups_per_s': _rate(asset_lookups, asset_seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="存储后端基准")
+    parser.add_argument("--users", type=int, default=200, help="用户数")
+    parser.add_argument("--trades", type=int, default=2000, help="交易笔数（申购加赎回）")
+    parser.add_argument("--lookups", type=int, default=20000, help="查询轮数（每轮3次主键查询）")
+    parser.add_argument("--batch", type=int, default=500, help="批量下单每批订单数")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench-sqlite-")
+    try:
+        results = [
+            run(backend, args.users, args.trades, args.lookups, args.batch, directory)
+            for backend in ('memory', 'sqlite')
+        ]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"{'后端':<8}{'交易(笔/s)':>12}{'批量下单(笔/s)':>16}{'主键查询(次/s)':>16}{'最新资产(次/s)':>16}")
+    for r in results:
+        print(f"{r['backend']:<8}{r['trades_per_s']:>12}{r['batch_orders_per_s']:>16}"
+              f"{r['lookups_per_s']:>16}{r['asset_lookups_per_s']:>16}")
+
+
+if __name__ == "__main__":
+    main()
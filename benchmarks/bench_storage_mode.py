@@ -0,0 +1,97 @@
+"""
+存储模式微基准 - 对比 dict 模式与 model 模式下单笔交易的CPU耗时和内存分配
+
+每笔交易为一次申购加一次赎回；峰值字节为交易过程中的临时分配，
+留存字节为写入存储的委托、确认、资产快照等记录。
+
+用法:
+    python benchmarks/bench_storage_mode.py [--trades 2000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repository import Repository, STORAGE_MODE_DICT, STORAGE_MODE_MODEL
+from service import FundService
+
+
+def _setup(storage_mode: str):
+    """准备一个用户、一个账户和一个有净值的产品"""
+    service = FundService(Repository(storage_mode=storage_mode))
+    user = service.create_user(user_name="基准用户")
+    balance = service.repo.get_user_balance(user.user_id)
+    balance.available_balance = Decimal("1000000000")
+    service.repo.update_user_balance(balance)
+    account = service.open_fund_account(user.user_id)
+    product = service.create_fund_product(product_code="000001", product_name="基准基金")
+    service.create_fund_nav(product_id=product.product_id, net_value=Decimal("1.2345"))
+    return service, account.fund_account_id, product.product_id
+
+
+def _trade(service: FundService, account_id: str, product_id: str):
+    """一笔申购加一笔赎回"""
+    result = service.subscribe_fund(account_id, product_id, Decimal("100"))
+    service.redeem_fund(account_id, product_id, Decimal(str(result['share'])) / 2)
+
+
+def run(storage_mode: str, trades: int) -> dict:
+    """运行基准，返回每笔交易的CPU耗时与内存分配"""
+    service, account_id, product_id = _setup(storage_mode)
+    # 预热
+    for _ in range(10):
+        _trade(service, account_id, product_id)
+
+    start = time.process_time()
+    for _ in range(trades):
+        _trade(service, account_id, product_id)
+    cpu_us = (time.process_time() - start) / trades * 1e6
+
+    # 单笔交易的瞬时内存峰值（临时对象）与留存内存（写入存储的记录）
+    sample = min(trades, 200)
+    tracemalloc.start()
+    peak_total = 0
+    for _ in range(sample):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        _trade(service, account_id, product_id)
+        peak_total += tracemalloc.get_traced_memory()[1] - current
+    before = tracemalloc.take_snapshot()
+    for _ in range(sample):
+        _trade(service, account_id, product_id)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    retained_blocks = sum(max(s.count_diff, 0) for s in stats) / sample
+    retained_bytes = sum(max(s.size_diff, 0) for s in stats) / sample
+
+    return {
+        'storage_mode': storage_mode,
+        'cpu_us_per_trade': round(cpu_us, 1),
+        'peak_bytes_per_trade': round(peak_total / sample),
+        'retained_blocks_per_trade': round(retained_blocks, 1),
+        'retained_bytes_per_trade': round(retained_bytes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="存储模式微基准")
+    parser.add_argument("--trades", type=int, default=2000, help="交易笔数")
+    args = parser.parse_args()
+
+    results = [run(mode, args.trades) for mode in (STORAGE_MODE_DICT, STORAGE_MODE_MODEL)]
+    print(f"{'模式':<8}{'CPU(us/笔)':>12}{'峰值字节/笔':>14}{'留存块数/笔':>14}{'留存字节/笔':>14}")
+    for r in results:
+        print(f"{r['storage_mode']:<8}{r['cpu_us_per_trade']:>12}{r['peak_bytes_per_trade']:>14}"
+              f"{r['retained_blocks_per_trade']:>14}{r['retained_bytes_per_trade']:>14}")
+    speedup = results[0]['cpu_us_per_trade'] / results[1]['cpu_us_per_trade']
+    print(f"\nmodel 模式CPU加速比: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
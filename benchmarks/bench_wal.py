@@ -0,0 +1,111 @@
+"""
+预写日志基准 - 组提交与逐条 fsync 的写入吞吐，以及恢复耗时随数据量的变化
+
+写入吞吐：多个线程并发写入余额记录，对比
+    - 逐条 fsync（group_commit=False）
+    - 组提交，写入方等待落盘（sync_commit=True）
+    - 组提交，写入方不等待落盘（sync_commit=False）
+恢复耗时：写入不同数量的份额记录，分别测量仅重放日志与加载快照后重启的耗时。
+
+用法:
+    python benchmarks/bench_wal.py [--threads 8] [--writes 500] [--sizes 10000,50000,100000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.persistence import Persistence
+from models import FundAccount, FundShare, UserBalance
+from repository import Repository
+
+
+def bench_writes(directory: str, threads: int, writes: int, group_commit: bool, sync_commit: bool) -> float:
+    """并发写入余额记录，返回每秒写入条数"""
+    repo = Repository(persistence=Persistence(directory, group_commit=group_commit,
+                                              sync_commit=sync_commit, snapshot_every=0))
+    balances = [
+        UserBalance(balance_id=f"BAL_{n}", user_id=f"USER_{n}", available_balance=Decimal("0"))
+        for n in range(threads)
+    ]
+
+    def writer(balance):
+        for i in range(writes):
+            balance = balance.model_copy()
+            balance.available_balance = Decimal(i)
+            repo.update_user_balance(balance)
+
+    workers = [threading.Thread(target=writer, args=(balance,)) for balance in balances]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    repo.close()
+    elapsed = time.perf_counter() - start
+    return threads * writes / elapsed
+
+
+def bench_recovery(directory: str, size: int, take_snapshot: bool) -> float:
+    """写入 size 条份额记录后重启，返回恢复耗时（毫秒）"""
+    repo = Repository(persistence=Persistence(directory, sync_commit=False, snapshot_every=0))
+    accounts = max(size // 10, 1)
+    for n in range(accounts):
+        repo.create_fund_account(FundAccount(
+            fund_account_id=f"ACC_{n}", user_id=f"USER_{n}", account_no=f"F{n}", open_date="2025-01-01"
+        ))
+    for i in range(size):
+        repo.create_or_update_fund_share(FundShare(
+            share_id=f"SHARE_{i}", fund_account_id=f"ACC_{i % accounts}", product_id=f"PROD_{i // accounts}",
+            total_share=Decimal(i), available_share=Decimal(i)
+        ))
+    if take_snapshot:
+        repo.snapshot()
+    repo.close()
+
+    start = time.perf_counter()
+    repo = Repository(persistence=Persistence(directory, snapshot_every=0))
+    elapsed = (time.perf_counter() - start) * 1000
+    repo.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预写日志基准")
+    parser.add_argument("--threads", type=int, default=8, help="并发写入线程数")
+    parser.add_argument("--writes", type=int, default=500, help="每个线程写入条数")
+    parser.add_argument("--sizes", default="10000,50000,100000", help="恢复测试的数据量")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_wal_")
+    try:
+        print(f"写入吞吐（{args.threads} 线程 x {args.writes} 条）")
+        print(f"{'模式':<24}{'条/秒':>12}")
+        for name, group_commit, sync_commit in [
+            ("逐条fsync", False, True),
+            ("组提交(等待落盘)", True, True),
+            ("组提交(不等待落盘)", True, False),
+        ]:
+            directory = os.path.join(root, f"writes_{group_commit}_{sync_commit}")
+            rate = bench_writes(directory, args.threads, args.writes, group_commit, sync_commit)
+            print(f"{name:<24}{rate:>12.0f}")
+
+        print("\n恢复耗时（ms）")
+        print(f"{'记录数':<10}{'仅日志':>12}{'快照':>12}")
+        for size in (int(s) for s in args.sizes.split(",")):
+            log_ms = bench_recovery(os.path.join(root, f"log_{size}"), size, take_snapshot=False)
+            snapshot_ms = bench_recovery(os.path.join(root, f"snap_{size}"), size, take_snapshot=True)
+            print(f"{size:<10}{log_ms:>12.1f}{snapshot_ms:>12.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
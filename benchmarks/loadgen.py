@@ -0,0 +1,356 @@
+"""
+负载生成器 - 合成用户重放 开户→入金→开通基金账户→申购→赎回，报告各接口吞吐、延迟分位与错误率
+
+分两个阶段：
+1. 开户阶段：--users 个合成用户各自完成 创建用户→入金→开通基金账户→首次申购（同时进行 --concurrency 个），
+   然后等待首次申购确认完成
+2. 稳态阶段：按泊松过程以平均 --rate 次/秒到达，持续 --duration 秒；每次到达按 --mix 的权重选择操作、随机选择用户，
+   不等待之前的请求完成（开环）。延迟从计划到达时刻算起，服务变慢造成的排队时间计入延迟，避免协调遗漏
+
+默认在进程内经 ASGI 传输直接调用 main_v2:app（不经过网络，客户端与服务共用一个事件循环）；
+指定 --url 时经 HTTP 访问已启动的服务，服务需以 LOADTEST_DEPOSIT=1 启动（开放压测入金接口）。
+结果以 JSON 输出到标准输出或 --output 文件；指定 --max-error-rate / --max-p99-ms 时，
+稳态阶段任一接口超出阈值则以退出码 1 结束，可用于发布前的回归检查。
+
+用法:
+    python benchmarks/loadgen.py [--users 1000] [--rate 500] [--duration 10]
+                                 [--mix subscribe=40,redeem=20,assets=30,products=10]
+                                 [--url http://localhost:8000] [--output report.json]
+                                 [--max-error-rate 0.01] [--max-p99-ms 200]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from async_client import AsyncFundClient
+from client import parse_response
+
+# 稳态阶段可选的操作及对应接口
+OPERATIONS = {
+    "subscribe": "POST /api/v1/funds/subscribe",
+    "redeem": "POST /api/v1/funds/redeem",
+    "assets": "GET /api/v1/assets/{user_id}",
+    "products": "GET /api/v1/products",
+    "user": "GET /api/v1/users/{user_id}",
+}
+DEFAULT_MIX = "subscribe=40,redeem=20,assets=30,products=10"
+PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999))
+# 每个接口保留的错误信息条数
+ERROR_SAMPLES = 3
+
+DEPOSIT_AMOUNT = 1000000
+SUBSCRIBE_AMOUNT = 100
+REDEEM_SHARE = 1
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """解析操作权重，如 "subscribe=40,redeem=20"（未列出的操作不发起）"""
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"未知操作: {name}（可选: {', '.join(OPERATIONS)}）")
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise ValueError(f"权重必须是数字: {item}")
+        if weights[name] < 0:
+            raise ValueError(f"权重不能为负数: {item}")
+    if sum(weights.values()) <= 0:
+        raise ValueError(f"权重之和必须大于0: {mix}")
+    return weights
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """最近秩法分位数（sorted_values 已升序且非空）"""
+    return sorted_values[max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))]
+
+
+class LatencyRecorder:
+    """按接口记录每次请求的延迟（秒）与错误"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.error_samples: Dict[str, List[str]] = defaultdict(list)
+
+    def record(self, endpoint: str, seconds: float, error: Optional[BaseException] = None) -> None:
+        self.latencies[endpoint].append(seconds)
+        if error is not None:
+            self.errors[endpoint] += 1
+            message = f"{type(error).__name__}: {error}"[:200]
+            samples = self.error_samples[endpoint]
+            if len(samples) < ERROR_SAMPLES and message not in samples:
+                samples.append(message)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        """汇总为 {duration_s, requests, errors, throughput, endpoints: {接口: 统计}}，延迟单位毫秒"""
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            errors = self.errors[endpoint]
+            latency = {"mean": sum(values) / len(values) * 1000}
+            latency.update((name, percentile(values, q) * 1000) for name, q in PERCENTILES)
+            latency["max"] = values[-1] * 1000
+            endpoints[endpoint] = {
+                "count": len(values),
+                "errors": errors,
+                "error_rate": errors / len(values),
+                "throughput": round(len(values) / elapsed, 3) if elapsed > 0 else 0.0,
+                "latency_ms": {name: round(value, 3) for name, value in latency.items()},
+            }
+            if self.error_samples[endpoint]:
+                endpoints[endpoint]["error_samples"] = self.error_samples[endpoint]
+        requests = sum(stats["count"] for stats in endpoints.values())
+        errors = sum(self.errors.values())
+        return {
+            "duration_s": round(elapsed, 3),
+            "requests": requests,
+            "errors": errors,
+            "error_rate": errors / requests if requests else 0.0,
+            "throughput": round(requests / elapsed, 3) if elapsed > 0 else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+async def _timed(recorder: LatencyRecorder, endpoint: str, call: Awaitable[Any],
+                 started: Optional[float] = None) -> Any:
+    """等待调用完成并记录延迟（started 为计划开始时刻，默认为当前时刻）；失败时记录后重新抛出"""
+    started = time.perf_counter() if started is None else started
+    try:
+        result = await call
+    except Exception as e:
+        recorder.record(endpoint, time.perf_counter() - started, e)
+        raise
+    recorder.record(endpoint, time.perf_counter() - started)
+    return result
+
+
+class Workload:
+    """一次压测：合成用户、操作权重与两个阶段的执行"""
+
+    def __init__(self, client: AsyncFundClient, users: int, mix: Dict[str, float],
+                 concurrency: int = 100, seed: Optional[int] = None):
+        self.client = client
+        self.user_count = users
+        self.mix = mix
+        self.concurrency = concurrency
+        self.rng = random.Random(seed)
+        # 标识本次运行，对同一服务重复压测时用户证件号、产品代码不重复
+        self.tag = uuid.uuid4().hex[:8]
+        self.product_id: Optional[str] = None
+        # (user_id, fund_account_id)
+        self.users: List[Tuple[str, str]] = []
+
+    async def _call(self, method: str, endpoint: str, **kwargs: Any) -> Any:
+        """调用 AsyncFundClient 未封装的接口（入金、委托查询）"""
+        response = await self.client.http_client.request(
+            method, f"{self.client.base_url}{endpoint}", headers=self.client.headers, **kwargs
+        )
+        return parse_response(response)
+
+    async def setup(self) -> None:
+        """创建压测用的产品和当日净值"""
+        self.product_id = await self.client.create_product(f"LT{self.tag}", f"压测基金{self.tag}")
+        await self.client.create_nav(self.product_id, 1.0)
+
+    async def onboard(self, recorder: LatencyRecorder, confirm_timeout: float = 60) -> Dict[str, Any]:
+        """开户阶段：全部合成用户完成开户和首次申购，等待申购确认后返回本阶段统计"""
+        gate = asyncio.Semaphore(self.concurrency)
+
+        async def one(i: int) -> Optional[Tuple[str, str, str]]:
+            async with gate:
+                try:
+                    user_id = await _timed(recorder, "POST /api/v1/users", self.client.create_user(
+                        f"压测用户{i}", f"{self.tag}{i:010d}"
+                    ))
+                    await _timed(recorder, "POST /internal/users/{user_id}/deposit", self._call(
+                        "POST", f"/internal/users/{user_id}/deposit", params={"amount": DEPOSIT_AMOUNT}
+                    ))
+                    account_id = await _timed(recorder, "POST /api/v1/accounts/open",
+                                              self.client.open_fund_account(user_id))
+                    result = await _timed(recorder, OPERATIONS["subscribe"], self.client.subscribe_fund(
+                        account_id, self.product_id, SUBSCRIBE_AMOUNT
+                    ))
+                except Exception:
+                    return None
+                return user_id, account_id, result["entrust_id"]
+
+        started = time.perf_counter()
+        onboarded = [item for item in await asyncio.gather(*(one(i) for i in range(self.user_count))) if item]
+        self.users = [(user_id, account_id) for user_id, account_id, _ in onboarded]
+        if onboarded:
+            # 确认按受理顺序处理，最后受理的委托完成即全部完成
+            await self._wait_confirmed(max(onboarded, key=lambda item: item[2])[2], confirm_timeout)
+        report = recorder.report(time.perf_counter() - started)
+        report["users"] = len(self.users)
+        return report
+
+    async def _wait_confirmed(self, entrust_id: str, timeout: float) -> None:
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            entrust = await self._call("GET", f"/api/v1/funds/entrusts/{entrust_id}")
+            if entrust["status"] not in ("PENDING", "PROCESSING"):
+                return
+            await asyncio.sleep(0.05)
+        raise TimeoutError(f"首次申购在 {timeout} 秒内未确认完成: {entrust_id}")
+
+    def _operation(self, name: str) -> Awaitable[Any]:
+        user_id, account_id = self.rng.choice(self.users)
+        if name == "subscribe":
+            return self.client.subscribe_fund(account_id, self.product_id, SUBSCRIBE_AMOUNT)
+        if name == "redeem":
+            return self.client.redeem_fund(account_id, self.product_id, REDEEM_SHARE)
+        if name == "assets":
+            return self.client.get_user_assets(user_id)
+        if name == "products":
+            return self.client.get_products()
+        return self.client.get_user(user_id)
+
+    async def open_loop(self, recorder: LatencyRecorder, rate: float, duration: float) -> Dict[str, Any]:
+        """稳态阶段：泊松到达的开环负载，返回本阶段统计"""
+        if not self.users:
+            raise ValueError("没有可用的合成用户（开户阶段全部失败）")
+        names, weights = list(self.mix), list(self.mix.values())
+        tasks = []
+        max_lag = 0.0
+
+        async def fire(name: str, scheduled: float) -> None:
+            try:
+                await _timed(recorder, OPERATIONS[name], self._operation(name), started=scheduled)
+            except Exception:
+                pass
+
+        started = time.perf_counter()
+        scheduled = started
+        while True:
+            scheduled += self.rng.expovariate(rate)
+            if scheduled - started >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # 生成器自身跟不上计划到达时刻（延迟仍从计划时刻计算）
+                max_lag = max(max_lag, -delay)
+            name = self.rng.choices(names, weights)[0]
+            tasks.append(asyncio.create_task(fire(name, scheduled)))
+        await asyncio.gather(*tasks)
+        report = recorder.report(time.perf_counter() - started)
+        report["target_rate"] = rate
+        report["offered_rate"] = round(len(tasks) / duration, 3)
+        report["max_schedule_lag_ms"] = round(max_lag * 1000, 3)
+        return report
+
+
+def in_process_transport() -> httpx.AsyncBaseTransport:
+    """进程内调用 main_v2:app 的 ASGI 传输（同时开放压测入金接口）"""
+    os.environ["LOADTEST_DEPOSIT"] = "1"
+    import main_v2
+    return httpx.ASGITransport(app=main_v2.app)
+
+
+async def run(users: int = 1000, rate: float = 500, duration: float = 10, mix: str = DEFAULT_MIX,
+              url: Optional[str] = None, concurrency: int = 100, max_in_flight: int = 10000,
+              seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    执行一次压测，返回 JSON 报告
+
+    Args:
+        users: 合成用户数
+        rate: 稳态阶段平均到达率（次/秒）
+        duration: 稳态阶段时长（秒）
+        mix: 操作权重，如 "subscribe=40,redeem=20,assets=30,products=10"
+        url: 服务地址；为 None 时在进程内调用 main_v2:app
+        concurrency: 开户阶段同时开户的用户数
+        max_in_flight: 客户端同时在途的最大请求数（超出的请求排队，排队时间计入延迟）
+        seed: 随机种子（到达间隔、操作与用户的选择）
+    """
+    if rate <= 0 or duration <= 0:
+        raise ValueError(f"到达率和时长必须大于0: rate={rate}, duration={duration}")
+    weights = parse_mix(mix)
+    transport = None if url else in_process_transport()
+    async with AsyncFundClient(url or "http://loadgen", max_concurrency=max_in_flight,
+                               max_connections=concurrency, transport=transport) as client:
+        workload = Workload(client, users, weights, concurrency=concurrency, seed=seed)
+        await workload.setup()
+        onboarding = await workload.onboard(LatencyRecorder())
+        steady = await workload.open_loop(LatencyRecorder(), rate, duration)
+    return {
+        "mode": "http" if url else "in-process",
+        "target": url or "main_v2:app",
+        "config": {"users": users, "rate": rate, "duration": duration, "mix": weights,
+                   "concurrency": concurrency, "max_in_flight": max_in_flight, "seed": seed},
+        "phases": {"onboarding": onboarding, "steady": steady},
+    }
+
+
+def check_thresholds(report: Dict[str, Any], max_error_rate: Optional[float] = None,
+                     max_p99_ms: Optional[float] = None) -> List[str]:
+    """检查稳态阶段各接口的错误率与 p99 延迟，返回超出阈值的说明（为空表示全部达标）"""
+    violations = []
+    for endpoint, stats in report["phases"]["steady"]["endpoints"].items():
+        if max_error_rate is not None and stats["error_rate"] > max_error_rate:
+            violations.append(f"{endpoint} 错误率 {stats['error_rate']:.2%} 超过 {max_error_rate:.2%}")
+        if max_p99_ms is not None and stats["latency_ms"]["p99"] > max_p99_ms:
+            violations.append(f"{endpoint} p99 {stats['latency_ms']['p99']:.1f}ms 超过 {max_p99_ms}ms")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="负载生成器")
+    parser.add_argument("--users", type=int, default=1000, help="合成用户数")
+    parser.add_argument("--rate", type=float, default=500, help="稳态阶段平均到达率（次/秒）")
+    parser.add_argument("--duration", type=float, default=10, help="稳态阶段时长（秒）")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"操作权重（可选: {', '.join(OPERATIONS)}）")
+    parser.add_argument("--url", default=None, help="服务地址，不指定时在进程内调用 main_v2:app")
+    parser.add_argument("--concurrency", type=int, default=100, help="开户阶段同时开户的用户数，也是连接池大小")
+    parser.add_argument("--max-in-flight", type=int, default=10000, help="同时在途的最大请求数")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    parser.add_argument("--output", default=None, help="JSON 报告文件，不指定时输出到标准输出")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="稳态阶段各接口允许的最大错误率")
+    parser.add_argument("--max-p99-ms", type=float, default=None, help="稳态阶段各接口允许的最大 p99 延迟（毫秒）")
+    args = parser.parse_args()
+    # 每个请求一行的客户端日志会影响压测结果
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = asyncio.run(run(args.users, args.rate, args.duration, args.mix, args.url,
+                             args.concurrency, args.max_in_flight, args.seed))
+    if not args.url:
+        import main_v2
+        main_v2.shutdown_event()
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    violations = check_thresholds(report, args.max_error_rate, args.max_p99_ms)
+    for violation in violations:
+        print(f"未达标: {violation}", file=sys.stderr)
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,21 +7,51 @@ from datetime import datetime
 from decimal import Decimal
 import logging
 
+from common.http_session import DEFAULT_TIMEOUT, Timeout, get_session
+from idempotency import IDEMPOTENCY_HEADER
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def parse_response(response: Any) -> Any:
+    """解析接口响应（requests 与 httpx 的响应均可）：成功时返回业务数据，否则抛出异常"""
+    # 处理成功响应（200-299 都是成功状态码）
+    if 200 <= response.status_code < 300:
+        result = response.json()
+        # 检查是否是包装格式 {'code': 0, 'data': {...}}
+        if isinstance(result, dict) and 'code' in result:
+            if result.get('code') == 0:
+                return result.get('data', {})
+            else:
+                raise Exception(f"业务错误: {result.get('message', '未知错误')}")
+        # 否则直接返回结果（FastAPI 直接返回对象）
+        return result
+    else:
+        # 处理错误响应
+        try:
+            error_detail = response.json().get('detail', '未知错误')
+        except:
+            error_detail = response.text or '未知错误'
+        raise Exception(f"HTTP错误 {response.status_code}: {error_detail}")
+
+
 class FundClient:
     """基金交易客户端"""
     
-    def __init__(self, base_url: str = "http://localhost:8000", token: str = "demo_token_2025", test_connection: bool = True):
+    def __init__(self, base_url: str = "http://localhost:8000", token: str = "demo_token_2025",
+                 test_connection: bool = False, session: Optional[requests.Session] = None,
+                 timeout: Timeout = DEFAULT_TIMEOUT):
         """
         初始化客户端
         
         Args:
             base_url: 微服务基础URL
             token: 认证令牌
-            test_connection: 是否在初始化时测试连接（默认True，测试时可设为False）
+            test_connection: 是否在初始化时测试连接（多一次阻塞请求，交互式使用时开启）
+            session: HTTP 会话，默认使用进程内共用的连接池会话（见 common/http_session.py），
+                     多个客户端共用连接，批量脚本不必每次调用都重新建立连接
+            timeout: 请求超时，(连接, 读取) 秒
         """
         self.base_url = base_url.rstrip('/')
         self.token = token
@@ -29,6 +59,8 @@ class FundClient:
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
+        self.session = session or get_session()
+        self.timeout = timeout
         
         # 测试连接（可选）
         if test_connection:
@@ -37,7 +69,7 @@ class FundClient:
     def _test_connection(self):
         """测试服务连接"""
         try:
-            response = requests.get(f"{self.base_url}/", timeout=5)
+            response = self.session.get(f"{self.base_url}/", timeout=self.timeout)
             if response.status_code == 200:
                 logger.info(f"连接成功: {response.json()}")
             else:
@@ -46,36 +78,23 @@ class FundClient:
             logger.error(f"无法连接到服务: {e}")
             raise
     
-    def _request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
-        """发送HTTP请求"""
+    def _request(self, method: str, endpoint: str, idempotency_key: Optional[str] = None,
+                 **kwargs) -> Dict[str, Any]:
+        """发送HTTP请求（提供 idempotency_key 时附带 Idempotency-Key 请求头）"""
         url = f"{self.base_url}{endpoint}"
+        kwargs.setdefault('timeout', self.timeout)
+        headers = self.headers
+        if idempotency_key is not None:
+            headers = {**headers, IDEMPOTENCY_HEADER: idempotency_key}
         
         try:
-            response = requests.request(
+            response = self.session.request(
                 method=method,
                 url=url,
-                headers=self.headers,
+                headers=headers,
                 **kwargs
             )
-            
-            # 处理成功响应（200-299 都是成功状态码）
-            if 200 <= response.status_code < 300:
-                result = response.json()
-                # 检查是否是包装格式 {'code': 0, 'data': {...}}
-                if isinstance(result, dict) and 'code' in result:
-                    if result.get('code') == 0:
-                        return result.get('data', {})
-                    else:
-                        raise Exception(f"业务错误: {result.get('message', '未知错误')}")
-                # 否则直接返回结果（FastAPI 直接返回对象）
-                return result
-            else:
-                # 处理错误响应
-                try:
-                    error_detail = response.json().get('detail', '未知错误')
-                except:
-                    error_detail = response.text or '未知错误'
-                raise Exception(f"HTTP错误 {response.status_code}: {error_detail}")
+            return parse_response(response)
                 
         except requests.exceptions.RequestException as e:
             logger.error(f"请求失败: {e}")
@@ -120,13 +139,15 @@ class FundClient:
         result = self._request("GET", f"/api/v1/users/{user_id}")
         return result
     
-    def open_fund_account(self, user_id: str, account_type: str = "INDIVIDUAL") -> str:
+    def open_fund_account(self, user_id: str, account_type: str = "INDIVIDUAL",
+                          idempotency_key: Optional[str] = None) -> str:
         """
         开通基金账户
         
         Args:
             user_id: 用户ID
             account_type: 账户类型
+            idempotency_key: 幂等键；重试同一次开户时使用相同的值，服务端返回第一次的结果
             
         Returns:
             基金账户ID
@@ -136,12 +157,13 @@ class FundClient:
             "account_type": account_type
         }
         
-        result = self._request("POST", "/api/v1/accounts/open", json=data)
+        result = self._request("POST", "/api/v1/accounts/open", idempotency_key=idempotency_key, json=data)
         account_id = result.get('fund_account_id')
         logger.info(f"基金账户开通成功: {account_id}")
         return account_id
     
-    def subscribe_fund(self, fund_account_id: str, product_id: str, amount: float) -> Dict[str, Any]:
+    def subscribe_fund(self, fund_account_id: str, product_id: str, amount: float,
+                       idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """
         申购基金
         
@@ -149,6 +171,7 @@ class FundClient:
             fund_account_id: 基金账户ID
             product_id: 产品ID
             amount: 申购金额
+            idempotency_key: 幂等键；重试同一笔申购时使用相同的值，不会重复下单
             
         Returns:
             申购结果
@@ -159,11 +182,12 @@ class FundClient:
             "amount": amount
         }
         
-        result = self._request("POST", "/api/v1/funds/subscribe", json=data)
+        result = self._request("POST", "/api/v1/funds/subscribe", idempotency_key=idempotency_key, json=data)
         logger.info(f"基金申购成功: {fund_account_id}, 金额: {amount}")
         return result
     
-    def redeem_fund(self, fund_account_id: str, product_id: str, share: float) -> Dict[str, Any]:
+    def redeem_fund(self, fund_account_id: str, product_id: str, share: float,
+                    idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """
         赎回基金
         
@@ -171,6 +195,7 @@ class FundClient:
             fund_account_id: 基金账户ID
             product_id: 产品ID
             share: 赎回份额
+            idempotency_key: 幂等键；重试同一笔赎回时使用相同的值，不会重复下单
             
         Returns:
             赎回结果
@@ -181,7 +206,7 @@ class FundClient:
             "share": share
         }
         
-        result = self._request("POST", "/api/v1/funds/redeem", json=data)
+        result = self._request("POST", "/api/v1/funds/redeem", idempotency_key=idempotency_key, json=data)
         logger.info(f"基金赎回成功: {fund_account_id}, 份额: {share}")
         return result
     
@@ -198,6 +223,48 @@ class FundClient:
         result = self._request("GET", f"/api/v1/assets/{user_id}")
         return result
     
+    def list_user_entrusts(self, user_id: str, cursor: Optional[str] = None, limit: int = 50,
+                           **filters) -> Dict[str, Any]:
+        """
+        分页查询用户委托历史（按创建时间倒序）
+        
+        Args:
+            user_id: 用户ID
+            cursor: 上一页返回的 next_cursor
+            limit: 每页条数
+            **filters: status、business_type、product_id、start_time、end_time
+            
+        Returns:
+            {"items": 委托列表, "next_cursor": 下一页游标}
+        """
+        params = {'limit': limit, **{key: value for key, value in filters.items() if value is not None}}
+        if cursor:
+            params['cursor'] = cursor
+        
+        result = self._request("GET", f"/api/v1/users/{user_id}/entrusts", params=params)
+        return result
+    
+    def list_user_confirms(self, user_id: str, cursor: Optional[str] = None, limit: int = 50,
+                           **filters) -> Dict[str, Any]:
+        """
+        分页查询用户确认记录（按确认时间倒序）
+        
+        Args:
+            user_id: 用户ID
+            cursor: 上一页返回的 next_cursor
+            limit: 每页条数
+            **filters: start_time、end_time
+            
+        Returns:
+            {"items": 确认列表, "next_cursor": 下一页游标}
+        """
+        params = {'limit': limit, **{key: value for key, value in filters.items() if value is not None}}
+        if cursor:
+            params['cursor'] = cursor
+        
+        result = self._request("GET", f"/api/v1/users/{user_id}/confirms", params=params)
+        return result
+    
     def get_products(self, product_type: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         获取基金产品列表
@@ -264,7 +331,7 @@ class FundClient:
     def health_check(self) -> Dict[str, Any]:
         """健康检查"""
         try:
-            response = requests.get(f"{self.base_url}/api/v1/health", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/v1/health", timeout=self.timeout)
             return response.json()
         except Exception as e:
             return {"status": "unhealthy", "error": str(e)}
@@ -0,0 +1,85 @@
+"""
+客户端 HTTP 会话 - 所有客户端类共用的连接池、保持连接、超时与重试
+"""
+import threading
+from typing import Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 每个主机保持的连接数
+DEFAULT_POOL_SIZE = 10
+# (连接超时, 读取超时)，单位秒
+DEFAULT_TIMEOUT: Tuple[float, float] = (3.05, 30)
+DEFAULT_RETRIES = 3
+# 第 n 次重试前等待 backoff_factor * 2^(n-1) 秒
+DEFAULT_BACKOFF = 0.2
+# 服务暂时不可用时重试的状态码
+RETRY_STATUS = (502, 503, 504)
+
+Timeout = Union[float, Tuple[float, float], None]
+
+_default_session: Optional[requests.Session] = None
+_default_lock = threading.Lock()
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES,
+                   backoff_factor: float = DEFAULT_BACKOFF, keep_alive: bool = True) -> requests.Session:
+    """
+    创建带连接池的会话
+
+    只有幂等方法（GET、PUT、DELETE 等，不含 POST）在读取失败或收到 RETRY_STATUS 时按退避重试；
+    连接未建立的失败（请求尚未发出）对所有方法重试。重试用尽后返回最后一次响应，由调用方按状态码处理。
+
+    Args:
+        pool_size: 每个主机的连接池大小（同时在用的连接数超过时新建连接，用完不保留）
+        retries: 最多重试次数，0 表示不重试
+        backoff_factor: 重试退避系数
+        keep_alive: 是否保持连接；False 时每个请求后关闭连接
+    """
+    if pool_size <= 0:
+        raise ValueError(f"连接池大小必须大于0: {pool_size}")
+    # 不重试时直接抛出超时等原始异常（重试用尽后 requests 统一抛出 ConnectionError）
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False
+    ) if retries > 0 else 0
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def get_session() -> requests.Session:
+    """进程内共用的默认会话（首次使用时按默认参数创建）"""
+    global _default_session
+    if _default_session is None:
+        with _default_lock:
+            if _default_session is None:
+                _default_session = create_session()
+    return _default_session
+
+
+def configure_default_session(**options) -> requests.Session:
+    """按 create_session() 的参数重建默认会话，之后创建的客户端使用新会话（已有客户端仍用原会话）"""
+    global _default_session
+    session = create_session(**options)
+    with _default_lock:
+        _default_session = session
+    return session
+
+
+def close_default_session() -> None:
+    """关闭默认会话的全部连接（下次使用时重新创建）"""
+    global _default_session
+    with _default_lock:
+        previous, _default_session = _default_session, None
+    if previous is not None:
+        previous.close()
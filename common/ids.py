@@ -0,0 +1,194 @@
+"""
+ID 生成 - 按时间递增的唯一ID（时间戳 + 工作进程号 + 序号）
+"""
+import fcntl
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+# 64 位ID：1 位符号（恒为 0） | 41 位毫秒时间戳 | 10 位工作进程号 | 12 位序号
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+_EPOCH_MS = int(EPOCH.timestamp() * 1000)
+TIMESTAMP_BITS = 41
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+_SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+_TIMESTAMP_SHIFT = WORKER_BITS + SEQUENCE_BITS
+# ID 以 16 位小写十六进制表示（与原来的 uuid4().hex[:16] 长度相同），字符串顺序即数值顺序
+ID_DIGITS = 16
+
+
+def _lease_dir() -> str:
+    """工作进程号租约目录（环境变量 ID_WORKER_DIR，默认在系统临时目录下）"""
+    return os.getenv("ID_WORKER_DIR") or os.path.join(tempfile.gettempdir(), "fund-id-workers")
+
+
+def _try_lease(directory: str, worker_id: int) -> Optional[int]:
+    """尝试对工作进程号的锁文件加排他锁，成功时返回文件描述符（进程退出时锁自动释放）"""
+    fd = os.open(os.path.join(directory, f"worker-{worker_id:04d}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _claim_worker_id() -> Tuple[int, int]:
+    """
+    为本进程取得工作进程号，返回 (工作进程号, 租约文件描述符)
+
+    每个工作进程号对应租约目录中的一个锁文件，进程持有锁直到退出，本机的进程之间不会取得同一个号：
+    - 设置了 ID_WORKER_ID 时使用该值；该值已被本机其他进程持有（多个 worker 进程继承了同一个环境变量，
+      或 fork 出的子进程沿用了父进程的设置）时抛出 RuntimeError，拒绝生成可能重复的ID。
+    - 未设置时从最大的号向下取第一个空闲的号（手工指定的号从 0 开始分配，如分片部署），
+      因此 uvicorn/gunicorn 的多个 worker 进程各自取得不同的号，与进程号无关。
+    租约只在本机有效，多机部署时须为每个进程指定不同的 ID_WORKER_ID。
+    """
+    directory = _lease_dir()
+    os.makedirs(directory, exist_ok=True)
+    pinned = os.getenv("ID_WORKER_ID")
+    if pinned:
+        worker_id = int(pinned)
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"工作进程号超出范围: {worker_id}")
+        fd = _try_lease(directory, worker_id)
+        if fd is None:
+            raise RuntimeError(f"工作进程号 {worker_id} 已被本机其他进程使用："
+                               f"ID_WORKER_ID 不能由多个进程共用，请为每个进程指定不同的值，或不设置以自动分配")
+        return worker_id, fd
+    for worker_id in range(MAX_WORKER_ID, -1, -1):
+        fd = _try_lease(directory, worker_id)
+        if fd is not None:
+            return worker_id, fd
+    raise RuntimeError(f"本机没有空闲的工作进程号: {directory}")
+
+
+class IdGenerator:
+    """按时间递增的ID生成器（Snowflake 布局）
+
+    同一毫秒内按序号递增，序号用完时借用下一毫秒；系统时钟回拨时沿用上次的时间戳，
+    因此同一生成器产生的ID严格递增。不同工作进程号的生成器互不重复，
+    多进程部署时各进程的工作进程号必须不同：未指定时在第一次生成ID时按 _claim_worker_id 取得本进程独占的号。
+
+    ID 按创建时间排序，可以用 id_floor 换算时间下界做范围查询。
+    """
+
+    def __init__(self, worker_id: Optional[int] = None):
+        """
+        初始化ID生成器
+
+        Args:
+            worker_id: 工作进程号（0-1023），为空时在第一次生成ID时取得（见 _claim_worker_id）
+        """
+        if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"工作进程号超出范围: {worker_id}")
+        self._worker_id = worker_id
+        self._lease_fd: Optional[int] = None
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    @property
+    def worker_id(self) -> int:
+        """工作进程号（尚未取得时立即取得）"""
+        with self._lock:
+            return self._resolve_worker_id()
+
+    def _resolve_worker_id(self) -> int:
+        """取得工作进程号（调用方持有 _lock）"""
+        if self._worker_id is None:
+            self._worker_id, self._lease_fd = _claim_worker_id()
+        return self._worker_id
+
+    def __call__(self, prefix: str = '') -> str:
+        """生成一个ID"""
+        with self._lock:
+            value = self._next()
+        return f"{prefix}{value:016x}"
+
+    def generate_many(self, prefix: str, count: int) -> List[str]:
+        """批量生成 count 个递增的ID"""
+        values: List[int] = []
+        with self._lock:
+            while len(values) < count:
+                # 同一毫秒内剩余的序号一次取完
+                first = self._next()
+                take = min(count - len(values), _SEQUENCE_MASK - self._sequence + 1)
+                values.extend(range(first, first + take))
+                self._sequence += take - 1
+        return [f"{prefix}{value:016x}" for value in values]
+
+    def reset(self, worker_id: Optional[int] = None) -> None:
+        """
+        更换工作进程号并重置状态（fork 出的子进程调用，避免与父进程重复；不能与生成并发调用）
+        
+        worker_id 为空时放弃继承的号，下次生成ID时重新取得：子进程不会沿用父进程的号，
+        ID_WORKER_ID 指定的号已被父进程持有时子进程拒绝生成ID。
+        """
+        if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"工作进程号超出范围: {worker_id}")
+        # fork 时锁可能正被父进程的其他线程持有，子进程使用新锁
+        self._lock = threading.Lock()
+        # 继承的租约描述符与父进程共用同一把文件锁，关闭后父进程仍持有
+        if self._lease_fd is not None:
+            os.close(self._lease_fd)
+            self._lease_fd = None
+        self._worker_id = worker_id
+        self._last_ms = 0
+        self._sequence = 0
+
+    def _next(self) -> int:
+        worker_id = self._worker_id if self._worker_id is not None else self._resolve_worker_id()
+        now_ms = _now_ms()
+        if now_ms > self._last_ms:
+            self._last_ms = now_ms
+            self._sequence = 0
+        else:
+            self._sequence = (self._sequence + 1) & _SEQUENCE_MASK
+            if self._sequence == 0:
+                self._last_ms += 1
+        return ((self._last_ms - _EPOCH_MS) << _TIMESTAMP_SHIFT
+                | worker_id << SEQUENCE_BITS | self._sequence)
+
+
+def _now_ms() -> int:
+    """当前 Unix 时间（毫秒）"""
+    return time.time_ns() // 1000000
+
+
+def id_timestamp(key: str) -> datetime:
+    """ID 的生成时间（UTC，精确到毫秒）；只对本模块生成的ID有意义"""
+    value = int(key[-ID_DIGITS:], 16)
+    return EPOCH + timedelta(milliseconds=value >> _TIMESTAMP_SHIFT)
+
+
+def id_floor(prefix: str, when: datetime) -> str:
+    """when 时刻及之后生成的ID都不小于返回值（无时区的 datetime 按本地时间处理）"""
+    offset_ms = max(int(when.timestamp() * 1000) - _EPOCH_MS, 0)
+    return f"{prefix}{offset_ms << _TIMESTAMP_SHIFT:016x}"
+
+
+# 进程内共用的生成器；fork 出的子进程重新取工作进程号
+_generator = IdGenerator()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_generator.reset)
+
+
+def worker_id() -> int:
+    """本进程的工作进程号；服务启动时调用，号与其他进程冲突时在启动阶段抛出 RuntimeError"""
+    return _generator.worker_id
+
+
+def generate_id(prefix: str = '') -> str:
+    """生成唯一ID（前缀 + 16 位十六进制），按生成时间递增"""
+    return _generator(prefix)
+
+
+def generate_ids(prefix: str, count: int) -> List[str]:
+    """批量生成唯一ID"""
+    return _generator.generate_many(prefix, count)
@@ -0,0 +1,142 @@
+"""
+内存哈希索引 - 为 BaseRepository 的表提供单列/组合索引
+"""
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+def normalize_value(value: Any) -> Any:
+    """索引键统一使用枚举的值，保证枚举与字符串查询命中同一个键"""
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+class Index:
+    """哈希索引
+
+    组合索引与数据库的 B+ 树索引一样支持最左前缀匹配：
+    为每个前缀长度维护一张 列值元组 -> 主键 的哈希表。
+    """
+
+    def __init__(self, name: str, columns: Sequence[str], unique: bool = False):
+        """
+        初始化索引
+
+        Args:
+            name: 索引名称（与 schema.sql 中的索引名一致）
+            columns: 索引列，按顺序
+            unique: 是否唯一索引
+        """
+        if not columns:
+            raise ValueError(f"索引至少需要一列: {name}")
+        self.name = name
+        self.columns: Tuple[str, ...] = tuple(columns)
+        self.unique = unique
+        # 前缀长度 -> {键元组: {主键: None}}，用字典保持插入顺序
+        self._entries: List[Dict[Tuple, Dict[str, None]]] = [{} for _ in self.columns]
+
+    def _key(self, record: Dict[str, Any]) -> Tuple:
+        """计算记录的完整索引键"""
+        return tuple(normalize_value(record.get(column)) for column in self.columns)
+
+    def add(self, primary_key: str, record: Dict[str, Any]) -> None:
+        """将记录加入索引"""
+        key = self._key(record)
+        for length, entries in enumerate(self._entries, start=1):
+            entries.setdefault(key[:length], {})[primary_key] = None
+
+    def remove(self, primary_key: str, record: Dict[str, Any]) -> None:
+        """将记录移出索引"""
+        key = self._key(record)
+        for length, entries in enumerate(self._entries, start=1):
+            bucket = entries.get(key[:length])
+            if bucket is not None:
+                bucket.pop(primary_key, None)
+                if not bucket:
+                    del entries[key[:length]]
+
+    def check_unique(self, primary_key: str, record: Dict[str, Any]) -> None:
+        """唯一索引冲突检查，冲突时抛出 ValueError"""
+        if not self.unique:
+            return
+        key = self._key(record)
+        bucket = self._entries[-1].get(key)
+        if bucket and any(pk != primary_key for pk in bucket):
+            raise ValueError(f"唯一索引冲突 {self.name}: {key}")
+
+    def usable_prefix(self, filters: Dict[str, Any]) -> int:
+        """过滤条件能使用的最左前缀长度，0 表示不可用"""
+        length = 0
+        for column in self.columns:
+            if column not in filters:
+                break
+            length += 1
+        return length
+
+    def lookup(self, filters: Dict[str, Any], prefix: int) -> Optional[Iterable[str]]:
+        """按最左前缀查找主键，过滤值不可哈希时返回 None"""
+        key = tuple(normalize_value(filters[column]) for column in self.columns[:prefix])
+        try:
+            return self._entries[prefix - 1].get(key, {})
+        except TypeError:
+            return None
+
+
+# 与 database/schema.sql 中的 INDEX / UNIQUE KEY 保持一致
+# 表名 -> [(索引名, 列, 是否唯一)]
+SCHEMA_INDEXES: Dict[str, List[Tuple[str, Tuple[str, ...], bool]]] = {
+    'user': [
+        ('idx_user_status', ('user_status',), False),
+        ('idx_user_type', ('user_type',), False),
+    ],
+    'user_bank_card': [
+        ('idx_user_card', ('user_id', 'card_status'), False),
+    ],
+    'user_balance': [
+        ('uk_user_balance', ('user_id',), True),
+    ],
+    'capital_change_entrust': [
+        ('idx_user_status', ('user_id', 'status'), False),
+        ('idx_change_type', ('change_type', 'status'), False),
+    ],
+    'capital_settlement': [
+        ('idx_entrust_settlement', ('entrust_id',), False),
+        ('idx_user_settlement', ('user_id', 'settlement_time'), False),
+    ],
+    'fund_account': [
+        ('idx_user_account', ('user_id', 'account_status'), False),
+        ('uk_account_no', ('account_no',), True),
+    ],
+    'fund_account_entrust': [
+        ('idx_user_status', ('user_id', 'status'), False),
+    ],
+    'fund_product': [
+        ('idx_product_type_status', ('product_type', 'product_status'), False),
+        ('uk_product_code', ('product_code',), True),
+    ],
+    'fund_net_value': [
+        ('idx_product_date', ('product_id', 'nav_date'), False),
+        ('uk_product_nav_date', ('product_id', 'nav_date'), True),
+    ],
+    'fund_transaction_entrust': [
+        ('idx_user_status', ('user_id', 'status'), False),
+        ('idx_account_product', ('fund_account_id', 'product_id'), False),
+        ('idx_transaction_type', ('transaction_type', 'status'), False),
+    ],
+    'fund_transaction_confirm': [
+        ('idx_entrust_confirm', ('entrust_id',), False),
+        ('idx_user_confirm', ('user_id', 'confirm_time'), False),
+    ],
+    'fund_share': [
+        ('uk_account_product', ('fund_account_id', 'product_id'), True),
+        ('idx_account_share', ('fund_account_id',), False),
+    ],
+    'user_total_asset': [
+        ('idx_user_date', ('user_id', 'calc_date'), False),
+    ],
+    'user_fund_asset': [
+        ('idx_user_product', ('user_id', 'product_id'), False),
+        ('idx_user_date', ('user_id', 'calc_date'), False),
+    ],
+}
@@ -0,0 +1,51 @@
+"""
+分段锁 - 按键把锁分散到固定数量的锁上，不同键的操作可以并行
+"""
+import threading
+from contextlib import contextmanager
+from typing import Hashable, Iterable, Iterator
+
+
+class StripedLock:
+    """分段锁
+
+    每个键按哈希映射到固定的一把锁（可重入），锁的数量与键的数量无关，
+    不需要为每个用户/持仓创建和回收锁对象。不同键可能落到同一把锁上，
+    此时只是多一次串行，不影响正确性。
+
+    同时锁定多个键时按锁的序号升序加锁、去重，多个线程以任意顺序
+    请求同一组键也不会死锁。
+    """
+
+    def __init__(self, stripes: int = 256):
+        """
+        初始化分段锁
+
+        Args:
+            stripes: 锁的数量
+        """
+        if stripes <= 0:
+            raise ValueError(f"锁的数量必须大于0: {stripes}")
+        self._locks = [threading.RLock() for _ in range(stripes)]
+
+    def _index(self, key: Hashable) -> int:
+        """键对应的锁序号"""
+        return hash(key) % len(self._locks)
+
+    def lock_for(self, key: Hashable) -> threading.RLock:
+        """获取键对应的锁"""
+        return self._locks[self._index(key)]
+
+    @contextmanager
+    def hold(self, keys: Iterable[Hashable]) -> Iterator[None]:
+        """锁定一组键，按锁序号升序加锁，退出时逆序释放"""
+        locks = [self._locks[index] for index in sorted({self._index(key) for key in keys})]
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
@@ -0,0 +1,344 @@
+"""
+持久化 - 内存仓库的预写日志（WAL）与快照
+
+写操作先修改内存再追加到 WAL；WAL 由后台线程组提交（一次 fsync 落盘一批记录）。
+快照定期把整个存储写成一个文件，之前的 WAL 段随即删除；启动时加载快照再重放其后的日志。
+
+目录结构:
+    wal-<起始序号>.log   日志段，每条记录为 [长度][CRC32][序号][pickle 负载]
+    snapshot.pkl         最近一次快照（含快照覆盖到的最后序号）
+"""
+import logging
+import os
+import pickle
+import struct
+import threading
+import zlib
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 记录头：负载长度、CRC32（覆盖序号与负载）、序号
+_HEADER = struct.Struct('<IIQ')
+_SEQ = struct.Struct('<Q')
+_SNAPSHOT_FILE = 'snapshot.pkl'
+_SEGMENT_PREFIX = 'wal-'
+_SEGMENT_SUFFIX = '.log'
+
+
+def _segment_name(first_seq: int) -> str:
+    """日志段文件名"""
+    return f"{_SEGMENT_PREFIX}{first_seq:016d}{_SEGMENT_SUFFIX}"
+
+
+def _fsync_dir(directory: str) -> None:
+    """同步目录项，保证新建/重命名的文件在崩溃后可见"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    """追加写日志
+
+    group_commit=True 时写入方只把记录放入缓冲区，由后台线程合并写入并统一 fsync；
+    sync_commit=True 时 append() 等到本条记录落盘才返回，否则立即返回（崩溃时可能丢失最后一批）。
+    group_commit=False 时每条记录单独写入并 fsync。
+    """
+
+    def __init__(self, directory: str, group_commit: bool = True, sync_commit: bool = True,
+                 fsync: bool = True):
+        """
+        初始化日志（不打开文件，需先 replay() 再 open()）
+
+        Args:
+            directory: 日志目录
+            group_commit: 是否组提交
+            sync_commit: append() 是否等待落盘
+            fsync: 是否调用 fsync（关闭后只写入操作系统缓存，仅用于测试/基准）
+        """
+        self.directory = directory
+        self.group_commit = group_commit
+        self.sync_commit = sync_commit
+        self.fsync = fsync
+        self._cond = threading.Condition()
+        # 写文件与轮换日志段互斥
+        self._io_lock = threading.Lock()
+        self._pending: List[bytes] = []
+        self._pending_seq = 0
+        self._next_seq = 1
+        self._durable_seq = 0
+        self._file = None
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+        self.commits = 0
+
+    # ==================== 读取 ====================
+
+    def segments(self) -> List[Tuple[int, str]]:
+        """列出日志段（起始序号, 路径），按序号升序"""
+        result = []
+        for name in os.listdir(self.directory):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                first_seq = int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)])
+                result.append((first_seq, os.path.join(self.directory, name)))
+        result.sort()
+        return result
+
+    def replay(self, after_seq: int = 0) -> Iterator[Any]:
+        """
+        按序返回序号大于 after_seq 的记录
+
+        遇到不完整或校验失败的记录（崩溃时写了一半）即停止，并把该段截断到最后一条完整记录。
+        """
+        last_seq = after_seq
+        for _, path in self.segments():
+            with open(path, 'r+b') as f:
+                data = f.read()
+                offset = 0
+                while offset + _HEADER.size <= len(data):
+                    length, crc, seq = _HEADER.unpack_from(data, offset)
+                    end = offset + _HEADER.size + length
+                    payload = data[offset + _HEADER.size:end]
+                    if end > len(data) or zlib.crc32(_SEQ.pack(seq) + payload) != crc:
+                        break
+                    offset = end
+                    if seq > last_seq:
+                        last_seq = seq
+                        yield pickle.loads(payload)
+                if offset < len(data):
+                    logger.warning(f"日志段尾部不完整，截断: {path} @ {offset}")
+                    f.truncate(offset)
+        self._next_seq = max(self._next_seq, last_seq + 1)
+
+    # ==================== 写入 ====================
+
+    def open(self) -> None:
+        """打开新的日志段并启动组提交线程"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._open_segment(self._next_seq)
+        if self.group_commit:
+            self._flusher = threading.Thread(target=self._run, name="wal-flusher", daemon=True)
+            self._flusher.start()
+
+    def _open_segment(self, first_seq: int) -> None:
+        """以指定序号为起点新建日志段"""
+        self._file = open(os.path.join(self.directory, _segment_name(first_seq)), 'ab')
+        if self.fsync:
+            _fsync_dir(self.directory)
+
+    def append(self, record: Any) -> int:
+        """追加一条记录，返回序号"""
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        if not self.group_commit:
+            with self._io_lock:
+                seq = self._next_seq
+                self._next_seq += 1
+                self._write([self._frame(seq, payload)])
+                self._durable_seq = seq
+            return seq
+
+        with self._cond:
+            if self._closed:
+                raise ValueError("预写日志已关闭")
+            seq = self._next_seq
+            self._next_seq += 1
+            self._pending.append(self._frame(seq, payload))
+            self._pending_seq = seq
+            self._cond.notify_all()
+            if self.sync_commit:
+                while self._durable_seq < seq:
+                    self._cond.wait()
+        return seq
+
+    @staticmethod
+    def _frame(seq: int, payload: bytes) -> bytes:
+        """编码一条记录"""
+        return _HEADER.pack(len(payload), zlib.crc32(_SEQ.pack(seq) + payload), seq) + payload
+
+    def _write(self, frames: List[bytes]) -> None:
+        """写入一批记录并落盘（调用方持有 _io_lock）"""
+        self._file.write(b''.join(frames))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.commits += 1
+
+    def _run(self) -> None:
+        """组提交线程：取走缓冲区中的全部记录，一次写入、一次 fsync"""
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+            self._commit_pending()
+
+    def _commit_pending(self) -> None:
+        """提交缓冲区中的记录"""
+        with self._io_lock:
+            with self._cond:
+                frames, self._pending = self._pending, []
+                last_seq = self._pending_seq
+            if frames:
+                self._write(frames)
+            with self._cond:
+                self._durable_seq = max(self._durable_seq, last_seq)
+                self._cond.notify_all()
+
+    def rotate(self) -> int:
+        """
+        提交缓冲区并切换到新的日志段
+
+        Returns:
+            新段的起始序号；此前分配的序号都在旧段中
+        """
+        with self._io_lock:
+            with self._cond:
+                frames, self._pending = self._pending, []
+                last_seq = self._pending_seq
+                boundary = self._next_seq
+            if frames:
+                self._write(frames)
+            self._file.close()
+            self._open_segment(boundary)
+            with self._cond:
+                self._durable_seq = max(self._durable_seq, last_seq)
+                self._cond.notify_all()
+        return boundary
+
+    def close(self) -> None:
+        """提交剩余记录并关闭"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        if self._file is not None:
+            with self._io_lock:
+                self._file.close()
+                self._file = None
+
+
+class Persistence:
+    """仓库持久化：预写日志 + 定期快照
+
+    仓库写操作调用 log() 记录变更，再调用 snapshot_if_due()：日志条数达到 snapshot_every 时写入当前状态。
+    启动时 recover() 返回快照状态和之后的日志记录。
+    """
+
+    def __init__(self, directory: str, group_commit: bool = True, sync_commit: bool = True,
+                 snapshot_every: int = 100000, fsync: bool = True):
+        """
+        初始化持久化
+
+        Args:
+            directory: 数据目录
+            group_commit: 是否组提交
+            sync_commit: 写操作是否等待日志落盘
+            snapshot_every: 每追加多少条日志做一次快照，0 表示不自动快照
+            fsync: 是否调用 fsync
+        """
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.wal = WriteAheadLog(directory, group_commit=group_commit,
+                                 sync_commit=sync_commit, fsync=fsync)
+        self._since_snapshot = 0
+        self._snapshot_lock = threading.Lock()
+        self._opened = False
+
+    @property
+    def snapshot_due(self) -> bool:
+        """是否应当做快照"""
+        return bool(self.snapshot_every) and self._since_snapshot >= self.snapshot_every
+
+    def recover(self) -> Tuple[Optional[Any], Iterator[Any]]:
+        """
+        读取快照和之后的日志
+
+        Returns:
+            (快照状态或 None, 快照之后的日志记录迭代器)；迭代完毕后调用 open() 开始写日志
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        state, last_seq = None, 0
+        path = os.path.join(self.directory, _SNAPSHOT_FILE)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                last_seq, state = pickle.load(f)
+        self.wal._next_seq = last_seq + 1
+        return state, self.wal.replay(last_seq)
+
+    def open(self) -> None:
+        """开始写日志"""
+        self.wal.open()
+        self._opened = True
+
+    def log(self, record: Any) -> None:
+        """记录一条变更"""
+        self.wal.append(record)
+        self._since_snapshot += 1
+
+    def snapshot_if_due(self, capture: Callable[[], Any]) -> Optional[int]:
+        """
+        日志条数达到阈值时做快照，返回快照覆盖到的最后序号；未做快照时返回 None
+
+        由写操作在记录日志后调用。其他线程正在做快照时直接返回；快照失败只记录日志、不向写操作抛出，
+        旧日志段保留（恢复不受影响），再追加 snapshot_every 条日志后重试。
+        """
+        if not self.snapshot_due or not self._snapshot_lock.acquire(blocking=False):
+            return None
+        try:
+            return self._write_snapshot(capture)
+        except Exception:
+            self._since_snapshot = 0
+            logger.exception(f"自动快照失败，{self.snapshot_every} 条日志后重试: {self.directory}")
+            return None
+        finally:
+            self._snapshot_lock.release()
+
+    def snapshot(self, capture: Callable[[], Any]) -> int:
+        """
+        写入快照并删除已被快照覆盖的日志段
+
+        Args:
+            capture: 返回当前状态的函数，在切换日志段之后调用，
+                因此状态一定包含新段之前的全部变更（可能也包含新段中的少量变更，重放需幂等）；
+                写操作可能同时进行，capture 需自行取得一致的副本
+
+        Returns:
+            快照覆盖到的最后序号
+        """
+        with self._snapshot_lock:
+            return self._write_snapshot(capture)
+
+    def _write_snapshot(self, capture: Callable[[], Any]) -> int:
+        """写入快照（调用方持有 _snapshot_lock）"""
+        boundary = self.wal.rotate()
+        self._since_snapshot = 0
+        state = capture()
+        path = os.path.join(self.directory, _SNAPSHOT_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((boundary - 1, state), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if self.fsync:
+            _fsync_dir(self.directory)
+        for first_seq, segment in self.wal.segments():
+            if first_seq < boundary:
+                os.remove(segment)
+        return boundary - 1
+
+    def close(self) -> None:
+        """提交剩余日志并关闭"""
+        if self._opened:
+            self.wal.close()
+            self._opened = False
@@ -1,37 +1,193 @@
 """
 统一数据存储层 - 基于内存的数据管理
 """
-from typing import Dict, List, Optional, Any
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Any, Sequence
 from datetime import datetime
+from .ids import generate_id
+from .index import Index, SCHEMA_INDEXES
+from .persistence import Persistence
+
+# 写入监听函数：(操作 create/update/delete, 主键, 写入后的记录；删除时为被删除的记录)
+WriteListener = Callable[[str, str, Dict[str, Any]], None]
 
 
 class BaseRepository:
     """数据仓库基类"""
     
-    def __init__(self):
-        """初始化数据存储"""
+    def __init__(self, declare_schema_indexes: bool = True,
+                 persistence: Optional[Persistence] = None):
+        """
+        初始化数据存储
+        
+        Args:
+            declare_schema_indexes: 是否按 database/schema.sql 声明各表索引
+            persistence: 持久化；提供时先从快照和预写日志恢复数据，之后每次写入都记录日志
+        """
         self._storage: Dict[str, Dict[str, Any]] = {}
+        self._indexes: Dict[str, List[Index]] = {}
+        self._listeners: Dict[str, List[WriteListener]] = {}
+        # 修改存储的字典（含记录的原地更新）与快照复制互斥
+        self._storage_lock = threading.Lock()
+        self._persistence = None
+        if persistence is not None:
+            self._recover(persistence)
+        if declare_schema_indexes:
+            for table_name, indexes in SCHEMA_INDEXES.items():
+                for name, columns, unique in indexes:
+                    self.declare_index(table_name, name, columns, unique)
+        if persistence is not None:
+            persistence.open()
+            self._persistence = persistence
     
     def _generate_id(self, prefix: str = '') -> str:
         """生成唯一ID"""
-        import uuid
-        return f"{prefix}{uuid.uuid4().hex[:16]}"
+        return generate_id(prefix)
+    
+    # ==================== 索引 ====================
+    
+    def declare_index(self, table_name: str, name: str, columns: Sequence[str],
+                      unique: bool = False) -> Index:
+        """声明索引，已有数据会立即建入索引"""
+        index = Index(name, columns, unique)
+        for primary_key, record in self._storage.get(table_name, {}).items():
+            index.check_unique(primary_key, record)
+            index.add(primary_key, record)
+        self._indexes.setdefault(table_name, []).append(index)
+        return index
+    
+    def get_indexes(self, table_name: str) -> List[Index]:
+        """获取表上声明的索引"""
+        return list(self._indexes.get(table_name, []))
+    
+    def _plan(self, table_name: str, filters: Dict[str, Any]) -> Optional[Any]:
+        """选择候选记录最少的索引，返回候选主键；没有可用索引时返回 None"""
+        best = None
+        for index in self._indexes.get(table_name, []):
+            prefix = index.usable_prefix(filters)
+            if not prefix:
+                continue
+            candidates = index.lookup(filters, prefix)
+            if candidates is None:
+                continue
+            if best is None or len(candidates) < len(best):
+                best = candidates
+                if not best:
+                    break
+        return best
+    
+    # ==================== 写入监听 ====================
+    
+    def add_listener(self, table_name: str, listener: WriteListener) -> None:
+        """注册表的写入监听，记录写入（含其他调用方的写入）后同步调用"""
+        self._listeners.setdefault(table_name, []).append(listener)
+    
+    def _notify(self, op: str, table_name: str, primary_key: str, record: Dict[str, Any]) -> None:
+        """通知写入监听"""
+        for listener in self._listeners.get(table_name, ()):
+            listener(op, primary_key, record)
+    
+    # ==================== 持久化 ====================
+    
+    def _log(self, record: tuple) -> None:
+        """记录一条变更，日志条数达到阈值时做快照（快照失败不影响本次写入）"""
+        self._persistence.log(record)
+        self._persistence.snapshot_if_due(self._snapshot_state)
+    
+    def snapshot(self) -> int:
+        """写入快照并清理已覆盖的日志，返回快照覆盖到的最后序号"""
+        if self._persistence is None:
+            raise ValueError("未配置持久化")
+        return self._persistence.snapshot(self._snapshot_state)
+    
+    def _snapshot_state(self) -> Dict[str, Dict[str, Any]]:
+        """快照内容：记录会被 update() 原地修改，在存储锁内逐行复制"""
+        with self._storage_lock:
+            return {
+                table_name: {primary_key: dict(record) for primary_key, record in table.items()}
+                for table_name, table in self._storage.items()
+            }
+    
+    def _ensure_table(self, table_name: str) -> Dict[str, Any]:
+        """获取表的存储，不存在时创建"""
+        table = self._storage.get(table_name)
+        if table is None:
+            with self._storage_lock:
+                table = self._storage.setdefault(table_name, {})
+        return table
+    
+    def close(self) -> None:
+        """提交剩余日志并关闭持久化"""
+        if self._persistence is not None:
+            self._persistence.close()
+    
+    def _recover(self, persistence: Persistence) -> None:
+        """加载快照并重放日志（在声明索引之前执行，索引随后按已有数据建立）"""
+        state, records = persistence.recover()
+        if state is not None:
+            self._storage = state
+        # 重放是幂等的：快照可能已包含日志开头的少量变更
+        for record in records:
+            op, table_name, primary_key = record[:3]
+            table = self._storage.setdefault(table_name, {})
+            if op == 'create':
+                table[primary_key] = record[3]
+            elif op == 'update':
+                if primary_key in table:
+                    table[primary_key].update(record[3])
+            else:
+                table.pop(primary_key, None)
+    
+    # ==================== 增删改查 ====================
     
     def create(self, table_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """创建记录"""
-        if table_name not in self._storage:
-            self._storage[table_name] = {}
-        
+        table = self._ensure_table(table_name)
         primary_key = data.get('id') or data.get(f'{table_name}_id')
         if not primary_key:
             raise ValueError(f"缺少主键字段: {table_name}")
         
-        if primary_key in self._storage[table_name]:
+        if primary_key in table:
             raise ValueError(f"记录已存在: {primary_key}")
         
-        self._storage[table_name][primary_key] = data.copy()
+        record = data.copy()
+        indexes = self._indexes.get(table_name, [])
+        for index in indexes:
+            index.check_unique(primary_key, record)
+        with self._storage_lock:
+            table[primary_key] = record
+        for index in indexes:
+            index.add(primary_key, record)
+        if self._persistence is not None:
+            self._log(('create', table_name, primary_key, record))
+        self._notify('create', table_name, primary_key, record)
         return data
     
+    def put(self, table_name: str, primary_key: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """写入整条记录：不存在则创建，存在则替换（记录归仓库所有，调用方不应再修改）"""
+        table = self._ensure_table(table_name)
+        old = table.get(primary_key)
+        indexes = self._indexes.get(table_name, [])
+        for index in indexes:
+            index.check_unique(primary_key, record)
+        if old is not None:
+            for index in indexes:
+                index.remove(primary_key, old)
+        with self._storage_lock:
+            table[primary_key] = record
+        for index in indexes:
+            index.add(primary_key, record)
+        if self._persistence is not None:
+            # 重放 create 即按主键覆盖写入
+            self._log(('create', table_name, primary_key, record))
+        self._notify('create' if old is None else 'update', table_name, primary_key, record)
+        return record
+    
+    def table(self, table_name: str) -> Dict[str, Any]:
+        """获取表的存储（主键 -> 记录），只读；写入需经过 create/put/update/delete"""
+        return self._ensure_table(table_name)
+    
     def get(self, table_name: str, primary_key: str) -> Optional[Dict[str, Any]]:
         """获取记录"""
         if table_name not in self._storage:
@@ -45,8 +201,26 @@ class BaseRepository:
         if primary_key not in self._storage[table_name]:
             return None
         
-        self._storage[table_name][primary_key].update(data)
-        return self._storage[table_name][primary_key]
+        record = self._storage[table_name][primary_key]
+        affected = [
+            index for index in self._indexes.get(table_name, [])
+            if any(column in data for column in index.columns)
+        ]
+        if affected:
+            updated = {**record, **data}
+            for index in affected:
+                index.check_unique(primary_key, updated)
+            for index in affected:
+                index.remove(primary_key, record)
+        
+        with self._storage_lock:
+            record.update(data)
+        for index in affected:
+            index.add(primary_key, record)
+        if self._persistence is not None:
+            self._log(('update', table_name, primary_key, data))
+        self._notify('update', table_name, primary_key, record)
+        return record
     
     def delete(self, table_name: str, primary_key: str) -> bool:
         """删除记录"""
@@ -55,29 +229,40 @@ class BaseRepository:
         if primary_key not in self._storage[table_name]:
             return False
         
-        del self._storage[table_name][primary_key]
+        with self._storage_lock:
+            record = self._storage[table_name].pop(primary_key)
+        for index in self._indexes.get(table_name, []):
+            index.remove(primary_key, record)
+        if self._persistence is not None:
+            self._log(('delete', table_name, primary_key))
+        self._notify('delete', table_name, primary_key, record)
         return True
     
     def list(self, table_name: str, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """列出记录"""
+        """列出记录，有可用索引时先按索引缩小候选范围"""
         if table_name not in self._storage:
             return []
         
-        records = list(self._storage[table_name].values())
+        table = self._storage[table_name]
+        if not filters:
+            return list(table.values())
         
-        if filters:
-            filtered = []
-            for record in records:
-                match = True
-                for key, value in filters.items():
-                    if record.get(key) != value:
-                        match = False
-                        break
-                if match:
-                    filtered.append(record)
-            return filtered
+        candidates = self._plan(table_name, filters)
+        if candidates is None:
+            records = table.values()
+        else:
+            records = [table[primary_key] for primary_key in candidates]
         
-        return records
+        filtered = []
+        for record in records:
+            match = True
+            for key, value in filters.items():
+                if record.get(key) != value:
+                    match = False
+                    break
+            if match:
+                filtered.append(record)
+        return filtered
     
     def exists(self, table_name: str, primary_key: str) -> bool:
         """检查记录是否存在"""
@@ -91,10 +276,22 @@ _repository_instance = None
 
 
 def get_repository() -> BaseRepository:
-    """获取仓库实例（单例）"""
+    """获取仓库实例（单例）
+    
+    STORAGE_BACKEND=sqlite 时使用 SQLITE_PATH 指定的 SQLite 数据库，
+    否则使用内存存储，设置 DATA_DIR 时启用持久化。
+    """
     global _repository_instance
     if _repository_instance is None:
-        _repository_instance = BaseRepository()
+        if os.getenv("STORAGE_BACKEND") == "sqlite":
+            from .sqlite_repository import SqliteBaseRepository
+            _repository_instance = SqliteBaseRepository(
+                os.getenv("SQLITE_PATH", "fund.db"),
+                pool_size=int(os.getenv("SQLITE_POOL_SIZE", "4"))
+            )
+        else:
+            data_dir = os.getenv("DATA_DIR")
+            _repository_instance = BaseRepository(
+                persistence=Persistence(os.path.join(data_dir, "common")) if data_dir else None
+            )
     return _repository_instance
-
-
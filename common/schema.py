@@ -0,0 +1,157 @@
+"""
+表结构 - 解析 database/schema.sql，并生成 SQLite 建表语句
+"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# database/schema.sql 的路径
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'schema.sql')
+
+# schema.sql 中各业务委托表各自存放公共字段，仓库另有一张委托主表
+ENTRUST_BASE_SQL = """
+CREATE TABLE IF NOT EXISTS `entrust_base` (
+    `entrust_id` VARCHAR(32) PRIMARY KEY COMMENT '委托ID',
+    `business_type` VARCHAR(30) NOT NULL COMMENT '业务类型',
+    `status` VARCHAR(20) NOT NULL DEFAULT 'PENDING' COMMENT '状态',
+    `user_id` VARCHAR(32) NOT NULL COMMENT '用户ID',
+    `request_data` JSON COMMENT '请求数据',
+    `response_data` JSON COMMENT '响应数据',
+    `create_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    `process_time` DATETIME COMMENT '处理时间',
+    `complete_time` DATETIME COMMENT '完成时间',
+    `error_msg` TEXT COMMENT '错误信息',
+    INDEX `idx_user_status` (`user_id`, `status`),
+    INDEX `idx_user_time` (`user_id`, `create_time`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='委托主表';
+"""
+
+_TABLE_PATTERN = re.compile(r"CREATE TABLE IF NOT EXISTS `(\w+)` \((.*?)\n\)[^;]*;", re.S)
+_COLUMN_PATTERN = re.compile(r"`(\w+)` (\w+)(?:\([\d,]+\))?(.*)")
+_INDEX_PATTERN = re.compile(r"(UNIQUE KEY|INDEX) `(\w+)` \(([^)]*)\)")
+_DEFAULT_PATTERN = re.compile(r"DEFAULT ('[^']*'|\w+)")
+
+# MySQL 类型 -> 值的种类（决定 SQLite 中的存储与还原方式）
+_KINDS = {
+    'VARCHAR': 'text',
+    'TEXT': 'text',
+    'DECIMAL': 'decimal',
+    'DATE': 'date',
+    'DATETIME': 'datetime',
+    'JSON': 'json',
+    'BOOLEAN': 'bool',
+}
+
+
+class Column:
+    """列定义"""
+
+    def __init__(self, name: str, kind: str, not_null: bool = False, default: Optional[str] = None):
+        """
+        初始化列定义
+
+        Args:
+            name: 列名
+            kind: 值的种类：text/decimal/date/datetime/json/bool
+            not_null: 是否非空
+            default: 默认值（SQL 字面量）
+        """
+        self.name = name
+        self.kind = kind
+        self.not_null = not_null
+        self.default = default
+
+
+class TableSchema:
+    """表定义"""
+
+    def __init__(self, name: str, columns: List[Column], primary_key: str,
+                 indexes: List[Tuple[str, Tuple[str, ...], bool]]):
+        """
+        初始化表定义
+
+        Args:
+            name: 表名
+            columns: 列定义，按建表顺序
+            primary_key: 主键列
+            indexes: 索引 (名称, 列, 是否唯一)
+        """
+        self.name = name
+        self.columns = columns
+        self.primary_key = primary_key
+        self.indexes = indexes
+
+    @property
+    def column_names(self) -> List[str]:
+        """列名列表"""
+        return [column.name for column in self.columns]
+
+
+def parse_schema(sql: str) -> Dict[str, TableSchema]:
+    """解析 MySQL 建表语句"""
+    tables = {}
+    for match in _TABLE_PATTERN.finditer(sql):
+        name, body = match.group(1), match.group(2)
+        columns, primary_key, indexes = [], None, []
+        for line in body.split('\n'):
+            line = line.strip().rstrip(',')
+            index = _INDEX_PATTERN.match(line)
+            if index:
+                index_columns = tuple(c.strip().strip('`') for c in index.group(3).split(','))
+                indexes.append((index.group(2), index_columns, index.group(1) == 'UNIQUE KEY'))
+                continue
+            column = _COLUMN_PATTERN.match(line)
+            if not column:
+                continue
+            column_name, sql_type, rest = column.groups()
+            rest = rest.split(' COMMENT ')[0]
+            default = _DEFAULT_PATTERN.search(rest)
+            columns.append(Column(
+                column_name,
+                _KINDS[sql_type.upper()],
+                not_null='NOT NULL' in rest,
+                default=default.group(1) if default else None
+            ))
+            if 'PRIMARY KEY' in rest:
+                primary_key = column_name
+        if primary_key is None:
+            raise ValueError(f"表缺少主键: {name}")
+        tables[name] = TableSchema(name, columns, primary_key, indexes)
+    return tables
+
+
+def load_schema(path: str = SCHEMA_PATH) -> Dict[str, TableSchema]:
+    """读取并解析 schema.sql"""
+    with open(path, encoding='utf-8') as f:
+        return parse_schema(f.read())
+
+
+def sqlite_ddl(table: TableSchema) -> List[str]:
+    """
+    生成 SQLite 建表与建索引语句
+
+    DECIMAL/DATE/DATETIME/JSON 均存为 TEXT（DECIMAL 存十进制字符串，避免浮点误差）；
+    SQLite 的索引名全库唯一，因此索引名加上表名前缀。
+    """
+    definitions = []
+    for column in table.columns:
+        sql_type = 'INTEGER' if column.kind == 'bool' else 'TEXT'
+        definition = f'"{column.name}" {sql_type}'
+        if column.name == table.primary_key:
+            definition += ' PRIMARY KEY'
+        elif column.not_null:
+            definition += ' NOT NULL'
+        if column.default is not None:
+            default = {'FALSE': '0', 'TRUE': '1'}.get(column.default.upper(), column.default)
+            if column.kind == 'decimal':
+                default = f"'{default}'"
+            definition += f' DEFAULT {default}'
+        definitions.append(definition)
+
+    statements = [f'CREATE TABLE IF NOT EXISTS "{table.name}" (\n    ' + ',\n    '.join(definitions) + '\n)']
+    for name, columns, unique in table.indexes:
+        statements.append(
+            f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{table.name}__{name}" '
+            f'ON "{table.name}" ({", ".join(f"{chr(34)}{c}{chr(34)}" for c in columns)})'
+        )
+    return statements
@@ -0,0 +1,141 @@
+"""
+SQLite 统一数据存储层 - 与 BaseRepository 接口一致，表结构与索引由 database/schema.sql 生成
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+from .index import Index
+from .repository import BaseRepository, WriteListener
+from .schema import ENTRUST_BASE_SQL, Column, TableSchema, load_schema, parse_schema
+from .sqlite_store import SqliteStore, SqliteTable
+
+
+class SqliteBaseRepository(BaseRepository):
+    """SQLite 数据仓库
+
+    schema.sql 中的表与委托主表 entrust_base 按原结构建立；其他表在首次写入时建成只有主键 id 的表，
+    字段全部存入 _extra 列。记录的主键（id 或 <表名>_id）写入表的主键列，
+    唯一约束由 SQLite 的唯一索引保证。读取返回记录的副本（未写入的列为默认值或 None），
+    修改需调用 update()。
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, strict: bool = False):
+        """
+        初始化数据仓库
+
+        Args:
+            path: 数据库文件路径，':memory:' 表示内存数据库
+            pool_size: 连接池大小
+            strict: 是否保留 schema.sql 的 NOT NULL 约束；BaseRepository 不校验字段，
+                默认放宽无默认值的 NOT NULL 列，记录可以只含部分字段
+        """
+        self._indexes: Dict[str, List[Index]] = {}
+        self._listeners: Dict[str, List[WriteListener]] = {}
+        self._persistence = None
+        self.store = SqliteStore(path, pool_size=pool_size)
+        for schema in {**load_schema(), **parse_schema(ENTRUST_BASE_SQL)}.values():
+            self.store.create_table(schema, strict=strict)
+            self._indexes[schema.name] = [
+                Index(name, columns, unique) for name, columns, unique in schema.indexes
+            ]
+
+    def _table(self, table_name: str, create: bool = False) -> Optional[SqliteTable]:
+        """获取表，create 为真时为不在 schema.sql 中的表建表"""
+        table = self.store.tables.get(table_name)
+        if table is None and create:
+            table = self.store.create_table(TableSchema(table_name, [Column('id', 'text')], 'id', []))
+        return table
+
+    # ==================== 索引 ====================
+
+    def declare_index(self, table_name: str, name: str, columns: Sequence[str],
+                      unique: bool = False) -> Index:
+        """在 SQLite 中建立索引（只支持表结构中的列）"""
+        table = self._table(table_name, create=True)
+        with self.store.pool.connection() as conn:
+            conn.execute(
+                f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{table_name}__{name}" '
+                f'ON "{table_name}" ({", ".join(f"{chr(34)}{c}{chr(34)}" for c in columns)})'
+            )
+        index = Index(name, columns, unique)
+        self._indexes.setdefault(table.name, []).append(index)
+        return index
+
+    # ==================== 持久化 ====================
+
+    def snapshot(self) -> int:
+        """SQLite 自身持久化，不需要快照"""
+        raise ValueError("SQLite 仓库不需要快照")
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        self.store.close()
+
+    # ==================== 增删改查 ====================
+
+    def create(self, table_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """创建记录"""
+        primary_key = data.get('id') or data.get(f'{table_name}_id')
+        if not primary_key:
+            raise ValueError(f"缺少主键字段: {table_name}")
+        self._table(table_name, create=True).insert(primary_key, data)
+        self._notify('create', table_name, primary_key, data)
+        return data
+
+    def put(self, table_name: str, primary_key: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """写入整条记录：不存在则创建，存在则替换"""
+        table = self._table(table_name, create=True)
+        with self.store.pool.transaction():
+            created = primary_key not in table
+            table[primary_key] = record
+        self._notify('create' if created else 'update', table_name, primary_key, record)
+        return record
+
+    def table(self, table_name: str) -> SqliteTable:
+        """获取表的字典视图，只读；写入需经过 create/put/update/delete"""
+        return self._table(table_name, create=True)
+
+    def get(self, table_name: str, primary_key: str) -> Optional[Dict[str, Any]]:
+        """获取记录"""
+        table = self._table(table_name)
+        if table is None:
+            return None
+        return table.get(primary_key)
+
+    def update(self, table_name: str, primary_key: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """更新记录（读取与写回在同一个写事务中）"""
+        table = self._table(table_name)
+        if table is None:
+            return None
+        with self.store.pool.transaction():
+            record = table.get(primary_key)
+            if record is None:
+                return None
+            record.update(data)
+            table[primary_key] = record
+        self._notify('update', table_name, primary_key, record)
+        return record
+
+    def delete(self, table_name: str, primary_key: str) -> bool:
+        """删除记录"""
+        table = self._table(table_name)
+        if table is None:
+            return False
+        with self.store.pool.transaction():
+            record = table.get(primary_key)
+            if record is None:
+                return False
+            del table[primary_key]
+        self._notify('delete', table_name, primary_key, record)
+        return True
+
+    def list(self, table_name: str, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """列出记录，过滤条件下推为 SQL 等值条件"""
+        table = self._table(table_name)
+        if table is None:
+            return []
+        return table.select(filters)
+
+    def exists(self, table_name: str, primary_key: str) -> bool:
+        """检查记录是否存在"""
+        table = self._table(table_name)
+        return table is not None and primary_key in table
@@ -0,0 +1,488 @@
+"""
+SQLite 存储 - 由 database/schema.sql 生成表结构，为仓库提供字典式的表访问
+
+连接池中的连接开启 WAL 日志模式（读写互不阻塞）并复用预编译语句；
+单条写入为自动提交的 UPSERT，批量写入在一个事务中用 executemany 完成。
+"""
+import json
+import pickle
+import queue
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .schema import Column, TableSchema, sqlite_ddl
+
+# 未在表结构中声明的字段统一 pickle 后存入该列
+EXTRA_COLUMN = '_extra'
+
+# 分页扫描每页的行数
+_SCAN_PAGE = 1000
+
+
+def _encode_text(value: Any) -> Any:
+    """枚举存其值"""
+    return value.value if isinstance(value, Enum) else value
+
+
+def _encode_decimal(value: Any) -> Any:
+    """DECIMAL 存十进制字符串，保证精确"""
+    return str(value)
+
+
+def _encode_temporal(value: Any) -> Any:
+    """日期/时间存 ISO 字符串"""
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _encode_json(value: Any) -> Any:
+    """JSON 列存 JSON 文本"""
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _encode_param(value: Any) -> Any:
+    """查询参数按值的类型编码，与列的存储形式一致（ISO 时间字符串可以直接比较大小）"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _decode_temporal(value: str) -> Any:
+    """按长度区分日期与时间，还原为写入时的类型"""
+    if len(value) == 10:
+        return date.fromisoformat(value)
+    return datetime.fromisoformat(value)
+
+
+_ENCODERS: Dict[str, Callable[[Any], Any]] = {
+    'text': _encode_text,
+    'decimal': _encode_decimal,
+    'date': _encode_temporal,
+    'datetime': _encode_temporal,
+    'json': _encode_json,
+    'bool': int,
+}
+
+_DECODERS: Dict[str, Callable[[Any], Any]] = {
+    'text': lambda value: value,
+    'decimal': Decimal,
+    'date': _decode_temporal,
+    'datetime': _decode_temporal,
+    'json': json.loads,
+    'bool': bool,
+}
+
+
+def _integrity_error(table: str, error: sqlite3.IntegrityError) -> ValueError:
+    """将 SQLite 约束错误转换为 ValueError"""
+    message = str(error)
+    if message.startswith('UNIQUE'):
+        return ValueError(f"唯一约束冲突 {table}: {message}")
+    if message.startswith('NOT NULL'):
+        return ValueError(f"缺少非空字段 {table}: {message}")
+    return ValueError(f"约束冲突 {table}: {message}")
+
+
+class ConnectionPool:
+    """SQLite 连接池
+
+    每个连接都以自动提交模式打开（isolation_level=None），显式事务用 transaction()；
+    sqlite3 按 SQL 文本缓存预编译语句，相同语句重复执行时不再解析。
+    内存数据库（':memory:'）只能有一个连接，池大小固定为 1。
+    """
+
+    def __init__(self, path: str, size: int = 4, cached_statements: int = 256,
+                 synchronous: str = 'NORMAL', timeout: float = 30.0):
+        """
+        初始化连接池
+
+        Args:
+            path: 数据库文件路径，':memory:' 表示内存数据库
+            size: 连接数
+            cached_statements: 每个连接缓存的预编译语句数
+            synchronous: PRAGMA synchronous；WAL 模式下 NORMAL 只在检查点时 fsync
+            timeout: 等待写锁的最长时间（秒）
+        """
+        if size < 1:
+            raise ValueError(f"连接池大小必须大于0: {size}")
+        self.path = path
+        self.size = 1 if path == ':memory:' else size
+        self._pool: "queue.SimpleQueue[sqlite3.Connection]" = queue.SimpleQueue()
+        self._connections: List[sqlite3.Connection] = []
+        for _ in range(self.size):
+            conn = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                   check_same_thread=False, cached_statements=cached_statements)
+            if path != ':memory:':
+                conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={synchronous}')
+            self._connections.append(conn)
+            self._pool.put(conn)
+        # 事务期间当前线程持有的连接，事务内的读写都使用它
+        self._local = threading.local()
+        self._closed = False
+
+    def acquire(self) -> sqlite3.Connection:
+        """借出一个连接；当前线程在事务中时返回事务所用的连接"""
+        if self._closed:
+            raise ValueError("连接池已关闭")
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        return self._pool.get()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """归还连接（事务中的连接在事务结束时归还）"""
+        if conn is not getattr(self._local, 'conn', None):
+            self._pool.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """借出一个连接，用完归还"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """在一个写事务中执行，异常时回滚；已在事务中时并入外层事务"""
+        if getattr(self._local, 'conn', None) is not None:
+            yield self._local.conn
+            return
+        conn = self.acquire()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._local.conn = conn
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            self._local.conn = None
+            self._pool.put(conn)
+
+    def close(self) -> None:
+        """关闭全部连接"""
+        if self._closed:
+            return
+        self._closed = True
+        for conn in self._connections:
+            conn.close()
+
+
+class SqliteTable(MutableMapping):
+    """SQLite 表的字典视图：主键 -> 记录字典
+
+    写入时按列类型编码（DECIMAL 存字符串、日期存 ISO 字符串、JSON 存文本），读取时还原；
+    记录中不属于表结构的字段 pickle 后存入 _extra 列。
+    只传入 fields 时，读取结果只包含这些列（以及 _extra 中的字段）。
+    """
+
+    def __init__(self, pool: ConnectionPool, schema: TableSchema,
+                 fields: Optional[Sequence[str]] = None):
+        """
+        初始化表视图
+
+        Args:
+            pool: 连接池
+            schema: 表定义
+            fields: 读写的列，默认全部列
+        """
+        self.pool = pool
+        self.schema = schema
+        self.name = schema.name
+        self.primary_key = schema.primary_key
+        columns = {column.name: column for column in schema.columns}
+        if fields is None:
+            self._columns: List[Column] = list(schema.columns)
+        else:
+            self._columns = [columns[name] for name in fields if name in columns]
+        self._column_names = [column.name for column in self._columns]
+        self._encoders = {column.name: _ENCODERS[column.kind] for column in self._columns}
+        self._decoders = [_DECODERS[column.kind] for column in self._columns]
+        select_list = ', '.join(f'"{name}"' for name in self._column_names + [EXTRA_COLUMN])
+        self._select_list = select_list
+        self._get_sql = f'SELECT {select_list} FROM "{self.name}" WHERE "{self.primary_key}" = ?'
+        # 列组合 -> (INSERT 语句, UPSERT 语句)
+        self._write_sql: Dict[Tuple[str, ...], Tuple[str, str]] = {}
+        self._sql_lock = threading.Lock()
+
+    # ==================== 编码 ====================
+
+    def _encode(self, key: str, record: Dict[str, Any]) -> Tuple[Tuple[str, ...], List[Any]]:
+        """编码一条记录，返回 (写入的列, 参数)；记录中未出现的列不写入，保留默认值"""
+        names, params, extra = [self.primary_key], [key], None
+        for name, value in record.items():
+            if name == self.primary_key:
+                if value != key:
+                    raise ValueError(f"主键不一致 {self.name}: {key} != {value}")
+                continue
+            encoder = self._encoders.get(name)
+            if encoder is None:
+                if extra is None:
+                    extra = {}
+                extra[name] = value
+                continue
+            names.append(name)
+            params.append(None if value is None else encoder(value))
+        names.append(EXTRA_COLUMN)
+        params.append(None if extra is None else pickle.dumps(extra, protocol=pickle.HIGHEST_PROTOCOL))
+        return tuple(names), params
+
+    def _decode(self, row: Sequence[Any]) -> Dict[str, Any]:
+        """解码一行（列顺序与 _select_list 一致）"""
+        record = {}
+        for name, decode, value in zip(self._column_names, self._decoders, row):
+            record[name] = None if value is None else decode(value)
+        if row[-1] is not None:
+            record.update(pickle.loads(row[-1]))
+        return record
+
+    def _statements(self, names: Tuple[str, ...]) -> Tuple[str, str]:
+        """按写入的列生成 INSERT 与 UPSERT 语句（同一列组合只生成一次）"""
+        statements = self._write_sql.get(names)
+        if statements is None:
+            with self._sql_lock:
+                column_list = ', '.join(f'"{name}"' for name in names)
+                placeholders = ', '.join('?' for _ in names)
+                assignments = ', '.join(
+                    f'"{name}" = excluded."{name}"' for name in names if name != self.primary_key
+                )
+                insert = f'INSERT INTO "{self.name}" ({column_list}) VALUES ({placeholders})'
+                upsert = f'{insert} ON CONFLICT("{self.primary_key}") DO UPDATE SET {assignments}'
+                statements = self._write_sql[names] = (insert, upsert)
+        return statements
+
+    # ==================== 写入 ====================
+
+    def insert(self, key: str, record: Dict[str, Any]) -> None:
+        """插入记录，主键已存在时抛出 ValueError"""
+        names, params = self._encode(key, record)
+        conn = self.pool.acquire()
+        try:
+            conn.execute(self._statements(names)[0], params)
+        except sqlite3.IntegrityError as e:
+            if str(e) == f'UNIQUE constraint failed: {self.name}.{self.primary_key}':
+                raise ValueError(f"记录已存在: {key}")
+            raise _integrity_error(self.name, e)
+        finally:
+            self.pool.release(conn)
+
+    def __setitem__(self, key: str, record: Dict[str, Any]) -> None:
+        """写入记录（UPSERT）"""
+        names, params = self._encode(key, record)
+        conn = self.pool.acquire()
+        try:
+            conn.execute(self._statements(names)[1], params)
+        except sqlite3.IntegrityError as e:
+            raise _integrity_error(self.name, e)
+        finally:
+            self.pool.release(conn)
+
+    def update(self, rows: Any = (), **kwargs: Any) -> None:
+        """批量写入记录：同一列组合的记录在一个事务中用 executemany 写入"""
+        items = rows.items() if isinstance(rows, dict) else rows
+        groups: Dict[Tuple[str, ...], List[List[Any]]] = {}
+        for key, record in items:
+            names, params = self._encode(key, record)
+            groups.setdefault(names, []).append(params)
+        for key, record in kwargs.items():
+            names, params = self._encode(key, record)
+            groups.setdefault(names, []).append(params)
+        if not groups:
+            return
+        try:
+            with self.pool.transaction() as conn:
+                for names, params in groups.items():
+                    conn.executemany(self._statements(names)[1], params)
+        except sqlite3.IntegrityError as e:
+            raise _integrity_error(self.name, e)
+
+    def __delitem__(self, key: str) -> None:
+        """删除记录"""
+        with self.pool.connection() as conn:
+            cursor = conn.execute(f'DELETE FROM "{self.name}" WHERE "{self.primary_key}" = ?', (key,))
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    # ==================== 读取 ====================
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        record = self.get(key)
+        if record is None:
+            raise KeyError(key)
+        return record
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """按主键读取记录"""
+        conn = self.pool.acquire()
+        try:
+            row = conn.execute(self._get_sql, (key,)).fetchone()
+        finally:
+            self.pool.release(conn)
+        return default if row is None else self._decode(row)
+
+    def __contains__(self, key: object) -> bool:
+        with self.pool.connection() as conn:
+            return conn.execute(
+                f'SELECT 1 FROM "{self.name}" WHERE "{self.primary_key}" = ?', (key,)
+            ).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM "{self.name}"').fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        for row in self._scan(f'"{self.primary_key}"'):
+            yield row[0]
+
+    def values(self) -> Iterator[Dict[str, Any]]:  # type: ignore[override]
+        """按写入顺序遍历记录"""
+        for row in self._scan(self._select_list):
+            yield self._decode(row)
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:  # type: ignore[override]
+        """按写入顺序遍历 (主键, 记录)"""
+        for row in self._scan(f'"{self.primary_key}", {self._select_list}'):
+            yield row[0], self._decode(row[1:])
+
+    def _scan(self, select_list: str) -> Iterator[Sequence[Any]]:
+        """按 rowid 分页扫描，每页之间归还连接，遍历过程中可以继续读写"""
+        last_rowid = 0
+        sql = f'SELECT rowid, {select_list} FROM "{self.name}" WHERE rowid > ? ORDER BY rowid LIMIT {_SCAN_PAGE}'
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(sql, (last_rowid,)).fetchall()
+            for row in rows:
+                yield row[1:]
+            if len(rows) < _SCAN_PAGE:
+                return
+            last_rowid = rows[-1][0]
+
+    def select(self, filters: Optional[Dict[str, Any]] = None, order_by: Optional[str] = None,
+               descending: bool = False, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        按列过滤查询（等值条件，可使用表上的索引）
+
+        Args:
+            filters: 列名 -> 值；不属于表结构的字段在解码后过滤
+            order_by: 排序列，默认按写入顺序
+            descending: 是否倒序
+            limit: 最多返回的行数（仅在所有过滤条件都是表列时下推到 SQL）
+        """
+        conditions, params, residual = [], [], {}
+        for name, value in (filters or {}).items():
+            encoder = self._encoders.get(name)
+            if encoder is None:
+                residual[name] = _encode_text(value)
+            elif value is None:
+                conditions.append(f'"{name}" IS NULL')
+            else:
+                conditions.append(f'"{name}" = ?')
+                params.append(encoder(value))
+        sql = f'SELECT {self._select_list} FROM "{self.name}"'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' ORDER BY "{order_by}"' if order_by else ' ORDER BY rowid'
+        if descending:
+            sql += ' DESC'
+        if limit is not None and not residual:
+            sql += f' LIMIT {int(limit)}'
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        records = [self._decode(row) for row in rows]
+        if residual:
+            records = [
+                record for record in records
+                if all(_encode_text(record.get(name)) == value for name, value in residual.items())
+            ]
+            if limit is not None:
+                records = records[:limit]
+        return records
+
+    def query(self, where: str = '', params: Sequence[Any] = (), order_by: str = '',
+              limit: Optional[int] = None, join: str = '') -> List[Dict[str, Any]]:
+        """
+        按 SQL 条件查询（区间、多列排序、连接其他表等 select() 不支持的查询，可使用表上的索引）
+
+        Args:
+            where: WHERE 条件，本表以别名 t 引用
+            params: 条件中的参数，按值的类型编码
+            order_by: ORDER BY 子句
+            limit: 最多返回的行数
+            join: 连接其他表的子句（只返回本表的列）
+        """
+        select_list = ', '.join(f't."{name}"' for name in self._column_names + [EXTRA_COLUMN])
+        sql = f'SELECT {select_list} FROM "{self.name}" AS t'
+        if join:
+            sql += f' {join}'
+        if where:
+            sql += f' WHERE {where}'
+        if order_by:
+            sql += f' ORDER BY {order_by}'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, [_encode_param(value) for value in params]).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        """执行只读 SQL，返回原始行（聚合、投影等不需要解码整条记录的查询）"""
+        with self.pool.connection() as conn:
+            return conn.execute(sql, [_encode_param(value) for value in params]).fetchall()
+
+
+class SqliteStore:
+    """SQLite 数据库：连接池 + 按表结构建立的表"""
+
+    def __init__(self, path: str, pool_size: int = 4):
+        """
+        初始化数据库
+
+        Args:
+            path: 数据库文件路径，':memory:' 表示内存数据库
+            pool_size: 连接池大小
+        """
+        self.pool = ConnectionPool(path, size=pool_size)
+        self.tables: Dict[str, SqliteTable] = {}
+
+    def create_table(self, schema: TableSchema, fields: Optional[Sequence[str]] = None,
+                     strict: bool = True) -> SqliteTable:
+        """
+        按表定义建表建索引（已存在则跳过），返回表视图
+
+        Args:
+            schema: 表定义
+            fields: 读写的列，默认全部列；其余无默认值的 NOT NULL 列放宽为可空，
+                否则写入会因缺少这些列而失败
+            strict: 为 False 时放宽所有无默认值的 NOT NULL 列（记录可以只含部分字段）
+        """
+        keep = set(schema.column_names if fields is None else fields) if strict else set()
+        schema = TableSchema(schema.name, [
+            column if column.name in keep or column.default is not None or not column.not_null
+            else Column(column.name, column.kind, not_null=False)
+            for column in schema.columns
+        ], schema.primary_key, schema.indexes)
+        statements = sqlite_ddl(schema)
+        statements[0] = statements[0][:-2] + f',\n    "{EXTRA_COLUMN}" BLOB\n)'
+        with self.pool.transaction() as conn:
+            for statement in statements:
+                conn.execute(statement)
+        table = self.tables[schema.name] = SqliteTable(self.pool, schema, fields)
+        return table
+
+    def close(self) -> None:
+        """关闭数据库"""
+        self.pool.close()
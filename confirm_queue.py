@@ -0,0 +1,159 @@
+"""
+确认队列 - 委托受理后入队，由后台线程按批次异步确认
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 批次处理函数：接收一批待确认条目
+BatchHandler = Callable[[List[Dict[str, Any]]], None]
+
+
+class ConfirmationQueue:
+    """异步确认队列
+    
+    请求线程只负责入队；后台工作线程取出第一条后最多再等待 linger_ms 凑批，
+    达到 batch_size 或等待超时即把整批交给处理函数。处理函数由 FundService 绑定。
+    """
+    
+    def __init__(self, batch_size: int = 500, linger_ms: float = 50,
+                 handler: Optional[BatchHandler] = None, autostart: bool = True):
+        """
+        初始化确认队列
+        
+        Args:
+            batch_size: 每批最多确认的条目数
+            linger_ms: 取到第一条后等待凑批的最长时间（毫秒）
+            handler: 批次处理函数
+            autostart: 首次入队时是否自动启动工作线程；为 False 时需调用 start() 或 flush()
+        """
+        if batch_size < 1:
+            raise ValueError(f"批次大小必须大于0: {batch_size}")
+        if linger_ms < 0:
+            raise ValueError(f"凑批等待时间不能为负数: {linger_ms}")
+        self.batch_size = batch_size
+        self.linger_ms = linger_ms
+        self._handler = handler
+        self._autostart = autostart
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        # 同一时间只处理一个批次（工作线程与 flush() 互斥）
+        self._batch_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        # stop() 之后拒绝入队，入队不再自动重启工作线程
+        self._stopped = False
+        self.batches = 0
+        self.confirmed = 0
+    
+    def set_handler(self, handler: BatchHandler) -> None:
+        """绑定批次处理函数"""
+        self._handler = handler
+    
+    def put(self, item: Dict[str, Any]) -> None:
+        """入队，工作线程未启动时自动启动；队列已停止时抛出 ValueError
+        
+        检查与入队在 stop() 使用的状态锁内完成：stop() 返回前入队的条目都会被最后一次排空处理，
+        之后的入队一律被拒绝，不会有条目留在队列中无人处理。
+        """
+        with self._state_lock:
+            if self._stopped:
+                raise ValueError("确认队列已停止")
+            self._queue.put(item)
+            if self._autostart and self._worker is None:
+                self._start_worker()
+    
+    @property
+    def stopped(self) -> bool:
+        """是否已调用 stop()（停止后拒绝入队，直到再次调用 start()）"""
+        return self._stopped
+    
+    def pending(self) -> int:
+        """队列中尚未取出的条目数"""
+        return self._queue.qsize()
+    
+    # ==================== 工作线程 ====================
+    
+    def start(self) -> None:
+        """启动后台工作线程"""
+        with self._state_lock:
+            self._stopped = False
+            self._start_worker()
+    
+    def _start_worker(self) -> None:
+        """工作线程未运行时启动（调用方持有 _state_lock）"""
+        if self._worker is not None:
+            return
+        self._stop_event.clear()
+        self._worker = threading.Thread(target=self._run, name="confirmation-worker", daemon=True)
+        self._worker.start()
+    
+    def stop(self, drain: bool = True, timeout: Optional[float] = None) -> None:
+        """
+        停止后台工作线程
+        
+        Args:
+            drain: 是否在停止后处理完队列中剩余的条目
+            timeout: 等待工作线程退出的最长时间（秒）
+        """
+        with self._state_lock:
+            worker, self._worker = self._worker, None
+            self._stopped = True
+            self._stop_event.set()
+        if worker is not None:
+            worker.join(timeout)
+        if drain:
+            self.flush()
+    
+    def flush(self) -> int:
+        """在当前线程中处理完队列中的全部条目，返回处理的条目数"""
+        total = 0
+        while True:
+            batch = self._take(block=False)
+            if not batch:
+                return total
+            self._process(batch)
+            total += len(batch)
+    
+    def _run(self) -> None:
+        """工作线程主循环"""
+        while not self._stop_event.is_set():
+            batch = self._take(block=True)
+            if batch:
+                self._process(batch)
+    
+    def _take(self, block: bool) -> List[Dict[str, Any]]:
+        """取出一批条目：阻塞模式下等待首条，再在 linger_ms 内凑满批次"""
+        try:
+            first = self._queue.get(timeout=0.1) if block else self._queue.get_nowait()
+        except queue.Empty:
+            return []
+        
+        batch = [first]
+        deadline = time.monotonic() + self.linger_ms / 1000 if block else 0
+        while len(batch) < self.batch_size:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _process(self, batch: List[Dict[str, Any]]) -> None:
+        """处理一个批次，处理函数异常不终止工作线程"""
+        if self._handler is None:
+            raise ValueError("确认队列未绑定处理函数")
+        with self._batch_lock:
+            try:
+                self._handler(batch)
+            except Exception:
+                logger.exception(f"确认批次处理失败: {len(batch)}条")
+            self.batches += 1
+            self.confirmed += len(batch)
@@ -0,0 +1,99 @@
+"""
+定点数运算 - 金额、份额、净值统一为 4 位小数的定点整数（与 database/schema.sql 的 DECIMAL(18,4) / DECIMAL(10,4) 一致）
+
+每个会产生多余小数位的运算都显式指定舍入方式：份额向下舍去（不多确认份额），金额四舍五入。
+
+使用范围：
+- 定点整数：用户资产聚合（asset_book.UserAssetBook 的余额、持仓、净值、市值）、批量净值重估
+  （revaluation.RevaluationEngine）和列式持仓存储（position_store.PositionStore），
+  这些循环全程使用整数，只在读取时转换为 Decimal。
+- Decimal：仓库中的余额、份额、净值记录（UserBalance / FundShare / FundNetValue 等模型，
+  各存储后端与接口共用这些模型）以及单笔申购、赎回。单笔交易用 quantized_share / quantized_amount
+  计算后舍入到同样的 4 位小数，结果与定点整数运算一致；单笔运算转换为整数再转回反而更慢。
+- 委托、确认记录的 JSON 字段（request_data / response_data / confirm_data）保存十进制字符串：
+  DECIMAL(18,4) 最多 18 位有效数字，浮点数只能精确表示约 15 位，超过约 1e11 的金额会丢失末位。
+"""
+from decimal import Context, Decimal, ROUND_DOWN, ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_UP
+
+# 4 位小数
+PLACES = 4
+SCALE = 10 ** PLACES
+
+# 申购确认份额：向下舍去
+SHARE_ROUNDING = ROUND_DOWN
+# 赎回金额、资产市值：四舍五入
+AMOUNT_ROUNDING = ROUND_HALF_UP
+
+_ROUNDINGS = (ROUND_DOWN, ROUND_HALF_UP, ROUND_HALF_EVEN, ROUND_UP)
+
+# 4 位小数的量子
+QUANTUM = Decimal(1).scaleb(-PLACES)
+# 舍入前的中间结果：精度足够容纳 DECIMAL(18,4) 与 DECIMAL(10,4) 的乘积，多余位截断而不进位，
+# 之后 quantize 的舍入方向不受中间结果影响
+_EXACT = Context(prec=40, rounding=ROUND_DOWN)
+
+
+def to_fixed(value: Decimal, rounding: str = ROUND_HALF_UP) -> int:
+    """Decimal 转为 4 位小数定点整数，超出的小数位按 rounding 舍入（浮点数按其十进制表示转换）"""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value)) if isinstance(value, float) else Decimal(value)
+    return int(value.scaleb(PLACES).to_integral_value(rounding=rounding))
+
+
+def from_fixed(value: int, places: int = PLACES) -> Decimal:
+    """定点整数转为 Decimal（places 为定点整数的小数位数）"""
+    return Decimal(value).scaleb(-places)
+
+
+def quantize(value: Decimal, rounding: str = ROUND_HALF_UP) -> Decimal:
+    """舍入到 4 位小数（浮点数按其十进制表示转换）"""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value)) if isinstance(value, float) else Decimal(value)
+    return value.quantize(QUANTUM, rounding=rounding, context=_EXACT)
+
+
+def quantized_share(amount: Decimal, nav: Decimal, rounding: str = SHARE_ROUNDING) -> Decimal:
+    """申购份额 = 金额 / 净值（Decimal），舍入到 4 位小数"""
+    if nav <= 0:
+        raise ValueError(f"净值必须大于0: {nav}")
+    return quantize(_EXACT.divide(amount, nav), rounding)
+
+
+def quantized_amount(share: Decimal, nav: Decimal, rounding: str = AMOUNT_ROUNDING) -> Decimal:
+    """赎回金额 = 份额 × 净值（Decimal），舍入到 4 位小数"""
+    return quantize(_EXACT.multiply(share, nav), rounding)
+
+
+def divide(numerator: int, denominator: int, rounding: str = ROUND_HALF_UP) -> int:
+    """整数除法，按 rounding 舍入（支持 ROUND_DOWN / ROUND_HALF_UP / ROUND_HALF_EVEN / ROUND_UP）"""
+    if denominator == 0:
+        raise ValueError("除数不能为0")
+    if rounding not in _ROUNDINGS:
+        raise ValueError(f"不支持的舍入方式: {rounding}")
+    negative = (numerator < 0) != (denominator < 0)
+    quotient, remainder = divmod(abs(numerator), abs(denominator))
+    if remainder:
+        twice = remainder * 2
+        denominator = abs(denominator)
+        if (rounding == ROUND_UP
+                or rounding == ROUND_HALF_UP and twice >= denominator
+                or rounding == ROUND_HALF_EVEN and (twice > denominator or twice == denominator and quotient % 2)):
+            quotient += 1
+    return -quotient if negative else quotient
+
+
+def share_for_amount(amount: int, nav: int, rounding: str = SHARE_ROUNDING) -> int:
+    """申购份额 = 金额 / 净值（均为定点整数）"""
+    if nav <= 0:
+        raise ValueError(f"净值必须大于0: {from_fixed(nav)}")
+    return divide(amount * SCALE, nav, rounding)
+
+
+def amount_for_share(share: int, nav: int, rounding: str = AMOUNT_ROUNDING) -> int:
+    """赎回金额 = 份额 × 净值（均为定点整数）"""
+    return divide(share * nav, SCALE, rounding)
+
+
+def round_product(value: int, rounding: str = AMOUNT_ROUNDING) -> int:
+    """8 位小数的乘积（份额 × 净值）舍入为 4 位小数"""
+    return divide(value, SCALE, rounding)
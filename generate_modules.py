@@ -90,6 +90,7 @@ app_template = '''"""
 """
 from typing import Optional, List
 from datetime import datetime
+from common.ids import generate_id
 from common.repository import get_repository
 from .{module_name}_schema import {class_name}, {class_name}CreateRequest
 
@@ -103,8 +104,7 @@ class {class_name}App:
     
     def _generate_id(self) -> str:
         """生成ID"""
-        import uuid
-        return f"{prefix}_{{uuid.uuid4().hex[:16]}}"
+        return generate_id("{prefix}_")
     
     def create(self, request: {class_name}CreateRequest) -> {class_name}:
         """创建{description}"""
@@ -176,25 +176,31 @@ api_template = '''"""
 {description}客户端API
 """
 import requests
-from typing import List, Dict, Any
+from typing import Optional, List, Dict, Any
+from common.http_session import DEFAULT_TIMEOUT, Timeout, get_session
 from .{module_name}_schema import {class_name}CreateRequest, {class_name}Response
 
 
 class {class_name}API:
     """{description}客户端API"""
     
-    def __init__(self, base_url: str = "http://localhost:8000", token: str = "demo_token_2025"):
+    def __init__(self, base_url: str = "http://localhost:8000", token: str = "demo_token_2025",
+                 session: Optional[requests.Session] = None, timeout: Timeout = DEFAULT_TIMEOUT):
         self.base_url = base_url.rstrip('/')
         self.token = token
         self.headers = {{
             "Authorization": f"Bearer {{token}}",
             "Content-Type": "application/json"
         }}
+        # 默认使用进程内共用的连接池会话（见 common/http_session.py）
+        self.session = session or get_session()
+        self.timeout = timeout
     
     def _request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """发送HTTP请求"""
         url = f"{{self.base_url}}{{endpoint}}"
-        response = requests.request(method=method, url=url, headers=self.headers, **kwargs)
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.request(method=method, url=url, headers=self.headers, **kwargs)
         if response.status_code == 200:
             return response.json()
         else:
@@ -0,0 +1,149 @@
+"""
+幂等键缓存 - 按请求头 Idempotency-Key 记住交易、开户接口的响应，客户端重试时返回第一次的结果而不再执行
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, Tuple
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# 重复请求返回缓存的响应时附带的响应头
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+def scoped_key(scope: str, caller: str, key: str) -> str:
+    """缓存键：接口名 + 调用方身份摘要 + 幂等键，不同接口、不同调用方使用相同的幂等键互不影响"""
+    return f"{scope}:{hashlib.blake2b(caller.encode(), digest_size=16).hexdigest()}:{key}"
+
+
+class IdempotencyKeyReused(ValueError):
+    """同一幂等键用于内容不同的请求"""
+
+
+class _Entry:
+    """缓存条目：请求指纹、过期时间，以及第一次执行的结果
+
+    执行期间 future 供重复请求等待；完成后只保留结果，释放 future（每个约 1KB）。
+    """
+    __slots__ = ('fingerprint', 'expires', 'future', 'result')
+
+    def __init__(self, fingerprint: bytes, expires: float):
+        self.fingerprint = fingerprint
+        self.expires = expires
+        self.future: Optional[Future] = Future()
+        self.result: Any = None
+
+
+class IdempotencyCache:
+    """幂等键缓存
+
+    第一个带某个键的请求执行并缓存结果，ttl 秒内相同键的请求直接返回该结果；
+    第一次执行尚未完成时，相同键的请求等待同一个结果，不会再执行一次。
+    执行抛出异常时不缓存（失败的请求没有改变数据，重试时重新执行），正在等待的请求收到同一个异常。
+    同一个键用于内容不同的请求（请求指纹不同）时抛出 IdempotencyKeyReused。
+
+    条目按写入顺序保存（过期时间 = 写入时间 + ttl，写入顺序即过期顺序），每次写入时从最早的条目开始清理过期条目；
+    条目数超过 max_entries 时淘汰最早的条目，所以内存有上限，与每天的键数无关。
+    请求指纹只保存 16 字节摘要，结果由调用方决定（接口保存序列化后的响应字节）。
+    """
+
+    def __init__(self, max_entries: int = 100000, ttl: float = 86400,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化幂等键缓存
+
+        Args:
+            max_entries: 最多保存的键数
+            ttl: 结果的保存时间（秒）
+            clock: 时钟（测试时替换）
+        """
+        if max_entries < 1:
+            raise ValueError(f"缓存键数必须大于0: {max_entries}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def run(self, key: str, fingerprint: bytes, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        按幂等键执行 func
+
+        Args:
+            key: 幂等键（调用方负责加上接口名和调用方身份，见 scoped_key）
+            fingerprint: 请求内容，用于识别同一个键用于不同请求
+            func: 第一次执行的函数
+
+        Returns:
+            (结果, 是否为重复请求)
+        """
+        entry, future = self._claim(key, fingerprint)
+        if entry is not None:
+            return self._execute(key, entry, func), False
+        return future.result(), True
+
+    async def run_async(self, key: str, fingerprint: bytes, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """与 run 相同，供异步接口使用：func 在当前线程同步执行，重复请求等待时不阻塞事件循环"""
+        entry, future = self._claim(key, fingerprint)
+        if entry is not None:
+            return self._execute(key, entry, func), False
+        return await asyncio.wrap_future(future), True
+
+    # ==================== 内部方法 ====================
+
+    def _claim(self, key: str, fingerprint: bytes) -> Tuple[Optional[_Entry], Future]:
+        """
+        取得键的结果
+
+        键不存在或已过期时创建条目并返回 (条目, 其 future)，由调用方执行；
+        否则返回 (None, future)，future 为第一次执行的结果（已完成时为新建的已完成 future）。
+        """
+        digest = hashlib.blake2b(fingerprint, digest_size=16).digest()
+        now = self._clock()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.fingerprint != digest:
+                    raise IdempotencyKeyReused(f"幂等键已用于其他请求: {key}")
+                if entry.future is not None:
+                    return None, entry.future
+                future: Future = Future()
+                future.set_result(entry.result)
+                return None, future
+            entry = self._entries[key] = _Entry(digest, now + self.ttl)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry, entry.future
+
+    def _execute(self, key: str, entry: _Entry, func: Callable[[], Any]) -> Any:
+        try:
+            result = func()
+        except BaseException as e:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                future, entry.future = entry.future, None
+            future.set_exception(e)
+            raise
+        with self._lock:
+            entry.result = result
+            future, entry.future = entry.future, None
+        future.set_result(result)
+        return result
+
+    def _evict_expired(self, now: float) -> None:
+        """从最早的条目开始清理过期条目（调用方持有锁）"""
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if entry.expires > now:
+                break
+            del entries[key]
@@ -14,7 +14,7 @@ class InteractiveClient:
     def __init__(self, base_url: str = "http://localhost:8000", token: str = "demo_token_2025"):
         """初始化交互式客户端"""
         try:
-            self.client = FundClient(base_url=base_url, token=token)
+            self.client = FundClient(base_url=base_url, token=token, test_connection=True)
             self.app = FundTradingApp(self.client)
             print("✓ 已连接到基金交易服务")
         except Exception as e:
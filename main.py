@@ -1,13 +1,14 @@
 """
 FastAPI微服务 - 基金交易系统API服务
 """
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, List
-from datetime import date
+from datetime import date, datetime
 from decimal import Decimal
 import logging
+import os
 
 from models import (
     UserCreateRequest, FundAccountOpenRequest, FundSubscribeRequest,
@@ -15,10 +16,18 @@ from models import (
     ResponseModel, UserAssetsResponse
 )
 from repository import Repository
+from sqlite_repository import SqliteRepository
 from service import FundService
+from sharding import ShardIdGenerator
+from nav_catalog import NavCatalog
+from fast_response import FastJSONRoute
+from product_listing import ProductListing, etag_matches
+from idempotency import IdempotencyCache, IdempotencyKeyReused, MAX_KEY_LENGTH, REPLAYED_HEADER, scoped_key
+from common.ids import worker_id
+from common.persistence import Persistence
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+# 配置日志（LOG_LEVEL 调整级别，默认 INFO）
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 logger = logging.getLogger(__name__)
 
 # 初始化FastAPI应用
@@ -27,6 +36,9 @@ app = FastAPI(
     description="开放式基金交易系统微服务API",
     version="1.0.0"
 )
+# FAST_JSON=1 时接口返回的 ResponseModel 不再重新校验，直接序列化（见 fast_response.py）
+if os.getenv("FAST_JSON", "0") == "1":
+    app.router.route_class = FastJSONRoute
 
 # 配置CORS
 app.add_middleware(
@@ -41,8 +53,48 @@ app.add_middleware(
 security = HTTPBearer()
 
 # 全局数据仓库和服务
-repository = Repository()
-fund_service = FundService(repository)
+# STORAGE_BACKEND=sqlite 时数据存放在 SQLITE_PATH 指定的 SQLite 数据库中；
+# 默认使用内存存储，设置 DATA_DIR 时数据写入预写日志和快照，重启后恢复
+# （DATA_FSYNC=0 时日志只写入操作系统缓存，仅用于测试/基准）；
+# COLUMNAR_POSITIONS=1 时内存存储的基金份额使用列式持仓存储（见 position_store.py）
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")
+DATA_DIR = os.getenv("DATA_DIR")
+# 分片部署（见 shard_router.py）：SHARD_COUNT 大于 1 时本进程只保存 SHARD_INDEX 号分片的用户，
+# 各分片的数据文件互相独立；产品与净值由路由同步写入每个分片
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_SUFFIX = f"-shard-{SHARD_INDEX}" if SHARD_COUNT > 1 else ""
+if STORAGE_BACKEND == "sqlite":
+    root, ext = os.path.splitext(os.getenv("SQLITE_PATH", "fund.db"))
+    repository = SqliteRepository(
+        f"{root}{SHARD_SUFFIX}{ext}",
+        pool_size=int(os.getenv("SQLITE_POOL_SIZE", "4"))
+    )
+else:
+    repository = Repository(
+        persistence=Persistence(
+            os.path.join(DATA_DIR, f"repository{SHARD_SUFFIX}"),
+            fsync=os.getenv("DATA_FSYNC", "1") != "0"
+        ) if DATA_DIR else None,
+        columnar_positions=os.getenv("COLUMNAR_POSITIONS", "0") == "1"
+    )
+# NAV_CATALOG 为共享内存产品净值目录的名称（run_service.py --shards 启动时创建）：
+# 产品与最新净值从目录读取，本进程写入的产品和净值其他工作进程立即可见
+NAV_CATALOG = os.getenv("NAV_CATALOG")
+nav_catalog = NavCatalog.attach(NAV_CATALOG) if NAV_CATALOG else None
+if nav_catalog is not None:
+    repository.attach_catalog(nav_catalog)
+fund_service = FundService(
+    repository,
+    id_generator=ShardIdGenerator(SHARD_INDEX, SHARD_COUNT) if SHARD_COUNT > 1 else None
+)
+product_listing = ProductListing(repository)
+# 开户、申购、赎回按请求头 Idempotency-Key 去重（见 idempotency.py）：
+# 最多保存 IDEMPOTENCY_MAX_KEYS 个键（每个键约 300 字节），每个键保存 IDEMPOTENCY_TTL 秒
+idempotency_cache = IdempotencyCache(
+    max_entries=int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000")),
+    ttl=float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+)
 
 # 初始化测试数据
 def init_test_data():
@@ -84,10 +136,20 @@ def init_test_data():
     except Exception as e:
         logger.warning(f"测试数据初始化失败: {e}")
 
-# 启动时初始化测试数据
+# 启动时初始化测试数据（已从持久化数据恢复时跳过；分片部署时产品须经路由同步创建，也跳过）
 @app.on_event("startup")
 async def startup_event():
-    init_test_data()
+    # 先取得ID工作进程号：与本机其他进程冲突时在启动阶段失败，而不是生成重复的ID
+    worker_id()
+    if SHARD_COUNT == 1 and not repository.list_users():
+        init_test_data()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    repository.close()
+    if nav_catalog is not None:
+        nav_catalog.close()
 
 # 辅助函数
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -109,7 +171,40 @@ def handle_exception(e: Exception, operation: str):
         detail=f"{operation}失败: {str(e)}"
     )
 
+def run_idempotent(scope: str, caller: str, idempotency_key: Optional[str], request, func):
+    """
+    按幂等键执行接口：相同键的重复请求返回第一次的响应（带 Idempotent-Replayed 响应头），不再执行
+    
+    在写接口的线程池线程中调用：第一次执行和重复请求等待第一次的结果都只阻塞本线程
+    
+    Args:
+        scope: 接口名，不同接口的键互不影响
+        caller: 调用方身份（认证凭证），不同调用方的键互不影响
+        idempotency_key: 请求头 Idempotency-Key，未提供时直接执行
+        request: 请求体，同一个键用于内容不同的请求时返回 422
+        func: 执行接口并返回 ResponseModel
+    """
+    if idempotency_key is None:
+        return func()
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key 长度必须为 1-{MAX_KEY_LENGTH}"
+        )
+    try:
+        body, replayed = idempotency_cache.run(
+            scoped_key(scope, caller, idempotency_key),
+            request.model_dump_json().encode(),
+            lambda: func().model_dump_json().encode()
+        )
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return Response(content=body, media_type="application/json",
+                    headers={REPLAYED_HEADER: "true"} if replayed else None)
+
 # ==================== API端点 ====================
+# 写接口为同步函数，由 FastAPI 在线程池中执行：等待预写日志落盘（sync_commit）时不阻塞事件循环，
+# 并发请求的写入可以合并为一次组提交
 
 @app.get("/")
 async def root():
@@ -126,7 +221,7 @@ async def health_check():
     return {"status": "healthy", "timestamp": str(date.today())}
 
 @app.post("/api/v1/users", response_model=ResponseModel)
-async def create_user(
+def create_user(
     request: UserCreateRequest,
     token: str = Depends(verify_token)
 ):
@@ -171,12 +266,13 @@ async def get_user(
         handle_exception(e, "获取用户信息")
 
 @app.post("/api/v1/accounts/open", response_model=ResponseModel)
-async def open_fund_account(
+def open_fund_account(
     request: FundAccountOpenRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，重试时使用相同的值"),
     token: str = Depends(verify_token)
 ):
     """开通基金账户"""
-    try:
+    def execute():
         account = fund_service.open_fund_account(
             request.user_id,
             request.account_type
@@ -191,16 +287,22 @@ async def open_fund_account(
                 "account_no": account.account_no
             }
         )
+    
+    try:
+        return run_idempotent("accounts/open", token, idempotency_key, request, execute)
+    except HTTPException:
+        raise
     except Exception as e:
         handle_exception(e, "开通基金账户")
 
 @app.post("/api/v1/funds/subscribe", response_model=ResponseModel)
-async def subscribe_fund(
+def subscribe_fund(
     request: FundSubscribeRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，重试时使用相同的值"),
     token: str = Depends(verify_token)
 ):
     """申购基金"""
-    try:
+    def execute():
         result = fund_service.subscribe_fund(
             request.fund_account_id,
             request.product_id,
@@ -208,6 +310,11 @@ async def subscribe_fund(
         )
         logger.info(f"基金申购成功: {request.fund_account_id}, 金额: {request.amount}")
         return ResponseModel(data=result)
+    
+    try:
+        return run_idempotent("funds/subscribe", token, idempotency_key, request, execute)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -217,12 +324,13 @@ async def subscribe_fund(
         handle_exception(e, "申购基金")
 
 @app.post("/api/v1/funds/redeem", response_model=ResponseModel)
-async def redeem_fund(
+def redeem_fund(
     request: FundRedeemRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，重试时使用相同的值"),
     token: str = Depends(verify_token)
 ):
     """赎回基金"""
-    try:
+    def execute():
         result = fund_service.redeem_fund(
             request.fund_account_id,
             request.product_id,
@@ -230,6 +338,11 @@ async def redeem_fund(
         )
         logger.info(f"基金赎回成功: {request.fund_account_id}, 份额: {request.share}")
         return ResponseModel(data=result)
+    
+    try:
+        return run_idempotent("funds/redeem", token, idempotency_key, request, execute)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -238,6 +351,60 @@ async def redeem_fund(
     except Exception as e:
         handle_exception(e, "赎回基金")
 
+@app.get("/api/v1/users/{user_id}/entrusts", response_model=ResponseModel)
+async def list_user_entrusts(
+    user_id: str,
+    entrust_status: Optional[str] = Query(None, alias="status", description="委托状态"),
+    business_type: Optional[str] = Query(None, description="业务类型"),
+    product_id: Optional[str] = Query(None, description="产品ID"),
+    start_time: Optional[datetime] = Query(None, description="创建时间下限（含）"),
+    end_time: Optional[datetime] = Query(None, description="创建时间上限（不含）"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    limit: int = Query(50, ge=1, le=500, description="每页条数"),
+    token: str = Depends(verify_token)
+):
+    """查询用户委托历史（按创建时间倒序游标分页，next_cursor 为空时没有下一页）"""
+    try:
+        if not fund_service.get_user(user_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"用户不存在: {user_id}"
+            )
+        page = fund_service.list_user_entrusts(
+            user_id, status=entrust_status, business_type=business_type, product_id=product_id,
+            start_time=start_time, end_time=end_time, cursor=cursor, limit=limit
+        )
+        return ResponseModel(data=page)
+    except HTTPException:
+        raise
+    except Exception as e:
+        handle_exception(e, "查询委托历史")
+
+@app.get("/api/v1/users/{user_id}/confirms", response_model=ResponseModel)
+async def list_user_confirms(
+    user_id: str,
+    start_time: Optional[datetime] = Query(None, description="确认时间下限（含）"),
+    end_time: Optional[datetime] = Query(None, description="确认时间上限（不含）"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    limit: int = Query(50, ge=1, le=500, description="每页条数"),
+    token: str = Depends(verify_token)
+):
+    """查询用户确认记录（按确认时间倒序游标分页，next_cursor 为空时没有下一页）"""
+    try:
+        if not fund_service.get_user(user_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"用户不存在: {user_id}"
+            )
+        page = fund_service.list_user_confirms(
+            user_id, start_time=start_time, end_time=end_time, cursor=cursor, limit=limit
+        )
+        return ResponseModel(data=page)
+    except HTTPException:
+        raise
+    except Exception as e:
+        handle_exception(e, "查询确认记录")
+
 @app.get("/api/v1/assets/{user_id}", response_model=ResponseModel)
 async def get_user_assets(
     user_id: str,
@@ -260,29 +427,29 @@ async def get_user_assets(
 @app.get("/api/v1/products", response_model=ResponseModel)
 async def get_products(
     product_type: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    product_status: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页条数，不传时返回全部"),
+    if_none_match: Optional[str] = Header(None),
     token: str = Depends(verify_token)
 ):
-    """获取基金产品列表"""
+    """获取基金产品列表（含最新净值；按创建顺序游标分页，下一页游标在响应头 X-Next-Cursor；
+    请求头 If-None-Match 与 ETag 相同时返回 304）"""
     try:
-        products = fund_service.list_fund_products(product_type)
-        result = []
-        for product in products:
-            product_data = product.model_dump()
-            # 获取最新净值
-            nav = fund_service.get_latest_nav(product.product_id)
-            if nav:
-                product_data['latest_nav'] = {
-                    'net_value': float(nav.net_value),
-                    'accumulated_nav': float(nav.accumulated_nav) if nav.accumulated_nav else None,
-                    'nav_date': nav.nav_date.isoformat()
-                }
-            result.append(product_data)
-        return ResponseModel(data=result)
+        page = product_listing.page(cursor, limit, product_type=product_type,
+                                    risk_level=risk_level, product_status=product_status)
     except Exception as e:
         handle_exception(e, "获取基金产品")
+    headers = {"ETag": page.etag}
+    if page.next_cursor is not None:
+        headers["X-Next-Cursor"] = page.next_cursor
+    if etag_matches(if_none_match, page.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=page.body, media_type="application/json", headers=headers)
 
 @app.post("/api/v1/products", response_model=ResponseModel)
-async def create_product(
+def create_product(
     request: ProductCreateRequest,
     token: str = Depends(verify_token)
 ):
@@ -308,8 +475,35 @@ async def create_product(
     except Exception as e:
         handle_exception(e, "创建基金产品")
 
+@app.post("/internal/products", response_model=ResponseModel, include_in_schema=False)
+def replicate_product(
+    request: ProductCreateRequest,
+    product_id: str,
+    token: str = Depends(verify_token)
+):
+    """按路由指定的产品ID创建基金产品（分片部署时路由向每个分片写入同一产品）"""
+    try:
+        product = fund_service.create_fund_product(
+            product_code=request.product_code,
+            product_name=request.product_name,
+            product_type=request.product_type,
+            risk_level=request.risk_level,
+            fund_company=request.fund_company,
+            issue_date=request.issue_date,
+            product_id=product_id
+        )
+        return ResponseModel(
+            data={
+                "product_id": product.product_id,
+                "product_name": product.product_name,
+                "product_type": product.product_type
+            }
+        )
+    except Exception as e:
+        handle_exception(e, "创建基金产品")
+
 @app.post("/api/v1/nav", response_model=ResponseModel)
-async def create_nav(
+def create_nav(
     request: NavCreateRequest,
     token: str = Depends(verify_token)
 ):
@@ -2,13 +2,16 @@
 FastAPI微服务主入口 - 完整集成版本
 整合了模块化路由和兼容性端点，按业务模块分类组织
 """
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
-from datetime import date
+from datetime import date, datetime
 from decimal import Decimal
+import json
 import logging
+import os
 
 # ==================== 导入模块化路由 ====================
 from modules.bank_account.bank_account_web import router as bank_account_router
@@ -28,11 +31,16 @@ from modules.user_asset.user_asset_web import router as user_asset_router
 
 # ==================== 导入兼容性端点所需的模块 ====================
 from models import (
-    UserCreateRequest, FundAccountOpenRequest, FundSubscribeRequest, FundRedeemRequest,
-    ProductCreateRequest, NavCreateRequest, ResponseModel, User
+    UserCreateRequest, FundAccountOpenRequest, FundSubscribeRequest, FundRedeemRequest, FundBatchRequest,
+    ProductCreateRequest, NavCreateRequest, NavBatchRequest, ResponseModel
 )
-from repository import Repository
+from unified_repository import create_unified_repository
 from service import FundService
+from confirm_queue import ConfirmationQueue
+from fast_response import FastJSONRoute
+from product_listing import ProductListing, etag_matches
+from idempotency import IdempotencyCache, IdempotencyKeyReused, MAX_KEY_LENGTH, REPLAYED_HEADER, scoped_key
+from common.ids import worker_id
 from common.repository import get_repository
 from modules.user.user_app import UserApp
 
@@ -48,70 +56,27 @@ security = HTTPBearer()
 common_repo = get_repository()
 user_app = UserApp()
 
-# ==================== Repository适配器 ====================
-# 创建一个适配器 Repository，桥接 common/repository 和旧版 Repository 接口
-class RepositoryAdapter(Repository):
-    """适配器：将 common/repository 的单例适配为 Repository 接口"""
-    
-    def __init__(self, common_repo_instance):
-        # 调用父类初始化，创建存储结构
-        super().__init__()
-        self._common_repo = common_repo_instance
-    
-    def get_user(self, user_id: str):
-        """获取用户（从 common_repo 读取，确保数据共享）"""
-        # 从 common_repo 读取用户数据
-        user_data = self._common_repo.get("user", user_id)
-        if user_data:
-            # 转换为 User 模型
-            user_id_value = user_data.get('user_id') or user_data.get('id')
-            return User(
-                user_id=user_id_value,
-                user_name=user_data.get('user_name'),
-                user_type=user_data.get('user_type', 'PERSONAL'),
-                user_status=user_data.get('user_status', 'ACTIVE'),
-                identity_no=user_data.get('identity_no'),
-                phone=user_data.get('phone'),
-                email=user_data.get('email'),
-                create_time=user_data.get('create_time'),
-                update_time=user_data.get('update_time')
-            )
-        return None
-    
-    def create_fund_account(self, account):
-        """创建基金账户（同时写入 common_repo 和旧存储）"""
-        # 先调用父类方法，写入旧存储
-        result = super().create_fund_account(account)
-        
-        # 同时写入 common_repo
-        from datetime import date as date_type
-        # 转换为 common_repo 格式
-        open_date_value = account.open_date
-        if isinstance(open_date_value, date_type):
-            open_date_str = open_date_value.isoformat()
-        else:
-            open_date_str = str(open_date_value)
-        
-        common_account_data = {
-            'id': account.fund_account_id,
-            'fund_account_id': account.fund_account_id,
-            'user_id': account.user_id,
-            'account_no': account.account_no,
-            'account_type': account.account_type,
-            'open_date': open_date_str,
-            'account_status': getattr(account, 'account_status', 'ACTIVE')
-        }
-        try:
-            self._common_repo.create("fund_account", common_account_data)
-        except Exception as e:
-            # 如果 common_repo 中已存在，忽略错误（可能已存在）
-            logger.warning(f"写入 common_repo 失败（可能已存在）: {e}")
-        
-        return result
-
-# 创建适配器实例（使用 common/repository 的单例）
-repository = RepositoryAdapter(common_repo)
-fund_service = FundService(repository)
+# ==================== 统一存储 ====================
+# FundService 与模块化服务共用 common_repo 中的表，每条记录只存一份；
+# 持久化（DATA_DIR）和存储后端（STORAGE_BACKEND）都由 common_repo 决定
+repository = create_unified_repository(common_repo)
+
+# ==================== 异步确认队列 ====================
+# 申购/赎回请求只冻结并受理委托，由后台线程按批确认；CONFIRM_ASYNC=0 时在请求内立即确认
+confirm_queue = ConfirmationQueue(
+    batch_size=int(os.getenv("CONFIRM_BATCH_SIZE", "500")),
+    linger_ms=float(os.getenv("CONFIRM_LINGER_MS", "50"))
+) if os.getenv("CONFIRM_ASYNC", "1") == "1" else None
+fund_service = FundService(repository, confirm_queue)
+product_listing = ProductListing(repository)
+
+# ==================== 幂等键 ====================
+# 开户、申购、赎回按请求头 Idempotency-Key 去重（见 idempotency.py）：
+# 最多保存 IDEMPOTENCY_MAX_KEYS 个键（每个键约 300 字节），每个键保存 IDEMPOTENCY_TTL 秒
+idempotency_cache = IdempotencyCache(
+    max_entries=int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000")),
+    ttl=float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+)
 
 # ==================== FastAPI应用初始化 ====================
 app = FastAPI(
@@ -122,6 +87,24 @@ app = FastAPI(
     redoc_url="/redoc",
     openapi_url="/openapi.json"
 )
+# FAST_JSON=1 时本文件中的接口返回的 ResponseModel 不再重新校验，直接序列化（见 fast_response.py）
+if os.getenv("FAST_JSON", "0") == "1":
+    app.router.route_class = FastJSONRoute
+
+
+@app.on_event("startup")
+def startup_event():
+    """取得ID工作进程号：与本机其他进程冲突时在启动阶段失败，而不是生成重复的ID"""
+    worker_id()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """停止确认线程并处理完队列中剩余的委托，然后关闭持久化"""
+    if confirm_queue is not None:
+        confirm_queue.stop(drain=True)
+    common_repo.close()
+
 
 # ==================== CORS配置 ====================
 app.add_middleware(
@@ -165,9 +148,43 @@ def handle_exception(e: Exception, operation: str):
     )
 
 
+def run_idempotent(scope: str, caller: str, idempotency_key: Optional[str], request, func):
+    """
+    按幂等键执行接口：相同键的重复请求返回第一次的响应（带 Idempotent-Replayed 响应头），不再执行
+    
+    在写接口的线程池线程中调用：第一次执行和重复请求等待第一次的结果都只阻塞本线程
+    
+    Args:
+        scope: 接口名，不同接口的键互不影响
+        caller: 调用方身份（认证凭证），不同调用方的键互不影响
+        idempotency_key: 请求头 Idempotency-Key，未提供时直接执行
+        request: 请求体，同一个键用于内容不同的请求时返回 422
+        func: 执行接口并返回 ResponseModel
+    """
+    if idempotency_key is None:
+        return func()
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key 长度必须为 1-{MAX_KEY_LENGTH}"
+        )
+    try:
+        body, replayed = idempotency_cache.run(
+            scoped_key(scope, caller, idempotency_key),
+            request.model_dump_json().encode(),
+            lambda: func().model_dump_json().encode()
+        )
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return Response(content=body, media_type="application/json",
+                    headers={REPLAYED_HEADER: "true"} if replayed else None)
+
+
 # ============================================================================
 # ==================== API端点 - 按业务模块分类 ====================
 # ============================================================================
+# 写接口为同步函数，由 FastAPI 在线程池中执行：等待预写日志落盘（sync_commit）时不阻塞事件循环，
+# 并发请求的写入可以合并为一次组提交
 
 # ==================== 1. 系统管理 ====================
 @app.get("/", tags=["系统管理"])
@@ -200,7 +217,7 @@ async def health_check():
 
 # ==================== 2. 用户管理 ====================
 @app.post("/api/v1/users", response_model=ResponseModel, tags=["用户管理"])
-async def create_user(
+def create_user(
     request: UserCreateRequest,
     token: str = Depends(verify_token)
 ):
@@ -248,12 +265,13 @@ async def get_user(
 
 # ==================== 3. 基金账户管理 ====================
 @app.post("/api/v1/accounts/open", response_model=ResponseModel, tags=["基金账户管理"])
-async def open_fund_account(
+def open_fund_account(
     request: FundAccountOpenRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，重试时使用相同的值"),
     token: str = Depends(verify_token)
 ):
     """开通基金账户（兼容性端点）"""
-    try:
+    def execute():
         account = fund_service.open_fund_account(
             request.user_id,
             request.account_type
@@ -268,6 +286,11 @@ async def open_fund_account(
                 "account_no": account.account_no
             }
         )
+    
+    try:
+        return run_idempotent("accounts/open", token, idempotency_key, request, execute)
+    except HTTPException:
+        raise
     except Exception as e:
         handle_exception(e, "开通基金账户")
 
@@ -276,30 +299,30 @@ async def open_fund_account(
 @app.get("/api/v1/products", response_model=ResponseModel, tags=["基金产品管理"])
 async def get_products(
     product_type: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    product_status: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页条数，不传时返回全部"),
+    if_none_match: Optional[str] = Header(None),
     token: str = Depends(verify_token)
 ):
-    """获取基金产品列表（兼容性端点）"""
+    """获取基金产品列表（兼容性端点）（含最新净值；按创建顺序游标分页，下一页游标在响应头 X-Next-Cursor；
+    请求头 If-None-Match 与 ETag 相同时返回 304）"""
     try:
-        products = fund_service.list_fund_products(product_type)
-        result = []
-        for product in products:
-            product_data = product.model_dump()
-            # 获取最新净值
-            nav = fund_service.get_latest_nav(product.product_id)
-            if nav:
-                product_data['latest_nav'] = {
-                    'net_value': float(nav.net_value),
-                    'accumulated_nav': float(nav.accumulated_nav) if nav.accumulated_nav else None,
-                    'nav_date': nav.nav_date.isoformat()
-                }
-            result.append(product_data)
-        return ResponseModel(data=result)
+        page = product_listing.page(cursor, limit, product_type=product_type,
+                                    risk_level=risk_level, product_status=product_status)
     except Exception as e:
         handle_exception(e, "获取基金产品")
+    headers = {"ETag": page.etag}
+    if page.next_cursor is not None:
+        headers["X-Next-Cursor"] = page.next_cursor
+    if etag_matches(if_none_match, page.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=page.body, media_type="application/json", headers=headers)
 
 
 @app.post("/api/v1/products", response_model=ResponseModel, tags=["基金产品管理"])
-async def create_product(
+def create_product(
     request: ProductCreateRequest,
     token: str = Depends(verify_token)
 ):
@@ -328,7 +351,7 @@ async def create_product(
 
 # ==================== 5. 基金净值管理 ====================
 @app.post("/api/v1/nav", response_model=ResponseModel, tags=["基金净值管理"])
-async def create_nav(
+def create_nav(
     request: NavCreateRequest,
     token: str = Depends(verify_token)
 ):
@@ -354,14 +377,32 @@ async def create_nav(
         handle_exception(e, "创建基金净值")
 
 
+@app.post("/api/v1/nav/batch", response_model=ResponseModel, tags=["基金净值管理"])
+def publish_navs(
+    request: NavBatchRequest,
+    token: str = Depends(verify_token)
+):
+    """批量发布基金净值并重估持仓（日终处理）"""
+    try:
+        result = fund_service.publish_navs(
+            [item.model_dump() for item in request.navs],
+            nav_date=request.nav_date
+        )
+        logger.info(f"批量净值发布完成: {result}")
+        return ResponseModel(data=result)
+    except Exception as e:
+        handle_exception(e, "批量发布基金净值")
+
+
 # ==================== 6. 基金交易 ====================
 @app.post("/api/v1/funds/subscribe", response_model=ResponseModel, tags=["基金交易"])
-async def subscribe_fund(
+def subscribe_fund(
     request: FundSubscribeRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，重试时使用相同的值"),
     token: str = Depends(verify_token)
 ):
     """申购基金（兼容性端点）"""
-    try:
+    def execute():
         result = fund_service.subscribe_fund(
             request.fund_account_id,
             request.product_id,
@@ -369,6 +410,11 @@ async def subscribe_fund(
         )
         logger.info(f"基金申购成功: {result.get('entrust_id')}")
         return ResponseModel(data=result)
+    
+    try:
+        return run_idempotent("funds/subscribe", token, idempotency_key, request, execute)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -379,12 +425,13 @@ async def subscribe_fund(
 
 
 @app.post("/api/v1/funds/redeem", response_model=ResponseModel, tags=["基金交易"])
-async def redeem_fund(
+def redeem_fund(
     request: FundRedeemRequest,
+    idempotency_key: Optional[str] = Header(None, description="幂等键，重试时使用相同的值"),
     token: str = Depends(verify_token)
 ):
     """赎回基金（兼容性端点）"""
-    try:
+    def execute():
         result = fund_service.redeem_fund(
             request.fund_account_id,
             request.product_id,
@@ -392,6 +439,11 @@ async def redeem_fund(
         )
         logger.info(f"基金赎回成功: {result.get('entrust_id')}")
         return ResponseModel(data=result)
+    
+    try:
+        return run_idempotent("funds/redeem", token, idempotency_key, request, execute)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -401,6 +453,100 @@ async def redeem_fund(
         handle_exception(e, "赎回基金")
 
 
+@app.post("/api/v1/funds/batch", tags=["基金交易"])
+def submit_orders(
+    request: FundBatchRequest,
+    token: str = Depends(verify_token)
+):
+    """批量申购/赎回，按订单顺序逐行返回处理结果（NDJSON）
+
+    整批订单在一次加锁内处理（最多 10000 笔），同步接口在线程池中执行，不阻塞事件循环。
+    """
+    try:
+        results = fund_service.submit_orders([order.model_dump() for order in request.orders])
+    except Exception as e:
+        handle_exception(e, "批量交易")
+    succeeded = sum(1 for result in results if result['success'])
+    logger.info(f"批量交易完成: 共{len(results)}笔, 成功{succeeded}笔")
+    
+    def stream():
+        for result in results:
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/api/v1/funds/entrusts/{entrust_id}", response_model=ResponseModel, tags=["基金交易"])
+async def get_entrust(
+    entrust_id: str,
+    token: str = Depends(verify_token)
+):
+    """查询交易委托状态（PENDING/PROCESSING/SUCCESS/FAILED）"""
+    entrust = fund_service.get_entrust(entrust_id)
+    if not entrust:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"委托不存在: {entrust_id}"
+        )
+    return ResponseModel(data=entrust.model_dump(mode="json"))
+
+
+@app.get("/api/v1/users/{user_id}/entrusts", response_model=ResponseModel, tags=["基金交易"])
+async def list_user_entrusts(
+    user_id: str,
+    entrust_status: Optional[str] = Query(None, alias="status", description="委托状态"),
+    business_type: Optional[str] = Query(None, description="业务类型"),
+    product_id: Optional[str] = Query(None, description="产品ID"),
+    start_time: Optional[datetime] = Query(None, description="创建时间下限（含）"),
+    end_time: Optional[datetime] = Query(None, description="创建时间上限（不含）"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    limit: int = Query(50, ge=1, le=500, description="每页条数"),
+    token: str = Depends(verify_token)
+):
+    """查询用户委托历史（按创建时间倒序游标分页，next_cursor 为空时没有下一页）"""
+    try:
+        if not fund_service.get_user(user_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"用户不存在: {user_id}"
+            )
+        page = fund_service.list_user_entrusts(
+            user_id, status=entrust_status, business_type=business_type, product_id=product_id,
+            start_time=start_time, end_time=end_time, cursor=cursor, limit=limit
+        )
+        return ResponseModel(data=page)
+    except HTTPException:
+        raise
+    except Exception as e:
+        handle_exception(e, "查询委托历史")
+
+
+@app.get("/api/v1/users/{user_id}/confirms", response_model=ResponseModel, tags=["基金交易"])
+async def list_user_confirms(
+    user_id: str,
+    start_time: Optional[datetime] = Query(None, description="确认时间下限（含）"),
+    end_time: Optional[datetime] = Query(None, description="确认时间上限（不含）"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    limit: int = Query(50, ge=1, le=500, description="每页条数"),
+    token: str = Depends(verify_token)
+):
+    """查询用户确认记录（按确认时间倒序游标分页，next_cursor 为空时没有下一页）"""
+    try:
+        if not fund_service.get_user(user_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"用户不存在: {user_id}"
+            )
+        page = fund_service.list_user_confirms(
+            user_id, start_time=start_time, end_time=end_time, cursor=cursor, limit=limit
+        )
+        return ResponseModel(data=page)
+    except HTTPException:
+        raise
+    except Exception as e:
+        handle_exception(e, "查询确认记录")
+
+
 # ==================== 7. 用户资产管理 ====================
 @app.get("/api/v1/assets/{user_id}", response_model=ResponseModel, tags=["用户资产管理"])
 async def get_user_assets(
@@ -422,6 +568,24 @@ async def get_user_assets(
         handle_exception(e, "获取用户资产")
 
 
+# ==================== 8. 压测入金（默认关闭） ====================
+# 仅在 LOADTEST_DEPOSIT=1 时可用（请求时检查），供 benchmarks/loadgen.py 给合成用户入金；生产环境不要开启
+@app.post("/internal/users/{user_id}/deposit", response_model=ResponseModel, include_in_schema=False)
+def deposit(
+    user_id: str,
+    amount: Decimal = Query(..., gt=0),
+    token: str = Depends(verify_token)
+):
+    """给用户入金（增加可用余额）"""
+    if os.getenv("LOADTEST_DEPOSIT", "0") != "1":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    try:
+        balance = fund_service.deposit(user_id, amount)
+        return ResponseModel(data={"user_id": user_id, "available_balance": float(balance.available_balance)})
+    except Exception as e:
+        handle_exception(e, "入金")
+
+
 # ============================================================================
 # ==================== 启动配置 ====================
 # ============================================================================
@@ -233,7 +233,7 @@ class FundTransactionEntrust(BaseModel):
     amount: Optional[Decimal] = Field(None, ge=0, description="交易金额")
     share: Optional[Decimal] = Field(None, ge=0, description="交易份额")
     nav: Optional[Decimal] = Field(None, ge=0, description="交易净值")
-    fee: Decimal = Field(0, ge=0, description="手续费")
+    fee: Decimal = Field(Decimal("0"), ge=0, description="手续费")
 
     class Config:
         use_enum_values = True
@@ -327,6 +327,20 @@ class FundRedeemRequest(BaseModel):
     share: Decimal = Field(..., gt=0, description="赎回份额")
 
 
+class FundOrderItem(BaseModel):
+    """批量交易订单"""
+    transaction_type: TransactionType
+    fund_account_id: str
+    product_id: str
+    amount: Optional[Decimal] = Field(None, gt=0, description="申购金额")
+    share: Optional[Decimal] = Field(None, gt=0, description="赎回份额")
+
+
+class FundBatchRequest(BaseModel):
+    """批量交易请求"""
+    orders: List[FundOrderItem] = Field(..., min_length=1, max_length=10000)
+
+
 class ProductCreateRequest(BaseModel):
     """产品创建请求"""
     product_code: str = Field(..., max_length=20)
@@ -348,6 +362,19 @@ class NavCreateRequest(BaseModel):
     nav_date: Optional[date] = None
 
 
+class NavBatchItem(BaseModel):
+    """批量净值条目"""
+    product_id: str
+    net_value: Decimal = Field(..., gt=0)
+    accumulated_nav: Optional[Decimal] = Field(None, ge=0)
+
+
+class NavBatchRequest(BaseModel):
+    """批量净值发布请求"""
+    nav_date: Optional[date] = None
+    navs: List[NavBatchItem] = Field(..., min_length=1)
+
+
 class ResponseModel(BaseModel):
     """通用响应模型"""
     code: int = Field(0, description="响应码，0表示成功")
@@ -3,6 +3,7 @@
 """
 from typing import Optional, List
 from datetime import datetime
+from common.ids import generate_id
 from common.repository import get_repository
 from .bank_account_schema import BankAccount, BankAccountCreateRequest
 
@@ -16,8 +17,7 @@ class BankAccountApp:
     
     def _generate_id(self) -> str:
         """生成ID"""
-        import uuid
-        return f"BANK_{uuid.uuid4().hex[:16]}"
+        return generate_id('BANK_')
     
     def create(self, request: BankAccountCreateRequest) -> BankAccount:
         """创建银行账户"""
@@ -16,7 +16,7 @@ def get_bank_account_app() -> BankAccountApp:
 
 
 @router.post("", response_model=BankAccountResponse, status_code=status.HTTP_201_CREATED)
-async def create_bank_account(
+def create_bank_account(
     request: BankAccountCreateRequest,
     app: BankAccountApp = Depends(get_bank_account_app)
 ):
@@ -3,6 +3,7 @@
 """
 from typing import Optional, List
 from datetime import datetime
+from common.ids import generate_id
 from common.repository import get_repository
 from .capital_entrust_schema import CapitalEntrust, CapitalEntrustCreateRequest
 
@@ -16,8 +17,7 @@ class CapitalEntrustApp:
     
     def _generate_id(self) -> str:
         """生成ID"""
-        import uuid
-        return f"CAPI_{uuid.uuid4().hex[:16]}"
+        return generate_id('CAPI_')
     
     def create(self, request: CapitalEntrustCreateRequest) -> CapitalEntrust:
         """创建资金委托"""
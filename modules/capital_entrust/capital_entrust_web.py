@@ -16,7 +16,7 @@ def get_capital_entrust_app() -> CapitalEntrustApp:
 
 
 @router.post("", response_model=CapitalEntrustResponse, status_code=status.HTTP_201_CREATED)
-async def create_capital_entrust(
+def create_capital_entrust(
     request: CapitalEntrustCreateRequest,
     app: CapitalEntrustApp = Depends(get_capital_entrust_app)
 ):
@@ -16,7 +16,7 @@ def get_capital_settlement_app() -> CapitalSettlementApp:
 
 
 @router.post("", response_model=CapitalSettlementResponse, status_code=status.HTTP_201_CREATED)
-async def create_capital_settlement(
+def create_capital_settlement(
     request: CapitalSettlementCreateRequest,
     app: CapitalSettlementApp = Depends(get_capital_settlement_app)
 ):
@@ -2,25 +2,31 @@
 基金账户客户端API
 """
 import requests
-from typing import List, Dict, Any
+from typing import Optional, List, Dict, Any
+from common.http_session import DEFAULT_TIMEOUT, Timeout, get_session
 from .fund_account_schema import FundAccountCreateRequest, FundAccountResponse
 
 
 class FundAccountAPI:
     """基金账户客户端API"""
     
-    def __init__(self, base_url: str = "http://localhost:8000", token: str = "demo_token_2025"):
+    def __init__(self, base_url: str = "http://localhost:8000", token: str = "demo_token_2025",
+                 session: Optional[requests.Session] = None, timeout: Timeout = DEFAULT_TIMEOUT):
         self.base_url = base_url.rstrip('/')
         self.token = token
         self.headers = {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
+        # 默认使用进程内共用的连接池会话（见 common/http_session.py）
+        self.session = session or get_session()
+        self.timeout = timeout
     
     def _request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """发送HTTP请求"""
         url = f"{self.base_url}{endpoint}"
-        response = requests.request(method=method, url=url, headers=self.headers, **kwargs)
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.request(method=method, url=url, headers=self.headers, **kwargs)
         if response.status_code == 200:
             return response.json()
         else:
@@ -3,6 +3,7 @@
 """
 from typing import Optional, List
 from datetime import datetime
+from common.ids import generate_id
 from common.repository import get_repository
 from .fund_account_schema import FundAccount, FundAccountCreateRequest
 
@@ -16,8 +17,7 @@ class FundAccountApp:
     
     def _generate_id(self) -> str:
         """生成ID"""
-        import uuid
-        return f"FUND_{uuid.uuid4().hex[:16]}"
+        return generate_id('FUND_')
     
     def create(self, request: FundAccountCreateRequest) -> FundAccount:
         """创建基金账户"""
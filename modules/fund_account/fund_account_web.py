@@ -16,7 +16,7 @@ def get_fund_account_app() -> FundAccountApp:
 
 
 @router.post("", response_model=FundAccountResponse, status_code=status.HTTP_201_CREATED)
-async def create_fund_account(
+def create_fund_account(
     request: FundAccountCreateRequest,
     app: FundAccountApp = Depends(get_fund_account_app)
 ):
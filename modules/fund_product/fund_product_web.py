@@ -16,7 +16,7 @@ def get_fund_product_app() -> FundProductApp:
 
 
 @router.post("", response_model=FundProductResponse, status_code=status.HTTP_201_CREATED)
-async def create_fund_product(
+def create_fund_product(
     request: FundProductCreateRequest,
     app: FundProductApp = Depends(get_fund_product_app)
 ):
@@ -3,6 +3,7 @@
 """
 from typing import Optional, List
 from datetime import datetime
+from common.ids import generate_id
 from common.repository import get_repository
 from .fund_share_schema import FundShare, FundShareCreateRequest
 
@@ -16,8 +17,7 @@ class FundShareApp:
     
     def _generate_id(self) -> str:
         """生成ID"""
-        import uuid
-        return f"FUND_{uuid.uuid4().hex[:16]}"
+        return generate_id('FUND_')
     
     def create(self, request: FundShareCreateRequest) -> FundShare:
         """创建基金份额"""
@@ -16,7 +16,7 @@ def get_fund_share_app() -> FundShareApp:
 
 
 @router.post("", response_model=FundShareResponse, status_code=status.HTTP_201_CREATED)
-async def create_fund_share(
+def create_fund_share(
     request: FundShareCreateRequest,
     app: FundShareApp = Depends(get_fund_share_app)
 ):
@@ -16,7 +16,7 @@ def get_transaction_confirm_app() -> TransactionConfirmApp:
 
 
 @router.post("", response_model=TransactionConfirmResponse, status_code=status.HTTP_201_CREATED)
-async def create_transaction_confirm(
+def create_transaction_confirm(
     request: TransactionConfirmCreateRequest,
     app: TransactionConfirmApp = Depends(get_transaction_confirm_app)
 ):
@@ -3,6 +3,7 @@
 """
 from typing import Optional, List
 from datetime import datetime
+from common.ids import generate_id
 from common.repository import get_repository
 from .transaction_entrust_schema import TransactionEntrust, TransactionEntrustCreateRequest
 
@@ -16,8 +17,7 @@ class TransactionEntrustApp:
     
     def _generate_id(self) -> str:
         """生成ID"""
-        import uuid
-        return f"TRAN_{uuid.uuid4().hex[:16]}"
+        return generate_id('TRAN_')
     
     def create(self, request: TransactionEntrustCreateRequest) -> TransactionEntrust:
         """创建交易委托"""
@@ -16,7 +16,7 @@ def get_transaction_entrust_app() -> TransactionEntrustApp:
 
 
 @router.post("", response_model=TransactionEntrustResponse, status_code=status.HTTP_201_CREATED)
-async def create_transaction_entrust(
+def create_transaction_entrust(
     request: TransactionEntrustCreateRequest,
     app: TransactionEntrustApp = Depends(get_transaction_entrust_app)
 ):
@@ -3,19 +3,23 @@
 """
 import requests
 from typing import Optional, List, Dict, Any
+from common.http_session import DEFAULT_TIMEOUT, Timeout, get_session
 from .user_schema import UserCreateRequest, UserResponse
 
 
 class UserAPI:
     """用户客户端API"""
     
-    def __init__(self, base_url: str = "http://localhost:8000", token: str = "demo_token_2025"):
+    def __init__(self, base_url: str = "http://localhost:8000", token: str = "demo_token_2025",
+                 session: Optional[requests.Session] = None, timeout: Timeout = DEFAULT_TIMEOUT):
         """
         初始化客户端
         
         Args:
             base_url: 微服务基础URL
             token: 认证令牌
+            session: HTTP 会话，默认使用进程内共用的连接池会话（见 common/http_session.py）
+            timeout: 请求超时，(连接, 读取) 秒
         """
         self.base_url = base_url.rstrip('/')
         self.token = token
@@ -23,13 +27,16 @@ class UserAPI:
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
+        self.session = session or get_session()
+        self.timeout = timeout
     
     def _request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """发送HTTP请求"""
         url = f"{self.base_url}{endpoint}"
+        kwargs.setdefault('timeout', self.timeout)
         
         try:
-            response = requests.request(
+            response = self.session.request(
                 method=method,
                 url=url,
                 headers=self.headers,
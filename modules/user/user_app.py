@@ -3,6 +3,7 @@
 """
 from typing import Optional, List
 from datetime import datetime
+from common.ids import generate_id
 from common.repository import get_repository
 from common.enums import UserType, UserStatus
 from .user_schema import User, UserCreateRequest
@@ -17,8 +18,7 @@ class UserApp:
     
     def _generate_id(self) -> str:
         """生成用户ID"""
-        import uuid
-        return f"USER_{uuid.uuid4().hex[:16]}"
+        return generate_id('USER_')
     
     def create_user(self, request: UserCreateRequest) -> User:
         """创建用户"""
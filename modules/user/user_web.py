@@ -17,7 +17,7 @@ def get_user_app() -> UserApp:
 
 
 @router.post("", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def create_user(
+def create_user(
     request: UserCreateRequest,
     app: UserApp = Depends(get_user_app)
 ):
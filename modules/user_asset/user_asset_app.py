@@ -4,6 +4,7 @@
 from typing import Optional, Dict, Any
 from datetime import datetime, date
 from decimal import Decimal
+from common.ids import generate_id
 from common.repository import get_repository
 from .user_asset_schema import UserBalance, UserTotalAsset, UserFundAsset, UserAssetsResponse
 
@@ -19,8 +20,7 @@ class UserAssetApp:
     
     def _generate_id(self, prefix: str = '') -> str:
         """生成ID"""
-        import uuid
-        return f"{prefix}{uuid.uuid4().hex[:16]}"
+        return generate_id(prefix)
     
     def init_user_balance(self, user_id: str) -> UserBalance:
         """初始化用户余额"""
@@ -0,0 +1,343 @@
+"""
+共享内存产品净值目录 - 多个工作进程共用一份产品与最新净值，读取不经过进程间通信
+"""
+import fcntl
+import os
+import struct
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from models import FundNetValue, FundProduct
+
+_MAGIC = b'NAVC'
+_LAYOUT_VERSION = 1
+# 头部：魔数、布局版本、容量、已用槽位数、修改代数
+_HEADER = struct.Struct('<4sIIIQ')
+_HEADER_SIZE = 64
+_COUNT_OFFSET = 12
+_GENERATION = struct.Struct('<Q')
+_GENERATION_OFFSET = 16
+# 记录：序号（seqlock）+ 定长字段，字符串按 schema.sql 的列宽定长（UTF-8 按每字符 3 字节）
+_SEQ = struct.Struct('<I')
+_BODY = struct.Struct(
+    '<'
+    '32s'   # product_id
+    '20s'   # product_code
+    '300s'  # product_name
+    '20s'   # product_type
+    '20s'   # product_status
+    '10s'   # risk_level
+    '150s'  # fund_company
+    'i'     # issue_date（公历序数）
+    'q'     # create_time（微秒）
+    '32s'   # nav_id
+    '24s'   # net_value（Decimal 字符串，精确还原）
+    '24s'   # accumulated_nav
+    'i'     # nav_date（公历序数，0 表示尚无净值）
+    'q'     # nav create_time（微秒）
+)
+_RECORD_SIZE = (_SEQ.size + _BODY.size + 7) // 8 * 8
+# 读取方不加锁重读的次数上限，超过后改为持写入锁读取
+_SPIN_LIMIT = 1000
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _encode(value: Any, width: int, name: str) -> bytes:
+    """字符串字段编码为定长字节，超长时抛出 ValueError"""
+    if isinstance(value, Enum):
+        value = value.value
+    data = b'' if value is None else str(value).encode()
+    if len(data) > width:
+        raise ValueError(f"字段超出目录定长: {name}（{len(data)} > {width} 字节）")
+    return data
+
+
+def _decode(data: bytes) -> Optional[str]:
+    """定长字节解码为字符串，空字段为 None"""
+    data = data.rstrip(b'\0')
+    return data.decode() if data else None
+
+
+def _micros(value: datetime) -> int:
+    """时间转换为自 1970-01-01 起的微秒数（不含时区，与模型中的时间一致）"""
+    return (value - _EPOCH) // _MICROSECOND
+
+
+class NavCatalog:
+    """共享内存产品净值目录
+    
+    一段 multiprocessing.shared_memory，头部之后是定长的产品槽位，
+    每个槽位保存一个产品的字段和它的最新净值；槽位只追加，不移动、不删除。
+    
+    每条记录以序号开头（seqlock）：写入方把序号加一（奇数表示写入中）、
+    写入字段、再加一；读取方读序号、复制字段、再读序号，两次相同且为偶数
+    才采用，否则重读。读取不加锁，也不需要与其他进程通信。写入方之间用
+    文件锁（跨进程）加线程锁（进程内）互斥。
+    
+    重读超过 _SPIN_LIMIT 次时读取方改为持写入锁读取，等待写入方完成；
+    持锁后序号仍为奇数说明写入方在写入中途退出（文件锁随进程释放），
+    记录可能不完整，抛出 RuntimeError 而不是一直重读，重新写入该槽位后恢复。
+    
+    读取方按槽位缓存已解码的记录，序号不变时直接返回缓存，
+    产品ID -> 槽位 的索引在已用槽位数增长时增量补齐。
+    """
+    
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        """
+        初始化目录（请使用 create() 或 attach()）
+        
+        Args:
+            shm: 共享内存段
+            owner: 是否由本进程创建（关闭时删除共享内存段）
+        """
+        self._shm = shm
+        self._buf = shm.buf
+        self._owner = owner
+        magic, version, capacity, _, _ = _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC or version != _LAYOUT_VERSION:
+            raise ValueError(f"共享内存段不是产品净值目录: {shm.name}")
+        self.capacity = capacity
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{shm.name}.lock")
+        self._thread_lock = threading.Lock()
+        # 持有写入锁的线程（写入过程中的读取不再加锁）
+        self._writer: Optional[int] = None
+        # 产品ID -> 槽位，以及已建立索引的槽位数
+        self._slots: Dict[str, int] = {}
+        self._indexed = 0
+        # 槽位 -> (序号, 产品字段, 净值字段)
+        self._cache: Dict[int, Tuple[int, Dict[str, Any], Optional[Dict[str, Any]]]] = {}
+    
+    @classmethod
+    def create(cls, name: Optional[str] = None, capacity: int = 4096) -> "NavCatalog":
+        """
+        创建目录
+        
+        Args:
+            name: 共享内存段名称，默认随机生成；工作进程凭此名称 attach()
+            capacity: 最多容纳的产品数
+        """
+        if capacity <= 0:
+            raise ValueError(f"目录容量必须大于0: {capacity}")
+        shm = shared_memory.SharedMemory(
+            name=name or f"fund-nav-{uuid.uuid4().hex[:12]}", create=True,
+            size=_HEADER_SIZE + capacity * _RECORD_SIZE
+        )
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, _LAYOUT_VERSION, capacity, 0, 0)
+        return cls(shm, owner=True)
+    
+    @classmethod
+    def attach(cls, name: str) -> "NavCatalog":
+        """映射已创建的目录"""
+        shm = shared_memory.SharedMemory(name=name)
+        # 映射方不拥有共享内存段，避免进程退出时被资源跟踪器删除
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, owner=False)
+    
+    @property
+    def name(self) -> str:
+        """共享内存段名称"""
+        return self._shm.name
+    
+    @property
+    def generation(self) -> int:
+        """修改代数，每次写入加一"""
+        return _GENERATION.unpack_from(self._buf, _GENERATION_OFFSET)[0]
+    
+    def __len__(self) -> int:
+        return _SEQ.unpack_from(self._buf, _COUNT_OFFSET)[0]
+    
+    def close(self) -> None:
+        """解除映射；创建方同时删除共享内存段"""
+        self._cache.clear()
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+            if os.path.exists(self._lock_path):
+                os.remove(self._lock_path)
+    
+    # ==================== 读取 ====================
+    
+    def _offset(self, slot: int) -> int:
+        """槽位在共享内存段中的偏移"""
+        return _HEADER_SIZE + slot * _RECORD_SIZE
+    
+    def _read(self, slot: int) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """按 seqlock 协议读取槽位，返回 (产品字段, 净值字段)"""
+        buf = self._buf
+        offset = self._offset(slot)
+        for _ in range(_SPIN_LIMIT):
+            seq = _SEQ.unpack_from(buf, offset)[0]
+            if seq & 1:
+                continue
+            cached = self._cache.get(slot)
+            if cached is not None and cached[0] == seq:
+                return cached[1], cached[2]
+            body = _BODY.unpack_from(buf, offset + _SEQ.size)
+            if _SEQ.unpack_from(buf, offset)[0] == seq:
+                break
+        else:
+            if self._writer == threading.get_ident():
+                seq, body = self._read_locked(slot)
+            else:
+                with self._locked():
+                    seq, body = self._read_locked(slot)
+        product, nav = self._decode(body)
+        self._cache[slot] = (seq, product, nav)
+        return product, nav
+    
+    def _read_locked(self, slot: int) -> Tuple[int, tuple]:
+        """持写入锁读取槽位的序号与字段，写入方中途退出留下的不完整记录抛出 RuntimeError"""
+        offset = self._offset(slot)
+        seq = _SEQ.unpack_from(self._buf, offset)[0]
+        if seq & 1:
+            raise RuntimeError(f"产品净值目录槽位 {slot} 写入未完成（写入进程异常退出），需重新写入")
+        return seq, _BODY.unpack_from(self._buf, offset + _SEQ.size)
+    
+    @staticmethod
+    def _decode(body: tuple) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """记录字段解码为产品字段字典与净值字段字典"""
+        (product_id, product_code, product_name, product_type, product_status, risk_level,
+         fund_company, issue_date, create_time, nav_id, net_value, accumulated_nav,
+         nav_date, nav_create_time) = body
+        product = {
+            'product_id': _decode(product_id),
+            'product_code': _decode(product_code),
+            'product_name': _decode(product_name),
+            'product_type': _decode(product_type),
+            'product_status': _decode(product_status),
+            'risk_level': _decode(risk_level),
+            'fund_company': _decode(fund_company),
+            'issue_date': date.fromordinal(issue_date),
+            'create_time': _EPOCH + create_time * _MICROSECOND,
+        }
+        if not nav_date:
+            return product, None
+        accumulated_nav = _decode(accumulated_nav)
+        nav = {
+            'nav_id': _decode(nav_id),
+            'product_id': product['product_id'],
+            'net_value': Decimal(_decode(net_value)),
+            'accumulated_nav': Decimal(accumulated_nav) if accumulated_nav is not None else None,
+            'nav_date': date.fromordinal(nav_date),
+            'create_time': _EPOCH + nav_create_time * _MICROSECOND,
+        }
+        return product, nav
+    
+    def _slot(self, product_id: str) -> Optional[int]:
+        """产品所在槽位，索引缺失时补齐新增的槽位后再查"""
+        slot = self._slots.get(product_id)
+        if slot is None and self._indexed < len(self):
+            self._refresh_index()
+            slot = self._slots.get(product_id)
+        return slot
+    
+    def _refresh_index(self) -> None:
+        """为新增的槽位建立索引（产品ID写入后不再变化）"""
+        count = len(self)
+        for slot in range(self._indexed, count):
+            self._slots[self._read(slot)[0]['product_id']] = slot
+        self._indexed = count
+    
+    def get_product(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """获取产品字段（副本）"""
+        slot = self._slot(product_id)
+        return dict(self._read(slot)[0]) if slot is not None else None
+    
+    def get_latest_nav(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """获取产品最新净值字段（副本），产品不存在或尚无净值时为 None"""
+        slot = self._slot(product_id)
+        if slot is None:
+            return None
+        nav = self._read(slot)[1]
+        return dict(nav) if nav is not None else None
+    
+    def products(self) -> List[Dict[str, Any]]:
+        """按创建顺序列出全部产品字段（副本）"""
+        self._refresh_index()
+        return [dict(self._read(slot)[0]) for slot in range(self._indexed)]
+    
+    # ==================== 写入 ====================
+    
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """写入锁：进程内线程锁加跨进程文件锁"""
+        with self._thread_lock, open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._writer = threading.get_ident()
+            try:
+                yield
+            finally:
+                self._writer = None
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _write(self, slot: int, body: tuple) -> None:
+        """按 seqlock 协议写入槽位（调用方持有写入锁）"""
+        buf = self._buf
+        offset = self._offset(slot)
+        seq = _SEQ.unpack_from(buf, offset)[0]
+        # 序号为奇数时上一个写入方在写入中途退出，从下一个偶数开始，写完后恢复为偶数
+        seq += seq & 1
+        _SEQ.pack_into(buf, offset, seq + 1)
+        _BODY.pack_into(buf, offset + _SEQ.size, *body)
+        _SEQ.pack_into(buf, offset, seq + 2)
+        _GENERATION.pack_into(buf, _GENERATION_OFFSET, self.generation + 1)
+    
+    @staticmethod
+    def _product_body(product: FundProduct) -> tuple:
+        """产品字段编码为记录的前半部分"""
+        return (
+            _encode(product.product_id, 32, 'product_id'),
+            _encode(product.product_code, 20, 'product_code'),
+            _encode(product.product_name, 300, 'product_name'),
+            _encode(product.product_type, 20, 'product_type'),
+            _encode(product.product_status, 20, 'product_status'),
+            _encode(product.risk_level, 10, 'risk_level'),
+            _encode(product.fund_company, 150, 'fund_company'),
+            product.issue_date.toordinal(),
+            _micros(product.create_time),
+        )
+    
+    def publish_product(self, product: FundProduct) -> None:
+        """写入产品：新产品追加槽位，已有产品更新字段并保留最新净值"""
+        product_body = self._product_body(product)
+        with self._locked():
+            slot = self._slot(product.product_id)
+            if slot is None:
+                slot = len(self)
+                if slot >= self.capacity:
+                    raise ValueError(f"产品净值目录已满: {self.capacity}")
+                self._write(slot, product_body + (b'', b'', b'', 0, 0))
+                # 记录写完后才增加已用槽位数，读取方不会看到未写完的新槽位
+                _SEQ.pack_into(self._buf, _COUNT_OFFSET, slot + 1)
+                return
+            current = _BODY.unpack_from(self._buf, self._offset(slot) + _SEQ.size)
+            self._write(slot, product_body + current[9:])
+    
+    def publish_nav(self, nav: FundNetValue) -> bool:
+        """写入净值：净值日期不早于目录中的最新净值时替换，返回是否替换"""
+        nav_body = (
+            _encode(nav.nav_id, 32, 'nav_id'),
+            _encode(nav.net_value, 24, 'net_value'),
+            _encode(nav.accumulated_nav, 24, 'accumulated_nav'),
+            nav.nav_date.toordinal(),
+            _micros(nav.create_time),
+        )
+        with self._locked():
+            slot = self._slot(nav.product_id)
+            if slot is None:
+                raise ValueError(f"基金产品不在目录中: {nav.product_id}")
+            current = _BODY.unpack_from(self._buf, self._offset(slot) + _SEQ.size)
+            if current[12] > nav_body[3]:
+                return False
+            self._write(slot, current[:9] + nav_body)
+        return True
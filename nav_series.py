@@ -0,0 +1,56 @@
+"""
+基金净值时间序列 - 按产品维护按净值日期有序的净值记录
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Any, List, Optional
+
+
+class NavSeries:
+    """单个产品的净值序列（按净值日期升序）
+
+    净值通常按日期递增发布，追加写入为 O(1)；补录历史净值时二分插入。
+    最新净值 O(1)，按日期查询 O(log n)，区间切片 O(log n + k)。
+    """
+
+    def __init__(self, product_id: str):
+        """初始化净值序列"""
+        self.product_id = product_id
+        self._dates: List[date] = []
+        self._values: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._dates)
+
+    def add(self, nav_date: date, value: Any) -> None:
+        """添加净值记录，同一产品同一日期只能有一条（uk_product_nav_date）"""
+        if not self._dates or nav_date > self._dates[-1]:
+            self._dates.append(nav_date)
+            self._values.append(value)
+            return
+
+        index = bisect_left(self._dates, nav_date)
+        if index < len(self._dates) and self._dates[index] == nav_date:
+            raise ValueError(f"基金净值已存在: {self.product_id} {nav_date.isoformat()}")
+        self._dates.insert(index, nav_date)
+        self._values.insert(index, value)
+
+    def latest(self) -> Optional[Any]:
+        """获取最新净值"""
+        if not self._values:
+            return None
+        return self._values[-1]
+
+    def as_of(self, as_of_date: date) -> Optional[Any]:
+        """获取指定日期（含）之前最近的净值"""
+        index = bisect_right(self._dates, as_of_date)
+        if index == 0:
+            return None
+        return self._values[index - 1]
+
+    def between(self, start_date: Optional[date] = None,
+                end_date: Optional[date] = None) -> List[Any]:
+        """获取日期区间 [start_date, end_date] 内的净值，按日期升序"""
+        start = 0 if start_date is None else bisect_left(self._dates, start_date)
+        end = len(self._dates) if end_date is None else bisect_right(self._dates, end_date)
+        return self._values[start:end]
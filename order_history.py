@@ -0,0 +1,262 @@
+"""
+委托与确认历史索引 - 按用户、状态、账户产品、交易类型定位委托，按时间倒序游标分页
+"""
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime
+from heapq import merge
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 排序键：(时间, ID)，同一时间按ID区分
+SortKey = Tuple[datetime, str]
+
+
+class _SortedIndex:
+    """组合索引：每个键（含各个最左前缀）对应一个按排序键升序的列表
+
+    委托按创建时间先后写入，通常追加在列表末尾；排序键之间的任意位置都可以 O(log n) 定位，
+    所以从任一游标开始读取一页的开销与页的深度无关。
+    """
+
+    def __init__(self, name: str, columns: Sequence[str]):
+        self.name = name
+        self.columns = tuple(columns)
+        self._buckets: Dict[tuple, List[SortKey]] = {}
+
+    def add(self, values: tuple, sort_key: SortKey) -> None:
+        for length in range(1, len(values) + 1):
+            bucket = self._buckets.setdefault(values[:length], [])
+            if not bucket or sort_key > bucket[-1]:
+                bucket.append(sort_key)
+            else:
+                insort(bucket, sort_key)
+
+    def remove(self, values: tuple, sort_key: SortKey) -> None:
+        for length in range(1, len(values) + 1):
+            bucket = self._buckets.get(values[:length])
+            if bucket is None:
+                continue
+            index = bisect_left(bucket, sort_key)
+            if index < len(bucket) and bucket[index] == sort_key:
+                del bucket[index]
+            if not bucket:
+                del self._buckets[values[:length]]
+
+    def count(self, values: tuple) -> int:
+        return len(self._buckets.get(values, ()))
+
+    def descending(self, values: tuple, before: Optional[tuple],
+                   start: Optional[datetime]) -> Iterator[SortKey]:
+        """按排序键倒序遍历键（或最左前缀）values 下小于 before、不早于 start 的排序键"""
+        bucket = self._buckets.get(values)
+        if not bucket:
+            return
+        index = len(bucket) if before is None else bisect_left(bucket, before)
+        while index > 0:
+            index -= 1
+            sort_key = bucket[index]
+            if start is not None and sort_key[0] < start:
+                return
+            yield sort_key
+
+
+class _EntrustMeta:
+    """委托在各索引中的列值"""
+    __slots__ = ('sort_key', 'user_id', 'status', 'business_type',
+                 'fund_account_id', 'product_id', 'transaction_type')
+
+    def __init__(self, sort_key: SortKey, user_id: str, status: str, business_type: str):
+        self.sort_key = sort_key
+        self.user_id = user_id
+        self.status = status
+        self.business_type = business_type
+        self.fund_account_id: Optional[str] = None
+        self.product_id: Optional[str] = None
+        self.transaction_type: Optional[str] = None
+
+
+class OrderHistory:
+    """委托与确认的历史索引
+
+    按 database/schema.sql 声明的组合索引组织（委托主表在 entrust_base，
+    账户、产品、交易类型在 fund_transaction_entrusts，两张表写入时分别登记）：
+        idx_user_status       (user_id, status)              委托
+        idx_account_product   (fund_account_id, product_id)  委托
+        idx_transaction_type  (transaction_type, status)     委托
+        idx_user_confirm      (user_id, confirm_time)        确认（用户取自所属委托）
+    委托按 (创建时间, 委托ID)、确认按 (确认时间, 确认ID) 排序，查询按时间倒序返回；
+    游标为上一页最后一条记录的ID，下一页从其排序键之后继续，深页与第一页开销相同。
+    不能由索引确定的过滤条件（如按用户查询时的业务类型）逐条检查。
+    各方法内部加锁，可在多个请求线程间共用。
+    """
+
+    def __init__(self):
+        """初始化历史索引"""
+        self._entrusts: Dict[str, _EntrustMeta] = {}
+        # 确认ID -> (排序键, 用户ID)
+        self._confirms: Dict[str, Tuple[SortKey, str]] = {}
+        self._user_status = _SortedIndex('idx_user_status', ('user_id', 'status'))
+        self._account_product = _SortedIndex('idx_account_product', ('fund_account_id', 'product_id'))
+        self._transaction_type = _SortedIndex('idx_transaction_type', ('transaction_type', 'status'))
+        self._user_confirm = _SortedIndex('idx_user_confirm', ('user_id',))
+        self._lock = threading.Lock()
+
+    # ==================== 登记 ====================
+
+    def add_entrust(self, entrust_id: str, user_id: str, status: Any, business_type: Any,
+                    create_time: datetime) -> None:
+        """登记或更新委托主表记录（状态变化时移动到新状态的索引项）"""
+        status, business_type = _value(status), _value(business_type)
+        with self._lock:
+            meta = self._entrusts.get(entrust_id)
+            if meta is not None:
+                if (meta.sort_key[0], meta.user_id, meta.status) == (create_time, user_id, status):
+                    meta.business_type = business_type
+                    return
+                self._unindex_entrust(meta)
+            new = _EntrustMeta((create_time, entrust_id), user_id, status, business_type)
+            if meta is not None:
+                new.fund_account_id = meta.fund_account_id
+                new.product_id = meta.product_id
+                new.transaction_type = meta.transaction_type
+            self._entrusts[entrust_id] = new
+            self._user_status.add((user_id, status), new.sort_key)
+            if new.transaction_type is not None:
+                self._account_product.add((new.fund_account_id, new.product_id), new.sort_key)
+                self._transaction_type.add((new.transaction_type, status), new.sort_key)
+
+    def add_transaction(self, entrust_id: str, fund_account_id: str, product_id: str,
+                        transaction_type: Any) -> None:
+        """登记基金交易委托（须先登记委托主表记录，否则忽略）"""
+        transaction_type = _value(transaction_type)
+        with self._lock:
+            meta = self._entrusts.get(entrust_id)
+            if meta is None:
+                return
+            if meta.transaction_type is not None:
+                self._account_product.remove((meta.fund_account_id, meta.product_id), meta.sort_key)
+                self._transaction_type.remove((meta.transaction_type, meta.status), meta.sort_key)
+            meta.fund_account_id = fund_account_id
+            meta.product_id = product_id
+            meta.transaction_type = transaction_type
+            self._account_product.add((fund_account_id, product_id), meta.sort_key)
+            self._transaction_type.add((transaction_type, meta.status), meta.sort_key)
+
+    def add_confirm(self, confirm_id: str, entrust_id: str, confirm_time: datetime) -> None:
+        """登记确认（所属委托未登记时忽略）"""
+        with self._lock:
+            meta = self._entrusts.get(entrust_id)
+            if meta is None or confirm_id in self._confirms:
+                return
+            sort_key = (confirm_time, confirm_id)
+            self._confirms[confirm_id] = (sort_key, meta.user_id)
+            self._user_confirm.add((meta.user_id,), sort_key)
+
+    # ==================== 查询 ====================
+
+    def user_entrusts(self, user_id: str, fund_account_ids: Sequence[str] = (),
+                      status: Optional[str] = None, business_type: Optional[str] = None,
+                      product_id: Optional[str] = None, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None, cursor: Optional[str] = None,
+                      limit: int = 50) -> Tuple[List[str], Optional[str]]:
+        """
+        按时间倒序分页查询用户的委托
+
+        Args:
+            user_id: 用户ID
+            fund_account_ids: 用户的基金账户（按产品过滤时经 idx_account_product 查询）
+            status: 委托状态
+            business_type: 业务类型
+            product_id: 产品ID
+            start: 创建时间下限（含）
+            end: 创建时间上限（不含）
+            cursor: 上一页返回的游标
+            limit: 每页条数
+
+        Returns:
+            (委托ID列表, 下一页游标；没有下一页时为 None)
+        """
+        status, business_type = _value(status), _value(business_type)
+        with self._lock:
+            before = self._before(cursor, end, self._entrust_sort_key)
+            if product_id is not None:
+                sources = [self._account_product.descending((account_id, product_id), before, start)
+                           for account_id in fund_account_ids]
+            elif status is not None:
+                sources = [self._user_status.descending((user_id, status), before, start)]
+            else:
+                sources = [self._user_status.descending((user_id,), before, start)]
+            candidates = merge(*sources, reverse=True) if len(sources) > 1 else iter(sources[0] if sources else ())
+            ids = []
+            for _, entrust_id in candidates:
+                meta = self._entrusts[entrust_id]
+                if (meta.user_id != user_id
+                        or status is not None and meta.status != status
+                        or business_type is not None and meta.business_type != business_type):
+                    continue
+                ids.append(entrust_id)
+                if len(ids) > limit:
+                    break
+        return _page(ids, limit)
+
+    def user_confirms(self, user_id: str, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None, cursor: Optional[str] = None,
+                      limit: int = 50) -> Tuple[List[str], Optional[str]]:
+        """按确认时间倒序分页查询用户的确认记录，返回 (确认ID列表, 下一页游标)"""
+        with self._lock:
+            before = self._before(cursor, end, self._confirm_sort_key)
+            ids = []
+            for _, confirm_id in self._user_confirm.descending((user_id,), before, start):
+                ids.append(confirm_id)
+                if len(ids) > limit:
+                    break
+        return _page(ids, limit)
+
+    def transaction_count(self, transaction_type: Any, status: Optional[Any] = None) -> int:
+        """按交易类型（及状态）统计委托数（idx_transaction_type）"""
+        key = (_value(transaction_type),) if status is None else (_value(transaction_type), _value(status))
+        with self._lock:
+            return self._transaction_type.count(key)
+
+    # ==================== 内部方法 ====================
+
+    def _unindex_entrust(self, meta: _EntrustMeta) -> None:
+        self._user_status.remove((meta.user_id, meta.status), meta.sort_key)
+        if meta.transaction_type is not None:
+            self._account_product.remove((meta.fund_account_id, meta.product_id), meta.sort_key)
+            self._transaction_type.remove((meta.transaction_type, meta.status), meta.sort_key)
+
+    def _entrust_sort_key(self, entrust_id: str) -> Optional[SortKey]:
+        meta = self._entrusts.get(entrust_id)
+        return None if meta is None else meta.sort_key
+
+    def _confirm_sort_key(self, confirm_id: str) -> Optional[SortKey]:
+        entry = self._confirms.get(confirm_id)
+        return None if entry is None else entry[0]
+
+    @staticmethod
+    def _before(cursor: Optional[str], end: Optional[datetime], sort_key_of) -> Optional[tuple]:
+        """本页排序键的上界（不含）：游标对应记录与结束时间中较小者"""
+        bounds = []
+        if cursor is not None:
+            sort_key = sort_key_of(cursor)
+            if sort_key is None:
+                raise ValueError(f"无效的分页游标: {cursor}")
+            bounds.append(sort_key)
+        if end is not None:
+            # (end,) 小于所有时间为 end 的排序键
+            bounds.append((end,))
+        return min(bounds) if bounds else None
+
+
+def _value(value: Any) -> Any:
+    """枚举取值，与存储的字符串统一"""
+    return getattr(value, 'value', value)
+
+
+def _page(ids: List[str], limit: int) -> Tuple[List[str], Optional[str]]:
+    """多取的一条说明还有下一页，游标为本页最后一条"""
+    if len(ids) > limit:
+        ids = ids[:limit]
+        return ids, ids[-1]
+    return ids, None
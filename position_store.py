@@ -0,0 +1,243 @@
+"""
+列式持仓存储 - 基金份额按列存放在定长整数数组中，代替每个持仓一个模型实例
+"""
+import threading
+from array import array
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from fixed_point import from_fixed, to_fixed
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# 标准格式的份额ID（前缀 + 16 位小写十六进制）压缩为 64 位整数存储，其他格式单独保存
+_SHARE_ID_PREFIX = 'SHARE_'
+_SHARE_ID_DIGITS = 16
+_NO_SLOT = -1
+
+_FIELDS = ('share_id', 'fund_account_id', 'product_id', 'total_share',
+           'available_share', 'frozen_share', 'last_update')
+
+
+class ShareView:
+    """持仓视图：从列式存储读出的一条份额记录
+
+    字段与 FundShare 相同，但不是 Pydantic 模型（不校验、没有 __dict__）。
+    视图是读取时的副本，修改视图不影响存储，需经 Repository.create_or_update_fund_share 写回。
+    """
+    __slots__ = _FIELDS
+
+    def __init__(self, share_id: str, fund_account_id: str, product_id: str, total_share: Decimal,
+                 available_share: Decimal, frozen_share: Decimal, last_update: datetime):
+        self.share_id = share_id
+        self.fund_account_id = fund_account_id
+        self.product_id = product_id
+        self.total_share = total_share
+        self.available_share = available_share
+        self.frozen_share = frozen_share
+        self.last_update = last_update
+
+    def model_dump(self) -> Dict[str, Any]:
+        """字段字典（与 FundShare.model_dump() 相同）"""
+        return {name: getattr(self, name) for name in _FIELDS}
+
+    def __repr__(self) -> str:
+        return f"ShareView({', '.join(f'{name}={getattr(self, name)!r}' for name in _FIELDS)})"
+
+
+class PositionStore:
+    """列式持仓存储
+
+    每个持仓占一个槽位，各字段分别存放在按槽位对齐的数组中：
+    账户ID、产品ID驻留为整数编号，份额为 4 位小数定点 int64，更新时间为微秒数，
+    槽位索引以 (账户编号, 产品编号) 为键；同一账户的持仓以槽位链表按写入顺序串联。
+    每个持仓约 50 字节列数据加一个索引项，而模型实例加字段约需 1KB 以上。
+
+    份额超过 4 位的小数部分在写入时四舍五入。结构变更与读取在同一把锁内进行，
+    读取不会看到写了一半的记录；比较并更新的原子性由调用方的行锁保证。
+    """
+
+    def __init__(self):
+        """初始化空存储"""
+        self._account_ids: List[str] = []
+        self._account_nos: Dict[str, int] = {}
+        self._product_ids: List[str] = []
+        self._product_nos: Dict[str, int] = {}
+        # (账户编号 << 32 | 产品编号) -> 槽位
+        self._slots: Dict[int, int] = {}
+        # 按槽位对齐的列
+        self._account = array('i')
+        self._product = array('i')
+        self._share_id = array('Q')
+        self._total = array('q')
+        self._available = array('q')
+        self._frozen = array('q')
+        self._updated = array('q')
+        self._next = array('i')
+        # 按账户编号：该账户第一个、最后一个持仓的槽位
+        self._account_head = array('i')
+        self._account_tail = array('i')
+        # 槽位 -> 非标准格式的份额ID
+        self._other_share_ids: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._total)
+
+    @property
+    def nbytes(self) -> int:
+        """列数组占用的字节数（不含索引字典和驻留的ID字符串）"""
+        columns = (self._account, self._product, self._share_id, self._total, self._available,
+                   self._frozen, self._updated, self._next, self._account_head, self._account_tail)
+        return sum(column.itemsize * len(column) for column in columns)
+
+    # ==================== 读取 ====================
+
+    def get(self, fund_account_id: str, product_id: str) -> Optional[ShareView]:
+        """获取持仓视图，不存在时返回 None"""
+        with self._lock:
+            slot = self._slot_of(fund_account_id, product_id)
+            return None if slot is None else self._view(slot)
+
+    def account_shares(self, fund_account_id: str) -> List[ShareView]:
+        """获取账户的全部持仓视图（按首次写入顺序）"""
+        with self._lock:
+            account_no = self._account_nos.get(fund_account_id)
+            if account_no is None:
+                return []
+            views = []
+            slot = self._account_head[account_no]
+            while slot != _NO_SLOT:
+                views.append(self._view(slot))
+                slot = self._next[slot]
+            return views
+
+    def compare(self, fund_account_id: str, product_id: str, share_id: str,
+                expected_available: Decimal, expected_frozen: Decimal) -> bool:
+        """存储的持仓是否仍为 share_id 且可用、冻结份额等于预期值"""
+        with self._lock:
+            slot = self._slot_of(fund_account_id, product_id)
+            return (slot is not None and self._get_share_id(slot) == share_id
+                    and self._available[slot] == to_fixed(expected_available)
+                    and self._frozen[slot] == to_fixed(expected_frozen))
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """遍历 (份额ID, 字段字典)，用于持久化快照"""
+        for slot in range(len(self)):
+            with self._lock:
+                view = self._view(slot)
+            yield view.share_id, view.model_dump()
+
+    # ==================== 写入 ====================
+
+    def put(self, share: Any) -> ShareView:
+        """
+        写入持仓（FundShare 或 ShareView），返回按存储精度读出的视图
+
+        (账户, 产品) 已有份额ID不同的持仓时抛出 ValueError。
+        """
+        total = to_fixed(share.total_share)
+        available = to_fixed(share.available_share)
+        frozen = to_fixed(share.frozen_share)
+        updated = (share.last_update - _EPOCH) // _MICROSECOND
+        with self._lock:
+            account_no = self._intern_account(share.fund_account_id)
+            product_no = self._intern_product(share.product_id)
+            key = account_no << 32 | product_no
+            slot = self._slots.get(key)
+            try:
+                if slot is None:
+                    slot = self._append(account_no, product_no, share.share_id, total, available, frozen, updated)
+                    self._slots[key] = slot
+                else:
+                    if self._get_share_id(slot) != share.share_id:
+                        raise ValueError(f"基金份额已存在: {share.fund_account_id}/{share.product_id}")
+                    self._total[slot] = total
+                    self._available[slot] = available
+                    self._frozen[slot] = frozen
+                    self._updated[slot] = updated
+            except OverflowError:
+                raise ValueError(f"基金份额超出存储范围: {share.fund_account_id}/{share.product_id}")
+            return self._view(slot)
+
+    # ==================== 内部方法 ====================
+
+    def _slot_of(self, fund_account_id: str, product_id: str) -> Optional[int]:
+        account_no = self._account_nos.get(fund_account_id)
+        product_no = self._product_nos.get(product_id)
+        if account_no is None or product_no is None:
+            return None
+        return self._slots.get(account_no << 32 | product_no)
+
+    def _view(self, slot: int) -> ShareView:
+        return ShareView(
+            self._get_share_id(slot),
+            self._account_ids[self._account[slot]],
+            self._product_ids[self._product[slot]],
+            from_fixed(self._total[slot]),
+            from_fixed(self._available[slot]),
+            from_fixed(self._frozen[slot]),
+            _EPOCH + self._updated[slot] * _MICROSECOND
+        )
+
+    def _intern_account(self, fund_account_id: str) -> int:
+        account_no = self._account_nos.get(fund_account_id)
+        if account_no is None:
+            account_no = self._account_nos[fund_account_id] = len(self._account_ids)
+            self._account_ids.append(fund_account_id)
+            self._account_head.append(_NO_SLOT)
+            self._account_tail.append(_NO_SLOT)
+        return account_no
+
+    def _intern_product(self, product_id: str) -> int:
+        product_no = self._product_nos.get(product_id)
+        if product_no is None:
+            product_no = self._product_nos[product_id] = len(self._product_ids)
+            self._product_ids.append(product_id)
+        return product_no
+
+    def _append(self, account_no: int, product_no: int, share_id: str,
+                total: int, available: int, frozen: int, updated: int) -> int:
+        """追加一个槽位并接到账户持仓链表末尾"""
+        slot = len(self._total)
+        # 先检查会溢出的值，避免各列长度不一致
+        for value in (total, available, frozen):
+            if not -2 ** 63 <= value < 2 ** 63:
+                raise OverflowError(value)
+        encoded = self._encode_share_id(share_id)
+        self._share_id.append(0 if encoded is None else encoded)
+        if encoded is None:
+            self._other_share_ids[slot] = share_id
+        self._account.append(account_no)
+        self._product.append(product_no)
+        self._total.append(total)
+        self._available.append(available)
+        self._frozen.append(frozen)
+        self._updated.append(updated)
+        self._next.append(_NO_SLOT)
+        tail = self._account_tail[account_no]
+        if tail == _NO_SLOT:
+            self._account_head[account_no] = slot
+        else:
+            self._next[tail] = slot
+        self._account_tail[account_no] = slot
+        return slot
+
+    @staticmethod
+    def _encode_share_id(share_id: str) -> Optional[int]:
+        """标准格式的份额ID转为整数，其他格式返回 None"""
+        digits = share_id[len(_SHARE_ID_PREFIX):]
+        if not share_id.startswith(_SHARE_ID_PREFIX) or len(digits) != _SHARE_ID_DIGITS:
+            return None
+        try:
+            value = int(digits, 16)
+        except ValueError:
+            return None
+        # int() 也接受大写字母和下划线，只有能还原为原字符串时才压缩
+        return value if f"{value:016x}" == digits else None
+
+    def _get_share_id(self, slot: int) -> str:
+        if self._other_share_ids and slot in self._other_share_ids:
+            return self._other_share_ids[slot]
+        return f"{_SHARE_ID_PREFIX}{self._share_id[slot]:016x}"
@@ -0,0 +1,130 @@
+"""
+产品列表视图 - 产品连同最新净值的物化列表，支持筛选、游标分页和 ETag
+"""
+import hashlib
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from models import ResponseModel
+from repository import Repository
+
+# 可筛选的产品字段
+FILTER_FIELDS = ('product_type', 'risk_level', 'product_status')
+
+
+class ProductPage(NamedTuple):
+    """一页产品列表的响应"""
+    etag: str
+    body: bytes
+    next_cursor: Optional[str]
+
+
+class ProductListing:
+    """产品列表物化视图
+
+    按创建顺序保存每个产品的接口数据（产品字段加 latest_nav），
+    仓库的产品版本（产品或最新净值变化时改变）不变时直接复用；
+    版本变化后的第一次请求重建整个列表，读取最新净值走净值序列，每个产品 O(1)。
+
+    每个查询（筛选条件 + 游标 + 每页条数）的序列化结果和 ETag 同样缓存到版本变化为止，
+    重复请求不再序列化；ETag 由响应内容计算，不同进程对相同数据给出相同的 ETag。
+    """
+
+    def __init__(self, repo: Repository, page_cache_size: int = 256):
+        """
+        初始化产品列表视图
+
+        Args:
+            repo: 数据仓库
+            page_cache_size: 缓存的查询结果数，超过时清空重来
+        """
+        self.repo = repo
+        self.page_cache_size = page_cache_size
+        self._lock = threading.Lock()
+        self._version: Optional[Tuple[int, int]] = None
+        self._rows: List[Dict[str, Any]] = []
+        # 产品ID -> 在列表中的位置（游标定位）
+        self._positions: Dict[str, int] = {}
+        self._pages: Dict[tuple, ProductPage] = {}
+
+    def _build(self) -> None:
+        """重建产品列表（调用方持有锁）"""
+        rows = []
+        for product in self.repo.list_fund_products():
+            row = product.model_dump()
+            nav = self.repo.get_latest_nav(product.product_id)
+            if nav:
+                row['latest_nav'] = {
+                    'net_value': float(nav.net_value),
+                    'accumulated_nav': float(nav.accumulated_nav) if nav.accumulated_nav else None,
+                    'nav_date': nav.nav_date.isoformat()
+                }
+            rows.append(row)
+        self._rows = rows
+        self._positions = {row['product_id']: i for i, row in enumerate(rows)}
+        self._pages = {}
+
+    def _refresh(self) -> None:
+        """版本变化时重建（调用方持有锁）"""
+        version = self.repo.get_product_version()
+        if version != self._version:
+            self._build()
+            self._version = version
+
+    def page(self, cursor: Optional[str] = None, limit: Optional[int] = None,
+             **filters: Optional[str]) -> ProductPage:
+        """
+        获取一页产品列表
+
+        Args:
+            cursor: 上一页返回的游标（该页最后一个产品的ID），从其后开始
+            limit: 每页条数，None 表示返回其后的全部产品
+            **filters: 按 FILTER_FIELDS 中的字段精确筛选，值为 None 的条件忽略
+
+        Returns:
+            ProductPage：ETag、序列化后的 ResponseModel、下一页游标（没有下一页时为 None）
+        """
+        unknown = set(filters) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"不支持的筛选字段: {sorted(unknown)}")
+        if limit is not None and limit <= 0:
+            raise ValueError(f"每页条数必须大于0: {limit}")
+        conditions = tuple((name, value) for name, value in sorted(filters.items()) if value is not None)
+        key = (conditions, cursor, limit)
+        with self._lock:
+            self._refresh()
+            page = self._pages.get(key)
+            if page is None:
+                page = self._render(conditions, cursor, limit)
+                if len(self._pages) >= self.page_cache_size:
+                    self._pages = {}
+                self._pages[key] = page
+            return page
+
+    def _render(self, conditions: tuple, cursor: Optional[str], limit: Optional[int]) -> ProductPage:
+        """筛选、分页并序列化（调用方持有锁）"""
+        start = 0
+        if cursor is not None:
+            position = self._positions.get(cursor)
+            if position is None:
+                raise ValueError(f"无效的分页游标: {cursor}")
+            start = position + 1
+        items = []
+        next_cursor = None
+        for row in self._rows[start:]:
+            if all(row[name] == value for name, value in conditions):
+                if limit is not None and len(items) == limit:
+                    next_cursor = items[-1]['product_id']
+                    break
+                items.append(row)
+        body = ResponseModel(data=items).model_dump_json().encode()
+        etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        return ProductPage(etag, body, next_cursor)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 请求头是否与 ETag 匹配（支持多个值、弱校验前缀和 *）"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    return '*' in candidates or any(value.removeprefix('W/') == etag for value in candidates)
@@ -2,23 +2,96 @@
 数据存储层 - 基于内存的数据管理
 使用字典存储数据，模拟数据库操作
 """
-from typing import Dict, List, Optional, Any
+import threading
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, date
 from decimal import Decimal
-import uuid
 from models import (
     User, UserBankCard, FundAccount, FundProduct, FundNetValue,
     UserBalance, FundShare, EntrustBase, FundAccountEntrust,
     FundTransactionEntrust, CapitalChangeEntrust, ConfirmBase,
     UserTotalAsset, UserFundAsset
 )
+from nav_series import NavSeries
+from nav_catalog import NavCatalog
+from order_history import OrderHistory
+from position_store import PositionStore
+from asset_book import UserAssetBook
+from common.ids import generate_id
+from common.locks import StripedLock
+from common.persistence import Persistence
+
+
+# 存储模式
+STORAGE_MODE_MODEL = 'model'
+STORAGE_MODE_DICT = 'dict'
+
+_object_setattr = object.__setattr__
+
+# 各表存储的模型类型
+_TABLE_MODELS = {
+    'users': User,
+    'user_bank_cards': UserBankCard,
+    'fund_accounts': FundAccount,
+    'fund_products': FundProduct,
+    'fund_net_values': FundNetValue,
+    'user_balances': UserBalance,
+    'fund_shares': FundShare,
+    'entrust_base': EntrustBase,
+    'fund_account_entrusts': FundAccountEntrust,
+    'fund_transaction_entrusts': FundTransactionEntrust,
+    'capital_change_entrusts': CapitalChangeEntrust,
+    'confirm_base': ConfirmBase,
+    'user_total_assets': UserTotalAsset,
+    'user_fund_assets': UserFundAsset,
+}
+
+# 仓库表名 -> database/schema.sql 表名（entrust_base 在 schema.sql 中没有对应的表）
+SCHEMA_TABLE_NAMES = {
+    'users': 'user',
+    'user_bank_cards': 'user_bank_card',
+    'fund_accounts': 'fund_account',
+    'fund_products': 'fund_product',
+    'fund_net_values': 'fund_net_value',
+    'user_balances': 'user_balance',
+    'fund_shares': 'fund_share',
+    'entrust_base': 'entrust_base',
+    'fund_account_entrusts': 'fund_account_entrust',
+    'fund_transaction_entrusts': 'fund_transaction_entrust',
+    'capital_change_entrusts': 'capital_change_entrust',
+    'confirm_base': 'fund_transaction_confirm',
+    'user_total_assets': 'user_total_asset',
+    'user_fund_assets': 'user_fund_asset',
+}
+
+# 含嵌套字典字段的表：复制模型时这些字段也需复制一层，避免共享可变状态
+_NESTED_FIELDS = {
+    'entrust_base': ('request_data', 'response_data'),
+    'confirm_base': ('confirm_data',),
+}
 
 
 class Repository:
     """数据仓库基类"""
     
-    def __init__(self):
-        """初始化数据存储"""
+    def __init__(self, storage_mode: str = STORAGE_MODE_MODEL,
+                 persistence: Optional[Persistence] = None,
+                 columnar_positions: bool = False):
+        """
+        初始化数据存储
+        
+        Args:
+            storage_mode: 存储模式
+                - 'model': 直接存储已校验的模型实例，读写时复制而不重新校验（默认）
+                - 'dict': 存储 model_dump() 字典，读取时重新构建并校验模型
+            persistence: 持久化；提供时先从快照和预写日志恢复数据，之后每次写入都记录日志
+            columnar_positions: 基金份额存入列式持仓存储（见 position_store.py），读取时返回 ShareView；
+                份额按 4 位小数存储，适合千万级持仓
+        """
+        if storage_mode not in (STORAGE_MODE_MODEL, STORAGE_MODE_DICT):
+            raise ValueError(f"不支持的存储模式: {storage_mode}")
+        self.storage_mode = storage_mode
+        self._store_models = storage_mode == STORAGE_MODE_MODEL
         self._storage: Dict[str, Dict[str, Any]] = {
             'users': {},
             'user_bank_cards': {},
@@ -35,10 +108,237 @@ class Repository:
             'user_total_assets': {},
             'user_fund_assets': {}
         }
+        # 二级索引：按用户/账户/产品定位记录，避免全表扫描
+        self._balance_by_user: Dict[str, str] = {}
+        self._accounts_by_user: Dict[str, List[str]] = {}
+        self._share_by_account_product: Dict[Tuple[str, str], str] = {}
+        self._shares_by_account: Dict[str, List[str]] = {}
+        # 列式持仓存储：启用时基金份额不进入 _storage 和上面两个索引
+        self._positions = PositionStore() if columnar_positions else None
+        # 按产品维护的净值时间序列
+        self._nav_series: Dict[str, NavSeries] = {}
+        # 按增量维护的用户资产聚合
+        self._asset_book = UserAssetBook()
+        # 委托与确认的历史索引（按用户、状态、账户产品、交易类型分页查询）
+        self._history = OrderHistory()
+        # 各表写入与快照复制互斥（只在修改字典时持有，快照据此取得一致的副本）
+        self._storage_lock = threading.Lock()
+        # 余额/份额记录的行锁：比较并更新与普通更新互斥
+        self._row_locks = StripedLock()
+        # 多进程共用的产品净值目录（attach_catalog() 接入）
+        self._catalog = None
+        # 产品或产品最新净值每变化一次加一（产品列表视图据此失效）
+        self._product_version = 0
+        
+        self._persistence = None
+        if persistence is not None:
+            self._recover(persistence)
+            persistence.open()
+            self._persistence = persistence
     
     def _generate_id(self, prefix: str = '') -> str:
         """生成唯一ID"""
-        return f"{prefix}{uuid.uuid4().hex[:16]}"
+        return generate_id(prefix)
+    
+    def _to_row(self, table: str, model: Any) -> Any:
+        """将模型转换为存储行
+        
+        模型模式下存储模型的副本（写时复制），调用方之后修改自己持有的
+        实例不会影响已存储的状态。
+        """
+        if self._store_models:
+            return self._copy_model(table, model)
+        return model.model_dump()
+    
+    def _put(self, table: str, key: str, model: Any) -> Any:
+        """写入记录，返回存储的行"""
+        row = self._to_row(table, model)
+        with self._storage_lock:
+            self._storage[table][key] = row
+        if self._persistence is not None:
+            self._log(('put', table, key, self._row_state(row)))
+        return row
+    
+    def _bulk_put(self, table: str, key_field: str, models: List[Any]) -> int:
+        """批量写入记录，调用方移交实例所有权（模型模式下不再复制）"""
+        if self._store_models:
+            rows = [(getattr(model, key_field), model) for model in models]
+        else:
+            rows = [(getattr(model, key_field), model.model_dump()) for model in models]
+        with self._storage_lock:
+            self._storage[table].update(rows)
+        if self._persistence is not None:
+            self._log(('bulk_put', table, [(key, self._row_state(row)) for key, row in rows]))
+        return len(models)
+    
+    def _load(self, table: str, model_cls: type, row: Any) -> Any:
+        """将存储的行转换为模型
+        
+        模型模式下存储的数据已校验过，直接复制返回（受信任的水合），
+        不再经过 Pydantic 校验；调用方拿到的是独立副本。
+        """
+        if row is None:
+            return None
+        if self._store_models:
+            return self._copy_model(table, row)
+        return model_cls(**row)
+    
+    @staticmethod
+    def _copy_model(table: str, model: Any) -> Any:
+        """复制模型，不经过校验
+        
+        与 model_construct 一样直接填充实例字段，比 model_copy() 和重新校验都快；
+        嵌套字典字段单独复制一层。
+        """
+        cls = type(model)
+        copied = cls.__new__(cls)
+        _object_setattr(copied, '__dict__', Repository._copy_fields(table, model.__dict__))
+        _object_setattr(copied, '__pydantic_fields_set__', set(model.__pydantic_fields_set__))
+        _object_setattr(copied, '__pydantic_extra__', None)
+        _object_setattr(copied, '__pydantic_private__', None)
+        return copied
+    
+    @staticmethod
+    def _copy_fields(table: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """复制字段字典，嵌套字典字段单独复制一层"""
+        fields = fields.copy()
+        for name in _NESTED_FIELDS.get(table, ()):
+            value = fields.get(name)
+            if value is not None:
+                fields[name] = dict(value)
+        return fields
+    
+    @staticmethod
+    def _construct_model(model_cls: type, fields: Dict[str, Any]) -> Any:
+        """用已校验过的字段字典直接构建模型，不经过校验"""
+        model = model_cls.__new__(model_cls)
+        _object_setattr(model, '__dict__', fields)
+        _object_setattr(model, '__pydantic_fields_set__', set(fields))
+        _object_setattr(model, '__pydantic_extra__', None)
+        _object_setattr(model, '__pydantic_private__', None)
+        return model
+    
+    @staticmethod
+    def _field(row: Any, name: str) -> Any:
+        """读取存储行的字段值"""
+        if isinstance(row, dict):
+            return row.get(name)
+        return getattr(row, name, None)
+    
+    # ==================== 持久化 ====================
+    
+    def _log(self, record: Tuple) -> None:
+        """记录一条变更，日志条数达到阈值时做快照（快照失败不影响本次写入）"""
+        self._persistence.log(record)
+        self._persistence.snapshot_if_due(self._snapshot_state)
+    
+    def snapshot(self) -> int:
+        """写入快照并清理已覆盖的日志，返回快照覆盖到的最后序号"""
+        if self._persistence is None:
+            raise ValueError("未配置持久化")
+        return self._persistence.snapshot(self._snapshot_state)
+    
+    def _snapshot_state(self) -> Dict[str, Any]:
+        """快照内容：各表的字段字典（列式持仓按行展开，与普通存储的快照格式相同）
+        
+        其他线程可能同时写入：先在存储锁内浅复制各表（存储的行只整行替换、不原地修改），
+        再在锁外转换为字段字典。
+        """
+        with self._storage_lock:
+            copies = {table: rows.copy() for table, rows in self._storage.items()}
+        tables = {
+            table: {key: self._row_state(row) for key, row in rows.items()}
+            for table, rows in copies.items()
+        }
+        if self._positions is not None:
+            tables['fund_shares'] = dict(self._positions.items())
+        return {'storage_mode': self.storage_mode, 'tables': tables}
+    
+    def close(self) -> None:
+        """提交剩余日志并关闭持久化"""
+        if self._persistence is not None:
+            self._persistence.close()
+    
+    def _row_state(self, row: Any) -> Dict[str, Any]:
+        """存储行的持久化形式：字段字典
+        
+        模型模式下直接取模型的字段字典（存储的模型不会被原地修改），
+        比 pickle 模型实例快得多，恢复时也不需要重新校验。
+        """
+        return row.__dict__ if self._store_models else row
+    
+    def _row_from_state(self, table: str, fields: Dict[str, Any]) -> Any:
+        """由持久化的字段字典还原存储行"""
+        if self._store_models:
+            return self._construct_model(_TABLE_MODELS[table], fields)
+        return fields
+    
+    def _recover(self, persistence: Persistence) -> None:
+        """加载快照、重放日志，然后重建二级索引、净值序列和资产聚合"""
+        state, records = persistence.recover()
+        if state is not None:
+            if state['storage_mode'] != self.storage_mode:
+                raise ValueError(f"存储模式与持久化数据不一致: {state['storage_mode']}")
+            for table, rows in state['tables'].items():
+                self._storage[table].update(
+                    (key, self._row_from_state(table, fields)) for key, fields in rows.items()
+                )
+        # 日志记录的是整行写入，重放是幂等的
+        for record in records:
+            if record[0] == 'put':
+                _, table, key, fields = record
+                self._storage[table][key] = self._row_from_state(table, fields)
+            else:
+                _, table, rows = record
+                self._storage[table].update(
+                    (key, self._row_from_state(table, fields)) for key, fields in rows
+                )
+        self._rebuild_derived()
+    
+    def _rebuild_derived(self) -> None:
+        """根据存储的数据重建派生结构"""
+        field = getattr if self._store_models else dict.get
+        for balance_id, row in self._storage['user_balances'].items():
+            user_id = field(row, 'user_id')
+            self._balance_by_user.setdefault(user_id, balance_id)
+            self._asset_book.set_balance(user_id, field(row, 'total_balance'))
+        for account_id, row in self._storage['fund_accounts'].items():
+            self._accounts_by_user.setdefault(field(row, 'user_id'), []).append(account_id)
+        for row in self._storage['fund_net_values'].values():
+            product_id = field(row, 'product_id')
+            series = self._nav_series.get(product_id)
+            if series is None:
+                series = self._nav_series[product_id] = NavSeries(product_id)
+            series.add(field(row, 'nav_date'), row)
+        for product_id, series in self._nav_series.items():
+            self._asset_book.set_nav(product_id, field(series.latest(), 'net_value'))
+        for share_id, row in self._storage['fund_shares'].items():
+            account_id = field(row, 'fund_account_id')
+            product_id = field(row, 'product_id')
+            total_share = field(row, 'total_share')
+            if self._positions is not None:
+                share = row if self._store_models else self._construct_model(FundShare, dict(row))
+                total_share = self._positions.put(share).total_share
+            else:
+                self._share_by_account_product[(account_id, product_id)] = share_id
+                self._shares_by_account.setdefault(account_id, []).append(share_id)
+            account = self._storage['fund_accounts'].get(account_id)
+            if account is not None:
+                self._asset_book.set_position(field(account, 'user_id'), account_id,
+                                              product_id, total_share)
+        if self._positions is not None:
+            # 恢复出的份额已移入列式存储
+            self._storage['fund_shares'].clear()
+        # 委托主表先于交易委托和确认登记（后两者按所属委托定位用户）
+        for row in self._storage['entrust_base'].values():
+            self._history.add_entrust(field(row, 'entrust_id'), field(row, 'user_id'), field(row, 'status'),
+                                      field(row, 'business_type'), field(row, 'create_time'))
+        for row in self._storage['fund_transaction_entrusts'].values():
+            self._history.add_transaction(field(row, 'entrust_id'), field(row, 'fund_account_id'),
+                                          field(row, 'product_id'), field(row, 'transaction_type'))
+        for row in self._storage['confirm_base'].values():
+            self._history.add_confirm(field(row, 'confirm_id'), field(row, 'entrust_id'),
+                                      field(row, 'confirm_time'))
     
     # ==================== 用户相关 ====================
     
@@ -46,7 +346,7 @@ class Repository:
         """创建用户"""
         if user.user_id in self._storage['users']:
             raise ValueError(f"用户已存在: {user.user_id}")
-        self._storage['users'][user.user_id] = user.model_dump()
+        self._put('users', user.user_id, user)
         # 初始化用户余额
         balance = UserBalance(
             balance_id=self._generate_id('BAL_'),
@@ -55,19 +355,17 @@ class Repository:
             frozen_balance=Decimal('0'),
             total_balance=Decimal('0')
         )
-        self._storage['user_balances'][balance.balance_id] = balance.model_dump()
+        self._put('user_balances', balance.balance_id, balance)
+        self._index_balance(balance)
         return user
     
     def get_user(self, user_id: str) -> Optional[User]:
         """获取用户"""
-        user_data = self._storage['users'].get(user_id)
-        if user_data:
-            return User(**user_data)
-        return None
+        return self._load('users', User, self._storage['users'].get(user_id))
     
     def list_users(self) -> List[User]:
         """列出所有用户"""
-        return [User(**data) for data in self._storage['users'].values()]
+        return [self._load('users', User, row) for row in self._storage['users'].values()]
     
     # ==================== 基金账户相关 ====================
     
@@ -75,23 +373,42 @@ class Repository:
         """创建基金账户"""
         if account.fund_account_id in self._storage['fund_accounts']:
             raise ValueError(f"基金账户已存在: {account.fund_account_id}")
-        self._storage['fund_accounts'][account.fund_account_id] = account.model_dump()
+        self._put('fund_accounts', account.fund_account_id, account)
+        self._index_account(account)
         return account
     
+    def _index_account(self, account: FundAccount) -> None:
+        """登记基金账户到用户 -> 账户索引"""
+        self._accounts_by_user.setdefault(account.user_id, []).append(account.fund_account_id)
+    
     def get_fund_account(self, fund_account_id: str) -> Optional[FundAccount]:
         """获取基金账户"""
-        account_data = self._storage['fund_accounts'].get(fund_account_id)
-        if account_data:
-            return FundAccount(**account_data)
-        return None
+        return self._load('fund_accounts', FundAccount, self._storage['fund_accounts'].get(fund_account_id))
     
     def get_user_fund_accounts(self, user_id: str) -> List[FundAccount]:
         """获取用户的所有基金账户"""
-        accounts = []
-        for account_data in self._storage['fund_accounts'].values():
-            if account_data.get('user_id') == user_id:
-                accounts.append(FundAccount(**account_data))
-        return accounts
+        storage = self._storage['fund_accounts']
+        return [
+            self._load('fund_accounts', FundAccount, storage[account_id])
+            for account_id in self._accounts_by_user.get(user_id, [])
+        ]
+    
+    # ==================== 产品净值目录 ====================
+    
+    def attach_catalog(self, catalog: NavCatalog) -> None:
+        """接入共享内存产品净值目录
+        
+        接入后产品与最新净值从目录读取，能看到其他工作进程创建的产品和发布的净值；
+        本仓库创建的产品与净值同时写入目录。本仓库已有的产品及其最新净值先写入目录。
+        净值历史（按日期查询、区间查询）和资产聚合仍只使用本仓库的数据。
+        """
+        for row in self._storage['fund_products'].values():
+            catalog.publish_product(self._load('fund_products', FundProduct, row))
+        for series in self._nav_series.values():
+            latest = series.latest()
+            if latest is not None:
+                catalog.publish_nav(self._load('fund_net_values', FundNetValue, latest))
+        self._catalog = catalog
     
     # ==================== 基金产品相关 ====================
     
@@ -99,154 +416,374 @@ class Repository:
         """创建基金产品"""
         if product.product_id in self._storage['fund_products']:
             raise ValueError(f"基金产品已存在: {product.product_id}")
-        self._storage['fund_products'][product.product_id] = product.model_dump()
+        self._put('fund_products', product.product_id, product)
+        self._product_version += 1
+        if self._catalog is not None:
+            self._catalog.publish_product(product)
         return product
     
     def get_fund_product(self, product_id: str) -> Optional[FundProduct]:
         """获取基金产品"""
-        product_data = self._storage['fund_products'].get(product_id)
-        if product_data:
-            return FundProduct(**product_data)
-        return None
+        if self._catalog is not None:
+            fields = self._catalog.get_product(product_id)
+            if fields is not None:
+                return self._construct_model(FundProduct, fields)
+        return self._load('fund_products', FundProduct, self._storage['fund_products'].get(product_id))
     
     def list_fund_products(self, product_type: Optional[str] = None) -> List[FundProduct]:
         """列出基金产品"""
+        if self._catalog is not None:
+            return [
+                self._construct_model(FundProduct, fields) for fields in self._catalog.products()
+                if product_type is None or fields['product_type'] == product_type
+            ]
         products = []
-        for product_data in self._storage['fund_products'].values():
-            if product_type is None or product_data.get('product_type') == product_type:
-                products.append(FundProduct(**product_data))
+        for row in self._storage['fund_products'].values():
+            if product_type is None or self._field(row, 'product_type') == product_type:
+                products.append(self._load('fund_products', FundProduct, row))
         return products
     
+    def get_product_version(self) -> Tuple[int, int]:
+        """产品列表版本：产品或产品最新净值变化后改变（接入目录时包含目录的修改代数）"""
+        return self._product_version, self._catalog.generation if self._catalog is not None else 0
+    
     # ==================== 基金净值相关 ====================
     
     def create_fund_net_value(self, nav: FundNetValue) -> FundNetValue:
         """创建基金净值"""
-        self._storage['fund_net_values'][nav.nav_id] = nav.model_dump()
+        series = self._nav_series.get(nav.product_id)
+        if series is None:
+            series = self._nav_series[nav.product_id] = NavSeries(nav.product_id)
+        row = self._to_row('fund_net_values', nav)
+        series.add(nav.nav_date, row)
+        with self._storage_lock:
+            self._storage['fund_net_values'][nav.nav_id] = row
+        if self._persistence is not None:
+            self._log(('put', 'fund_net_values', nav.nav_id, self._row_state(row)))
+        if series.latest() is row:
+            self._asset_book.set_nav(nav.product_id, nav.net_value)
+            self._product_version += 1
+        if self._catalog is not None:
+            self._catalog.publish_nav(nav)
         return nav
     
     def get_latest_nav(self, product_id: str) -> Optional[FundNetValue]:
         """获取最新净值"""
-        navs = []
-        for nav_data in self._storage['fund_net_values'].values():
-            if nav_data.get('product_id') == product_id:
-                navs.append(FundNetValue(**nav_data))
-        
-        if not navs:
-            return None
-        
-        # 按日期排序，返回最新的
-        navs.sort(key=lambda x: x.nav_date, reverse=True)
-        return navs[0]
-    
-    def list_navs_by_product(self, product_id: str) -> List[FundNetValue]:
-        """获取产品的所有净值记录"""
-        navs = []
-        for nav_data in self._storage['fund_net_values'].values():
-            if nav_data.get('product_id') == product_id:
-                navs.append(FundNetValue(**nav_data))
-        navs.sort(key=lambda x: x.nav_date, reverse=True)
-        return navs
+        if self._catalog is not None:
+            fields = self._catalog.get_latest_nav(product_id)
+            if fields is not None:
+                return self._construct_model(FundNetValue, fields)
+        series = self._nav_series.get(product_id)
+        return self._load('fund_net_values', FundNetValue, series.latest() if series else None)
+    
+    def get_nav_as_of(self, product_id: str, as_of_date: date) -> Optional[FundNetValue]:
+        """获取指定日期（含）之前最近的净值"""
+        series = self._nav_series.get(product_id)
+        return self._load('fund_net_values', FundNetValue, series.as_of(as_of_date) if series else None)
+    
+    def list_navs_by_product(self, product_id: str,
+                             start_date: Optional[date] = None,
+                             end_date: Optional[date] = None) -> List[FundNetValue]:
+        """获取产品的净值记录（按日期倒序，可按日期区间过滤）"""
+        series = self._nav_series.get(product_id)
+        if not series:
+            return []
+        return [
+            self._load('fund_net_values', FundNetValue, row)
+            for row in reversed(series.between(start_date, end_date))
+        ]
     
     # ==================== 用户余额相关 ====================
     
     def get_user_balance(self, user_id: str) -> Optional[UserBalance]:
         """获取用户余额"""
-        for balance_data in self._storage['user_balances'].values():
-            if balance_data.get('user_id') == user_id:
-                return UserBalance(**balance_data)
-        return None
+        balance_id = self._balance_by_user.get(user_id)
+        if balance_id is None:
+            return None
+        return self._load('user_balances', UserBalance, self._storage['user_balances'][balance_id])
     
     def update_user_balance(self, balance: UserBalance) -> UserBalance:
         """更新用户余额"""
-        # 计算总余额
-        balance.total_balance = balance.available_balance + balance.frozen_balance
-        balance.last_update = datetime.now()
-        self._storage['user_balances'][balance.balance_id] = balance.model_dump()
+        with self._row_locks.lock_for(balance.balance_id):
+            # 计算总余额
+            balance.total_balance = balance.available_balance + balance.frozen_balance
+            balance.last_update = datetime.now()
+            self._put('user_balances', balance.balance_id, balance)
+            self._index_balance(balance)
         return balance
     
+    def _index_balance(self, balance: UserBalance) -> None:
+        """登记余额到用户 -> 余额索引和资产聚合"""
+        # 每个用户仅有一条余额记录（uk_user_balance），保留最先写入的记录
+        self._balance_by_user.setdefault(balance.user_id, balance.balance_id)
+        self._asset_book.set_balance(balance.user_id, balance.total_balance)
+    
+    def compare_and_set_user_balance(self, balance: UserBalance, expected_available: Decimal,
+                                     expected_frozen: Decimal) -> bool:
+        """比较并更新用户余额
+        
+        存储的可用余额、冻结余额仍为读取时的值才写入 balance 并返回 True；
+        读取之后余额已被其他写入修改时不写入，返回 False，由调用方重新读取后重试。
+        """
+        with self._row_locks.lock_for(balance.balance_id):
+            row = self._storage['user_balances'].get(balance.balance_id)
+            if (row is None or self._field(row, 'available_balance') != expected_available
+                    or self._field(row, 'frozen_balance') != expected_frozen):
+                return False
+            self.update_user_balance(balance)
+        return True
+    
     # ==================== 基金份额相关 ====================
     
     def get_fund_share(self, fund_account_id: str, product_id: str) -> Optional[FundShare]:
-        """获取基金份额"""
-        for share_data in self._storage['fund_shares'].values():
-            if (share_data.get('fund_account_id') == fund_account_id and
-                share_data.get('product_id') == product_id):
-                return FundShare(**share_data)
-        return None
+        """获取基金份额（列式持仓存储时返回 ShareView）"""
+        if self._positions is not None:
+            return self._positions.get(fund_account_id, product_id)
+        share_id = self._share_by_account_product.get((fund_account_id, product_id))
+        if share_id is None:
+            return None
+        return self._load('fund_shares', FundShare, self._storage['fund_shares'][share_id])
     
     def create_or_update_fund_share(self, share: FundShare) -> FundShare:
         """创建或更新基金份额"""
-        share.last_update = datetime.now()
-        self._storage['fund_shares'][share.share_id] = share.model_dump()
+        with self._row_locks.lock_for((share.fund_account_id, share.product_id)):
+            share.last_update = datetime.now()
+            if self._positions is not None:
+                self._put_position(share)
+                return share
+            self._index_share(share)
+            self._put('fund_shares', share.share_id, share)
+            self._index_position(share.fund_account_id, share.product_id, share.total_share)
         return share
     
+    def _index_share(self, share: FundShare) -> None:
+        """新份额登记到账户/产品 -> 份额索引（调用方持有该持仓的行锁），同一账户同一产品已有份额时抛出 ValueError"""
+        if share.share_id in self._storage['fund_shares']:
+            return
+        key = (share.fund_account_id, share.product_id)
+        if key in self._share_by_account_product:
+            raise ValueError(f"基金份额已存在: {share.fund_account_id}/{share.product_id}")
+        self._share_by_account_product[key] = share.share_id
+        self._shares_by_account.setdefault(share.fund_account_id, []).append(share.share_id)
+    
+    def _index_position(self, fund_account_id: str, product_id: str, total_share: Decimal) -> None:
+        """更新资产聚合中的持仓份额"""
+        account = self._storage['fund_accounts'].get(fund_account_id)
+        if account is not None:
+            self._asset_book.set_position(self._field(account, 'user_id'), fund_account_id,
+                                          product_id, total_share)
+    
+    def _put_position(self, share: FundShare) -> None:
+        """写入列式持仓存储（调用方持有该持仓的行锁），share 的份额改为存储精度"""
+        stored = self._positions.put(share)
+        share.total_share = stored.total_share
+        share.available_share = stored.available_share
+        share.frozen_share = stored.frozen_share
+        if self._persistence is not None:
+            self._log(('put', 'fund_shares', stored.share_id, stored.model_dump()))
+        self._index_position(share.fund_account_id, share.product_id, stored.total_share)
+    
+    def compare_and_set_fund_share(self, share: FundShare, expected_available: Decimal,
+                                   expected_frozen: Decimal) -> bool:
+        """比较并更新基金份额
+        
+        存储的可用份额、冻结份额仍为读取时的值才写入 share 并返回 True，否则返回 False。
+        """
+        with self._row_locks.lock_for((share.fund_account_id, share.product_id)):
+            if self._positions is not None:
+                if not self._positions.compare(share.fund_account_id, share.product_id, share.share_id,
+                                               expected_available, expected_frozen):
+                    return False
+                self.create_or_update_fund_share(share)
+                return True
+            row = self._storage['fund_shares'].get(share.share_id)
+            if (row is None or self._field(row, 'available_share') != expected_available
+                    or self._field(row, 'frozen_share') != expected_frozen):
+                return False
+            self.create_or_update_fund_share(share)
+        return True
+    
     def get_account_shares(self, fund_account_id: str) -> List[FundShare]:
-        """获取账户的所有份额"""
-        shares = []
-        for share_data in self._storage['fund_shares'].values():
-            if share_data.get('fund_account_id') == fund_account_id:
-                shares.append(FundShare(**share_data))
-        return shares
+        """获取账户的所有份额（列式持仓存储时返回 ShareView）"""
+        if self._positions is not None:
+            return self._positions.account_shares(fund_account_id)
+        storage = self._storage['fund_shares']
+        return [
+            self._load('fund_shares', FundShare, storage[share_id])
+            for share_id in self._shares_by_account.get(fund_account_id, [])
+        ]
     
     # ==================== 委托相关 ====================
     
     def create_entrust(self, entrust: EntrustBase) -> EntrustBase:
         """创建委托"""
-        self._storage['entrust_base'][entrust.entrust_id] = entrust.model_dump()
+        self._put('entrust_base', entrust.entrust_id, entrust)
+        self._index_entrust(entrust)
         return entrust
     
     def get_entrust(self, entrust_id: str) -> Optional[EntrustBase]:
         """获取委托"""
-        entrust_data = self._storage['entrust_base'].get(entrust_id)
-        if entrust_data:
-            return EntrustBase(**entrust_data)
-        return None
+        return self._load('entrust_base', EntrustBase, self._storage['entrust_base'].get(entrust_id))
     
     def update_entrust(self, entrust: EntrustBase) -> EntrustBase:
         """更新委托"""
-        self._storage['entrust_base'][entrust.entrust_id] = entrust.model_dump()
+        self._put('entrust_base', entrust.entrust_id, entrust)
+        self._index_entrust(entrust)
         return entrust
     
     def create_fund_transaction_entrust(self, entrust: FundTransactionEntrust) -> FundTransactionEntrust:
         """创建基金交易委托"""
-        self._storage['fund_transaction_entrusts'][entrust.entrust_id] = entrust.model_dump()
+        self._put('fund_transaction_entrusts', entrust.entrust_id, entrust)
+        self._index_transaction(entrust)
         return entrust
     
+    def get_fund_transaction_entrust(self, entrust_id: str) -> Optional[FundTransactionEntrust]:
+        """获取基金交易委托"""
+        return self._load('fund_transaction_entrusts', FundTransactionEntrust,
+                          self._storage['fund_transaction_entrusts'].get(entrust_id))
+    
+    def bulk_create_entrusts(self, entrusts: List[EntrustBase]) -> int:
+        """批量创建委托，调用方移交实例所有权（模型模式下不再复制）"""
+        count = self._bulk_put('entrust_base', 'entrust_id', entrusts)
+        for entrust in entrusts:
+            self._index_entrust(entrust)
+        return count
+    
+    def bulk_create_fund_transaction_entrusts(self, entrusts: List[FundTransactionEntrust]) -> int:
+        """批量创建基金交易委托，调用方移交实例所有权（模型模式下不再复制）"""
+        count = self._bulk_put('fund_transaction_entrusts', 'entrust_id', entrusts)
+        for entrust in entrusts:
+            self._index_transaction(entrust)
+        return count
+    
     def create_fund_account_entrust(self, entrust: FundAccountEntrust) -> FundAccountEntrust:
         """创建基金账户委托"""
-        self._storage['fund_account_entrusts'][entrust.entrust_id] = entrust.model_dump()
+        self._put('fund_account_entrusts', entrust.entrust_id, entrust)
         return entrust
     
+    def list_user_entrusts(self, user_id: str, status: Optional[str] = None,
+                           business_type: Optional[str] = None, product_id: Optional[str] = None,
+                           start_time: Optional[datetime] = None, end_time: Optional[datetime] = None,
+                           cursor: Optional[str] = None,
+                           limit: int = 50) -> Tuple[List[EntrustBase], Optional[str]]:
+        """
+        按创建时间倒序分页查询用户的委托
+        
+        Args:
+            user_id: 用户ID
+            status: 委托状态
+            business_type: 业务类型
+            product_id: 产品ID（只含基金交易委托）
+            start_time: 创建时间下限（含）
+            end_time: 创建时间上限（不含）
+            cursor: 上一页返回的游标，为空时从最新的委托开始
+            limit: 每页条数
+        
+        Returns:
+            (委托列表, 下一页游标；没有下一页时为 None)
+        """
+        entrust_ids, next_cursor = self._history.user_entrusts(
+            user_id, self._accounts_by_user.get(user_id, ()), status=status,
+            business_type=business_type, product_id=product_id, start=start_time,
+            end=end_time, cursor=cursor, limit=limit
+        )
+        storage = self._storage['entrust_base']
+        return [self._load('entrust_base', EntrustBase, storage[entrust_id])
+                for entrust_id in entrust_ids], next_cursor
+    
+    def _index_entrust(self, entrust: EntrustBase) -> None:
+        """登记委托到历史索引"""
+        self._history.add_entrust(entrust.entrust_id, entrust.user_id, entrust.status,
+                                  entrust.business_type, entrust.create_time)
+    
+    def _index_transaction(self, entrust: FundTransactionEntrust) -> None:
+        """登记基金交易委托到历史索引"""
+        self._history.add_transaction(entrust.entrust_id, entrust.fund_account_id,
+                                      entrust.product_id, entrust.transaction_type)
+    
     # ==================== 确认相关 ====================
     
     def create_confirm(self, confirm: ConfirmBase) -> ConfirmBase:
         """创建确认"""
-        self._storage['confirm_base'][confirm.confirm_id] = confirm.model_dump()
+        self._put('confirm_base', confirm.confirm_id, confirm)
+        self._index_confirm(confirm)
         return confirm
     
+    def bulk_create_confirms(self, confirms: List[ConfirmBase]) -> int:
+        """批量创建确认，调用方移交实例所有权（模型模式下不再复制）"""
+        count = self._bulk_put('confirm_base', 'confirm_id', confirms)
+        for confirm in confirms:
+            self._index_confirm(confirm)
+        return count
+    
+    def _index_confirm(self, confirm: ConfirmBase) -> None:
+        """登记确认到历史索引"""
+        self._history.add_confirm(confirm.confirm_id, confirm.entrust_id, confirm.confirm_time)
+    
+    def list_user_confirms(self, user_id: str, start_time: Optional[datetime] = None,
+                           end_time: Optional[datetime] = None, cursor: Optional[str] = None,
+                           limit: int = 50) -> Tuple[List[ConfirmBase], Optional[str]]:
+        """按确认时间倒序分页查询用户的确认记录，返回 (确认列表, 下一页游标)"""
+        confirm_ids, next_cursor = self._history.user_confirms(
+            user_id, start=start_time, end=end_time, cursor=cursor, limit=limit
+        )
+        storage = self._storage['confirm_base']
+        return [self._load('confirm_base', ConfirmBase, storage[confirm_id])
+                for confirm_id in confirm_ids], next_cursor
+    
     # ==================== 资产相关 ====================
     
     def create_user_total_asset(self, asset: UserTotalAsset) -> UserTotalAsset:
         """创建用户总资产"""
-        self._storage['user_total_assets'][asset.asset_id] = asset.model_dump()
+        self._put('user_total_assets', asset.asset_id, asset)
         return asset
     
     def create_user_fund_asset(self, asset: UserFundAsset) -> UserFundAsset:
         """创建用户基金资产"""
-        self._storage['user_fund_assets'][asset.fund_asset_id] = asset.model_dump()
+        self._put('user_fund_assets', asset.fund_asset_id, asset)
         return asset
     
     def get_latest_user_total_asset(self, user_id: str) -> Optional[UserTotalAsset]:
         """获取用户最新总资产"""
         assets = []
-        for asset_data in self._storage['user_total_assets'].values():
-            if asset_data.get('user_id') == user_id:
-                assets.append(UserTotalAsset(**asset_data))
+        for row in self._storage['user_total_assets'].values():
+            if self._field(row, 'user_id') == user_id:
+                assets.append(self._load('user_total_assets', UserTotalAsset, row))
         
         if not assets:
             return None
         
         assets.sort(key=lambda x: x.calc_date, reverse=True)
         return assets[0]
-
-
+    
+    def get_user_asset_summary(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取按增量维护的用户资产汇总（不写入快照）"""
+        return self._asset_book.get(user_id)
+    
+    def list_asset_user_ids(self) -> List[str]:
+        """列出资产聚合中的所有用户"""
+        return self._asset_book.user_ids()
+    
+    def get_product_holders(self, product_id: str) -> Dict[str, Decimal]:
+        """获取产品的持有人及各自持有的总份额"""
+        return self._asset_book.product_holders(product_id)
+    
+    def get_user_holdings(self, user_id: str) -> Dict[str, Decimal]:
+        """获取用户按产品汇总的持有份额"""
+        return self._asset_book.user_holdings(user_id)
+    
+    def get_user_holdings_fixed(self, user_id: str) -> Dict[str, int]:
+        """获取用户按产品汇总的持有份额（4 位小数定点整数，供批量计算使用）"""
+        return self._asset_book.user_holdings_fixed(user_id)
+    
+    def get_user_total_balance(self, user_id: str) -> Optional[Decimal]:
+        """获取用户总余额"""
+        return self._asset_book.get_balance(user_id)
+    
+    def bulk_create_user_total_assets(self, assets: List[UserTotalAsset]) -> int:
+        """批量创建用户总资产，调用方移交实例所有权（模型模式下不再复制）"""
+        return self._bulk_put('user_total_assets', 'asset_id', assets)
+    
+    def bulk_create_user_fund_assets(self, assets: List[UserFundAsset]) -> int:
+        """批量创建用户基金资产，调用方移交实例所有权（模型模式下不再复制）"""
+        return self._bulk_put('user_fund_assets', 'fund_asset_id', assets)
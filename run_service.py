@@ -1,10 +1,55 @@
 """
 启动微服务的便捷脚本
+
+    python run_service.py                 # 单进程（main_v2:app，自动重载）
+    python run_service.py --shards 4      # 按用户分片：4 个 main:app 工作进程 + 路由（见 shard_router.py）
 """
+import argparse
+import os
+import tempfile
 import uvicorn
 import sys
 
+from nav_catalog import NavCatalog
+from sharding import start_shards, stop_shards
+
+
+def run_sharded(shards: int, router_workers: int, port: int):
+    """启动分片工作进程，在前台运行路由，退出时停止工作进程
+    
+    工作进程共用一份共享内存产品净值目录，由本进程创建并在退出时删除。
+    """
+    socket_dir = tempfile.mkdtemp(prefix="fund-shards-")
+    catalog = NavCatalog.create()
+    try:
+        processes = start_shards(shards, socket_dir, env={'NAV_CATALOG': catalog.name})
+    except Exception:
+        catalog.close()
+        raise
+    os.environ["SHARD_SOCKET_DIR"] = socket_dir
+    os.environ["SHARD_COUNT"] = str(shards)
+    # 分片已占用 ID_WORKER_ID 起始的工作进程号，路由进程不再继承，各自自动取得空闲的号
+    os.environ.pop("ID_WORKER_ID", None)
+    try:
+        uvicorn.run(
+            "shard_router:app",
+            host="0.0.0.0",
+            port=port,
+            workers=router_workers,
+            log_level="info"
+        )
+    finally:
+        stop_shards(processes)
+        catalog.close()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="启动基金交易微服务")
+    parser.add_argument("--shards", type=int, default=0, help="按用户分片的工作进程数，0 表示单进程")
+    parser.add_argument("--router-workers", type=int, default=1, help="分片部署时路由的进程数")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    args = parser.parse_args()
+    
     print("=" * 50)
     print("Starting Fund Trading Microservice")
     print("=" * 50)
@@ -16,13 +61,17 @@ if __name__ == "__main__":
     print("\nPress Ctrl+C to stop the service\n")
     
     try:
-        uvicorn.run(
-            "main_v2:app",
-            host="0.0.0.0",
-            port=8000,
-            reload=True,
-            log_level="info"
-        )
+        if args.shards > 0:
+            print(f"Sharded mode: {args.shards} shard workers behind the router")
+            run_sharded(args.shards, args.router_workers, args.port)
+        else:
+            uvicorn.run(
+                "main_v2:app",
+                host="0.0.0.0",
+                port=args.port,
+                reload=True,
+                log_level="info"
+            )
     except KeyboardInterrupt:
         print("\n\nService stopped by user")
         sys.exit(0)
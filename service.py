@@ -1,9 +1,12 @@
 """
 业务服务层 - 实现基金交易系统的核心业务逻辑
 """
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Callable, Iterable, Iterator, Tuple
+from contextlib import contextmanager
 from datetime import datetime, date
 from decimal import Decimal
+import logging
+import time
 import uuid
 from models import (
     User, FundAccount, FundProduct, FundNetValue, UserBalance, FundShare,
@@ -12,18 +15,121 @@ from models import (
     BusinessType, EntrustStatus, TransactionType, ConfirmResultStatus
 )
 from repository import Repository
+from revaluation import RevaluationEngine
+from confirm_queue import ConfirmationQueue
+from common.ids import generate_id
+from common.locks import StripedLock
+from fixed_point import AMOUNT_ROUNDING, SHARE_ROUNDING, quantize, quantized_amount, quantized_share
+
+logger = logging.getLogger(__name__)
+
+# 比较并更新余额/份额失败（被服务之外的写入抢先修改）时的最大重试次数
+CAS_MAX_RETRIES = 8
+
+
+def _subscribe_share(amount: Decimal, net_value: Decimal) -> Decimal:
+    """申购份额 = 金额 / 净值（份额向下舍去到 4 位小数）"""
+    return quantized_share(amount, net_value)
+
+
+def _redeem_amount(share: Decimal, net_value: Decimal) -> Decimal:
+    """赎回金额 = 份额 × 净值（四舍五入到 4 位小数）"""
+    return quantized_amount(share, net_value)
+
+
+def _optional_float(value: Optional[Decimal]) -> Optional[float]:
+    """金额、份额等转换为接口返回的浮点数，空值保持为空"""
+    return None if value is None else float(value)
 
 
 class FundService:
     """基金交易服务"""
     
-    def __init__(self, repository: Repository):
-        """初始化服务"""
+    def __init__(self, repository: Repository, confirm_queue: Optional[ConfirmationQueue] = None,
+                 id_generator: Optional[Callable[[str], str]] = None):
+        """
+        初始化服务
+        
+        Args:
+            repository: 数据仓库
+            confirm_queue: 确认队列；为空时申购/赎回在请求内立即确认，
+                否则请求只冻结并受理委托，由队列后台批量确认
+            id_generator: ID 生成函数（参数为前缀）；分片部署时生成落在本分片的ID
+        """
         self.repo = repository
+        self.confirm_queue = confirm_queue
+        self.id_generator = id_generator
+        # 请求线程与确认线程共用同一份仓库数据：余额的读改写按用户加锁，
+        # 份额的读改写按 账户、产品 加锁，不同用户的交易并行执行
+        self._user_locks = StripedLock()
+        self._position_locks = StripedLock()
+        if confirm_queue is not None:
+            confirm_queue.set_handler(self.confirm_entrusts)
     
     def _generate_id(self, prefix: str = '') -> str:
         """生成唯一ID"""
-        return f"{prefix}{uuid.uuid4().hex[:16]}"
+        if self.id_generator is not None:
+            return self.id_generator(prefix)
+        return generate_id(prefix)
+    
+    @contextmanager
+    def _locked(self, user_ids: Iterable[str] = (),
+                positions: Iterable[Tuple[str, str]] = ()) -> Iterator[None]:
+        """锁定用户余额与持仓份额
+        
+        固定先锁用户、再锁持仓，每组内按锁序号升序加锁，
+        单笔交易、批量下单与异步确认之间不会相互死锁。
+        """
+        with self._user_locks.hold(user_ids), self._position_locks.hold(positions):
+            yield
+    
+    def _check_accepting(self) -> None:
+        """确认队列已停止（服务关闭中）时拒绝受理异步确认的交易，避免冻结后无人确认"""
+        if self.confirm_queue is not None and self.confirm_queue.stopped:
+            raise ValueError("服务正在停止，暂不受理交易")
+    
+    def _enqueue_confirmation(self, item: Dict[str, Any]) -> None:
+        """委托入队异步确认；入队前队列已停止时委托置为 FAILED 并解冻，再向调用方抛出 ValueError"""
+        try:
+            self.confirm_queue.put(item)
+        except ValueError:
+            self._fail_entrust(item, "服务正在停止，委托未受理")
+            raise ValueError("服务正在停止，暂不受理交易")
+    
+    def _get_account(self, fund_account_id: str) -> FundAccount:
+        """获取基金账户，不存在时抛出 ValueError"""
+        account = self.repo.get_fund_account(fund_account_id)
+        if not account:
+            raise ValueError(f"基金账户不存在: {fund_account_id}")
+        return account
+    
+    def _freeze_balance(self, user_id: str, amount: Decimal) -> None:
+        """冻结资金：检查可用余额后比较并更新，余额在读取后被修改时重新读取"""
+        for _ in range(CAS_MAX_RETRIES):
+            balance = self.repo.get_user_balance(user_id)
+            if not balance:
+                raise ValueError(f"用户余额不存在: {user_id}")
+            if balance.available_balance < amount:
+                raise ValueError(f"余额不足: 可用余额{balance.available_balance}, 申购金额{amount}")
+            available, frozen = balance.available_balance, balance.frozen_balance
+            balance.available_balance -= amount
+            balance.frozen_balance += amount
+            if self.repo.compare_and_set_user_balance(balance, available, frozen):
+                return
+        raise ValueError(f"余额更新冲突，请重试: {user_id}")
+    
+    def _freeze_share(self, fund_account_id: str, product_id: str, share: Decimal) -> None:
+        """冻结份额：检查可用份额后比较并更新，份额在读取后被修改时重新读取"""
+        for _ in range(CAS_MAX_RETRIES):
+            fund_share = self.repo.get_fund_share(fund_account_id, product_id)
+            if not fund_share or fund_share.available_share < share:
+                raise ValueError(f"可用份额不足: 请求赎回{share}份")
+            available, frozen = fund_share.available_share, fund_share.frozen_share
+            fund_share.available_share -= share
+            fund_share.frozen_share += share
+            if self.repo.compare_and_set_fund_share(fund_share, available, frozen):
+                return
+        raise ValueError(f"份额更新冲突，请重试: {fund_account_id}/{product_id}")
     
     # ==================== 用户管理 ====================
     
@@ -46,6 +152,23 @@ class FundService:
         """获取用户信息"""
         return self.repo.get_user(user_id)
     
+    def deposit(self, user_id: str, amount: Decimal) -> UserBalance:
+        """入金：增加用户的可用余额与总余额（比较并更新，与交易的资金冻结互不覆盖）"""
+        amount = quantize(amount, AMOUNT_ROUNDING)
+        if amount <= 0:
+            raise ValueError(f"入金金额必须大于0: {amount}")
+        with self._locked(user_ids=[user_id]):
+            for _ in range(CAS_MAX_RETRIES):
+                balance = self.repo.get_user_balance(user_id)
+                if not balance:
+                    raise ValueError(f"用户余额不存在: {user_id}")
+                available, frozen = balance.available_balance, balance.frozen_balance
+                balance.available_balance += amount
+                balance.total_balance += amount
+                if self.repo.compare_and_set_user_balance(balance, available, frozen):
+                    return balance
+        raise ValueError(f"余额更新冲突，请重试: {user_id}")
+    
     # ==================== 基金账户管理 ====================
     
     def open_fund_account(self, user_id: str, account_type: str = "INDIVIDUAL") -> FundAccount:
@@ -96,10 +219,11 @@ class FundService:
                            product_type: str = "EQUITY",
                            risk_level: str = "R3",
                            fund_company: Optional[str] = None,
-                           issue_date: Optional[date] = None) -> FundProduct:
-        """创建基金产品"""
+                           issue_date: Optional[date] = None,
+                           product_id: Optional[str] = None) -> FundProduct:
+        """创建基金产品（product_id 为空时生成；分片部署时由路由统一生成，各分片一致）"""
         product = FundProduct(
-            product_id=self._generate_id('PROD_'),
+            product_id=product_id or self._generate_id('PROD_'),
             product_code=product_code,
             product_name=product_name,
             product_type=product_type,
@@ -123,30 +247,83 @@ class FundService:
                        accumulated_nav: Optional[Decimal] = None,
                        nav_date: Optional[date] = None) -> FundNetValue:
         """创建基金净值"""
-        nav = FundNetValue(
+        return self.repo.create_fund_net_value(self._new_nav(product_id, net_value, accumulated_nav, nav_date))
+    
+    def _new_nav(self, product_id: str, net_value: Decimal, accumulated_nav: Optional[Decimal] = None,
+                 nav_date: Optional[date] = None) -> FundNetValue:
+        """构建（校验）净值记录，不写入"""
+        return FundNetValue(
             nav_id=self._generate_id('NAV_'),
             product_id=product_id,
             net_value=net_value,
             accumulated_nav=accumulated_nav or net_value,
             nav_date=nav_date or date.today()
         )
-        return self.repo.create_fund_net_value(nav)
     
     def get_latest_nav(self, product_id: str) -> Optional[FundNetValue]:
         """获取最新净值"""
         return self.repo.get_latest_nav(product_id)
     
+    def publish_navs(self, navs: List[Dict[str, Any]], nav_date: Optional[date] = None) -> Dict[str, Any]:
+        """
+        批量发布净值并重估相关持仓（日终处理）
+        
+        写入前先校验整批（产品存在、净值合法、批次内与已有净值均无同一产品同一日期的净值），
+        任一项不合法时整批拒绝、不写入；写入中途失败时仍重估已写入的净值，再抛出异常。
+        
+        Args:
+            navs: 净值列表，每项包含 product_id、net_value，可选 accumulated_nav
+            nav_date: 净值日期，默认当天
+        
+        Returns:
+            重估统计信息
+        """
+        nav_date = nav_date or date.today()
+        records = []
+        for item in navs:
+            product_id = item['product_id']
+            if not self.repo.get_fund_product(product_id):
+                raise ValueError(f"基金产品不存在: {product_id}")
+            if any(record.product_id == product_id for record in records):
+                raise ValueError(f"批次中基金净值重复: {product_id} {nav_date.isoformat()}")
+            existing = self.repo.get_nav_as_of(product_id, nav_date)
+            if existing is not None and existing.nav_date == nav_date:
+                raise ValueError(f"基金净值已存在: {product_id} {nav_date.isoformat()}")
+            records.append(self._new_nav(product_id, item['net_value'], item.get('accumulated_nav'), nav_date))
+        
+        batch = {}
+        try:
+            for record in records:
+                nav = self.repo.create_fund_net_value(record)
+                batch[nav.product_id] = nav.net_value
+        except Exception:
+            # 已写入的净值仍需重估，否则持有人资产停留在旧净值
+            if batch:
+                RevaluationEngine(self.repo).revalue(nav_date, batch)
+            raise
+        
+        return RevaluationEngine(self.repo).revalue(nav_date, batch)
+    
     # ==================== 基金申购 ====================
     
     def subscribe_fund(self, fund_account_id: str, product_id: str, amount: Decimal) -> Dict[str, Any]:
-        """申购基金"""
+        """申购基金（锁定该用户的余额；立即确认时同时锁定该持仓）
+        
+        金额按 DECIMAL(18,4) 四舍五入到 4 位小数，确认份额向下舍去到 4 位小数。
+        """
+        amount = quantize(amount, AMOUNT_ROUNDING)
+        if amount <= 0:
+            raise ValueError(f"申购金额必须大于0: {amount}")
+        self._check_accepting()
         # 1. 验证账户
-        account = self.repo.get_fund_account(fund_account_id)
-        if not account:
-            raise ValueError(f"基金账户不存在: {fund_account_id}")
-        
-        user_id = account.user_id
-        
+        user_id = self._get_account(fund_account_id).user_id
+        positions = [(fund_account_id, product_id)] if self.confirm_queue is None else []
+        with self._locked([user_id], positions):
+            return self._subscribe_fund(user_id, fund_account_id, product_id, amount)
+    
+    def _subscribe_fund(self, user_id: str, fund_account_id: str, product_id: str,
+                        amount: Decimal) -> Dict[str, Any]:
+        """申购基金：冻结资金、受理委托，并立即确认或入队异步确认"""
         # 2. 验证产品
         product = self.repo.get_fund_product(product_id)
         if not product:
@@ -157,23 +334,13 @@ class FundService:
         if not nav:
             raise ValueError(f"基金产品无净值数据: {product_id}")
         
-        # 4. 检查用户余额
-        balance = self.repo.get_user_balance(user_id)
-        if not balance:
-            raise ValueError(f"用户余额不存在: {user_id}")
-        
-        if balance.available_balance < amount:
-            raise ValueError(f"余额不足: 可用余额{balance.available_balance}, 申购金额{amount}")
+        # 4. 计算份额
+        share = _subscribe_share(amount, nav.net_value)
         
-        # 5. 计算份额
-        share = amount / nav.net_value
+        # 5. 检查用户余额并冻结资金
+        self._freeze_balance(user_id, amount)
         
-        # 6. 冻结资金
-        balance.available_balance -= amount
-        balance.frozen_balance += amount
-        self.repo.update_user_balance(balance)
-        
-        # 7. 创建委托
+        # 6. 创建委托
         entrust = EntrustBase(
             entrust_id=self._generate_id('ENT_'),
             business_type=BusinessType.FUND_SUBSCRIBE,
@@ -182,13 +349,13 @@ class FundService:
             request_data={
                 "fund_account_id": fund_account_id,
                 "product_id": product_id,
-                "amount": float(amount)
+                "amount": str(amount)
             },
             process_time=datetime.now()
         )
         self.repo.create_entrust(entrust)
         
-        # 8. 创建交易委托详情
+        # 7. 创建交易委托详情
         trans_entrust = FundTransactionEntrust(
             entrust_id=entrust.entrust_id,
             fund_account_id=fund_account_id,
@@ -200,11 +367,25 @@ class FundService:
         )
         self.repo.create_fund_transaction_entrust(trans_entrust)
         
-        # 9. 处理确认（模拟立即确认）
-        self._process_subscribe_confirmation(entrust.entrust_id, fund_account_id, product_id, share, amount)
+        # 8. 处理确认：配置了确认队列时入队异步确认，否则立即确认
+        if self.confirm_queue is not None:
+            self._enqueue_confirmation({
+                "entrust_id": entrust.entrust_id,
+                "transaction_type": TransactionType.SUBSCRIBE,
+                "user_id": user_id,
+                "fund_account_id": fund_account_id,
+                "product_id": product_id,
+                "nav_date": nav.nav_date,
+                "amount": amount
+            })
+            status = EntrustStatus.PENDING
+        else:
+            self._process_subscribe_confirmation(entrust.entrust_id, fund_account_id, product_id, share, amount)
+            status = EntrustStatus.SUCCESS
         
         return {
             "entrust_id": entrust.entrust_id,
+            "status": status.value,
             "fund_account_id": fund_account_id,
             "product_id": product_id,
             "amount": float(amount),
@@ -221,8 +402,8 @@ class FundService:
             entrust.status = EntrustStatus.SUCCESS
             entrust.complete_time = datetime.now()
             entrust.response_data = {
-                "share": float(share),
-                "nav": float(entrust.request_data.get('nav', 0))
+                "share": str(share),
+                "nav": str(entrust.request_data.get('nav', 0))
             }
             self.repo.update_entrust(entrust)
         
@@ -232,7 +413,7 @@ class FundService:
             entrust_id=entrust_id,
             confirm_type="FUND_SUBSCRIBE",
             result_status=ConfirmResultStatus.SUCCESS,
-            confirm_data={"share": float(share), "amount": float(amount)}
+            confirm_data={"share": str(share), "amount": str(amount)}
         )
         self.repo.create_confirm(confirm)
         
@@ -257,45 +438,44 @@ class FundService:
         balance = self.repo.get_user_balance(account.user_id)
         balance.frozen_balance -= amount
         self.repo.update_user_balance(balance)
-        
-        # 5. 重新计算资产
-        self.calculate_user_assets(account.user_id)
     
     # ==================== 基金赎回 ====================
     
     def redeem_fund(self, fund_account_id: str, product_id: str, share: Decimal) -> Dict[str, Any]:
-        """赎回基金"""
+        """赎回基金（锁定该持仓；立即确认时同时锁定该用户的余额）
+        
+        份额按 DECIMAL(18,4) 向下舍去到 4 位小数，赎回金额四舍五入到 4 位小数。
+        """
+        share = quantize(share, SHARE_ROUNDING)
+        if share <= 0:
+            raise ValueError(f"赎回份额必须大于0: {share}")
+        self._check_accepting()
         # 1. 验证账户
-        account = self.repo.get_fund_account(fund_account_id)
-        if not account:
-            raise ValueError(f"基金账户不存在: {fund_account_id}")
-        
-        user_id = account.user_id
-        
+        user_id = self._get_account(fund_account_id).user_id
+        user_ids = [user_id] if self.confirm_queue is None else []
+        with self._locked(user_ids, [(fund_account_id, product_id)]):
+            return self._redeem_fund(user_id, fund_account_id, product_id, share)
+    
+    def _redeem_fund(self, user_id: str, fund_account_id: str, product_id: str,
+                     share: Decimal) -> Dict[str, Any]:
+        """赎回基金：冻结份额、受理委托，并立即确认或入队异步确认"""
         # 2. 验证产品
         product = self.repo.get_fund_product(product_id)
         if not product:
             raise ValueError(f"基金产品不存在: {product_id}")
         
-        # 3. 检查份额
-        fund_share = self.repo.get_fund_share(fund_account_id, product_id)
-        if not fund_share or fund_share.available_share < share:
-            raise ValueError(f"可用份额不足: 请求赎回{share}份")
-        
-        # 4. 获取最新净值
+        # 3. 获取最新净值
         nav = self.repo.get_latest_nav(product_id)
         if not nav:
             raise ValueError(f"基金产品无净值数据: {product_id}")
         
-        # 5. 计算赎回金额
-        amount = share * nav.net_value
+        # 4. 计算赎回金额
+        amount = _redeem_amount(share, nav.net_value)
         
-        # 6. 冻结份额
-        fund_share.available_share -= share
-        fund_share.frozen_share += share
-        self.repo.create_or_update_fund_share(fund_share)
+        # 5. 检查份额并冻结
+        self._freeze_share(fund_account_id, product_id, share)
         
-        # 7. 创建委托
+        # 6. 创建委托
         entrust = EntrustBase(
             entrust_id=self._generate_id('ENT_'),
             business_type=BusinessType.FUND_REDEEM,
@@ -304,13 +484,13 @@ class FundService:
             request_data={
                 "fund_account_id": fund_account_id,
                 "product_id": product_id,
-                "share": float(share)
+                "share": str(share)
             },
             process_time=datetime.now()
         )
         self.repo.create_entrust(entrust)
         
-        # 8. 创建交易委托详情
+        # 7. 创建交易委托详情
         trans_entrust = FundTransactionEntrust(
             entrust_id=entrust.entrust_id,
             fund_account_id=fund_account_id,
@@ -322,11 +502,25 @@ class FundService:
         )
         self.repo.create_fund_transaction_entrust(trans_entrust)
         
-        # 9. 处理确认（模拟立即确认）
-        self._process_redeem_confirmation(entrust.entrust_id, user_id, fund_account_id, product_id, share, amount)
+        # 8. 处理确认：配置了确认队列时入队异步确认，否则立即确认
+        if self.confirm_queue is not None:
+            self._enqueue_confirmation({
+                "entrust_id": entrust.entrust_id,
+                "transaction_type": TransactionType.REDEEM,
+                "user_id": user_id,
+                "fund_account_id": fund_account_id,
+                "product_id": product_id,
+                "nav_date": nav.nav_date,
+                "share": share
+            })
+            status = EntrustStatus.PENDING
+        else:
+            self._process_redeem_confirmation(entrust.entrust_id, user_id, fund_account_id, product_id, share, amount)
+            status = EntrustStatus.SUCCESS
         
         return {
             "entrust_id": entrust.entrust_id,
+            "status": status.value,
             "fund_account_id": fund_account_id,
             "product_id": product_id,
             "share": float(share),
@@ -344,8 +538,8 @@ class FundService:
             entrust.status = EntrustStatus.SUCCESS
             entrust.complete_time = datetime.now()
             entrust.response_data = {
-                "amount": float(amount),
-                "nav": float(entrust.request_data.get('nav', 0))
+                "amount": str(amount),
+                "nav": str(entrust.request_data.get('nav', 0))
             }
             self.repo.update_entrust(entrust)
         
@@ -355,7 +549,7 @@ class FundService:
             entrust_id=entrust_id,
             confirm_type="FUND_REDEEM",
             result_status=ConfirmResultStatus.SUCCESS,
-            confirm_data={"amount": float(amount), "share": float(share)}
+            confirm_data={"amount": str(amount), "share": str(share)}
         )
         self.repo.create_confirm(confirm)
         
@@ -370,86 +564,415 @@ class FundService:
         balance = self.repo.get_user_balance(user_id)
         balance.available_balance += amount
         self.repo.update_user_balance(balance)
+    
+    # ==================== 异步确认 ====================
+    
+    def confirm_entrusts(self, items: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        批量确认已受理的申购/赎回委托（确认队列的批次处理函数）
+        
+        按 产品、净值日期 分组，每组只查询一次净值；组内委托先置为 PROCESSING，
+        再逐笔按该净值确认份额或金额，成功置为 SUCCESS，失败置为 FAILED 并解冻。
+        
+        Args:
+            items: 入队时记录的委托信息
+        
+        Returns:
+            成功与失败的笔数
+        """
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for item in items:
+            groups.setdefault((item['product_id'], item['nav_date']), []).append(item)
+        
+        succeeded = failed = 0
+        for (product_id, nav_date), group in groups.items():
+            nav = self.repo.get_nav_as_of(product_id, nav_date)
+            now = datetime.now()
+            processing = []
+            for item in group:
+                try:
+                    entrust = self.repo.get_entrust(item['entrust_id'])
+                    entrust.status = EntrustStatus.PROCESSING
+                    entrust.process_time = now
+                    self.repo.update_entrust(entrust)
+                except Exception as e:
+                    logger.exception(f"委托置为处理中失败: {item['entrust_id']}")
+                    with self._locked([item['user_id']], [(item['fund_account_id'], product_id)]):
+                        self._fail_entrust_safely(item, f"确认异常: {e}")
+                    failed += 1
+                    continue
+                processing.append(item)
+            
+            # 逐笔锁定该用户与该持仓，确认批次不会长时间阻塞请求线程
+            for item in processing:
+                with self._locked([item['user_id']], [(item['fund_account_id'], product_id)]):
+                    try:
+                        if nav is None:
+                            raise ValueError(f"基金产品无净值数据: {product_id} {nav_date}")
+                        if item['transaction_type'] == TransactionType.SUBSCRIBE:
+                            share = _subscribe_share(item['amount'], nav.net_value)
+                            self._process_subscribe_confirmation(
+                                item['entrust_id'], item['fund_account_id'], product_id, share, item['amount']
+                            )
+                        else:
+                            amount = _redeem_amount(item['share'], nav.net_value)
+                            self._process_redeem_confirmation(
+                                item['entrust_id'], item['user_id'], item['fund_account_id'],
+                                product_id, item['share'], amount
+                            )
+                        succeeded += 1
+                    except ValueError as e:
+                        self._fail_entrust_safely(item, str(e))
+                        failed += 1
+                    except Exception as e:
+                        # 非业务异常同样只让本笔失败并解冻，不中断批次中其余委托
+                        logger.exception(f"委托确认异常: {item['entrust_id']}")
+                        self._fail_entrust_safely(item, f"确认异常: {e}")
+                        failed += 1
+                # 让出 GIL，请求线程无需等待解释器切换间隔
+                time.sleep(0)
+        return {"succeeded": succeeded, "failed": failed}
+    
+    def get_entrust(self, entrust_id: str) -> Optional[EntrustBase]:
+        """获取委托（含异步确认状态）"""
+        return self.repo.get_entrust(entrust_id)
+    
+    def list_user_entrusts(self, user_id: str, status: Optional[str] = None,
+                           business_type: Optional[str] = None, product_id: Optional[str] = None,
+                           start_time: Optional[datetime] = None, end_time: Optional[datetime] = None,
+                           cursor: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        分页查询用户的委托历史（按创建时间倒序）
+        
+        基金交易委托附带账户、产品、交易类型及金额、份额等交易字段。
+        
+        Returns:
+            {"items": 委托列表, "next_cursor": 下一页游标（没有下一页时为 None）}
+        """
+        entrusts, next_cursor = self.repo.list_user_entrusts(
+            user_id, status=status, business_type=business_type, product_id=product_id,
+            start_time=start_time, end_time=end_time, cursor=cursor, limit=limit
+        )
+        items = []
+        for entrust in entrusts:
+            item = entrust.model_dump(mode="json")
+            transaction = self.repo.get_fund_transaction_entrust(entrust.entrust_id)
+            if transaction is not None:
+                item.update({
+                    "fund_account_id": transaction.fund_account_id,
+                    "product_id": transaction.product_id,
+                    "transaction_type": transaction.transaction_type,
+                    "amount": _optional_float(transaction.amount),
+                    "share": _optional_float(transaction.share),
+                    "nav": _optional_float(transaction.nav),
+                    "fee": float(transaction.fee)
+                })
+            items.append(item)
+        return {"items": items, "next_cursor": next_cursor}
+    
+    def list_user_confirms(self, user_id: str, start_time: Optional[datetime] = None,
+                           end_time: Optional[datetime] = None, cursor: Optional[str] = None,
+                           limit: int = 50) -> Dict[str, Any]:
+        """分页查询用户的确认记录（按确认时间倒序），返回 {"items", "next_cursor"}"""
+        confirms, next_cursor = self.repo.list_user_confirms(
+            user_id, start_time=start_time, end_time=end_time, cursor=cursor, limit=limit
+        )
+        return {"items": [confirm.model_dump(mode="json") for confirm in confirms],
+                "next_cursor": next_cursor}
+    
+    def _fail_entrust_safely(self, item: Dict[str, Any], error_msg: str) -> None:
+        """确认失败处理，处理本身出错时记录日志，不中断批次"""
+        try:
+            self._fail_entrust(item, error_msg)
+        except Exception:
+            logger.exception(f"委托失败处理异常: {item['entrust_id']}")
+    
+    def _fail_entrust(self, item: Dict[str, Any], error_msg: str):
+        """确认失败：委托置为 FAILED，写入失败确认记录并解冻资金或份额"""
+        entrust = self.repo.get_entrust(item['entrust_id'])
+        entrust.status = EntrustStatus.FAILED
+        entrust.complete_time = datetime.now()
+        entrust.error_msg = error_msg
+        self.repo.update_entrust(entrust)
+        
+        subscribe = item['transaction_type'] == TransactionType.SUBSCRIBE
+        confirm = ConfirmBase(
+            confirm_id=self._generate_id('CFM_'),
+            entrust_id=item['entrust_id'],
+            confirm_type="FUND_SUBSCRIBE" if subscribe else "FUND_REDEEM",
+            result_status=ConfirmResultStatus.FAILED,
+            remark=error_msg[:500]
+        )
+        self.repo.create_confirm(confirm)
         
-        # 5. 重新计算资产
-        self.calculate_user_assets(user_id)
+        if subscribe:
+            balance = self.repo.get_user_balance(item['user_id'])
+            balance.frozen_balance -= item['amount']
+            balance.available_balance += item['amount']
+            self.repo.update_user_balance(balance)
+        else:
+            fund_share = self.repo.get_fund_share(item['fund_account_id'], item['product_id'])
+            fund_share.frozen_share -= item['share']
+            fund_share.available_share += item['share']
+            self.repo.create_or_update_fund_share(fund_share)
+    
+    # ==================== 批量交易 ====================
+    
+    def submit_orders(self, orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量申购/赎回（订单在批内立即确认，不经过确认队列）
+        
+        整批订单共用一次查询：每个账户、产品、产品净值只解析一次，
+        每个用户的余额、每个持仓的份额只读取和写回一次；订单按顺序在内存中应用
+        （同批次内先申购后赎回可以看到新份额），委托与确认记录批量写入。
+        
+        Args:
+            orders: 订单列表，每项包含 transaction_type（SUBSCRIBE/REDEEM）、
+                fund_account_id、product_id，申购需 amount，赎回需 share
+        
+        Returns:
+            与订单一一对应的处理结果，成功为 {index, success: True, data}，
+            失败为 {index, success: False, error}；data 与单笔接口返回一致
+        """
+        # 整批解析账户（每个只查一次），锁定批内所有用户与持仓
+        accounts: Dict[str, Optional[FundAccount]] = {}
+        positions = set()
+        for order in orders:
+            fund_account_id = order.get('fund_account_id')
+            if fund_account_id not in accounts:
+                accounts[fund_account_id] = self.repo.get_fund_account(fund_account_id)
+            if accounts[fund_account_id]:
+                positions.add((fund_account_id, order.get('product_id')))
+        user_ids = {account.user_id for account in accounts.values() if account}
+        with self._locked(user_ids, positions):
+            return self._submit_orders(orders, accounts)
+    
+    def _submit_orders(self, orders: List[Dict[str, Any]],
+                       accounts: Dict[str, Optional[FundAccount]]) -> List[Dict[str, Any]]:
+        """批量申购/赎回：整批解析、内存中逐笔应用、批量写入"""
+        # 1. 整批解析产品与最新净值（每个只查一次）
+        products: Dict[str, bool] = {}
+        navs: Dict[str, Optional[Decimal]] = {}
+        for order in orders:
+            product_id = order.get('product_id')
+            if product_id not in products:
+                products[product_id] = self.repo.get_fund_product(product_id) is not None
+                nav = self.repo.get_latest_nav(product_id) if products[product_id] else None
+                navs[product_id] = nav.net_value if nav else None
+        
+        # 2. 逐笔在内存中应用，余额与份额按用户/持仓缓存
+        balances: Dict[str, Optional[UserBalance]] = {}
+        shares: Dict[tuple, Optional[FundShare]] = {}
+        changed_users = set()
+        changed_shares = set()
+        entrusts: List[EntrustBase] = []
+        trans_entrusts: List[FundTransactionEntrust] = []
+        confirms: List[ConfirmBase] = []
+        results: List[Dict[str, Any]] = []
+        now = datetime.now()
+        
+        for index, order in enumerate(orders):
+            try:
+                transaction_type = order.get('transaction_type')
+                fund_account_id = order.get('fund_account_id')
+                product_id = order.get('product_id')
+                
+                account = accounts[fund_account_id]
+                if not account:
+                    raise ValueError(f"基金账户不存在: {fund_account_id}")
+                user_id = account.user_id
+                
+                if not products[product_id]:
+                    raise ValueError(f"基金产品不存在: {product_id}")
+                nav = navs[product_id]
+                if nav is None:
+                    raise ValueError(f"基金产品无净值数据: {product_id}")
+                
+                if user_id not in balances:
+                    balances[user_id] = self.repo.get_user_balance(user_id)
+                balance = balances[user_id]
+                if not balance:
+                    raise ValueError(f"用户余额不存在: {user_id}")
+                
+                key = (fund_account_id, product_id)
+                if key not in shares:
+                    shares[key] = self.repo.get_fund_share(fund_account_id, product_id)
+                fund_share = shares[key]
+                
+                if transaction_type == TransactionType.SUBSCRIBE:
+                    amount = order.get('amount')
+                    if amount is not None:
+                        amount = quantize(amount, AMOUNT_ROUNDING)
+                    if amount is None or amount <= 0:
+                        raise ValueError("申购金额必须大于0")
+                    if balance.available_balance < amount:
+                        raise ValueError(f"余额不足: 可用余额{balance.available_balance}, 申购金额{amount}")
+                    share = _subscribe_share(amount, nav)
+                    
+                    # 冻结后立即确认，净效果为扣减可用余额、增加份额
+                    balance.available_balance -= amount
+                    if fund_share:
+                        fund_share.total_share += share
+                        fund_share.available_share += share
+                    else:
+                        shares[key] = FundShare(
+                            share_id=self._generate_id('SHARE_'),
+                            fund_account_id=fund_account_id,
+                            product_id=product_id,
+                            total_share=share,
+                            available_share=share,
+                            frozen_share=Decimal('0')
+                        )
+                    business_type = BusinessType.FUND_SUBSCRIBE
+                    request_data = {"fund_account_id": fund_account_id, "product_id": product_id,
+                                    "amount": str(amount)}
+                    response_data = {"share": str(share), "nav": str(nav)}
+                elif transaction_type == TransactionType.REDEEM:
+                    share = order.get('share')
+                    if share is not None:
+                        share = quantize(share, SHARE_ROUNDING)
+                    if share is None or share <= 0:
+                        raise ValueError("赎回份额必须大于0")
+                    if not fund_share or fund_share.available_share < share:
+                        raise ValueError(f"可用份额不足: 请求赎回{share}份")
+                    amount = _redeem_amount(share, nav)
+                    
+                    # 冻结后立即确认，净效果为扣减份额、增加可用余额
+                    fund_share.total_share -= share
+                    fund_share.available_share -= share
+                    balance.available_balance += amount
+                    business_type = BusinessType.FUND_REDEEM
+                    request_data = {"fund_account_id": fund_account_id, "product_id": product_id,
+                                    "share": str(share)}
+                    response_data = {"amount": str(amount), "nav": str(nav)}
+                else:
+                    raise ValueError(f"不支持的交易类型: {transaction_type}")
+            except ValueError as e:
+                results.append({"index": index, "success": False, "error": str(e)})
+                continue
+            
+            changed_users.add(user_id)
+            changed_shares.add(key)
+            
+            # 3. 生成委托、交易委托详情与确认记录（已确认的最终状态）
+            entrust_id = self._generate_id('ENT_')
+            entrusts.append(EntrustBase(
+                entrust_id=entrust_id,
+                business_type=business_type,
+                status=EntrustStatus.SUCCESS,
+                user_id=user_id,
+                request_data=request_data,
+                response_data=response_data,
+                process_time=now,
+                complete_time=now
+            ))
+            trans_entrusts.append(FundTransactionEntrust(
+                entrust_id=entrust_id,
+                fund_account_id=fund_account_id,
+                product_id=product_id,
+                transaction_type=transaction_type,
+                amount=amount,
+                share=share,
+                nav=nav
+            ))
+            confirms.append(ConfirmBase(
+                confirm_id=self._generate_id('CFM_'),
+                entrust_id=entrust_id,
+                confirm_type=business_type.value,
+                result_status=ConfirmResultStatus.SUCCESS,
+                confirm_data={"share": str(share), "amount": str(amount)}
+            ))
+            results.append({
+                "index": index,
+                "success": True,
+                "data": {
+                    "entrust_id": entrust_id,
+                    "fund_account_id": fund_account_id,
+                    "product_id": product_id,
+                    "amount": float(amount),
+                    "share": float(share),
+                    "nav": float(nav)
+                }
+            })
+        
+        # 4. 批量写入记录，余额和份额各写回一次
+        self.repo.bulk_create_entrusts(entrusts)
+        self.repo.bulk_create_fund_transaction_entrusts(trans_entrusts)
+        self.repo.bulk_create_confirms(confirms)
+        for key in changed_shares:
+            self.repo.create_or_update_fund_share(shares[key])
+        for user_id in changed_users:
+            self.repo.update_user_balance(balances[user_id])
+        
+        return results
     
     # ==================== 资产计算 ====================
     
+    @staticmethod
+    def _format_assets(summary: Dict[str, Any]) -> Dict[str, Any]:
+        """将资产汇总转换为接口返回格式"""
+        return {
+            'user_id': summary['user_id'],
+            'total_asset': float(summary['total_asset']),
+            'total_fund_asset': float(summary['total_fund_asset']),
+            'total_balance': float(summary['total_balance']),
+            'fund_assets': [
+                {
+                    'product_id': item['product_id'],
+                    'share': float(item['share']),
+                    'nav': float(item['nav']),
+                    'value': float(item['value'])
+                }
+                for item in summary['fund_assets']
+            ],
+            'calc_date': summary['calc_date'].isoformat()
+        }
+    
     def calculate_user_assets(self, user_id: str) -> Dict[str, Any]:
-        """计算用户资产"""
-        # 1. 获取用户余额
-        balance = self.repo.get_user_balance(user_id)
-        if not balance:
-            raise ValueError(f"用户余额不存在: {user_id}")
-        
-        total_balance = balance.total_balance
-        
-        # 2. 获取用户所有基金账户
-        accounts = self.repo.get_user_fund_accounts(user_id)
+        """计算用户资产并写入资产快照
         
-        total_fund_value = Decimal('0')
-        fund_assets = []
+        资产汇总由仓库在余额、份额、净值变化时增量维护，这里只按需落快照，
+        交易确认时不再调用。
+        """
+        summary = self.repo.get_user_asset_summary(user_id)
+        if not summary:
+            raise ValueError(f"用户余额不存在: {user_id}")
         
-        # 3. 计算每个产品的基金资产
-        for account in accounts:
-            shares = self.repo.get_account_shares(account.fund_account_id)
-            
-            for share in shares:
-                # 获取最新净值
-                nav = self.repo.get_latest_nav(share.product_id)
-                if nav:
-                    # 计算基金价值
-                    fund_value = share.total_share * nav.net_value
-                    total_fund_value += fund_value
-                    
-                    # 记录基金资产明细
-                    fund_assets.append({
-                        'product_id': share.product_id,
-                        'share': float(share.total_share),
-                        'nav': float(nav.net_value),
-                        'value': float(fund_value)
-                    })
-        
-        # 4. 计算总资产
-        total_asset = total_balance + total_fund_value
-        
-        # 5. 更新用户总资产表
+        calc_date = summary['calc_date']
         asset = UserTotalAsset(
             asset_id=self._generate_id('ASSET_'),
             user_id=user_id,
-            total_asset=total_asset,
-            total_fund_asset=total_fund_value,
-            total_balance=total_balance,
-            calc_date=date.today()
+            total_asset=summary['total_asset'],
+            total_fund_asset=summary['total_fund_asset'],
+            total_balance=summary['total_balance'],
+            calc_date=calc_date
         )
         self.repo.create_user_total_asset(asset)
         
-        # 6. 更新用户基金资产表
-        for fund_asset_info in fund_assets:
+        for item in summary['fund_assets']:
             fund_asset = UserFundAsset(
                 fund_asset_id=self._generate_id('FA_'),
                 user_id=user_id,
-                product_id=fund_asset_info['product_id'],
-                fund_share=Decimal(str(fund_asset_info['share'])),
-                fund_value=Decimal(str(fund_asset_info['value'])),
-                nav=Decimal(str(fund_asset_info['nav'])),
-                calc_date=date.today()
+                product_id=item['product_id'],
+                fund_share=item['share'],
+                fund_value=item['value'],
+                nav=item['nav'],
+                calc_date=calc_date
             )
             self.repo.create_user_fund_asset(fund_asset)
         
-        return {
-            'user_id': user_id,
-            'total_asset': float(total_asset),
-            'total_fund_asset': float(total_fund_value),
-            'total_balance': float(total_balance),
-            'fund_assets': fund_assets,
-            'calc_date': date.today().isoformat()
-        }
+        return self._format_assets(summary)
+    
+    def snapshot_all_user_assets(self) -> int:
+        """为所有用户写入资产快照（供定时任务调用），返回写入的用户数"""
+        user_ids = self.repo.list_asset_user_ids()
+        for user_id in user_ids:
+            self.calculate_user_assets(user_id)
+        return len(user_ids)
     
     def get_user_assets(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """获取用户资产"""
-        # 先计算最新资产
-        return self.calculate_user_assets(user_id)
-
-
+        """获取用户资产（读取增量维护的汇总，不写快照）"""
+        summary = self.repo.get_user_asset_summary(user_id)
+        if not summary:
+            return None
+        return self._format_assets(summary)
@@ -0,0 +1,239 @@
+"""
+分片路由 - 对外提供与 main.py 相同的接口，按用户把请求转发到所属分片的工作进程
+
+部署方式（run_service.py --shards N）：
+  N 个工作进程各运行一份 main:app，只保存本分片用户的数据，监听各自的 Unix 套接字；
+  路由进程对外监听端口，按请求中的 用户ID / 基金账户ID 计算所属分片并转发。
+  用户、账户、委托的ID由所属分片生成（见 sharding.ShardIdGenerator），路由无需映射表；
+  产品和净值在每个分片各存一份，写入时由路由同步写到全部分片，读取时任选一个分片。
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import JSONResponse
+
+from common.ids import generate_id, worker_id
+from sharding import shard_of, socket_path
+
+logger = logging.getLogger(__name__)
+
+# 转发请求时透传的请求头
+_FORWARD_HEADERS = ('authorization', 'content-type', 'if-none-match', 'idempotency-key')
+# 原样返回给客户端的分片响应头
+_RETURN_HEADERS = ('etag', 'x-next-cursor', 'idempotent-replayed')
+
+
+class ShardRouter:
+    """分片路由：每个分片一个保持连接的 HTTP 客户端"""
+    
+    def __init__(self, transports: List[httpx.AsyncBaseTransport], timeout: float = 30):
+        """
+        初始化路由
+        
+        Args:
+            transports: 按分片序号排列的传输层（生产为 Unix 套接字，测试可用 ASGITransport）
+            timeout: 转发请求的超时时间（秒）
+        """
+        if not transports:
+            raise ValueError("至少需要一个分片")
+        self.clients = [
+            httpx.AsyncClient(transport=transport, base_url=f"http://shard{index}", timeout=timeout)
+            for index, transport in enumerate(transports)
+        ]
+        self._round_robin = itertools.count()
+    
+    @classmethod
+    def connect(cls, socket_dir: str, shard_count: int, timeout: float = 30) -> "ShardRouter":
+        """连接监听在 socket_dir 下的各分片工作进程"""
+        return cls([
+            httpx.AsyncHTTPTransport(uds=socket_path(socket_dir, index))
+            for index in range(shard_count)
+        ], timeout=timeout)
+    
+    @property
+    def shard_count(self) -> int:
+        """分片数"""
+        return len(self.clients)
+    
+    def shard_for(self, key: Optional[str]) -> int:
+        """ID所属的分片；请求缺少ID时交给 0 号分片，由其返回参数校验错误"""
+        return shard_of(key, self.shard_count) if isinstance(key, str) else 0
+    
+    def any_shard(self) -> int:
+        """轮流选择分片（新用户的归属、已复制数据的读取）"""
+        return next(self._round_robin) % self.shard_count
+    
+    async def send(self, shard: int, request: Request, path: Optional[str] = None,
+                   body: Optional[bytes] = None, params: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """把请求转发到指定分片"""
+        headers = {name: request.headers[name] for name in _FORWARD_HEADERS if name in request.headers}
+        return await self.clients[shard].request(
+            request.method,
+            path or request.url.path,
+            content=body if body is not None else await request.body(),
+            params=params if params is not None else request.url.query,
+            headers=headers
+        )
+    
+    async def forward(self, shard: int, request: Request, **kwargs: Any) -> Response:
+        """转发请求并原样返回分片的响应"""
+        return _to_response(await self.send(shard, request, **kwargs))
+    
+    async def broadcast(self, request: Request, **kwargs: Any) -> Response:
+        """写入复制数据：先写 0 号分片，成功后并发写其余分片，返回 0 号分片的响应"""
+        body = await request.body()
+        primary = await self.send(0, request, body=body, **kwargs)
+        if primary.status_code >= 400 or self.shard_count == 1:
+            return _to_response(primary)
+        replicas = await asyncio.gather(*[
+            self.send(shard, request, body=body, **kwargs) for shard in range(1, self.shard_count)
+        ], return_exceptions=True)
+        failed = [
+            shard for shard, reply in enumerate(replicas, start=1)
+            if isinstance(reply, Exception) or reply.status_code >= 400
+        ]
+        if failed:
+            logger.error(f"分片同步失败: {request.url.path} 分片{failed}")
+            return JSONResponse(status_code=status.HTTP_502_BAD_GATEWAY,
+                                content={"detail": f"分片同步失败: {failed}"})
+        return _to_response(primary)
+    
+    async def close(self) -> None:
+        """关闭到各分片的连接"""
+        for client in self.clients:
+            await client.aclose()
+
+
+def _to_response(reply: httpx.Response) -> Response:
+    """分片响应转换为路由响应"""
+    headers = {name: reply.headers[name] for name in _RETURN_HEADERS if name in reply.headers}
+    return Response(content=reply.content, status_code=reply.status_code,
+                    media_type=reply.headers.get('content-type'), headers=headers)
+
+
+def _body_field(body: bytes, field: str) -> Optional[str]:
+    """从 JSON 请求体中读取路由字段，请求体无法解析时返回 None"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    return data.get(field) if isinstance(data, dict) else None
+
+
+def create_app(router: ShardRouter) -> FastAPI:
+    """创建路由应用"""
+    app = FastAPI(
+        title="基金交易微服务（分片路由）",
+        description="按用户分片转发到各工作进程",
+        version="1.0.0"
+    )
+    
+    @app.on_event("startup")
+    async def startup_event():
+        # 先取得ID工作进程号：与本机其他进程冲突时在启动阶段失败
+        worker_id()
+    
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        await router.close()
+    
+    @app.get("/")
+    async def root():
+        """根端点"""
+        return {
+            "service": "基金交易微服务",
+            "version": "1.0.0",
+            "status": "运行中",
+            "shards": router.shard_count
+        }
+    
+    @app.get("/api/v1/health")
+    async def health_check(request: Request):
+        """健康检查：全部分片健康才返回健康"""
+        replies = await asyncio.gather(*[
+            router.send(shard, request) for shard in range(router.shard_count)
+        ], return_exceptions=True)
+        healthy = all(not isinstance(reply, Exception) and reply.status_code == 200 for reply in replies)
+        return JSONResponse(
+            status_code=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "healthy" if healthy else "degraded", "timestamp": str(date.today())}
+        )
+    
+    # ==================== 按用户路由 ====================
+    
+    @app.post("/api/v1/users")
+    async def create_user(request: Request):
+        """创建用户：轮流分配到分片，用户ID由该分片生成"""
+        return await router.forward(router.any_shard(), request)
+    
+    @app.get("/api/v1/users/{user_id}")
+    async def get_user(user_id: str, request: Request):
+        """获取用户信息"""
+        return await router.forward(router.shard_for(user_id), request)
+    
+    @app.get("/api/v1/assets/{user_id}")
+    async def get_user_assets(user_id: str, request: Request):
+        """获取用户资产"""
+        return await router.forward(router.shard_for(user_id), request)
+    
+    @app.get("/api/v1/users/{user_id}/entrusts")
+    async def list_user_entrusts(user_id: str, request: Request):
+        """查询用户委托历史：用户的委托都在其所属分片，游标原样转发"""
+        return await router.forward(router.shard_for(user_id), request)
+    
+    @app.get("/api/v1/users/{user_id}/confirms")
+    async def list_user_confirms(user_id: str, request: Request):
+        """查询用户确认记录"""
+        return await router.forward(router.shard_for(user_id), request)
+    
+    @app.post("/api/v1/accounts/open")
+    async def open_fund_account(request: Request):
+        """开通基金账户：转发到用户所属分片，账户ID与用户同分片"""
+        body = await request.body()
+        return await router.forward(router.shard_for(_body_field(body, 'user_id')), request, body=body)
+    
+    @app.post("/api/v1/funds/subscribe")
+    async def subscribe_fund(request: Request):
+        """申购基金：转发到基金账户所属分片"""
+        body = await request.body()
+        return await router.forward(router.shard_for(_body_field(body, 'fund_account_id')), request, body=body)
+    
+    @app.post("/api/v1/funds/redeem")
+    async def redeem_fund(request: Request):
+        """赎回基金：转发到基金账户所属分片"""
+        body = await request.body()
+        return await router.forward(router.shard_for(_body_field(body, 'fund_account_id')), request, body=body)
+    
+    # ==================== 复制数据 ====================
+    
+    @app.get("/api/v1/products")
+    async def get_products(request: Request):
+        """获取基金产品列表（任选一个分片）"""
+        return await router.forward(router.any_shard(), request)
+    
+    @app.post("/api/v1/products")
+    async def create_product(request: Request):
+        """创建基金产品：由路由生成产品ID，写入全部分片"""
+        return await router.broadcast(request, path="/internal/products",
+                                      params={'product_id': generate_id('PROD_')})
+    
+    @app.post("/api/v1/nav")
+    async def create_nav(request: Request):
+        """创建基金净值：写入全部分片"""
+        return await router.broadcast(request)
+    
+    return app
+
+
+# uvicorn shard_router:app 启动时按环境变量连接分片（run_service.py --shards 设置）
+app = (
+    create_app(ShardRouter.connect(os.environ["SHARD_SOCKET_DIR"], int(os.environ["SHARD_COUNT"])))
+    if os.getenv("SHARD_SOCKET_DIR") else None
+)
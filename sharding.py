@@ -0,0 +1,126 @@
+"""
+用户分片 - 按用户哈希把数据分布到多个工作进程，路由按请求中的ID转发到所属分片
+"""
+import os
+import subprocess
+import sys
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import httpx
+
+from common.ids import MAX_WORKER_ID, generate_id
+
+
+def shard_of(key: str, shard_count: int) -> int:
+    """计算ID所属的分片（crc32 取模，跨进程稳定，不受 PYTHONHASHSEED 影响）"""
+    return zlib.crc32(key.encode()) % shard_count
+
+
+class ShardIdGenerator:
+    """分片ID生成器
+    
+    依次生成按时间递增的ID，直到其哈希落在本分片为止（平均尝试 分片数 次），
+    ID 格式与单进程部署一致。一个ID只属于一个分片，各分片生成的ID不会重复。用户、基金账户、委托的ID由所属分片生成，
+    路由只凭ID即可计算出所属分片，不需要维护映射表。
+    """
+    
+    def __init__(self, shard_index: int, shard_count: int):
+        """
+        初始化ID生成器
+        
+        Args:
+            shard_index: 本分片序号
+            shard_count: 分片总数
+        """
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"分片序号超出范围: {shard_index}/{shard_count}")
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+    
+    def __call__(self, prefix: str = '') -> str:
+        """生成落在本分片的唯一ID"""
+        while True:
+            key = generate_id(prefix)
+            if shard_of(key, self.shard_count) == self.shard_index:
+                return key
+
+
+# ==================== 工作进程 ====================
+
+def socket_path(socket_dir: str, shard_index: int) -> str:
+    """分片工作进程监听的 Unix 套接字路径"""
+    return os.path.join(socket_dir, f"fund-shard-{shard_index}.sock")
+
+
+def start_shards(shard_count: int, socket_dir: str, app: str = "main:app",
+                 env: Optional[Dict[str, str]] = None, timeout: float = 30) -> List[subprocess.Popen]:
+    """
+    启动分片工作进程，每个进程运行一份 app 并监听各自的 Unix 套接字
+    
+    Args:
+        shard_count: 分片数
+        socket_dir: 套接字目录
+        app: uvicorn 应用路径
+        env: 额外的环境变量（如 DATA_DIR、STORAGE_BACKEND）
+        timeout: 等待全部分片就绪的最长时间（秒）
+    
+    Returns:
+        工作进程列表，按分片序号排列
+    
+    各分片的ID工作进程号（ID_WORKER_ID）为 起始值 + 分片序号，互不相同，同一毫秒内生成的ID不会重复；
+    起始值取 env 或当前环境中的 ID_WORKER_ID，未设置时为 0（多机部署时各机器的起始值须错开）。
+    """
+    worker_base = int((env or {}).get('ID_WORKER_ID') or os.getenv('ID_WORKER_ID') or 0)
+    if worker_base < 0 or worker_base + shard_count - 1 > MAX_WORKER_ID:
+        raise ValueError(f"分片的工作进程号超出范围: {worker_base}+{shard_count}")
+    os.makedirs(socket_dir, exist_ok=True)
+    project_root = os.path.dirname(os.path.abspath(__file__))
+    processes = []
+    for shard_index in range(shard_count):
+        path = socket_path(socket_dir, shard_index)
+        if os.path.exists(path):
+            os.remove(path)
+        shard_env = {**os.environ, **(env or {}),
+                     'SHARD_INDEX': str(shard_index), 'SHARD_COUNT': str(shard_count),
+                     'ID_WORKER_ID': str(worker_base + shard_index)}
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--uds", path, "--log-level", "warning"],
+            cwd=project_root, env=shard_env
+        ))
+    try:
+        for shard_index, process in enumerate(processes):
+            _wait_ready(socket_path(socket_dir, shard_index), process, timeout)
+    except Exception:
+        stop_shards(processes)
+        raise
+    return processes
+
+
+def _wait_ready(path: str, process: subprocess.Popen, timeout: float) -> None:
+    """等待分片的健康检查接口可用"""
+    deadline = time.monotonic() + timeout
+    with httpx.Client(transport=httpx.HTTPTransport(uds=path), base_url="http://shard") as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"分片进程启动失败: {path}，退出码 {process.returncode}")
+            try:
+                if client.get("/api/v1/health").status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+    raise RuntimeError(f"等待分片就绪超时: {path}")
+
+
+def stop_shards(processes: List[subprocess.Popen], timeout: float = 10) -> None:
+    """停止分片工作进程（SIGTERM 触发应用的关闭流程）"""
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
@@ -0,0 +1,329 @@
+"""
+SQLite 数据存储层 - 与 Repository 接口一致，数据存放在由 database/schema.sql 生成的表中
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from common.schema import ENTRUST_BASE_SQL, load_schema, parse_schema
+from common.sqlite_store import SqliteStore
+from fixed_point import from_fixed, round_product, to_fixed
+from models import (
+    ConfirmBase, EntrustBase, FundAccount, FundNetValue, FundProduct, FundShare,
+    FundTransactionEntrust, UserBalance, UserTotalAsset
+)
+from nav_catalog import NavCatalog
+from order_history import _page
+from repository import Repository, SCHEMA_TABLE_NAMES, STORAGE_MODE_DICT, _TABLE_MODELS
+
+# 查询用到、schema.sql 中没有的索引：仓库表名 -> [(索引名, 列)]
+_LOOKUP_INDEXES = {
+    'fund_shares': [('idx_product_share', ('product_id',))],
+}
+
+
+class SqliteLookupMixin:
+    """按 SQL 索引查询的仓库操作（与 Repository 或其子类一起继承，各表的存储须为 SqliteTable）
+    
+    二级索引、净值序列、委托历史和资产聚合都不在内存中维护，数据量可以超过内存：
+        用户余额          uk_user_balance       (user_id)
+        用户的基金账户    idx_user_account      (user_id, account_status)
+        账户的基金份额    uk_account_product    (fund_account_id, product_id)
+        产品的持有人      idx_product_share     (product_id)
+        净值按日期查询    uk_product_nav_date   (product_id, nav_date)
+        用户的委托        idx_user_time         (user_id, create_time)
+        用户的确认        idx_user_time + idx_entrust_confirm（确认的用户取自所属委托）
+    同一产品同一日期的净值、同一账户同一产品的份额由唯一索引拒绝重复。
+    资产汇总在读取时由余额、份额和各产品最新净值计算，与 UserAssetBook 的结果一致。
+    """
+    
+    # ==================== 派生结构 ====================
+    
+    def _rebuild_derived(self) -> None:
+        """不在内存中重建派生结构，只补建查询用到的索引"""
+        for table, indexes in _LOOKUP_INDEXES.items():
+            storage = self._storage[table]
+            with storage.pool.connection() as conn:
+                for name, columns in indexes:
+                    column_list = ', '.join(f'"{column}"' for column in columns)
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "{storage.name}__{name}" '
+                                 f'ON "{storage.name}" ({column_list})')
+    
+    def _index_balance(self, balance: UserBalance) -> None:
+        """由 uk_user_balance 查询，不登记"""
+    
+    def _index_account(self, account: FundAccount) -> None:
+        """由 idx_user_account 查询，不登记"""
+    
+    def _index_share(self, share: FundShare) -> None:
+        """由 uk_account_product 查询并拒绝重复，不登记"""
+    
+    def _index_position(self, fund_account_id: str, product_id: str, total_share: Decimal) -> None:
+        """资产汇总读取时计算，不登记"""
+    
+    def _index_entrust(self, entrust: EntrustBase) -> None:
+        """由 idx_user_time 查询，不登记"""
+    
+    def _index_transaction(self, entrust: FundTransactionEntrust) -> None:
+        """按委托ID连接查询，不登记"""
+    
+    def _index_confirm(self, confirm: ConfirmBase) -> None:
+        """按所属委托连接查询，不登记"""
+    
+    # ==================== 基金账户与余额 ====================
+    
+    def get_user_fund_accounts(self, user_id: str) -> List[FundAccount]:
+        """获取用户的所有基金账户（idx_user_account）"""
+        return [self._load('fund_accounts', FundAccount, row)
+                for row in self._storage['fund_accounts'].select({'user_id': user_id})]
+    
+    def get_user_balance(self, user_id: str) -> Optional[UserBalance]:
+        """获取用户余额（uk_user_balance）"""
+        rows = self._storage['user_balances'].select({'user_id': user_id}, limit=1)
+        return self._load('user_balances', UserBalance, rows[0]) if rows else None
+    
+    def get_user_total_balance(self, user_id: str) -> Optional[Decimal]:
+        """获取用户总余额（按资产聚合的精度）"""
+        rows = self._storage['user_balances'].select({'user_id': user_id}, limit=1)
+        return from_fixed(to_fixed(rows[0]['total_balance'])) if rows else None
+    
+    # ==================== 基金份额 ====================
+    
+    def get_fund_share(self, fund_account_id: str, product_id: str) -> Optional[FundShare]:
+        """获取基金份额（uk_account_product）"""
+        rows = self._storage['fund_shares'].select(
+            {'fund_account_id': fund_account_id, 'product_id': product_id}, limit=1
+        )
+        return self._load('fund_shares', FundShare, rows[0]) if rows else None
+    
+    def get_account_shares(self, fund_account_id: str) -> List[FundShare]:
+        """获取账户的所有份额（uk_account_product 最左前缀）"""
+        return [self._load('fund_shares', FundShare, row)
+                for row in self._storage['fund_shares'].select({'fund_account_id': fund_account_id})]
+    
+    # ==================== 基金净值 ====================
+    
+    def attach_catalog(self, catalog: NavCatalog) -> None:
+        """接入共享内存产品净值目录，本仓库已有的产品及其最新净值先写入目录"""
+        for row in self._storage['fund_products'].values():
+            product = self._load('fund_products', FundProduct, row)
+            catalog.publish_product(product)
+            latest = self._navs(product.product_id, limit=1)
+            if latest:
+                catalog.publish_nav(latest[0])
+        self._catalog = catalog
+    
+    def create_fund_net_value(self, nav: FundNetValue) -> FundNetValue:
+        """创建基金净值（同一产品同一日期的重复净值由唯一索引 uk_product_nav_date 拒绝）"""
+        self._put('fund_net_values', nav.nav_id, nav)
+        self._product_version += 1
+        if self._catalog is not None:
+            self._catalog.publish_nav(nav)
+        return nav
+    
+    def get_latest_nav(self, product_id: str) -> Optional[FundNetValue]:
+        """获取最新净值"""
+        if self._catalog is not None:
+            fields = self._catalog.get_latest_nav(product_id)
+            if fields is not None:
+                return self._construct_model(FundNetValue, fields)
+        navs = self._navs(product_id, limit=1)
+        return navs[0] if navs else None
+    
+    def get_nav_as_of(self, product_id: str, as_of_date: date) -> Optional[FundNetValue]:
+        """获取指定日期（含）之前最近的净值"""
+        navs = self._navs(product_id, ['t.nav_date <= ?'], [as_of_date], limit=1)
+        return navs[0] if navs else None
+    
+    def list_navs_by_product(self, product_id: str,
+                             start_date: Optional[date] = None,
+                             end_date: Optional[date] = None) -> List[FundNetValue]:
+        """获取产品的净值记录（按日期倒序，可按日期区间过滤）"""
+        conditions, params = [], []
+        if start_date is not None:
+            conditions.append('t.nav_date >= ?')
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append('t.nav_date <= ?')
+            params.append(end_date)
+        return self._navs(product_id, conditions, params)
+    
+    def _navs(self, product_id: str, conditions: Sequence[str] = (), params: Sequence[Any] = (),
+              limit: Optional[int] = None) -> List[FundNetValue]:
+        """按 uk_product_nav_date 查询产品的净值，按日期倒序"""
+        rows = self._storage['fund_net_values'].query(
+            ' AND '.join(['t.product_id = ?', *conditions]), [product_id, *params],
+            order_by='t.nav_date DESC', limit=limit
+        )
+        return [self._load('fund_net_values', FundNetValue, row) for row in rows]
+    
+    # ==================== 委托与确认 ====================
+    
+    def list_user_entrusts(self, user_id: str, status: Optional[str] = None,
+                           business_type: Optional[str] = None, product_id: Optional[str] = None,
+                           start_time: Optional[datetime] = None, end_time: Optional[datetime] = None,
+                           cursor: Optional[str] = None,
+                           limit: int = 50) -> Tuple[List[EntrustBase], Optional[str]]:
+        """按创建时间倒序分页查询用户的委托（idx_user_time，按产品过滤时连接基金交易委托）"""
+        entrusts = self._storage['entrust_base']
+        conditions, params, join = ['t.user_id = ?'], [user_id], ''
+        for column, value in (('status', status), ('business_type', business_type)):
+            if value is not None:
+                conditions.append(f't.{column} = ?')
+                params.append(value)
+        if product_id is not None:
+            join = (f'JOIN "{self._storage["fund_transaction_entrusts"].name}" AS f '
+                    f'ON f.entrust_id = t.entrust_id')
+            conditions.append('f.product_id = ?')
+            params.append(product_id)
+        self._time_range(conditions, params, 't.create_time', 't.entrust_id', start_time, end_time,
+                         cursor, entrusts, 'create_time')
+        rows = entrusts.query(' AND '.join(conditions), params, join=join,
+                              order_by='t.create_time DESC, t.entrust_id DESC', limit=limit + 1)
+        rows, next_cursor = _page(rows, limit)
+        return ([self._load('entrust_base', EntrustBase, row) for row in rows],
+                next_cursor['entrust_id'] if next_cursor else None)
+    
+    def list_user_confirms(self, user_id: str, start_time: Optional[datetime] = None,
+                           end_time: Optional[datetime] = None, cursor: Optional[str] = None,
+                           limit: int = 50) -> Tuple[List[ConfirmBase], Optional[str]]:
+        """按确认时间倒序分页查询用户的确认记录（经所属委托按用户过滤），返回 (确认列表, 下一页游标)"""
+        confirms = self._storage['confirm_base']
+        conditions, params = ['e.user_id = ?'], [user_id]
+        self._time_range(conditions, params, 't.confirm_time', 't.confirm_id', start_time, end_time,
+                         cursor, confirms, 'confirm_time')
+        rows = confirms.query(
+            ' AND '.join(conditions), params,
+            join=f'JOIN "{self._storage["entrust_base"].name}" AS e ON e.entrust_id = t.entrust_id',
+            order_by='t.confirm_time DESC, t.confirm_id DESC', limit=limit + 1
+        )
+        rows, next_cursor = _page(rows, limit)
+        return ([self._load('confirm_base', ConfirmBase, row) for row in rows],
+                next_cursor['confirm_id'] if next_cursor else None)
+    
+    @staticmethod
+    def _time_range(conditions: List[str], params: List[Any], time_column: str, id_column: str,
+                    start: Optional[datetime], end: Optional[datetime], cursor: Optional[str],
+                    table: Any, time_field: str) -> None:
+        """追加时间区间与游标条件：游标为上一页最后一条记录的ID，本页从其 (时间, ID) 之后继续"""
+        if start is not None:
+            conditions.append(f'{time_column} >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append(f'{time_column} < ?')
+            params.append(end)
+        if cursor is not None:
+            record = table.get(cursor)
+            if record is None:
+                raise ValueError(f"无效的分页游标: {cursor}")
+            conditions.append(f'({time_column} < ? OR {time_column} = ? AND {id_column} < ?)')
+            params.extend((record[time_field], record[time_field], cursor))
+    
+    # ==================== 资产 ====================
+    
+    def get_latest_user_total_asset(self, user_id: str) -> Optional[UserTotalAsset]:
+        """获取用户最新总资产（按 idx_user_date 索引查询）"""
+        rows = self._storage['user_total_assets'].select(
+            {'user_id': user_id}, order_by='calc_date', descending=True, limit=1
+        )
+        return self._load('user_total_assets', UserTotalAsset, rows[0]) if rows else None
+    
+    def get_user_asset_summary(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取用户资产汇总：由余额、各持仓份额与产品最新净值计算（与 UserAssetBook.get 的结果一致）"""
+        total_balance = self.get_user_total_balance(user_id)
+        if total_balance is None:
+            return None
+        navs: Dict[str, Optional[int]] = {}
+        fund_assets, fund_value = [], 0
+        for fund_account_id, product_id, share in self._user_positions(user_id):
+            if product_id not in navs:
+                latest = self._navs(product_id, limit=1)
+                navs[product_id] = to_fixed(latest[0].net_value) if latest else None
+            nav = navs[product_id]
+            if nav is None:
+                continue
+            fund_value += share * nav
+            fund_assets.append({
+                'fund_account_id': fund_account_id,
+                'product_id': product_id,
+                'share': from_fixed(share),
+                'nav': from_fixed(nav),
+                'value': from_fixed(round_product(share * nav))
+            })
+        total_fund_value = from_fixed(round_product(fund_value))
+        return {
+            'user_id': user_id,
+            'total_asset': total_balance + total_fund_value,
+            'total_fund_asset': total_fund_value,
+            'total_balance': total_balance,
+            'fund_assets': fund_assets,
+            'calc_date': date.today()
+        }
+    
+    def list_asset_user_ids(self) -> List[str]:
+        """列出所有有余额记录的用户"""
+        balances = self._storage['user_balances']
+        return [row[0] for row in balances.execute(f'SELECT user_id FROM "{balances.name}" ORDER BY rowid')]
+    
+    def get_product_holders(self, product_id: str) -> Dict[str, Decimal]:
+        """获取产品的持有人及各自持有的总份额（idx_product_share 连接基金账户）"""
+        shares, accounts = self._storage['fund_shares'], self._storage['fund_accounts']
+        holders: Dict[str, int] = {}
+        for user_id, total_share in shares.execute(
+                f'SELECT a.user_id, s.total_share FROM "{shares.name}" AS s '
+                f'JOIN "{accounts.name}" AS a ON a.fund_account_id = s.fund_account_id '
+                f'WHERE s.product_id = ?', (product_id,)):
+            holders[user_id] = holders.get(user_id, 0) + to_fixed(Decimal(total_share or 0))
+        return {user_id: from_fixed(share) for user_id, share in holders.items()}
+    
+    def get_user_holdings(self, user_id: str) -> Dict[str, Decimal]:
+        """获取用户按产品汇总的持有份额"""
+        return {product_id: from_fixed(share) for product_id, share in self.get_user_holdings_fixed(user_id).items()}
+    
+    def get_user_holdings_fixed(self, user_id: str) -> Dict[str, int]:
+        """获取用户按产品汇总的持有份额（4 位小数定点整数，供批量计算使用）"""
+        holdings: Dict[str, int] = {}
+        for _, product_id, share in self._user_positions(user_id):
+            holdings[product_id] = holdings.get(product_id, 0) + share
+        return holdings
+    
+    def _user_positions(self, user_id: str) -> List[Tuple[str, str, int]]:
+        """用户各基金账户的持仓 (基金账户ID, 产品ID, 定点总份额)（idx_user_account 连接 uk_account_product）"""
+        shares, accounts = self._storage['fund_shares'], self._storage['fund_accounts']
+        rows = shares.execute(
+            f'SELECT s.fund_account_id, s.product_id, s.total_share FROM "{accounts.name}" AS a '
+            f'JOIN "{shares.name}" AS s ON s.fund_account_id = a.fund_account_id '
+            f'WHERE a.user_id = ? ORDER BY s.rowid', (user_id,)
+        )
+        return [(account_id, product_id, to_fixed(Decimal(total_share or 0)))
+                for account_id, product_id, total_share in rows]
+
+
+class SqliteRepository(SqliteLookupMixin, Repository):
+    """SQLite 数据仓库
+    
+    以字典模式复用 Repository 的全部业务逻辑，只把每张表的存储换成 SqliteTable；
+    按用户、账户、产品的查询由 SqliteLookupMixin 用表上的索引完成，不在内存中维护派生结构，
+    打开数据库时也不需要加载数据。FundService 无需任何修改即可使用。
+    """
+    
+    def __init__(self, path: str, pool_size: int = 4):
+        """
+        初始化数据仓库
+        
+        Args:
+            path: 数据库文件路径，':memory:' 表示内存数据库
+            pool_size: 连接池大小
+        """
+        super().__init__(storage_mode=STORAGE_MODE_DICT)
+        self.store = SqliteStore(path, pool_size=pool_size)
+        schemas = {**load_schema(), **parse_schema(ENTRUST_BASE_SQL)}
+        for table, schema_table in SCHEMA_TABLE_NAMES.items():
+            self._storage[table] = self.store.create_table(
+                schemas[schema_table], fields=list(_TABLE_MODELS[table].model_fields)
+            )
+        self._rebuild_derived()
+    
+    def close(self) -> None:
+        """关闭数据库连接"""
+        self.store.close()
@@ -0,0 +1,100 @@
+"""
+测试异步客户端
+"""
+import asyncio
+import os
+import sys
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+
+from async_client import AsyncFundClient
+
+
+class _CountingTransport(httpx.AsyncBaseTransport):
+    """记录同时在途请求数的传输"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    async def handle_async_request(self, request):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return httpx.Response(200, json={"code": 0, "message": "success", "data": {"path": request.url.path}})
+
+
+class TestAsyncFundClient:
+    """测试异步客户端的业务方法与并发控制"""
+
+    def test_trading_flow(self):
+        """测试经 main:app 完成建产品、开户、批量申购、赎回与查询"""
+        import main
+
+        async def flow():
+            async with AsyncFundClient("http://test", transport=httpx.ASGITransport(app=main.app)) as client:
+                assert (await client.health_check())["status"] == "healthy"
+                product_id = await client.create_product("200001", "异步基金")
+                assert await client.create_nav(product_id, 2.0, nav_date="2025-01-01")
+
+                user_ids = await client.gather(client.create_user(f"异步用户{i}", f"32010119900101{i:04d}") for i in range(20))
+                for user_id in user_ids:
+                    balance = main.repository.get_user_balance(user_id)
+                    balance.available_balance = balance.total_balance = Decimal("1000")
+                    main.repository.update_user_balance(balance)
+                account_ids = await client.gather(client.open_fund_account(user_id) for user_id in user_ids)
+                results = await client.gather(
+                    client.subscribe_fund(account_id, product_id, 500) for account_id in account_ids
+                )
+                assert all(result["status"] == "SUCCESS" for result in results)
+
+                await client.redeem_fund(account_ids[0], product_id, 100)
+                assets = await client.get_user_assets(user_ids[0])
+                assert assets["total_asset"] == pytest.approx(1000)
+                assert (await client.get_user(user_ids[0]))["user_name"] == "异步用户0"
+                assert product_id in [p["product_id"] for p in await client.get_products()]
+
+                failures = await client.gather([client.get_user("USER_404"), client.get_user(user_ids[1])],
+                                               return_exceptions=True)
+                assert "404" in str(failures[0])
+                assert failures[1]["user_id"] == user_ids[1]
+
+        asyncio.run(flow())
+
+    def test_concurrency_limited(self):
+        """测试同时在途的请求数不超过 max_concurrency"""
+        transport = _CountingTransport()
+
+        async def run():
+            async with AsyncFundClient("http://test", max_concurrency=8, transport=transport) as client:
+                results = await client.gather(client.get_user(f"USER_{i}") for i in range(200))
+            assert [r["path"] for r in results] == [f"/api/v1/users/USER_{i}" for i in range(200)]
+
+        asyncio.run(run())
+        assert transport.peak == 8
+
+    def test_shared_http_client(self):
+        """测试共用 http_client 时不关闭调用方的连接池"""
+        async def run():
+            async with httpx.AsyncClient(transport=_CountingTransport()) as shared:
+                async with AsyncFundClient("http://test", http_client=shared) as client:
+                    await client.get_user("USER_1")
+                assert not shared.is_closed
+                await AsyncFundClient("http://test", http_client=shared).get_user_assets("USER_1")
+
+        asyncio.run(run())
+
+    def test_invalid_concurrency(self):
+        """测试最大并发数必须大于0"""
+        with pytest.raises(ValueError):
+            AsyncFundClient(max_concurrency=0)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,83 @@
+"""
+测试统一数据存储层的索引与查询
+"""
+import os
+import sys
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from common.enums import AccountStatus
+from common.repository import BaseRepository
+
+
+class TestBaseRepositoryIndexes:
+    """测试声明式索引"""
+
+    @pytest.fixture
+    def repo(self):
+        """创建仓库实例并写入基金账户"""
+        repo = BaseRepository()
+        for i, (user_id, status) in enumerate([
+            ("USER_001", "ACTIVE"),
+            ("USER_001", "FROZEN"),
+            ("USER_002", "ACTIVE"),
+        ]):
+            repo.create("fund_account", {
+                'id': f"ACC_{i}",
+                'fund_account_id': f"ACC_{i}",
+                'user_id': user_id,
+                'account_no': f"F{i}",
+                'account_status': status
+            })
+        return repo
+
+    def test_schema_indexes_declared(self, repo):
+        """测试按 schema.sql 声明索引"""
+        names = [index.name for index in repo.get_indexes("fund_account")]
+        assert names == ["idx_user_account", "uk_account_no"]
+
+    def test_list_uses_index(self, repo):
+        """测试按最左前缀和完整组合键查询"""
+        assert [r['id'] for r in repo.list("fund_account", {'user_id': "USER_001"})] == ["ACC_0", "ACC_1"]
+        assert [r['id'] for r in repo.list("fund_account", {
+            'user_id': "USER_001", 'account_status': AccountStatus.FROZEN
+        })] == ["ACC_1"]
+        assert repo.list("fund_account", {'user_id': "USER_404"}) == []
+
+    def test_list_falls_back_to_scan(self, repo):
+        """测试没有可用索引时全表扫描"""
+        assert [r['id'] for r in repo.list("fund_account", {'account_status': "ACTIVE"})] == ["ACC_0", "ACC_2"]
+
+    def test_update_keeps_index_current(self, repo):
+        """测试更新索引列后索引同步"""
+        repo.update("fund_account", "ACC_0", {'account_status': "FROZEN"})
+        assert sorted(r['id'] for r in repo.list("fund_account", {
+            'user_id': "USER_001", 'account_status': "FROZEN"
+        })) == ["ACC_0", "ACC_1"]
+        assert repo.list("fund_account", {'user_id': "USER_001", 'account_status': "ACTIVE"}) == []
+
+    def test_delete_keeps_index_current(self, repo):
+        """测试删除记录后索引同步"""
+        assert repo.delete("fund_account", "ACC_0")
+        assert [r['id'] for r in repo.list("fund_account", {'user_id': "USER_001"})] == ["ACC_1"]
+
+    def test_unique_index(self, repo):
+        """测试唯一索引冲突"""
+        with pytest.raises(ValueError):
+            repo.create("fund_account", {'id': "ACC_9", 'user_id': "USER_003", 'account_no': "F0"})
+        with pytest.raises(ValueError):
+            repo.update("fund_account", "ACC_1", {'account_no': "F2"})
+        # 冲突的更新不应生效
+        assert repo.get("fund_account", "ACC_1")['account_no'] == "F1"
+
+    def test_declare_index_on_existing_data(self, repo):
+        """测试对已有数据声明索引"""
+        repo.declare_index("fund_account", "idx_status", ("account_status",))
+        assert [r['id'] for r in repo.list("fund_account", {'account_status': "ACTIVE"})] == ["ACC_0", "ACC_2"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
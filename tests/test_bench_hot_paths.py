@@ -0,0 +1,66 @@
+"""
+测试热点路径基准：测量结果结构、增长阶数与基线回归检查
+"""
+import os
+import sys
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import pytest
+
+import bench_hot_paths
+from bench_hot_paths import compare, growth_order, run
+
+
+def _point(us, peak=1000):
+    return {"us_per_call": us, "median_us": us, "peak_bytes": peak, "retained_blocks": 0}
+
+
+class TestHotPathBenchmark:
+    """测试热点路径基准"""
+
+    def test_run(self):
+        """测试小规模测量覆盖全部路径与规模"""
+        results = run([40, 80], number=20, repeat=2, alloc_calls=10)
+        assert set(results) == {
+            "repo.get_latest_nav", "repo.get_user_balance",
+            "service.subscribe_fund", "service.calculate_user_assets"
+        }
+        for points in results.values():
+            assert set(points) == {"40", "80"}
+            assert all(point["us_per_call"] > 0 for point in points.values())
+        assert results["service.subscribe_fund"]["40"]["peak_bytes"] > 0
+
+    def test_growth_order(self):
+        """测试按最小、最大规模估算增长阶数"""
+        assert growth_order({"1000": _point(1), "100000": _point(100)}) == pytest.approx(1)
+        assert growth_order({"1000": _point(5), "10000": _point(6), "1000000": _point(5)}) == pytest.approx(0)
+        assert growth_order({"1000": _point(5)}) == 0
+
+    def test_compare(self):
+        """测试耗时或峰值分配超出阈值时报告回归，缺少的基线项不比较"""
+        baseline = {"repo.get_user_balance": {"1000": _point(10, peak=10000)}}
+        assert compare({"repo.get_user_balance": {"1000": _point(12, peak=11000)}}, baseline, 0.25) == []
+        assert len(compare({"repo.get_user_balance": {"1000": _point(13, peak=20000)}}, baseline, 0.25)) == 2
+        assert compare({"repo.get_user_balance": {"10000": _point(99)}, "other": {"1000": _point(99)}},
+                       baseline, 0.25) == []
+
+    @pytest.mark.parametrize("extra, code", [([], 2), (["--no-check"], None)])
+    def test_missing_baseline(self, tmp_path, monkeypatch, extra, code):
+        """测试没有基线文件时以非零退出码结束，--no-check 时只输出报告"""
+        monkeypatch.setattr(sys, "argv", [
+            "bench_hot_paths.py", "--sizes", "40", "--number", "5", "--repeat", "1", "--alloc-calls", "2",
+            "--baseline", str(tmp_path / "missing.json"), *extra
+        ])
+        if code is None:
+            bench_hot_paths.main()
+        else:
+            with pytest.raises(SystemExit) as exc:
+                bench_hot_paths.main()
+            assert exc.value.code == code
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,340 @@
+"""
+测试多线程并发交易：分段锁、比较并更新与余额/份额不变量
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+
+from common.locks import StripedLock
+from confirm_queue import ConfirmationQueue
+from repository import Repository
+from service import FundService
+
+
+def _run_threads(count, target):
+    """启动 count 个线程执行 target(线程序号)，等待全部结束"""
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not any(thread.is_alive() for thread in threads), "线程未结束，可能死锁"
+
+
+@pytest.fixture(autouse=True)
+def frequent_switches():
+    """缩短解释器切换间隔，让线程在读改写之间更容易被打断"""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def _setup(service, users, balance):
+    """创建用户、账户和一个有净值的产品"""
+    product = service.create_fund_product(product_code="001234", product_name="测试基金")
+    service.create_fund_nav(product_id=product.product_id, net_value=Decimal("1.0000"),
+                            nav_date=date(2025, 1, 1))
+    accounts = []
+    for i in range(users):
+        user = service.create_user(user_name=f"用户{i}")
+        user_balance = service.repo.get_user_balance(user.user_id)
+        user_balance.available_balance = Decimal(balance)
+        service.repo.update_user_balance(user_balance)
+        accounts.append((user.user_id, service.open_fund_account(user.user_id).fund_account_id))
+    return accounts, product.product_id
+
+
+class TestStripedLock:
+    """测试分段锁"""
+
+    def test_same_key_same_lock(self):
+        """测试同一个键总是映射到同一把锁"""
+        locks = StripedLock(16)
+        assert locks.lock_for("USER_001") is locks.lock_for("USER_001")
+        assert locks.lock_for(("ACC_1", "P1")) is locks.lock_for(("ACC_1", "P1"))
+
+    def test_hold_dedupes_and_reenters(self):
+        """测试同时锁定落在同一把锁上的多个键，且可重入"""
+        locks = StripedLock(1)
+        with locks.hold(["A", "B", "A"]):
+            with locks.hold(["C"]):
+                pass
+
+    def test_hold_in_any_order_does_not_deadlock(self):
+        """测试多个线程以相反顺序锁定同一组键"""
+        locks = StripedLock(64)
+        keys = [f"KEY_{i}" for i in range(32)]
+
+        def worker(i):
+            order = keys if i % 2 else list(reversed(keys))
+            for _ in range(200):
+                with locks.hold(order):
+                    pass
+
+        _run_threads(8, worker)
+
+    def test_invalid_stripes(self):
+        """测试锁的数量必须大于0"""
+        with pytest.raises(ValueError):
+            StripedLock(0)
+
+
+class TestCompareAndSet:
+    """测试仓库的比较并更新"""
+
+    def test_balance(self):
+        """测试余额在读取后被修改时比较并更新失败"""
+        service = FundService(Repository())
+        [(user_id, _)], _ = _setup(service, 1, "100")
+        balance = service.repo.get_user_balance(user_id)
+        stale = service.repo.get_user_balance(user_id)
+
+        balance.available_balance -= Decimal("30")
+        assert service.repo.compare_and_set_user_balance(balance, Decimal("100"), Decimal("0"))
+        stale.available_balance -= Decimal("80")
+        assert not service.repo.compare_and_set_user_balance(stale, Decimal("100"), Decimal("0"))
+        assert service.repo.get_user_balance(user_id).available_balance == Decimal("70")
+
+    def test_share(self):
+        """测试份额比较并更新"""
+        service = FundService(Repository())
+        [(_, account_id)], product_id = _setup(service, 1, "100")
+        service.subscribe_fund(account_id, product_id, Decimal("50"))
+        fund_share = service.repo.get_fund_share(account_id, product_id)
+
+        fund_share.available_share -= Decimal("10")
+        fund_share.frozen_share += Decimal("10")
+        assert not service.repo.compare_and_set_fund_share(fund_share, Decimal("49"), Decimal("0"))
+        assert service.repo.compare_and_set_fund_share(fund_share, Decimal("50"), Decimal("0"))
+        assert service.repo.get_fund_share(account_id, product_id).frozen_share == Decimal("10")
+
+
+class TestConcurrentTrading:
+    """并发压力测试：多线程下单后余额与份额守恒、不超额扣减"""
+
+    @pytest.fixture(params=["immediate", "queued"])
+    def service(self, request):
+        """创建服务：立即确认或经确认队列异步确认"""
+        if request.param == "immediate":
+            yield FundService(Repository())
+            return
+        confirm_queue = ConfirmationQueue(batch_size=50, linger_ms=1)
+        yield FundService(Repository(), confirm_queue=confirm_queue)
+        confirm_queue.stop()
+
+    def _drain(self, service):
+        """停止工作线程并处理完剩余条目，再重新启动（停止后的队列不接受入队）"""
+        if service.confirm_queue is not None:
+            service.confirm_queue.stop()
+            service.confirm_queue.start()
+
+    def test_no_double_spend(self, service):
+        """测试同一用户的并发申购不会超额扣减余额"""
+        [(user_id, account_id)], product_id = _setup(service, 1, "1000")
+        succeeded = []
+
+        def worker(_):
+            for _ in range(50):
+                try:
+                    service.subscribe_fund(account_id, product_id, Decimal("10"))
+                    succeeded.append(1)
+                except ValueError:
+                    pass
+
+        _run_threads(8, worker)
+        self._drain(service)
+        balance = service.repo.get_user_balance(user_id)
+        assert len(succeeded) == 100
+        assert balance.available_balance == Decimal("0")
+        assert balance.frozen_balance == Decimal("0")
+        assert service.repo.get_fund_share(account_id, product_id).total_share == Decimal("1000")
+
+    def test_no_over_redeem(self, service):
+        """测试同一持仓的并发赎回不会超额扣减份额"""
+        [(user_id, account_id)], product_id = _setup(service, 1, "100")
+        service.subscribe_fund(account_id, product_id, Decimal("100"))
+        self._drain(service)
+        succeeded = []
+
+        def worker(_):
+            for _ in range(20):
+                try:
+                    service.redeem_fund(account_id, product_id, Decimal("1"))
+                    succeeded.append(1)
+                except ValueError:
+                    pass
+
+        _run_threads(8, worker)
+        self._drain(service)
+        fund_share = service.repo.get_fund_share(account_id, product_id)
+        assert len(succeeded) == 100
+        assert fund_share.total_share == fund_share.available_share == Decimal("0")
+        assert service.repo.get_user_balance(user_id).available_balance == Decimal("100")
+
+    def test_mixed_users_conserve_money(self, service):
+        """测试多用户交叉申购、赎回与批量下单后资金与份额守恒"""
+        accounts, product_id = _setup(service, 4, "1000")
+
+        def worker(i):
+            for n in range(30):
+                _, account_id = accounts[(i + n) % len(accounts)]
+                try:
+                    if n % 3 == 0:
+                        service.redeem_fund(account_id, product_id, Decimal("5"))
+                    elif n % 3 == 1:
+                        service.subscribe_fund(account_id, product_id, Decimal("10"))
+                    else:
+                        service.submit_orders([
+                            {'transaction_type': 'SUBSCRIBE', 'fund_account_id': account_id,
+                             'product_id': product_id, 'amount': Decimal("3")},
+                            {'transaction_type': 'SUBSCRIBE', 'fund_account_id': accounts[-1 - i % 4][1],
+                             'product_id': product_id, 'amount': Decimal("2")},
+                        ])
+                except ValueError:
+                    pass
+
+        _run_threads(8, worker)
+        self._drain(service)
+        for user_id, account_id in accounts:
+            balance = service.repo.get_user_balance(user_id)
+            fund_share = service.repo.get_fund_share(account_id, product_id)
+            assert balance.frozen_balance == fund_share.frozen_share == Decimal("0")
+            assert balance.available_balance >= 0 and fund_share.available_share >= 0
+            # 净值为 1，申购赎回不改变资金与份额之和
+            assert balance.available_balance + fund_share.total_share == Decimal("1000")
+            assert service.get_user_assets(user_id)['total_asset'] == 1000.0
+
+    def test_unrelated_users_run_in_parallel(self):
+        """测试持有一个用户的锁时，其他用户的交易不被阻塞"""
+        service = FundService(Repository())
+        accounts, product_id = _setup(service, 3, "100")
+        (busy_user, _), *others = accounts
+        # 不同用户可能落到同一把锁上，取一个与其不同锁的用户
+        other_account = next(account_id for user_id, account_id in others
+                             if service._user_locks.lock_for(user_id) is not service._user_locks.lock_for(busy_user))
+        done = threading.Event()
+
+        with service._locked([busy_user]):
+            thread = threading.Thread(
+                target=lambda: (service.subscribe_fund(other_account, product_id, Decimal("10")), done.set())
+            )
+            thread.start()
+            assert done.wait(5)
+        thread.join()
+
+    def test_same_user_serialized(self):
+        """测试持有一个用户的锁时，该用户的申购等待锁释放"""
+        service = FundService(Repository())
+        [(user_id, account_id)], product_id = _setup(service, 1, "100")
+        done = threading.Event()
+
+        with service._locked([user_id]):
+            thread = threading.Thread(
+                target=lambda: (service.subscribe_fund(account_id, product_id, Decimal("10")), done.set())
+            )
+            thread.start()
+            time.sleep(0.05)
+            assert not done.is_set()
+        assert done.wait(5)
+        thread.join()
+
+
+
+class TestBatchEndpoint:
+    """测试批量交易接口不阻塞事件循环"""
+
+    def test_batch_runs_off_event_loop(self, monkeypatch):
+        """测试批量处理期间其他请求照常响应，结果按订单逐行返回"""
+        import main_v2
+
+        def slow_submit(orders):
+            time.sleep(0.5)
+            return [{"index": i, "success": True, "data": {}} for i in range(len(orders))]
+
+        monkeypatch.setattr(main_v2.fund_service, "submit_orders", slow_submit)
+        headers = {"Authorization": "Bearer demo_token_2025"}
+        order = {"transaction_type": "SUBSCRIBE", "fund_account_id": "ACC_1", "product_id": "PROD_1", "amount": 1}
+        health_done = []
+
+        async def main():
+            transport = httpx.ASGITransport(app=main_v2.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                async def health():
+                    await asyncio.sleep(0.05)
+                    await client.get("/api/v1/health")
+                    health_done.append(time.monotonic() - started)
+
+                started = time.monotonic()
+                response, _ = await asyncio.gather(
+                    client.post("/api/v1/funds/batch", headers=headers, json={"orders": [order] * 3}),
+                    health()
+                )
+                return response
+
+        response = asyncio.run(main())
+        # 批量处理阻塞事件循环时，批量请求之后发出的健康检查要等到批量处理结束（0.5 秒后）
+        assert health_done[0] < 0.3
+        lines = response.text.splitlines()
+        assert len(lines) == 3 and response.headers["content-type"].startswith("application/x-ndjson")
+
+
+class TestWriteEndpoints:
+    """测试写接口在线程池中执行：等待落盘时不阻塞事件循环，不同请求的写入可以同时等待组提交"""
+
+    @pytest.mark.parametrize("module_name", ["main", "main_v2"])
+    @pytest.mark.parametrize("path,method,body", [
+        ("/api/v1/funds/subscribe", "subscribe_fund", {"amount": 1}),
+        ("/api/v1/funds/redeem", "redeem_fund", {"share": 1}),
+    ])
+    @pytest.mark.parametrize("idempotent", [False, True])
+    def test_trades_run_off_event_loop(self, monkeypatch, module_name, path, method, body, idempotent):
+        """测试两笔交易同时等待（模拟 sync_commit 等待落盘），期间健康检查照常响应"""
+        module = __import__(module_name)
+
+        def slow_trade(fund_account_id, product_id, value):
+            time.sleep(0.5)
+            return {"entrust_id": f"ENT_{fund_account_id}"}
+
+        monkeypatch.setattr(module.fund_service, method, slow_trade)
+        done = {}
+
+        async def main():
+            transport = httpx.ASGITransport(app=module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                async def trade(n):
+                    headers = {"Authorization": "Bearer demo_token_2025"}
+                    if idempotent:
+                        headers["Idempotency-Key"] = f"{module_name}-{method}-{n}"
+                    response = await client.post(path, headers=headers, json={
+                        "fund_account_id": f"ACC_{n}", "product_id": "PROD_1", **body
+                    })
+                    assert response.status_code == 200
+                    done[n] = time.monotonic() - started
+
+                async def health():
+                    await asyncio.sleep(0.05)
+                    await client.get("/api/v1/health")
+                    done["health"] = time.monotonic() - started
+
+                started = time.monotonic()
+                await asyncio.gather(trade(1), trade(2), health())
+
+        asyncio.run(main())
+        # 在事件循环上执行时两笔交易依次等待（约 1 秒），健康检查排在其后
+        assert done["health"] < 0.3
+        assert max(done[1], done[2]) < 0.9
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
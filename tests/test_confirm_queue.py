@@ -0,0 +1,111 @@
+"""
+测试异步确认队列
+"""
+import os
+import sys
+import threading
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from confirm_queue import ConfirmationQueue
+
+
+class TestConfirmationQueue:
+    """测试确认队列的凑批与工作线程"""
+
+    def test_flush_respects_batch_size(self):
+        """测试同步处理时按批次大小切分"""
+        batches = []
+        confirm_queue = ConfirmationQueue(batch_size=3, handler=batches.append, autostart=False)
+        for i in range(7):
+            confirm_queue.put({'entrust_id': i})
+        assert confirm_queue.flush() == 7
+        assert [len(batch) for batch in batches] == [3, 3, 1]
+        assert confirm_queue.pending() == 0
+
+    def test_worker_lingers_to_fill_batch(self):
+        """测试工作线程在等待时间内凑批"""
+        batches = []
+        done = threading.Event()
+
+        def handler(batch):
+            batches.append(batch)
+            if sum(len(b) for b in batches) == 5:
+                done.set()
+
+        confirm_queue = ConfirmationQueue(batch_size=100, linger_ms=200, handler=handler)
+        for i in range(5):
+            confirm_queue.put({'entrust_id': i})
+        assert done.wait(2)
+        confirm_queue.stop()
+        assert [item['entrust_id'] for batch in batches for item in batch] == [0, 1, 2, 3, 4]
+        assert len(batches) == 1
+
+    def test_handler_error_does_not_stop_worker(self):
+        """测试批次处理异常不终止工作线程"""
+        seen = []
+        done = threading.Event()
+
+        def handler(batch):
+            seen.extend(batch)
+            if len(seen) == 1:
+                raise RuntimeError("boom")
+            done.set()
+
+        confirm_queue = ConfirmationQueue(batch_size=1, linger_ms=0, handler=handler)
+        confirm_queue.put({'entrust_id': 1})
+        confirm_queue.put({'entrust_id': 2})
+        assert done.wait(2)
+        confirm_queue.stop()
+        assert confirm_queue.batches == 2
+
+    def test_put_after_stop_rejected(self):
+        """测试停止后入队被拒绝，且不会重新启动工作线程；显式 start() 后恢复"""
+        confirm_queue = ConfirmationQueue(handler=lambda batch: None)
+        confirm_queue.put({'entrust_id': 1})
+        confirm_queue.stop()
+        with pytest.raises(ValueError, match="已停止"):
+            confirm_queue.put({'entrust_id': 2})
+        assert confirm_queue._worker is None
+        confirm_queue.start()
+        confirm_queue.put({'entrust_id': 3})
+        confirm_queue.stop()
+        assert confirm_queue.confirmed == 2
+
+    def test_stop_during_concurrent_puts(self):
+        """测试入队与 stop() 并发：每个成功入队的条目都在停止时处理，其余入队被拒绝"""
+        processed = []
+        confirm_queue = ConfirmationQueue(batch_size=50, linger_ms=1, handler=processed.extend)
+        accepted = []
+
+        def producer(n):
+            for i in range(2000):
+                try:
+                    confirm_queue.put({'entrust_id': (n, i)})
+                except ValueError:
+                    return
+                accepted.append((n, i))
+
+        threads = [threading.Thread(target=producer, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        confirm_queue.stop(timeout=5)
+        for t in threads:
+            t.join(5)
+        assert not any(t.is_alive() for t in threads)
+        assert sorted(item['entrust_id'] for item in processed) == sorted(accepted)
+        assert confirm_queue.pending() == 0
+
+    def test_invalid_config(self):
+        """测试非法配置"""
+        with pytest.raises(ValueError):
+            ConfirmationQueue(batch_size=0)
+        with pytest.raises(ValueError):
+            ConfirmationQueue(linger_ms=-1)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,94 @@
+"""
+测试快速响应路由
+"""
+import asyncio
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.testclient import TestClient
+
+from fast_response import FastJSONRoute
+from models import FundNetValue, ResponseModel
+
+NAV = FundNetValue(nav_id="NAV_1", product_id="PROD_1", net_value=Decimal("1.2345"),
+                   nav_date=date(2025, 1, 2), create_time=datetime(2025, 1, 2, 15, 0))
+
+
+def _app(fast: bool) -> FastAPI:
+    """两种模式注册相同的接口"""
+    app = FastAPI()
+    if fast:
+        app.router.route_class = FastJSONRoute
+
+    @app.get("/nav", response_model=ResponseModel)
+    async def get_nav():
+        return ResponseModel(data={"nav": NAV, "value": Decimal("10.50"), "date": date(2025, 1, 2)})
+
+    @app.get("/sync", response_model=ResponseModel)
+    def get_sync(name: str):
+        return ResponseModel(message=name, data=[1.5, None])
+
+    @app.post("/created", response_model=ResponseModel, status_code=201)
+    async def create():
+        return ResponseModel(data={"id": 1})
+
+    @app.get("/dict", response_model=ResponseModel)
+    async def get_dict():
+        return {"data": {"id": 1}}
+
+    @app.get("/missing", response_model=ResponseModel)
+    async def missing():
+        raise HTTPException(status_code=404, detail="不存在")
+
+    return app
+
+
+@pytest.fixture(scope="module")
+def clients():
+    return TestClient(_app(False)), TestClient(_app(True))
+
+
+class TestFastJSONRoute:
+    """测试快速响应与默认流程的输出一致"""
+
+    @pytest.mark.parametrize("method,path", [
+        ("GET", "/nav"), ("GET", "/sync?name=测试"), ("POST", "/created"), ("GET", "/dict"), ("GET", "/missing")
+    ])
+    def test_same_response(self, clients, method, path):
+        """测试状态码与 JSON 内容相同"""
+        default, fast = (client.request(method, path) for client in clients)
+        assert fast.status_code == default.status_code
+        assert fast.headers["content-type"] == default.headers["content-type"]
+        assert fast.json() == default.json()
+
+    def test_decimal_and_date_encoding(self, clients):
+        """测试 Decimal 与日期按 Pydantic 的 JSON 表示输出"""
+        data = clients[1].get("/nav").json()["data"]
+        assert data["value"] == "10.50"
+        assert data["nav"]["net_value"] == "1.2345"
+        assert data["nav"]["nav_date"] == "2025-01-02"
+
+    def test_trusted_response_serialized_by_endpoint(self, clients):
+        """测试快速模式下接口直接返回序列化好的 JSON 响应，不再交给 FastAPI 校验"""
+        route = next(route for route in clients[1].app.routes if getattr(route, "path", None) == "/created")
+        response = asyncio.run(route.endpoint())
+        assert isinstance(response, Response)
+        assert response.status_code == 201
+        assert response.body == b'{"code":0,"message":"success","data":{"id":1}}'
+
+    def test_signature_preserved(self, clients):
+        """测试包装后接口的参数与文档不变"""
+        default, fast = clients
+        assert fast.get("/sync").status_code == 422
+        assert fast.get("/openapi.json").json() == default.get("/openapi.json").json()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
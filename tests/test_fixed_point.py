@@ -0,0 +1,151 @@
+"""
+测试定点数运算及交易路径的份额、金额舍入
+"""
+import os
+import sys
+from datetime import date
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_UP
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from asset_book import UserAssetBook
+from fixed_point import (
+    amount_for_share, divide, from_fixed, quantize, quantized_amount, quantized_share, share_for_amount, to_fixed
+)
+from repository import Repository
+from service import FundService
+
+
+class TestFixedPoint:
+    """测试定点数运算"""
+
+    @pytest.mark.parametrize("numerator,denominator,rounding,expected", [
+        (7, 2, ROUND_DOWN, 3), (7, 2, ROUND_HALF_UP, 4), (7, 2, ROUND_HALF_EVEN, 4), (7, 2, ROUND_UP, 4),
+        (5, 2, ROUND_HALF_EVEN, 2), (5, 2, ROUND_HALF_UP, 3), (7, 3, ROUND_HALF_UP, 2), (7, 3, ROUND_UP, 3),
+        (-7, 2, ROUND_DOWN, -3), (-7, 2, ROUND_HALF_UP, -4), (7, -2, ROUND_UP, -4), (-5, -2, ROUND_HALF_EVEN, 2),
+        (6, 3, ROUND_UP, 2),
+    ])
+    def test_divide(self, numerator, denominator, rounding, expected):
+        """测试整数除法各舍入方式（负数按绝对值舍入，与 Decimal 一致）"""
+        assert divide(numerator, denominator, rounding) == expected
+        assert divide(numerator, denominator, rounding) == int(
+            (Decimal(numerator) / Decimal(denominator)).to_integral_value(rounding=rounding))
+
+    def test_divide_errors(self):
+        """测试除数为0或不支持的舍入方式"""
+        with pytest.raises(ValueError, match="除数"):
+            divide(1, 0)
+        with pytest.raises(ValueError, match="舍入方式"):
+            divide(1, 2, "ROUND_05UP")
+
+    def test_conversion(self):
+        """测试 Decimal、整数、浮点数与定点整数互相转换"""
+        assert to_fixed(Decimal("1.2345")) == 12345
+        assert to_fixed(Decimal("1.23455")) == 12346
+        assert to_fixed(Decimal("1.23455"), ROUND_DOWN) == 12345
+        assert to_fixed(3) == 30000
+        assert to_fixed(0.1) == 1000
+        assert from_fixed(12345) == Decimal("1.2345")
+        assert from_fixed(123456789, places=8) == Decimal("1.23456789")
+        assert quantize(Decimal("-2.00005")) == Decimal("-2.0001")
+
+    def test_trade_arithmetic(self):
+        """测试申购份额向下舍去、赎回金额四舍五入"""
+        # 10000 / 1.2345 = 8100.44552450385...
+        assert share_for_amount(to_fixed(10000), to_fixed(Decimal("1.2345"))) == 81004455
+        # 3 / 1.5 整除，不受舍入影响
+        assert share_for_amount(to_fixed(3), to_fixed(Decimal("1.5"))) == 20000
+        # 1.0001 × 1.2345 = 1.23462345
+        assert amount_for_share(to_fixed(Decimal("1.0001")), to_fixed(Decimal("1.2345"))) == 12346
+        assert amount_for_share(to_fixed(Decimal("1.0001")), to_fixed(Decimal("1.2345")), ROUND_DOWN) == 12346
+        assert amount_for_share(to_fixed(Decimal("0.0001")), to_fixed(Decimal("0.5"))) == 1
+        with pytest.raises(ValueError, match="净值"):
+            share_for_amount(to_fixed(1), 0)
+
+    def test_decimal_trade_arithmetic(self):
+        """测试交易路径的 Decimal 运算与定点整数运算舍入结果一致"""
+        navs = [Decimal("1.2345"), Decimal("0.0001"), Decimal("3"), Decimal("999999.9999"), Decimal("1.0007")]
+        values = [Decimal("10000"), Decimal("0.0001"), Decimal("99999999999999.9999"), Decimal("1.0001")]
+        for nav in navs:
+            for value in values:
+                for rounding in (ROUND_DOWN, ROUND_HALF_UP, ROUND_UP):
+                    assert quantized_share(value, nav, rounding) == \
+                        from_fixed(share_for_amount(to_fixed(value), to_fixed(nav), rounding))
+                    assert quantized_amount(value, nav, rounding) == \
+                        from_fixed(amount_for_share(to_fixed(value), to_fixed(nav), rounding))
+        with pytest.raises(ValueError, match="净值"):
+            quantized_share(Decimal("1"), Decimal("0"))
+
+    def test_asset_book(self):
+        """测试资产聚合按定点整数累计市值，读取时舍入为 4 位小数"""
+        book = UserAssetBook()
+        book.set_balance("U1", Decimal("100"))
+        book.set_nav("P1", Decimal("1.2345"))
+        book.set_position("U1", "A1", "P1", Decimal("0.0001"))
+        book.set_position("U1", "A2", "P1", Decimal("0.0001"))
+        # 市值为 0.0002 × 1.2345 = 0.0002469，不是逐笔舍入后的 0.0002 + 0.0002
+        assert book.get("U1")['total_fund_asset'] == Decimal("0.0002")
+        book.set_nav("P1", Decimal("2.5"))
+        assert book.get("U1")['total_fund_asset'] == Decimal("0.0005")
+        assert book.user_holdings_fixed("U1") == {"P1": 2}
+        assert book.get_nav("P1") == Decimal("2.5")
+
+
+class TestTradeRounding:
+    """测试交易路径的定点舍入"""
+
+    def _seed(self, net_value="1.2345"):
+        service = FundService(Repository())
+        user = service.create_user(user_name="测试用户")
+        service.deposit(user.user_id, Decimal("100000"))
+        account = service.open_fund_account(user.user_id)
+        product = service.create_fund_product(product_code="001234", product_name="测试基金")
+        service.create_fund_nav(product_id=product.product_id, net_value=Decimal(net_value),
+                                nav_date=date(2025, 1, 1))
+        return service, user.user_id, account.fund_account_id, product.product_id
+
+    def test_subscribe_share_rounded_down(self):
+        """测试申购份额向下舍去到 4 位小数"""
+        service, _, account_id, product_id = self._seed()
+        result = service.subscribe_fund(account_id, product_id, Decimal("10000"))
+        assert result['share'] == 8100.4455
+        assert service.repo.get_fund_share(account_id, product_id).total_share == Decimal("8100.4455")
+
+    def test_redeem_amount_rounded_half_up(self):
+        """测试赎回份额舍去到 4 位小数、赎回金额四舍五入"""
+        service, user_id, account_id, product_id = self._seed()
+        service.subscribe_fund(account_id, product_id, Decimal("10000"))
+        result = service.redeem_fund(account_id, product_id, Decimal("1.00019"))
+        assert (result['share'], result['amount']) == (1.0001, 1.2346)
+        assert service.repo.get_user_balance(user_id).total_balance == Decimal("90001.2346")
+
+    def test_large_amount_stored_exactly(self):
+        """测试超过浮点数精度的金额在委托、确认记录中按十进制字符串完整保存"""
+        service, user_id, account_id, product_id = self._seed(net_value="1.0000")
+        amount = Decimal("98765432109876.5432")
+        service.deposit(user_id, amount)
+        result = service.subscribe_fund(account_id, product_id, amount)
+        entrust = service.repo.get_entrust(result['entrust_id'])
+        assert Decimal(entrust.request_data['amount']) == amount
+        assert Decimal(entrust.response_data['share']) == amount
+        confirm = service.repo.list_user_confirms(user_id)[0][0]
+        assert Decimal(confirm.confirm_data['amount']) == amount
+        assert service.repo.get_fund_share(account_id, product_id).total_share == amount
+
+    def test_amount_quantized(self):
+        """测试金额四舍五入到 4 位小数，舍入后为0时拒绝"""
+        service, _, account_id, product_id = self._seed()
+        result = service.subscribe_fund(account_id, product_id, Decimal("100.00005"))
+        assert result['amount'] == 100.0001
+        assert service.repo.get_entrust(result['entrust_id']).request_data['amount'] == "100.0001"
+        with pytest.raises(ValueError, match="大于0"):
+            service.subscribe_fund(account_id, product_id, Decimal("0.00004"))
+        with pytest.raises(ValueError, match="大于0"):
+            service.redeem_fund(account_id, product_id, Decimal("0.00009"))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,119 @@
+"""
+测试客户端共用的连接池会话：保持连接、超时与幂等请求重试
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import requests
+
+from client import FundClient
+from common.http_session import create_session, get_session
+from modules.fund_share.fund_share_api import FundShareAPI
+from modules.user.user_api import UserAPI
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """按 server.statuses 依次返回状态码（用完后返回 200），记录连接数和请求"""
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.server.requests.append((self.command, self.path))
+        time.sleep(self.server.delay)
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = json.dumps({"code": 0, "message": "success", "data": [{"product_id": "PROD_1"}]}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """本地 HTTP 服务"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.connections, server.requests, server.statuses, server.delay = 0, [], [], 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+class TestHttpSession:
+    """测试连接池会话"""
+
+    def test_connections_reused(self, server):
+        """测试多个客户端、多次调用共用同一个连接"""
+        server, url = server
+        session = create_session()
+        assert FundClient(url, session=session).get_products() == [{"product_id": "PROD_1"}]
+        for _ in range(4):
+            FundClient(url, session=session).get_products()
+        assert len(server.requests) == 5
+        assert server.connections == 1
+
+    def test_no_request_on_init(self, server):
+        """测试默认初始化不发起连接测试请求"""
+        server, url = server
+        FundClient(url, session=create_session())
+        assert server.requests == []
+
+    def test_idempotent_request_retried(self, server):
+        """测试 GET 在服务暂时不可用时退避重试"""
+        server, url = server
+        server.statuses = [503, 502]
+        client = FundClient(url, session=create_session(backoff_factor=0))
+        assert client.get_products() == [{"product_id": "PROD_1"}]
+        assert len(server.requests) == 3
+
+    def test_post_not_retried(self, server):
+        """测试 POST 不重试，错误状态交给调用方"""
+        server, url = server
+        server.statuses = [503]
+        client = FundClient(url, session=create_session(backoff_factor=0))
+        with pytest.raises(Exception, match="503"):
+            client.create_product("000001", "测试基金")
+        assert server.requests == [("POST", "/api/v1/products")]
+
+    def test_timeout(self, server):
+        """测试请求超时"""
+        server, url = server
+        server.delay = 0.5
+        client = FundClient(url, session=create_session(retries=0), timeout=0.1)
+        with pytest.raises(requests.exceptions.Timeout):
+            client.get_products()
+
+    def test_module_apis_share_default_session(self):
+        """测试模块客户端默认共用进程内的会话"""
+        assert UserAPI().session is get_session()
+        assert FundShareAPI().session is FundClient().session
+
+    def test_invalid_pool_size(self):
+        """测试连接池大小必须大于0"""
+        with pytest.raises(ValueError):
+            create_session(pool_size=0)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,246 @@
+"""
+测试幂等键缓存及交易、开户接口的 Idempotency-Key
+"""
+import asyncio
+import os
+import sys
+import threading
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from idempotency import IdempotencyCache, IdempotencyKeyReused
+
+HEADERS = {"Authorization": "Bearer demo_token_2025"}
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestIdempotencyCache:
+    """测试幂等键缓存"""
+
+    def test_replay(self):
+        """测试相同键、相同请求只执行一次，重复请求返回第一次的结果"""
+        cache = IdempotencyCache()
+        calls = []
+        assert cache.run("k", b"req", lambda: calls.append(1) or "first") == ("first", False)
+        assert cache.run("k", b"req", lambda: calls.append(2) or "second") == ("first", True)
+        assert calls == [1]
+        assert cache.run("other", b"req", lambda: "other") == ("other", False)
+
+    def test_key_reused(self):
+        """测试同一个键用于内容不同的请求"""
+        cache = IdempotencyCache()
+        cache.run("k", b"req", lambda: 1)
+        with pytest.raises(IdempotencyKeyReused):
+            cache.run("k", b"another", lambda: 2)
+
+    def test_failure_not_cached(self):
+        """测试执行失败时不缓存，重试会重新执行"""
+        cache = IdempotencyCache()
+
+        def fail():
+            raise ValueError("可用余额不足")
+
+        with pytest.raises(ValueError, match="余额不足"):
+            cache.run("k", b"req", fail)
+        assert len(cache) == 0
+        assert cache.run("k", b"req", lambda: "ok") == ("ok", False)
+
+    def test_in_flight_duplicates_wait(self):
+        """测试第一次执行期间的重复请求等待其结果，不再执行"""
+        cache = IdempotencyCache()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "done"
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(cache.run("k", b"req", slow)))
+        first.start()
+        started.wait(5)
+        waiters = [threading.Thread(target=lambda: results.append(cache.run("k", b"req", slow)))
+                   for _ in range(3)]
+        for thread in waiters:
+            thread.start()
+        release.set()
+        for thread in [first] + waiters:
+            thread.join(5)
+        assert calls == [1]
+        assert sorted(results) == [("done", False)] + [("done", True)] * 3
+
+    def test_in_flight_failure_propagates(self):
+        """测试等待中的重复请求收到第一次执行的异常"""
+        cache = IdempotencyCache()
+        started, release = threading.Event(), threading.Event()
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise ValueError("产品不存在")
+
+        errors = []
+
+        def call():
+            try:
+                cache.run("k", b"req", fail)
+            except ValueError as e:
+                errors.append(str(e))
+
+        first = threading.Thread(target=call)
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=call)
+        second.start()
+        release.set()
+        first.join(5)
+        second.join(5)
+        assert errors == ["产品不存在", "产品不存在"]
+
+    def test_async_waiter(self):
+        """测试异步接口等待重复请求时不阻塞事件循环"""
+        cache = IdempotencyCache()
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return "done"
+
+        first = threading.Thread(target=lambda: cache.run("k", b"req", slow))
+        first.start()
+        started.wait(5)
+
+        async def main():
+            waiter = asyncio.ensure_future(cache.run_async("k", b"req", slow))
+            await asyncio.sleep(0.01)
+            assert not waiter.done()
+            release.set()
+            return await waiter
+
+        assert asyncio.run(main()) == ("done", True)
+        first.join(5)
+
+    def test_ttl(self):
+        """测试过期的键重新执行"""
+        clock = _Clock()
+        cache = IdempotencyCache(ttl=60, clock=clock)
+        cache.run("k", b"req", lambda: 1)
+        clock.now = 59
+        assert cache.run("k", b"req", lambda: 2) == (1, True)
+        clock.now = 61
+        assert cache.run("k", b"req", lambda: 3) == (3, False)
+        assert len(cache) == 1
+
+    def test_bounded(self):
+        """测试条目数不超过上限，淘汰最早的键"""
+        cache = IdempotencyCache(max_entries=100)
+        for i in range(1000):
+            cache.run(f"k{i}", b"req", lambda: i)
+        assert len(cache) == 100
+        assert cache.run("k999", b"req", lambda: None) == (999, True)
+        assert cache.run("k0", b"req", lambda: "again") == ("again", False)
+
+
+class TestIdempotentEndpoints:
+    """测试接口的 Idempotency-Key 请求头"""
+
+    @pytest.fixture(scope="class")
+    def context(self):
+        import main
+        with TestClient(main.app) as client:
+            user_id = client.post("/api/v1/users", headers=HEADERS, json={
+                "user_name": "幂等用户", "identity_no": "110101199001019999"
+            }).json()["data"]["user_id"]
+            main.fund_service.deposit(user_id, Decimal("10000"))
+            product = main.fund_service.create_fund_product(product_code="900001", product_name="幂等基金")
+            main.fund_service.create_fund_nav(product.product_id, Decimal("1.0000"), nav_date=date(2025, 1, 1))
+            yield client, main.fund_service, user_id, product.product_id
+
+    def test_open_account(self, context):
+        """测试重复开户请求返回同一个基金账户"""
+        client, service, user_id, _ = context
+        headers = {**HEADERS, "Idempotency-Key": "open-1"}
+        first = client.post("/api/v1/accounts/open", headers=headers, json={"user_id": user_id})
+        second = client.post("/api/v1/accounts/open", headers=headers, json={"user_id": user_id})
+        assert first.status_code == second.status_code == 200
+        assert first.json() == second.json()
+        assert "idempotent-replayed" not in first.headers
+        assert second.headers["idempotent-replayed"] == "true"
+
+    def test_subscribe(self, context):
+        """测试重复申购只冻结一次资金，键用于其他请求时返回 422"""
+        client, service, user_id, product_id = context
+        account_id = service.open_fund_account(user_id).fund_account_id
+        before = service.repo.get_user_balance(user_id).available_balance
+        body = {"fund_account_id": account_id, "product_id": product_id, "amount": 100}
+        headers = {**HEADERS, "Idempotency-Key": "sub-1"}
+        responses = [client.post("/api/v1/funds/subscribe", headers=headers, json=body) for _ in range(3)]
+        assert len({response.json()["data"]["entrust_id"] for response in responses}) == 1
+        assert service.repo.get_user_balance(user_id).available_balance == before - 100
+        conflict = client.post("/api/v1/funds/subscribe", headers=headers, json={**body, "amount": 200})
+        assert conflict.status_code == 422
+        # 不带幂等键时每次都执行
+        client.post("/api/v1/funds/subscribe", headers=HEADERS, json=body)
+        assert service.repo.get_user_balance(user_id).available_balance == before - 200
+
+    def test_failed_request_retried(self, context):
+        """测试失败的请求不缓存，修正后用同一个键重试会执行"""
+        client, service, user_id, product_id = context
+        account_id = service.open_fund_account(user_id).fund_account_id
+        headers = {**HEADERS, "Idempotency-Key": "redeem-1"}
+        body = {"fund_account_id": account_id, "product_id": product_id, "share": 10}
+        assert client.post("/api/v1/funds/redeem", headers=headers, json=body).status_code == 400
+        service.subscribe_fund(account_id, product_id, Decimal("50"))
+        response = client.post("/api/v1/funds/redeem", headers=headers, json=body)
+        assert response.status_code == 200
+        assert "idempotent-replayed" not in response.headers
+
+    def test_scoped_by_caller(self, context):
+        """测试不同调用方使用相同的幂等键互不影响：既不重放别人的响应，也不报键冲突"""
+        import main
+        from fastapi import Request
+        client, service, user_id, _ = context
+        other_id = service.create_user("另一个用户", identity_no="110101199001018888").user_id
+
+        def token_from_header(request: Request):
+            return request.headers["Authorization"]
+
+        main.app.dependency_overrides[main.verify_token] = token_from_header
+        try:
+            first = client.post("/api/v1/accounts/open", headers={**HEADERS, "Idempotency-Key": "shared"},
+                                json={"user_id": user_id})
+            second = client.post("/api/v1/accounts/open",
+                                 headers={"Authorization": "Bearer other_token", "Idempotency-Key": "shared"},
+                                 json={"user_id": other_id})
+        finally:
+            main.app.dependency_overrides.clear()
+        assert first.status_code == second.status_code == 200
+        assert "idempotent-replayed" not in second.headers
+        assert second.json()["data"]["user_id"] == other_id
+
+    def test_invalid_key(self, context):
+        """测试过长的幂等键"""
+        client, _, user_id, _ = context
+        response = client.post("/api/v1/accounts/open", headers={**HEADERS, "Idempotency-Key": "k" * 300},
+                               json={"user_id": user_id})
+        assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,162 @@
+"""
+测试按时间递增的ID生成
+"""
+import os
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import common.ids
+from common.ids import IdGenerator, generate_id, id_floor, id_timestamp
+from sharding import ShardIdGenerator
+
+
+class TestIdGenerator:
+    """测试ID生成器"""
+
+    def test_format(self):
+        """测试ID为前缀加 16 位小写十六进制，与原格式长度相同"""
+        key = generate_id('ENT_')
+        assert key.startswith('ENT_') and len(key) == 20
+        int(key[4:], 16)
+        assert key[4:] == key[4:].lower()
+
+    def test_monotonic(self):
+        """测试逐个、批量生成的ID严格递增（包括同一毫秒内序号用完时）"""
+        generate = IdGenerator(worker_id=3)
+        keys = [generate('CFM_') for _ in range(5000)]
+        keys += generate.generate_many('CFM_', 10000)
+        keys.append(generate('CFM_'))
+        assert keys == sorted(keys)
+        assert len(set(keys)) == len(keys)
+        assert generate.generate_many('CFM_', 0) == []
+
+    def test_clock_moves_backwards(self, monkeypatch):
+        """测试系统时钟回拨时仍然递增"""
+        generate = IdGenerator(worker_id=1)
+        now = [common.ids._now_ms()]
+        monkeypatch.setattr(common.ids, "_now_ms", lambda: now[0])
+        first = generate()
+        now[0] -= 5000
+        second = generate()
+        assert second > first
+
+    def test_workers_do_not_collide(self):
+        """测试不同工作进程号在同一毫秒内生成的ID互不重复"""
+        generators = [IdGenerator(worker_id=i) for i in range(4)]
+        keys = set()
+        for generate in generators:
+            keys.update(generate.generate_many('USER_', 1000))
+        assert len(keys) == 4000
+
+    def test_threads(self):
+        """测试多线程共用同一生成器不产生重复ID"""
+        generate = IdGenerator(worker_id=2)
+        results = [[] for _ in range(4)]
+
+        def worker(out):
+            out.extend(generate('ENT_') for _ in range(2000))
+
+        threads = [threading.Thread(target=worker, args=(out,)) for out in results]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        keys = [key for out in results for key in out]
+        assert len(set(keys)) == len(keys)
+        assert all(out == sorted(out) for out in results)
+
+    def test_invalid_worker_id(self):
+        """测试工作进程号超出范围"""
+        with pytest.raises(ValueError):
+            IdGenerator(worker_id=1024)
+        with pytest.raises(ValueError):
+            IdGenerator(worker_id=-1)
+
+    def test_time_range(self):
+        """测试按时间换算ID下界，可以用ID做创建时间的范围查询"""
+        before = datetime.now(timezone.utc) - timedelta(milliseconds=1)
+        key = generate_id('ENT_')
+        after = datetime.now(timezone.utc) + timedelta(milliseconds=1)
+        assert id_floor('ENT_', before) <= key < id_floor('ENT_', after)
+        assert before <= id_timestamp(key) <= after
+
+    def test_processes_lease_distinct_worker_ids(self, tmp_path, monkeypatch):
+        """测试未指定工作进程号时各进程取得不同的号，与进程号无关"""
+        monkeypatch.setenv("ID_WORKER_DIR", str(tmp_path))
+        monkeypatch.delenv("ID_WORKER_ID", raising=False)
+        monkeypatch.setattr(os, "getpid", lambda: 1024)
+        generators = [IdGenerator() for _ in range(3)]
+        try:
+            assert sorted(generate.worker_id for generate in generators) == [1021, 1022, 1023]
+        finally:
+            for generate in generators:
+                generate.reset()
+
+    def test_shared_pinned_worker_id_refused(self, tmp_path, monkeypatch):
+        """测试多个进程使用同一个 ID_WORKER_ID 时拒绝生成ID"""
+        monkeypatch.setenv("ID_WORKER_DIR", str(tmp_path))
+        monkeypatch.setenv("ID_WORKER_ID", "5")
+        first = IdGenerator()
+        try:
+            assert first.worker_id == 5
+            with pytest.raises(RuntimeError):
+                IdGenerator()('ENT_')
+        finally:
+            first.reset()
+        # 持有者退出后可以重新使用
+        second = IdGenerator()
+        assert second.worker_id == 5
+        second.reset()
+
+    @pytest.mark.parametrize("pinned", [False, True])
+    def test_forked_child_does_not_inherit_worker_id(self, tmp_path, monkeypatch, pinned):
+        """测试 fork 出的子进程不沿用父进程的工作进程号；ID_WORKER_ID 指定的号被父进程持有时子进程拒绝生成ID"""
+        monkeypatch.setenv("ID_WORKER_DIR", str(tmp_path))
+        if pinned:
+            monkeypatch.setenv("ID_WORKER_ID", "7")
+        else:
+            monkeypatch.delenv("ID_WORKER_ID", raising=False)
+        generate = IdGenerator()
+        parent_worker = generate.worker_id
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                generate.reset()
+                result = str(generate.worker_id)
+            except RuntimeError:
+                result = "refused"
+            os.write(write_fd, result.encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as reader:
+            result = reader.read()
+        os.waitpid(pid, 0)
+        try:
+            if pinned:
+                assert result == "refused"
+            else:
+                assert int(result) != parent_worker
+            # 子进程关闭继承的描述符后，父进程仍持有自己的号
+            with pytest.raises(RuntimeError):
+                monkeypatch.setenv("ID_WORKER_ID", str(parent_worker))
+                IdGenerator().worker_id
+        finally:
+            generate.reset()
+
+    def test_shard_ids_are_time_ordered(self):
+        """测试分片ID同样按生成顺序递增"""
+        generate = ShardIdGenerator(1, 4)
+        keys = [generate('ACC_') for _ in range(200)]
+        assert keys == sorted(keys)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,71 @@
+"""
+测试负载生成器：操作权重、分位数、阈值检查与进程内压测
+"""
+import asyncio
+import os
+import sys
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import pytest
+
+from loadgen import LatencyRecorder, check_thresholds, parse_mix, percentile, run
+
+
+class TestLoadgen:
+    """测试负载生成器"""
+
+    def test_parse_mix(self):
+        """测试解析操作权重"""
+        assert parse_mix("subscribe=3, assets=1") == {"subscribe": 3.0, "assets": 1.0}
+        for mix in ("withdraw=1", "subscribe=x", "subscribe=-1", "subscribe=0"):
+            with pytest.raises(ValueError):
+                parse_mix(mix)
+
+    def test_percentile(self):
+        """测试最近秩法分位数"""
+        values = [float(i) for i in range(1, 101)]
+        assert percentile(values, 0.5) == 50
+        assert percentile(values, 0.99) == 99
+        assert percentile(values, 0.999) == 100
+        assert percentile([7.0], 0.5) == 7
+
+    def test_report_and_thresholds(self):
+        """测试汇总统计与阈值检查"""
+        recorder = LatencyRecorder()
+        for i in range(9):
+            recorder.record("GET /a", 0.001 * (i + 1))
+        recorder.record("GET /a", 0.5, RuntimeError("HTTP错误 500"))
+        report = recorder.report(2.0)
+        stats = report["endpoints"]["GET /a"]
+        assert (stats["count"], stats["errors"], stats["error_rate"], stats["throughput"]) == (10, 1, 0.1, 5.0)
+        assert stats["latency_ms"]["p50"] == pytest.approx(5)
+        assert stats["latency_ms"]["max"] == pytest.approx(500)
+        assert stats["error_samples"] == ["RuntimeError: HTTP错误 500"]
+
+        full = {"phases": {"steady": report}}
+        assert check_thresholds(full) == []
+        assert check_thresholds(full, max_error_rate=0.2, max_p99_ms=1000) == []
+        assert len(check_thresholds(full, max_error_rate=0.05, max_p99_ms=100)) == 2
+
+    def test_in_process_run(self):
+        """测试进程内对 main_v2:app 完成开户与开环压测"""
+        report = asyncio.run(run(users=20, rate=100, duration=0.5, concurrency=10, seed=1,
+                                 mix="subscribe=1,redeem=1,assets=1,products=1,user=1"))
+        assert report["mode"] == "in-process"
+        onboarding, steady = report["phases"]["onboarding"], report["phases"]["steady"]
+        assert onboarding["users"] == 20
+        assert onboarding["errors"] == 0
+        assert onboarding["endpoints"]["POST /internal/users/{user_id}/deposit"]["count"] == 20
+        assert steady["requests"] > 0
+        assert steady["errors"] == 0
+        assert set(steady["endpoints"]) <= {
+            "POST /api/v1/funds/subscribe", "POST /api/v1/funds/redeem", "GET /api/v1/assets/{user_id}",
+            "GET /api/v1/products", "GET /api/v1/users/{user_id}"
+        }
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
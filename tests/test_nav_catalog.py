@@ -0,0 +1,234 @@
+"""
+测试共享内存产品净值目录
+"""
+import fcntl
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from models import FundNetValue, FundProduct
+import nav_catalog
+from nav_catalog import NavCatalog
+from repository import Repository
+from service import FundService
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def catalog():
+    """创建目录，测试结束后删除"""
+    catalog = NavCatalog.create(capacity=8)
+    yield catalog
+    catalog.close()
+
+
+def _product(product_id="PROD_0000000000000001", **fields):
+    return FundProduct(product_id=product_id, product_code="000001", product_name="测试基金",
+                       issue_date=date(2024, 1, 1), **fields)
+
+
+def _nav(nav_date, net_value, product_id="PROD_0000000000000001", accumulated_nav=None):
+    return FundNetValue(nav_id=f"NAV_{nav_date:%Y%m%d}", product_id=product_id, net_value=net_value,
+                        accumulated_nav=accumulated_nav, nav_date=nav_date)
+
+
+def _run_python(code: str, *args: str) -> subprocess.Popen:
+    """在另一个进程中运行代码（项目根目录下）"""
+    return subprocess.Popen([sys.executable, "-c", code, *args], cwd=PROJECT_ROOT,
+                            stdout=subprocess.PIPE, text=True)
+
+
+class TestNavCatalog:
+    """测试目录的读写"""
+
+    def test_round_trip(self, catalog):
+        """测试产品与净值字段原样读回"""
+        product = _product(fund_company="测试基金公司", risk_level="R4")
+        catalog.publish_product(product)
+        assert catalog.get_latest_nav(product.product_id) is None
+        nav = _nav(date(2025, 1, 2), Decimal("1.23450000"), accumulated_nav=Decimal("2.5"))
+        assert catalog.publish_nav(nav)
+
+        assert catalog.get_product(product.product_id) == product.model_dump()
+        assert catalog.get_latest_nav(product.product_id) == nav.model_dump()
+        assert len(catalog) == 1
+        assert catalog.get_product("PROD_404") is None
+
+    def test_older_nav_not_replaced(self, catalog):
+        """测试只有日期不早于当前最新净值的净值才替换"""
+        catalog.publish_product(_product())
+        assert catalog.publish_nav(_nav(date(2025, 1, 2), Decimal("1.1")))
+        assert not catalog.publish_nav(_nav(date(2025, 1, 1), Decimal("1.0")))
+        assert catalog.get_latest_nav("PROD_0000000000000001")["net_value"] == Decimal("1.1")
+
+    def test_republish_product_keeps_nav(self, catalog):
+        """测试更新产品字段保留最新净值"""
+        catalog.publish_product(_product())
+        catalog.publish_nav(_nav(date(2025, 1, 2), Decimal("1.1")))
+        catalog.publish_product(_product(product_status="INACTIVE"))
+        assert len(catalog) == 1
+        assert catalog.get_product("PROD_0000000000000001")["product_status"] == "INACTIVE"
+        assert catalog.get_latest_nav("PROD_0000000000000001")["net_value"] == Decimal("1.1")
+
+    def test_capacity_and_field_width(self, catalog):
+        """测试目录已满与字段超长"""
+        for i in range(catalog.capacity):
+            catalog.publish_product(_product(f"PROD_{i:016d}"))
+        with pytest.raises(ValueError, match="目录已满"):
+            catalog.publish_product(_product("PROD_full"))
+        with pytest.raises(ValueError, match="目录定长"):
+            catalog.publish_product(_product("PROD_" + "x" * 40))
+        with pytest.raises(ValueError, match="不在目录中"):
+            catalog.publish_nav(_nav(date(2025, 1, 1), Decimal("1"), product_id="PROD_404"))
+
+    def test_visible_in_other_process(self, catalog):
+        """测试另一个进程映射目录后读到已发布的产品，其发布的净值本进程立即可见"""
+        catalog.publish_product(_product())
+        catalog.publish_nav(_nav(date(2025, 1, 1), Decimal("1.0")))
+        child = _run_python(
+            "import sys\n"
+            "from datetime import date\n"
+            "from decimal import Decimal\n"
+            "from models import FundNetValue\n"
+            "from nav_catalog import NavCatalog\n"
+            "catalog = NavCatalog.attach(sys.argv[1])\n"
+            "print(catalog.get_latest_nav('PROD_0000000000000001')['net_value'])\n"
+            "catalog.publish_nav(FundNetValue(nav_id='NAV_child', product_id='PROD_0000000000000001',\n"
+            "                                 net_value=Decimal('1.5'), nav_date=date(2025, 1, 2)))\n"
+            "catalog.close()\n",
+            catalog.name
+        )
+        assert child.communicate(timeout=30)[0].strip() == "1.0"
+        assert child.returncode == 0
+        nav = catalog.get_latest_nav("PROD_0000000000000001")
+        assert (nav["nav_id"], nav["net_value"]) == ("NAV_child", Decimal("1.5"))
+        assert catalog.generation == 3
+
+    def test_no_torn_reads(self, catalog):
+        """测试另一个进程连续写入时，读取到的净值与累计净值总是同一次写入的"""
+        catalog.publish_product(_product())
+        catalog.publish_nav(FundNetValue(nav_id="NAV_0", product_id="PROD_0000000000000001", net_value=Decimal(0),
+                                         accumulated_nav=Decimal(0), nav_date=date(2025, 1, 1)))
+        writer = _run_python(
+            "import sys\n"
+            "from datetime import date\n"
+            "from decimal import Decimal\n"
+            "from models import FundNetValue\n"
+            "from nav_catalog import NavCatalog\n"
+            "catalog = NavCatalog.attach(sys.argv[1])\n"
+            "for i in range(1, 20001):\n"
+            "    value = Decimal(i)\n"
+            "    catalog.publish_nav(FundNetValue(nav_id=f'NAV_{i}', product_id='PROD_0000000000000001',\n"
+            "                                     net_value=value, accumulated_nav=value, nav_date=date(2025, 1, 1)))\n"
+            "catalog.close()\n",
+            catalog.name
+        )
+        seen = set()
+        while writer.poll() is None:
+            nav = catalog.get_latest_nav("PROD_0000000000000001")
+            assert nav["net_value"] == nav["accumulated_nav"]
+            assert nav["nav_id"] == f"NAV_{nav['net_value']}"
+            seen.add(nav["net_value"])
+        assert writer.returncode == 0
+        assert catalog.get_latest_nav("PROD_0000000000000001")["net_value"] == Decimal(20000)
+        assert len(seen) > 1
+
+    def test_dead_writer_does_not_hang_readers(self, catalog):
+        """测试写入方中途退出（序号停在奇数）时读取方不会一直重读，重新写入后恢复"""
+        catalog.publish_product(_product())
+        catalog.publish_nav(_nav(date(2025, 1, 2), Decimal("1.1")))
+        offset = catalog._offset(0)
+        seq = nav_catalog._SEQ.unpack_from(catalog._buf, offset)[0]
+        nav_catalog._SEQ.pack_into(catalog._buf, offset, seq + 1)
+        catalog._cache.clear()
+        with pytest.raises(RuntimeError):
+            catalog.get_latest_nav("PROD_0000000000000001")
+
+        assert catalog.publish_nav(_nav(date(2025, 1, 3), Decimal("1.2")))
+        assert nav_catalog._SEQ.unpack_from(catalog._buf, offset)[0] % 2 == 0
+        assert catalog.get_latest_nav("PROD_0000000000000001")["net_value"] == Decimal("1.2")
+
+    def test_slow_writer_read_under_lock(self, catalog):
+        """测试写入方长时间未写完时读取方改为持锁读取，等写入完成后读到新值"""
+        catalog.publish_product(_product())
+        catalog.publish_nav(_nav(date(2025, 1, 2), Decimal("1.1")))
+        offset = catalog._offset(0)
+        seq = nav_catalog._SEQ.unpack_from(catalog._buf, offset)[0]
+        locked = threading.Event()
+
+        def slow_writer():
+            # 模拟另一个进程的写入方：持文件锁，序号为奇数期间停顿
+            with open(catalog._lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                nav_catalog._SEQ.pack_into(catalog._buf, offset, seq + 1)
+                locked.set()
+                time.sleep(0.2)
+                body = list(nav_catalog._BODY.unpack_from(catalog._buf, offset + nav_catalog._SEQ.size))
+                body[10] = b"1.3"
+                nav_catalog._BODY.pack_into(catalog._buf, offset + nav_catalog._SEQ.size, *body)
+                nav_catalog._SEQ.pack_into(catalog._buf, offset, seq + 2)
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        writer = threading.Thread(target=slow_writer)
+        writer.start()
+        locked.wait()
+        assert catalog.get_latest_nav("PROD_0000000000000001")["net_value"] == Decimal("1.3")
+        writer.join()
+
+
+class TestRepositoryCatalog:
+    """测试多个数据仓库（模拟多个工作进程）共用目录"""
+
+    def test_products_and_navs_shared(self, catalog):
+        """测试一个仓库创建的产品和净值，另一个仓库经目录读到"""
+        first, second = Repository(), Repository()
+        local = FundService(first).create_fund_product(product_code="000009", product_name="已有基金")
+        first.attach_catalog(catalog)
+        second.attach_catalog(catalog)
+        assert second.get_fund_product(local.product_id).product_name == "已有基金"
+
+        service = FundService(first)
+        product = service.create_fund_product(product_code="000010", product_name="债券基金",
+                                              product_type="BOND")
+        service.create_fund_nav(product.product_id, Decimal("1.0"), nav_date=date(2025, 1, 1))
+        service.create_fund_nav(product.product_id, Decimal("1.2"), nav_date=date(2025, 1, 2))
+
+        assert second.get_fund_product(product.product_id) == product
+        assert second.get_latest_nav(product.product_id).net_value == Decimal("1.2")
+        assert [p.product_id for p in second.list_fund_products("BOND")] == [product.product_id]
+        assert len(second.list_fund_products()) == 2
+        # 净值历史仍只在写入的仓库中
+        assert second.get_nav_as_of(product.product_id, date(2025, 1, 1)) is None
+        assert first.get_nav_as_of(product.product_id, date(2025, 1, 1)).net_value == Decimal("1.0")
+
+    def test_attach_in_other_process(self, catalog):
+        """测试另一个进程的仓库接入目录后看到本进程发布的净值"""
+        repository = Repository()
+        repository.attach_catalog(catalog)
+        service = FundService(repository)
+        product = service.create_fund_product(product_code="000011", product_name="跨进程基金")
+        service.create_fund_nav(product.product_id, Decimal("1.3579"), nav_date=date(2025, 1, 1))
+        child = _run_python(
+            "import sys\n"
+            "from nav_catalog import NavCatalog\n"
+            "from repository import Repository\n"
+            "repository = Repository()\n"
+            "repository.attach_catalog(NavCatalog.attach(sys.argv[1]))\n"
+            "print(repository.get_latest_nav(sys.argv[2]).net_value)\n",
+            catalog.name, product.product_id
+        )
+        assert child.communicate(timeout=30)[0].strip() == "1.3579"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,244 @@
+"""
+测试委托与确认历史索引及用户委托历史查询接口
+"""
+import os
+import sys
+import warnings
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from order_history import OrderHistory
+from repository import Repository
+from service import FundService
+from sqlite_repository import SqliteRepository
+
+HEADERS = {"Authorization": "Bearer demo_token_2025"}
+T0 = datetime(2025, 1, 1, 9, 30)
+
+
+def _paginate(query, limit, **kwargs):
+    """按游标读完所有页，返回每页的ID列表"""
+    pages, cursor = [], None
+    while True:
+        ids, cursor = query(limit=limit, cursor=cursor, **kwargs)
+        pages.append(ids)
+        if cursor is None:
+            return pages
+
+
+class TestOrderHistory:
+    """测试历史索引"""
+
+    @pytest.fixture
+    def history(self):
+        history = OrderHistory()
+        for i in range(20):
+            account = "ACC_A" if i % 2 == 0 else "ACC_B"
+            product = "PROD_X" if i % 3 == 0 else "PROD_Y"
+            entrust_id = f"ENT_{i:03d}"
+            history.add_entrust(entrust_id, "U1", "SUCCESS", "FUND_SUBSCRIBE", T0 + timedelta(minutes=i))
+            history.add_transaction(entrust_id, account, product, "SUBSCRIBE")
+            history.add_confirm(f"CFM_{i:03d}", entrust_id, T0 + timedelta(minutes=i, seconds=30))
+        history.add_entrust("ENT_OTHER", "U2", "SUCCESS", "FUND_SUBSCRIBE", T0)
+        history.add_entrust("ENT_OPEN", "U1", "SUCCESS", "ACCOUNT_OPEN", T0 - timedelta(days=1))
+        return history
+
+    def test_pages_newest_first(self, history):
+        """测试游标分页按时间倒序返回全部委托，不重复不遗漏"""
+        pages = _paginate(history.user_entrusts, 6, user_id="U1")
+        assert [len(page) for page in pages] == [6, 6, 6, 3]
+        ids = [entrust_id for page in pages for entrust_id in page]
+        assert ids == [f"ENT_{i:03d}" for i in reversed(range(20))] + ["ENT_OPEN"]
+
+    def test_exact_last_page(self, history):
+        """测试最后一页正好满页时不返回游标"""
+        ids, cursor = history.user_entrusts("U1", limit=21)
+        assert len(ids) == 21 and cursor is None
+
+    def test_filters(self, history):
+        """测试按状态、业务类型、时间范围过滤"""
+        assert history.user_entrusts("U1", status="FAILED")[0] == []
+        assert history.user_entrusts("U1", business_type="ACCOUNT_OPEN")[0] == ["ENT_OPEN"]
+        ids, _ = history.user_entrusts("U1", start=T0 + timedelta(minutes=5),
+                                       end=T0 + timedelta(minutes=8), limit=100)
+        assert ids == ["ENT_007", "ENT_006", "ENT_005"]
+
+    def test_product_across_accounts(self, history):
+        """测试按产品查询合并用户各账户的 idx_account_product 项，仍按时间倒序"""
+        pages = _paginate(history.user_entrusts, 3, user_id="U1",
+                          fund_account_ids=["ACC_A", "ACC_B"], product_id="PROD_X")
+        ids = [entrust_id for page in pages for entrust_id in page]
+        assert ids == [f"ENT_{i:03d}" for i in reversed(range(20)) if i % 3 == 0]
+        # 只查其中一个账户
+        ids, _ = history.user_entrusts("U1", fund_account_ids=["ACC_A"], product_id="PROD_X", limit=100)
+        assert ids == ["ENT_018", "ENT_012", "ENT_006", "ENT_000"]
+
+    def test_status_update_moves_entry(self, history):
+        """测试委托状态变化后按新状态查询，idx_transaction_type 同步更新"""
+        history.add_entrust("ENT_004", "U1", "FAILED", "FUND_SUBSCRIBE", T0 + timedelta(minutes=4))
+        assert history.user_entrusts("U1", status="FAILED")[0] == ["ENT_004"]
+        assert "ENT_004" not in history.user_entrusts("U1", status="SUCCESS", limit=100)[0]
+        assert history.transaction_count("SUBSCRIBE", "FAILED") == 1
+        assert history.transaction_count("SUBSCRIBE", "SUCCESS") == 19
+        assert history.transaction_count("SUBSCRIBE") == 20
+
+    def test_cursor_stable_under_inserts(self, history):
+        """测试翻页期间写入的新委托不影响后续页（游标按排序键定位，不按偏移量）"""
+        first, cursor = history.user_entrusts("U1", limit=5)
+        for i in range(5):
+            history.add_entrust(f"ENT_NEW{i}", "U1", "SUCCESS", "FUND_SUBSCRIBE", T0 + timedelta(hours=1, minutes=i))
+        second, _ = history.user_entrusts("U1", limit=5, cursor=cursor)
+        assert second == [f"ENT_{i:03d}" for i in range(14, 9, -1)]
+
+    def test_same_time_ordered_by_id(self):
+        """测试创建时间相同的委托按ID区分，分页不重复"""
+        history = OrderHistory()
+        for i in range(7):
+            history.add_entrust(f"ENT_{i}", "U1", "SUCCESS", "FUND_SUBSCRIBE", T0)
+        pages = _paginate(history.user_entrusts, 2, user_id="U1")
+        assert [entrust_id for page in pages for entrust_id in page] == [f"ENT_{i}" for i in reversed(range(7))]
+
+    def test_confirms(self, history):
+        """测试按确认时间倒序分页查询确认记录（idx_user_confirm）"""
+        pages = _paginate(history.user_confirms, 8, user_id="U1")
+        assert [confirm_id for page in pages for confirm_id in page] == [f"CFM_{i:03d}" for i in reversed(range(20))]
+        assert history.user_confirms("U2")[0] == []
+        ids, _ = history.user_confirms("U1", end=T0 + timedelta(minutes=2), limit=100)
+        assert ids == ["CFM_001", "CFM_000"]
+
+    def test_invalid_cursor(self, history):
+        """测试未知的游标"""
+        with pytest.raises(ValueError, match="无效的分页游标"):
+            history.user_entrusts("U1", cursor="ENT_MISSING")
+        with pytest.raises(ValueError, match="无效的分页游标"):
+            history.user_confirms("U1", cursor="ENT_000")
+
+
+def _trade(service, repeat=3):
+    """创建用户、两个账户和两只产品，各账户每只产品申购 repeat 次，返回 (用户ID, 账户, 产品)"""
+    user_id = service.create_user("历史用户").user_id
+    service.deposit(user_id, Decimal("100000"))
+    accounts = [service.open_fund_account(user_id).fund_account_id for _ in range(2)]
+    products = []
+    for code in ("700001", "700002"):
+        product_id = service.create_fund_product(product_code=code, product_name=f"基金{code}").product_id
+        service.create_fund_nav(product_id, Decimal("1.0000"), nav_date=date(2025, 1, 1))
+        products.append(product_id)
+    for _ in range(repeat):
+        for account_id in accounts:
+            for product_id in products:
+                service.subscribe_fund(account_id, product_id, Decimal("100"))
+    return user_id, accounts, products
+
+
+class TestRepositoryHistory:
+    """测试仓库的委托与确认历史查询"""
+
+    def test_service_history(self):
+        """测试委托历史附带交易字段，按产品、业务类型过滤"""
+        service = FundService(Repository())
+        user_id, accounts, products = _trade(service)
+        page = service.list_user_entrusts(user_id, product_id=products[0], limit=100)
+        assert len(page["items"]) == 6 and page["next_cursor"] is None
+        assert {item["product_id"] for item in page["items"]} == {products[0]}
+        assert {item["fund_account_id"] for item in page["items"]} == set(accounts)
+        item = page["items"][0]
+        assert item["amount"] == 100.0 and item["share"] == 100.0 and item["nav"] == 1.0 and item["fee"] == 0.0
+        assert all(type(item[field]) is float for field in ("amount", "share", "nav", "fee"))
+        opens = service.list_user_entrusts(user_id, business_type="ACCOUNT_OPEN")
+        assert len(opens["items"]) == 2 and "product_id" not in opens["items"][0]
+        confirms = service.list_user_confirms(user_id, limit=5)
+        assert len(confirms["items"]) == 5 and confirms["next_cursor"] is not None
+
+    def test_no_serializer_warnings(self, tmp_path):
+        """测试字典模式写入和查询委托历史不产生 Pydantic 序列化警告"""
+        repo = SqliteRepository(str(tmp_path / "warnings.db"))
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                service = FundService(repo)
+                user_id, _, _ = _trade(service, repeat=1)
+                service.list_user_entrusts(user_id)
+                service.list_user_confirms(user_id)
+        finally:
+            repo.close()
+
+    def test_rebuilt_on_open(self, tmp_path):
+        """测试重新打开数据库时由表数据重建索引"""
+        path = str(tmp_path / "history.db")
+        repo = SqliteRepository(path)
+        user_id, accounts, products = _trade(FundService(repo), repeat=1)
+        expected = repo.list_user_entrusts(user_id, limit=100)[0]
+        repo.close()
+
+        repo = SqliteRepository(path)
+        try:
+            entrusts, _ = repo.list_user_entrusts(user_id, limit=100)
+            assert [e.entrust_id for e in entrusts] == [e.entrust_id for e in expected]
+            entrusts, _ = repo.list_user_entrusts(user_id, product_id=products[1], limit=100)
+            assert len(entrusts) == 2
+            assert len(repo.list_user_confirms(user_id, limit=100)[0]) == 4
+        finally:
+            repo.close()
+
+
+class TestHistoryEndpoints:
+    """测试委托历史接口"""
+
+    @pytest.fixture(scope="class")
+    def context(self):
+        import main
+        with TestClient(main.app) as client:
+            user_id, accounts, products = _trade(main.fund_service, repeat=2)
+            yield client, user_id, products
+
+    def test_entrust_pages(self, context):
+        """测试按游标读完委托历史"""
+        client, user_id, _ = context
+        ids, cursor = [], None
+        while True:
+            params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            response = client.get(f"/api/v1/users/{user_id}/entrusts", headers=HEADERS, params=params)
+            assert response.status_code == 200
+            data = response.json()["data"]
+            ids += [item["entrust_id"] for item in data["items"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        # 2 次开户 + 2 账户 × 2 产品 × 2 次申购
+        assert len(ids) == len(set(ids)) == 10
+
+    def test_entrust_filters(self, context):
+        """测试按状态、产品、时间范围过滤"""
+        client, user_id, products = context
+        url = f"/api/v1/users/{user_id}/entrusts"
+        data = client.get(url, headers=HEADERS, params={"product_id": products[0], "status": "SUCCESS"}).json()["data"]
+        assert len(data["items"]) == 4
+        future = (datetime.now() + timedelta(days=1)).isoformat()
+        data = client.get(url, headers=HEADERS, params={"start_time": future}).json()["data"]
+        assert data == {"items": [], "next_cursor": None}
+
+    def test_confirms(self, context):
+        """测试确认记录接口"""
+        client, user_id, _ = context
+        data = client.get(f"/api/v1/users/{user_id}/confirms", headers=HEADERS).json()["data"]
+        assert len(data["items"]) == 8
+
+    def test_errors(self, context):
+        """测试用户不存在、游标无效、每页条数超限"""
+        client, user_id, _ = context
+        assert client.get("/api/v1/users/USER_MISSING/entrusts", headers=HEADERS).status_code == 404
+        response = client.get(f"/api/v1/users/{user_id}/entrusts", headers=HEADERS, params={"cursor": "bad"})
+        assert response.status_code == 400
+        response = client.get(f"/api/v1/users/{user_id}/confirms", headers=HEADERS, params={"limit": 501})
+        assert response.status_code == 422
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
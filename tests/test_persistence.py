@@ -0,0 +1,263 @@
+"""
+测试预写日志、快照与恢复
+"""
+import os
+import sys
+import threading
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from common.persistence import Persistence, WriteAheadLog
+from common.repository import BaseRepository
+from repository import Repository, STORAGE_MODE_DICT, STORAGE_MODE_MODEL
+from service import FundService
+
+
+def _run_interleaved(threads):
+    """缩短线程切换间隔后运行线程，让写入与快照尽量交错"""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+
+class TestWriteAheadLog:
+    """测试日志的追加、组提交与截断"""
+
+    @pytest.mark.parametrize("group_commit", [True, False])
+    def test_append_and_replay(self, tmp_path, group_commit):
+        """测试追加后按序重放"""
+        wal = WriteAheadLog(str(tmp_path), group_commit=group_commit, fsync=False)
+        list(wal.replay())
+        wal.open()
+        for i in range(100):
+            assert wal.append(('put', i)) == i + 1
+        wal.close()
+
+        wal = WriteAheadLog(str(tmp_path), fsync=False)
+        assert list(wal.replay()) == [('put', i) for i in range(100)]
+        assert list(wal.replay(after_seq=99)) == [('put', 99)]
+
+    def test_group_commit_batches_writers(self, tmp_path):
+        """测试并发写入合并为少量提交"""
+        wal = WriteAheadLog(str(tmp_path), fsync=False)
+        wal.open()
+
+        def writer(n):
+            for i in range(200):
+                wal.append((n, i))
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wal.close()
+        assert wal.commits < 1600
+        assert len(list(WriteAheadLog(str(tmp_path)).replay())) == 1600
+
+    def test_torn_tail_truncated(self, tmp_path):
+        """测试崩溃时写了一半的尾部记录被截断"""
+        wal = WriteAheadLog(str(tmp_path), fsync=False)
+        wal.open()
+        wal.append('a')
+        wal.append('b')
+        wal.close()
+        _, path = wal.segments()[-1]
+        size = os.path.getsize(path)
+        with open(path, 'r+b') as f:
+            f.truncate(size - 3)
+
+        wal = WriteAheadLog(str(tmp_path), fsync=False)
+        assert list(wal.replay()) == ['a']
+        wal.open()
+        wal.append('c')
+        wal.close()
+        assert list(WriteAheadLog(str(tmp_path)).replay()) == ['a', 'c']
+
+
+class TestRepositoryRecovery:
+    """测试仓库从快照和日志恢复"""
+
+    def _seed(self, service):
+        """创建用户、账户、产品、净值并申购"""
+        user = service.create_user(user_name="测试用户")
+        balance = service.repo.get_user_balance(user.user_id)
+        balance.available_balance = Decimal("10000")
+        service.repo.update_user_balance(balance)
+        account = service.open_fund_account(user.user_id)
+        product = service.create_fund_product(product_code="001234", product_name="测试基金")
+        service.create_fund_nav(product_id=product.product_id, net_value=Decimal("2.0000"),
+                                nav_date=date(2025, 1, 1))
+        service.subscribe_fund(account.fund_account_id, product.product_id, Decimal("4000"))
+        return user.user_id, account.fund_account_id, product.product_id
+
+    @pytest.mark.parametrize("storage_mode", [STORAGE_MODE_MODEL, STORAGE_MODE_DICT])
+    @pytest.mark.parametrize("take_snapshot", [False, True])
+    def test_recover(self, tmp_path, storage_mode, take_snapshot):
+        """测试重启后数据、二级索引和资产聚合都恢复"""
+        repo = Repository(storage_mode, Persistence(str(tmp_path), fsync=False))
+        service = FundService(repo)
+        user_id, account_id, product_id = self._seed(service)
+        if take_snapshot:
+            repo.snapshot()
+        # 快照之后的日志尾部
+        service.create_fund_nav(product_id=product_id, net_value=Decimal("2.5000"),
+                                nav_date=date(2025, 1, 2))
+        service.redeem_fund(account_id, product_id, Decimal("1000"))
+        expected = service.get_user_assets(user_id)
+        repo.close()
+
+        repo = Repository(storage_mode, Persistence(str(tmp_path), fsync=False))
+        service = FundService(repo)
+        assert service.get_user_assets(user_id) == expected
+        assert repo.get_user_balance(user_id).available_balance == Decimal("8500")
+        assert repo.get_fund_share(account_id, product_id).total_share == Decimal("1000")
+        assert [a.fund_account_id for a in repo.get_user_fund_accounts(user_id)] == [account_id]
+        assert repo.get_nav_as_of(product_id, date(2025, 1, 1)).net_value == Decimal("2.0000")
+        # 恢复后继续写入
+        service.subscribe_fund(account_id, product_id, Decimal("500"))
+        repo.close()
+
+    def test_periodic_snapshot_compacts_log(self, tmp_path):
+        """测试定期快照后旧日志段被删除"""
+        persistence = Persistence(str(tmp_path), snapshot_every=10, fsync=False)
+        repo = Repository(persistence=persistence)
+        service = FundService(repo)
+        user_id = self._seed(service)[0]
+        repo.close()
+        assert os.path.exists(tmp_path / "snapshot.pkl")
+        assert len(persistence.wal.segments()) == 1
+
+        repo = Repository(persistence=Persistence(str(tmp_path), fsync=False))
+        assert repo.get_user_balance(user_id).available_balance == Decimal("6000")
+        repo.close()
+
+    def test_snapshot_during_concurrent_trades(self, tmp_path):
+        """测试多线程申购期间自动快照：快照不影响交易，恢复后余额与份额一致"""
+        persistence = Persistence(str(tmp_path), snapshot_every=50, fsync=False, sync_commit=False)
+        repo = Repository(persistence=persistence)
+        service = FundService(repo)
+        product_id = service.create_fund_product(product_code="001234", product_name="测试基金").product_id
+        service.create_fund_nav(product_id=product_id, net_value=Decimal("1.0000"), nav_date=date(2025, 1, 1))
+        accounts = []
+        for i in range(8):
+            user_id = service.create_user(user_name=f"用户{i}").user_id
+            service.deposit(user_id, Decimal("1000"))
+            accounts.append((user_id, service.open_fund_account(user_id).fund_account_id))
+        errors = []
+
+        def trade(account_id):
+            try:
+                for _ in range(200):
+                    service.subscribe_fund(account_id, product_id, Decimal("1"))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=trade, args=(account_id,)) for _, account_id in accounts]
+        _run_interleaved(threads)
+        repo.close()
+        assert errors == []
+        assert len(persistence.wal.segments()) == 1
+
+        repo = Repository(persistence=Persistence(str(tmp_path), fsync=False))
+        for user_id, account_id in accounts:
+            balance = repo.get_user_balance(user_id)
+            assert (balance.available_balance, balance.frozen_balance) == (Decimal("800"), Decimal("0"))
+            assert repo.get_fund_share(account_id, product_id).total_share == Decimal("200")
+        repo.close()
+
+    def test_snapshot_failure_not_raised(self, tmp_path, monkeypatch):
+        """测试自动快照失败时写操作照常完成，之后再次达到阈值时重试"""
+        persistence = Persistence(str(tmp_path), snapshot_every=5, fsync=False)
+        repo = Repository(persistence=persistence)
+        attempts = []
+
+        def broken_state():
+            attempts.append(1)
+            raise OSError("磁盘已满")
+
+        monkeypatch.setattr(repo, '_snapshot_state', broken_state)
+        service = FundService(repo)
+        user_id = service.create_user(user_name="测试用户").user_id
+        for _ in range(20):
+            service.deposit(user_id, Decimal("1"))
+        assert len(attempts) >= 2
+        monkeypatch.undo()
+        for _ in range(20):
+            service.deposit(user_id, Decimal("1"))
+        repo.close()
+        assert os.path.exists(tmp_path / "snapshot.pkl")
+
+        repo = Repository(persistence=Persistence(str(tmp_path), fsync=False))
+        assert repo.get_user_balance(user_id).available_balance == Decimal("40")
+        repo.close()
+
+    def test_storage_mode_mismatch(self, tmp_path):
+        """测试快照与存储模式不一致"""
+        repo = Repository(persistence=Persistence(str(tmp_path), fsync=False))
+        repo.snapshot()
+        repo.close()
+        with pytest.raises(ValueError):
+            Repository(STORAGE_MODE_DICT, Persistence(str(tmp_path), fsync=False))
+
+
+class TestBaseRepositoryRecovery:
+    """测试统一数据存储层从快照和日志恢复"""
+
+    def test_recover_with_indexes(self, tmp_path):
+        """测试恢复后记录与索引一致"""
+        repo = BaseRepository(persistence=Persistence(str(tmp_path), fsync=False))
+        for i in range(3):
+            repo.create("fund_account", {'id': f"ACC_{i}", 'user_id': "USER_001", 'account_no': f"F{i}"})
+        repo.snapshot()
+        repo.update("fund_account", "ACC_1", {'user_id': "USER_002"})
+        repo.delete("fund_account", "ACC_2")
+        repo.close()
+
+        repo = BaseRepository(persistence=Persistence(str(tmp_path), fsync=False))
+        assert [r['id'] for r in repo.list("fund_account", {'user_id': "USER_001"})] == ["ACC_0"]
+        assert [r['id'] for r in repo.list("fund_account", {'user_id': "USER_002"})] == ["ACC_1"]
+        assert not repo.exists("fund_account", "ACC_2")
+        with pytest.raises(ValueError):
+            repo.create("fund_account", {'id': "ACC_9", 'user_id': "USER_003", 'account_no': "F0"})
+        repo.close()
+
+    def test_snapshot_during_concurrent_writes(self, tmp_path):
+        """测试并发创建、原地更新记录时做快照，恢复后记录完整"""
+        persistence = Persistence(str(tmp_path), snapshot_every=20, fsync=False, sync_commit=False)
+        repo = BaseRepository(declare_schema_indexes=False, persistence=persistence)
+        errors = []
+
+        def writer(n):
+            try:
+                for i in range(300):
+                    repo.create(f"table_{n}_{i % 3}", {'id': f"R{i}", 'value': 0})
+                    repo.update(f"table_{n}_{i % 3}", f"R{i}", {'value': i})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(6)]
+        _run_interleaved(threads)
+        repo.close()
+        assert errors == []
+
+        repo = BaseRepository(declare_schema_indexes=False, persistence=Persistence(str(tmp_path), fsync=False))
+        for n in range(6):
+            for i in range(300):
+                assert repo.get(f"table_{n}_{i % 3}", f"R{i}")['value'] == i
+        repo.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,179 @@
+"""
+测试列式持仓存储及其在仓库中的使用
+"""
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from common.persistence import Persistence
+from models import FundShare
+from position_store import PositionStore, ShareView
+from repository import Repository, STORAGE_MODE_DICT, STORAGE_MODE_MODEL
+from service import FundService
+
+
+def _share(share_id="SHARE_00000000000000a1", account_id="ACC_1", product_id="PROD_1", total="100"):
+    return FundShare(share_id=share_id, fund_account_id=account_id, product_id=product_id,
+                     total_share=Decimal(total), available_share=Decimal(total),
+                     last_update=datetime(2025, 1, 2, 3, 4, 5, 678901))
+
+
+class TestPositionStore:
+    """测试列式持仓存储"""
+
+    def test_put_and_get(self):
+        """测试写入后读出相同字段的视图，份额按 4 位小数存储"""
+        store = PositionStore()
+        share = _share(total="8100.445524503848")
+        view = store.put(share)
+        assert isinstance(view, ShareView)
+        assert view.total_share == Decimal("8100.4455")
+        assert store.get("ACC_1", "PROD_1").model_dump() == {
+            **share.model_dump(), "total_share": Decimal("8100.4455"), "available_share": Decimal("8100.4455")
+        }
+        assert store.get("ACC_1", "PROD_2") is None
+        assert store.get("ACC_2", "PROD_1") is None
+        assert len(store) == 1
+
+    def test_view_is_detached(self):
+        """测试修改视图不影响存储，写回后才生效"""
+        store = PositionStore()
+        store.put(_share())
+        view = store.get("ACC_1", "PROD_1")
+        view.available_share -= Decimal("30")
+        view.frozen_share += Decimal("30")
+        assert store.get("ACC_1", "PROD_1").available_share == Decimal("100")
+        store.put(view)
+        stored = store.get("ACC_1", "PROD_1")
+        assert (stored.available_share, stored.frozen_share) == (Decimal("70"), Decimal("30"))
+        assert len(store) == 1
+
+    def test_account_shares_in_write_order(self):
+        """测试按账户读取全部持仓，保持首次写入顺序"""
+        store = PositionStore()
+        for i, (account_id, product_id) in enumerate([("ACC_1", "PROD_2"), ("ACC_2", "PROD_1"),
+                                                      ("ACC_1", "PROD_1"), ("ACC_1", "PROD_3")]):
+            store.put(_share(f"SHARE_{i:016x}", account_id, product_id))
+        store.put(_share("SHARE_0000000000000000", "ACC_1", "PROD_2", total="5"))
+        assert [v.product_id for v in store.account_shares("ACC_1")] == ["PROD_2", "PROD_1", "PROD_3"]
+        assert store.account_shares("ACC_1")[0].total_share == Decimal("5")
+        assert [v.product_id for v in store.account_shares("ACC_2")] == ["PROD_1"]
+        assert store.account_shares("ACC_404") == []
+
+    def test_share_ids(self):
+        """测试标准格式的份额ID压缩存储，其他格式原样保留"""
+        store = PositionStore()
+        ids = ["SHARE_0123456789abcdef", "SHARE_0123456789ABCDEF", "SHARE_0123_56789abcde", "S1", "SHARE_1"]
+        for i, share_id in enumerate(ids):
+            store.put(_share(share_id, product_id=f"PROD_{i}"))
+        assert [store.get("ACC_1", f"PROD_{i}").share_id for i in range(len(ids))] == ids
+        assert [share_id for share_id, _ in store.items()] == ids
+
+    def test_conflicting_share_id(self):
+        """测试同一账户、产品已有其他份额ID的持仓时拒绝写入"""
+        store = PositionStore()
+        store.put(_share())
+        with pytest.raises(ValueError, match="已存在"):
+            store.put(_share("SHARE_00000000000000b2"))
+
+    def test_compare(self):
+        """测试比较份额ID与可用、冻结份额"""
+        store = PositionStore()
+        store.put(_share())
+        assert store.compare("ACC_1", "PROD_1", "SHARE_00000000000000a1", Decimal("100"), Decimal("0"))
+        assert not store.compare("ACC_1", "PROD_1", "SHARE_00000000000000a1", Decimal("99"), Decimal("0"))
+        assert not store.compare("ACC_1", "PROD_1", "SHARE_00000000000000b2", Decimal("100"), Decimal("0"))
+        assert not store.compare("ACC_1", "PROD_2", "SHARE_00000000000000a1", Decimal("100"), Decimal("0"))
+
+    def test_overflow(self):
+        """测试超出定点范围的份额被拒绝且不破坏已有数据"""
+        store = PositionStore()
+        store.put(_share())
+        with pytest.raises(ValueError, match="范围"):
+            store.put(_share("SHARE_00000000000000b2", product_id="PROD_2", total="1e20"))
+        with pytest.raises(ValueError, match="范围"):
+            store.put(_share(total="1e20"))
+        assert len(store) == 1
+        assert store.get("ACC_1", "PROD_1").total_share == Decimal("100")
+        assert store.get("ACC_1", "PROD_2") is None
+
+
+class TestColumnarRepository:
+    """测试仓库使用列式持仓存储"""
+
+    def _seed(self, service):
+        """创建用户、账户、产品、净值并申购"""
+        user = service.create_user(user_name="测试用户")
+        service.deposit(user.user_id, Decimal("10000"))
+        account = service.open_fund_account(user.user_id)
+        product = service.create_fund_product(product_code="001234", product_name="测试基金")
+        service.create_fund_nav(product_id=product.product_id, net_value=Decimal("2.0000"),
+                                nav_date=date(2025, 1, 1))
+        service.subscribe_fund(account.fund_account_id, product.product_id, Decimal("4000"))
+        return user.user_id, account.fund_account_id, product.product_id
+
+    def test_trading_flow(self):
+        """测试申购、赎回与资产计算"""
+        service = FundService(Repository(columnar_positions=True))
+        user_id, account_id, product_id = self._seed(service)
+        service.redeem_fund(account_id, product_id, Decimal("500"))
+
+        share = service.repo.get_fund_share(account_id, product_id)
+        assert isinstance(share, ShareView)
+        assert share.total_share == Decimal("1500")
+        assert [s.share_id for s in service.repo.get_account_shares(account_id)] == [share.share_id]
+        assert service.get_user_assets(user_id)['total_asset'] == 10000.0
+        assert service.calculate_user_assets(user_id)['total_fund_asset'] == 3000.0
+        assert service.repo._storage['fund_shares'] == {}
+
+    def test_compare_and_set(self):
+        """测试读取后份额已变化时比较并更新失败"""
+        repo = Repository(columnar_positions=True)
+        repo.create_or_update_fund_share(_share())
+        first = repo.get_fund_share("ACC_1", "PROD_1")
+        second = repo.get_fund_share("ACC_1", "PROD_1")
+        first.available_share -= Decimal("10")
+        first.frozen_share += Decimal("10")
+        assert repo.compare_and_set_fund_share(first, Decimal("100"), Decimal("0"))
+        second.available_share -= Decimal("20")
+        assert not repo.compare_and_set_fund_share(second, Decimal("100"), Decimal("0"))
+        assert repo.get_fund_share("ACC_1", "PROD_1").available_share == Decimal("90")
+
+    @pytest.mark.parametrize("storage_mode", [STORAGE_MODE_MODEL, STORAGE_MODE_DICT])
+    @pytest.mark.parametrize("take_snapshot", [False, True])
+    def test_recover(self, tmp_path, storage_mode, take_snapshot):
+        """测试从快照和日志恢复列式持仓"""
+        repo = Repository(storage_mode, Persistence(str(tmp_path), fsync=False), columnar_positions=True)
+        service = FundService(repo)
+        user_id, account_id, product_id = self._seed(service)
+        if take_snapshot:
+            repo.snapshot()
+        service.redeem_fund(account_id, product_id, Decimal("1000"))
+        expected = service.get_user_assets(user_id)
+        repo.close()
+
+        repo = Repository(storage_mode, Persistence(str(tmp_path), fsync=False), columnar_positions=True)
+        assert repo.get_fund_share(account_id, product_id).total_share == Decimal("1000")
+        assert FundService(repo).get_user_assets(user_id) == expected
+        repo.close()
+
+    def test_recover_from_row_storage(self, tmp_path):
+        """测试普通存储写入的快照可由列式持仓的仓库恢复"""
+        repo = Repository(persistence=Persistence(str(tmp_path), fsync=False))
+        _, account_id, product_id = self._seed(FundService(repo))
+        repo.snapshot()
+        repo.close()
+
+        repo = Repository(persistence=Persistence(str(tmp_path), fsync=False), columnar_positions=True)
+        assert repo.get_fund_share(account_id, product_id).total_share == Decimal("2000")
+        repo.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,166 @@
+"""
+测试产品列表视图：失效、筛选、游标分页与 ETag
+"""
+import json
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from common.repository import BaseRepository
+from product_listing import ProductListing, etag_matches
+from repository import Repository
+from service import FundService
+from unified_repository import UnifiedRepository
+
+HEADERS = {"Authorization": "Bearer demo_token_2025"}
+
+
+def _items(page):
+    return json.loads(page.body)["data"]
+
+
+@pytest.fixture
+def context():
+    """仓库、服务、视图，以及 5 个产品（偶数序号为债券型、R2）"""
+    repo = Repository()
+    service = FundService(repo)
+    product_ids = []
+    for i in range(5):
+        product = service.create_fund_product(
+            product_code=f"00000{i}", product_name=f"基金{i}",
+            product_type="BOND" if i % 2 == 0 else "EQUITY", risk_level="R2" if i % 2 == 0 else "R4"
+        )
+        service.create_fund_nav(product.product_id, Decimal("1.5"), nav_date=date(2025, 1, 2))
+        product_ids.append(product.product_id)
+    return repo, service, ProductListing(repo), product_ids
+
+
+class TestProductListing:
+    """测试产品列表视图"""
+
+    def test_rows_match_endpoint_format(self, context):
+        """测试每个产品带最新净值，格式与原接口一致"""
+        _, _, listing, product_ids = context
+        items = _items(listing.page())
+        assert [item["product_id"] for item in items] == product_ids
+        assert items[0]["latest_nav"] == {"net_value": 1.5, "accumulated_nav": 1.5, "nav_date": "2025-01-02"}
+
+    def test_cached_until_changed(self, context):
+        """测试数据不变时复用同一结果，新产品和新的最新净值使视图失效"""
+        _, service, listing, product_ids = context
+        page = listing.page()
+        assert listing.page() is page
+
+        # 早于最新净值的历史净值不改变列表
+        service.create_fund_nav(product_ids[0], Decimal("1.4"), nav_date=date(2025, 1, 1))
+        assert listing.page() is page
+
+        service.create_fund_nav(product_ids[0], Decimal("1.6"), nav_date=date(2025, 1, 3))
+        changed = listing.page()
+        assert changed.etag != page.etag
+        assert _items(changed)[0]["latest_nav"]["net_value"] == 1.6
+
+        product = service.create_fund_product(product_code="000009", product_name="新基金")
+        assert _items(listing.page())[-1]["product_id"] == product.product_id
+
+    def test_filters(self, context):
+        """测试按类型、风险等级、状态筛选"""
+        _, _, listing, product_ids = context
+        assert [item["product_id"] for item in _items(listing.page(product_type="BOND"))] == product_ids[::2]
+        assert [item["product_id"] for item in _items(listing.page(risk_level="R4"))] == product_ids[1::2]
+        assert _items(listing.page(product_type="BOND", risk_level="R4")) == []
+        assert len(_items(listing.page(product_status="ACTIVE", product_type=None))) == 5
+        with pytest.raises(ValueError):
+            listing.page(fund_company="x")
+
+    def test_cursor_pagination(self, context):
+        """测试游标分页遍历全部产品，筛选条件在各页保持"""
+        _, _, listing, product_ids = context
+        seen, cursor = [], None
+        while True:
+            page = listing.page(cursor, 2)
+            seen += [item["product_id"] for item in _items(page)]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert seen == product_ids
+
+        first = listing.page(None, 2, product_type="BOND")
+        assert first.next_cursor == product_ids[2]
+        last = listing.page(first.next_cursor, 2, product_type="BOND")
+        assert [item["product_id"] for item in _items(last)] == [product_ids[4]]
+        assert last.next_cursor is None
+        with pytest.raises(ValueError, match="游标"):
+            listing.page("PROD_404", 2)
+
+    def test_etag_matches(self):
+        """测试 If-None-Match 的多值、弱校验与通配"""
+        assert etag_matches('"a", "b"', '"b"')
+        assert etag_matches('W/"b"', '"b"')
+        assert etag_matches('*', '"b"')
+        assert not etag_matches('"a"', '"b"')
+        assert not etag_matches(None, '"b"')
+
+    def test_module_writes_invalidate(self):
+        """测试统一存储中模块直接写入的产品同样使视图失效"""
+        store = BaseRepository()
+        listing = ProductListing(UnifiedRepository(store))
+        assert _items(listing.page()) == []
+        now = datetime.now()
+        store.create("fund_product", {
+            'id': "PROD_M1", 'product_id': "PROD_M1", 'product_code': "000100", 'product_name': "模块基金",
+            'product_type': "EQUITY", 'product_status': "ACTIVE", 'risk_level': "R3", 'fund_company': None,
+            'issue_date': date(2025, 1, 1), 'create_time': now
+        })
+        assert [item["product_id"] for item in _items(listing.page())] == ["PROD_M1"]
+
+
+class TestProductsEndpoint:
+    """测试 GET /api/v1/products 的分页与 304"""
+
+    @pytest.fixture(scope="class")
+    def client(self):
+        import main
+        with TestClient(main.app) as client:
+            for i in range(3):
+                client.post("/api/v1/products", headers=HEADERS, json={
+                    "product_code": f"10000{i}", "product_name": f"分页基金{i}"
+                })
+            yield client
+
+    def test_not_modified(self, client):
+        """测试携带 ETag 的重复请求返回 304"""
+        response = client.get("/api/v1/products", headers=HEADERS)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        repeat = client.get("/api/v1/products", headers={**HEADERS, "If-None-Match": etag})
+        assert repeat.status_code == 304
+        assert repeat.content == b""
+        assert repeat.headers["etag"] == etag
+
+    def test_pagination_headers(self, client):
+        """测试分页返回下一页游标，最后一页没有游标"""
+        products = client.get("/api/v1/products", headers=HEADERS).json()["data"]
+        first = client.get("/api/v1/products", headers=HEADERS, params={"limit": len(products) - 1})
+        assert len(first.json()["data"]) == len(products) - 1
+        rest = client.get("/api/v1/products", headers=HEADERS,
+                          params={"limit": 10, "cursor": first.headers["x-next-cursor"]})
+        assert [p["product_id"] for p in first.json()["data"] + rest.json()["data"]] == \
+            [p["product_id"] for p in products]
+        assert "x-next-cursor" not in rest.headers
+
+    def test_invalid_parameters(self, client):
+        """测试无效游标与每页条数"""
+        assert client.get("/api/v1/products", headers=HEADERS, params={"cursor": "PROD_404"}).status_code == 400
+        assert client.get("/api/v1/products", headers=HEADERS, params={"limit": 0}).status_code == 422
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
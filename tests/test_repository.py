@@ -0,0 +1,181 @@
+"""
+测试数据存储层
+"""
+import os
+import sys
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from models import EntrustBase, FundAccount, FundNetValue, FundShare, User
+from repository import Repository
+
+
+class TestSecondaryIndexes:
+    """测试二级索引"""
+
+    @pytest.fixture
+    def repo(self):
+        """创建仓库实例"""
+        return Repository()
+
+    def _create_account(self, repo, user_id: str, account_id: str) -> FundAccount:
+        """创建基金账户"""
+        account = FundAccount(
+            fund_account_id=account_id,
+            user_id=user_id,
+            account_no=f"F{account_id}",
+            open_date=date.today()
+        )
+        return repo.create_fund_account(account)
+
+    def test_user_balance_lookup(self, repo):
+        """测试按用户查询余额"""
+        repo.create_user(User(user_id="USER_001"))
+        repo.create_user(User(user_id="USER_002"))
+
+        balance = repo.get_user_balance("USER_002")
+        assert balance.user_id == "USER_002"
+
+        balance.available_balance = Decimal("500")
+        repo.update_user_balance(balance)
+        assert repo.get_user_balance("USER_002").total_balance == Decimal("500")
+        assert repo.get_user_balance("USER_001").total_balance == Decimal("0")
+        assert repo.get_user_balance("USER_404") is None
+
+    def test_user_fund_accounts_lookup(self, repo):
+        """测试按用户查询基金账户"""
+        self._create_account(repo, "USER_001", "ACC_001")
+        self._create_account(repo, "USER_002", "ACC_002")
+        self._create_account(repo, "USER_001", "ACC_003")
+
+        accounts = repo.get_user_fund_accounts("USER_001")
+        assert [a.fund_account_id for a in accounts] == ["ACC_001", "ACC_003"]
+        assert repo.get_user_fund_accounts("USER_404") == []
+
+    def test_fund_share_lookup(self, repo):
+        """测试按账户和产品查询份额"""
+        repo.create_or_update_fund_share(FundShare(
+            share_id="SHARE_001", fund_account_id="ACC_001", product_id="PROD_001",
+            total_share=Decimal("100"), available_share=Decimal("100")
+        ))
+        repo.create_or_update_fund_share(FundShare(
+            share_id="SHARE_002", fund_account_id="ACC_001", product_id="PROD_002",
+            total_share=Decimal("50"), available_share=Decimal("50")
+        ))
+
+        share = repo.get_fund_share("ACC_001", "PROD_001")
+        assert share.share_id == "SHARE_001"
+
+        # 更新已有份额不应产生重复索引
+        share.total_share += Decimal("10")
+        repo.create_or_update_fund_share(share)
+        shares = repo.get_account_shares("ACC_001")
+        assert [s.share_id for s in shares] == ["SHARE_001", "SHARE_002"]
+        assert shares[0].total_share == Decimal("110")
+        assert repo.get_fund_share("ACC_001", "PROD_404") is None
+
+    def test_duplicate_fund_share_rejected(self, repo):
+        """测试同一账户同一产品不能有两条份额记录"""
+        repo.create_or_update_fund_share(FundShare(
+            share_id="SHARE_001", fund_account_id="ACC_001", product_id="PROD_001"
+        ))
+        with pytest.raises(ValueError):
+            repo.create_or_update_fund_share(FundShare(
+                share_id="SHARE_002", fund_account_id="ACC_001", product_id="PROD_001"
+            ))
+
+
+class TestNavSeries:
+    """测试净值时间序列"""
+
+    @pytest.fixture
+    def repo(self):
+        """创建仓库实例，写入乱序的净值"""
+        repo = Repository()
+        for nav_id, value, nav_date in [
+            ("NAV_002", "1.02", date(2025, 1, 2)),
+            ("NAV_005", "1.05", date(2025, 1, 5)),
+            ("NAV_001", "1.01", date(2025, 1, 1)),
+            ("NAV_003", "1.03", date(2025, 1, 3)),
+        ]:
+            repo.create_fund_net_value(FundNetValue(
+                nav_id=nav_id, product_id="PROD_001",
+                net_value=Decimal(value), nav_date=nav_date
+            ))
+        return repo
+
+    def test_latest_nav(self, repo):
+        """测试获取最新净值"""
+        assert repo.get_latest_nav("PROD_001").nav_id == "NAV_005"
+        assert repo.get_latest_nav("PROD_404") is None
+
+    def test_nav_as_of(self, repo):
+        """测试按日期查询净值"""
+        assert repo.get_nav_as_of("PROD_001", date(2025, 1, 4)).nav_id == "NAV_003"
+        assert repo.get_nav_as_of("PROD_001", date(2025, 1, 5)).nav_id == "NAV_005"
+        assert repo.get_nav_as_of("PROD_001", date(2024, 12, 31)) is None
+
+    def test_list_navs(self, repo):
+        """测试净值列表与区间过滤"""
+        navs = repo.list_navs_by_product("PROD_001")
+        assert [n.nav_id for n in navs] == ["NAV_005", "NAV_003", "NAV_002", "NAV_001"]
+
+        navs = repo.list_navs_by_product("PROD_001", date(2025, 1, 2), date(2025, 1, 4))
+        assert [n.nav_id for n in navs] == ["NAV_003", "NAV_002"]
+
+    def test_duplicate_nav_date_rejected(self, repo):
+        """测试同一产品同一日期只能有一条净值"""
+        with pytest.raises(ValueError):
+            repo.create_fund_net_value(FundNetValue(
+                nav_id="NAV_006", product_id="PROD_001",
+                net_value=Decimal("1.10"), nav_date=date(2025, 1, 3)
+            ))
+        assert repo.get_nav_as_of("PROD_001", date(2025, 1, 3)).nav_id == "NAV_003"
+
+
+class TestStorageMode:
+    """测试存储模式"""
+
+    @pytest.mark.parametrize("storage_mode", ["model", "dict"])
+    def test_returned_models_are_isolated(self, storage_mode):
+        """测试读写的模型与存储状态相互隔离"""
+        repo = Repository(storage_mode=storage_mode)
+        share = FundShare(
+            share_id="SHARE_001", fund_account_id="ACC_001", product_id="PROD_001",
+            total_share=Decimal("100"), available_share=Decimal("100")
+        )
+        repo.create_or_update_fund_share(share)
+
+        # 写入后修改调用方持有的实例
+        share.total_share = Decimal("1")
+        # 修改读取到的实例
+        repo.get_fund_share("ACC_001", "PROD_001").total_share = Decimal("2")
+
+        assert repo.get_fund_share("ACC_001", "PROD_001").total_share == Decimal("100")
+
+    def test_nested_data_is_isolated(self):
+        """测试委托中的嵌套字典不会被调用方修改"""
+        repo = Repository()
+        repo.create_entrust(EntrustBase(
+            entrust_id="ENT_001", business_type="FUND_SUBSCRIBE",
+            user_id="USER_001", request_data={"amount": 100.0}
+        ))
+
+        repo.get_entrust("ENT_001").request_data["amount"] = 1.0
+
+        assert repo.get_entrust("ENT_001").request_data == {"amount": 100.0}
+
+    def test_invalid_storage_mode(self):
+        """测试不支持的存储模式"""
+        with pytest.raises(ValueError):
+            Repository(storage_mode="pickle")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
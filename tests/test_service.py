@@ -12,6 +12,8 @@ from decimal import Decimal
 
 import pytest
 
+from confirm_queue import ConfirmationQueue
+from models import EntrustStatus
 from repository import Repository
 from service import FundService
 
@@ -100,6 +102,18 @@ class TestFundService:
         assert share is not None
         assert share.total_share > 0
     
+    def test_deposit(self, service):
+        """测试入金"""
+        user = service.create_user(user_name="测试用户")
+        balance = service.deposit(user.user_id, Decimal("500"))
+        assert balance.available_balance == Decimal("500")
+        assert service.repo.get_user_balance(user.user_id).total_balance == Decimal("500")
+        
+        with pytest.raises(ValueError):
+            service.deposit(user.user_id, Decimal("0"))
+        with pytest.raises(ValueError):
+            service.deposit("USER_404", Decimal("1"))
+    
     def test_redeem_fund(self, service):
         """测试赎回基金"""
         # 创建用户
@@ -186,6 +200,373 @@ class TestFundService:
         assert len(assets['fund_assets']) > 0
 
 
+class TestIncrementalAssets:
+    """测试增量维护的用户资产"""
+    
+    @pytest.fixture
+    def context(self):
+        """创建有余额、账户和产品净值的用户"""
+        service = FundService(Repository())
+        user = service.create_user(user_name="测试用户")
+        balance = service.repo.get_user_balance(user.user_id)
+        balance.available_balance = Decimal("10000")
+        service.repo.update_user_balance(balance)
+        account = service.open_fund_account(user.user_id)
+        product = service.create_fund_product(product_code="001234", product_name="测试基金")
+        service.create_fund_nav(
+            product_id=product.product_id,
+            net_value=Decimal("2.0000"),
+            nav_date=date(2025, 1, 1)
+        )
+        return service, user.user_id, account.fund_account_id, product.product_id
+    
+    def test_trade_updates_assets_without_snapshot(self, context):
+        """测试交易后资产即时更新且不写快照"""
+        service, user_id, account_id, product_id = context
+        service.subscribe_fund(account_id, product_id, Decimal("4000"))
+        service.redeem_fund(account_id, product_id, Decimal("500"))
+        
+        assets = service.get_user_assets(user_id)
+        assert assets['total_fund_asset'] == 3000.0
+        assert assets['total_balance'] == 7000.0
+        assert assets['total_asset'] == 10000.0
+        assert assets['fund_assets'] == [
+            {'product_id': product_id, 'share': 1500.0, 'nav': 2.0, 'value': 3000.0}
+        ]
+        assert service.repo.get_latest_user_total_asset(user_id) is None
+    
+    def test_nav_change_revalues_holders(self, context):
+        """测试发布新净值后持有人资产重估，补录历史净值不影响"""
+        service, user_id, account_id, product_id = context
+        service.subscribe_fund(account_id, product_id, Decimal("4000"))
+        
+        service.create_fund_nav(product_id=product_id, net_value=Decimal("2.5"), nav_date=date(2025, 1, 2))
+        assert service.get_user_assets(user_id)['total_fund_asset'] == 5000.0
+        
+        service.create_fund_nav(product_id=product_id, net_value=Decimal("1.0"), nav_date=date(2024, 12, 31))
+        assert service.get_user_assets(user_id)['total_fund_asset'] == 5000.0
+    
+    def test_snapshot_on_demand(self, context):
+        """测试按需写入资产快照"""
+        service, user_id, account_id, product_id = context
+        service.subscribe_fund(account_id, product_id, Decimal("4000"))
+        
+        assert service.snapshot_all_user_assets() == 1
+        snapshot = service.repo.get_latest_user_total_asset(user_id)
+        assert snapshot.total_asset == Decimal("10000")
+        assert snapshot.total_fund_asset == Decimal("4000")
+    
+    def test_unknown_user(self, context):
+        """测试不存在的用户"""
+        service = context[0]
+        assert service.get_user_assets("USER_404") is None
+        with pytest.raises(ValueError):
+            service.calculate_user_assets("USER_404")
+
+
+class TestRevaluation:
+    """测试净值批量发布与重估"""
+    
+    @pytest.fixture
+    def context(self):
+        """创建两个产品，两个用户分别持有"""
+        service = FundService(Repository())
+        products = [
+            service.create_fund_product(product_code=code, product_name=f"基金{code}").product_id
+            for code in ("000001", "000002")
+        ]
+        service.publish_navs([
+            {'product_id': products[0], 'net_value': Decimal("1.0000")},
+            {'product_id': products[1], 'net_value': Decimal("2.0000")},
+        ], nav_date=date(2025, 1, 1))
+        users = []
+        for amount in (Decimal("1000"), Decimal("3000")):
+            user = service.create_user(user_name="测试用户")
+            balance = service.repo.get_user_balance(user.user_id)
+            balance.available_balance = Decimal("10000")
+            service.repo.update_user_balance(balance)
+            account = service.open_fund_account(user.user_id)
+            service.subscribe_fund(account.fund_account_id, products[0], amount)
+            users.append(user.user_id)
+        service.subscribe_fund(
+            service.repo.get_user_fund_accounts(users[1])[0].fund_account_id,
+            products[1], Decimal("2000")
+        )
+        return service, users, products
+    
+    def test_publish_navs_writes_snapshots(self, context):
+        """测试发布净值后批量写入持有人的资产快照"""
+        service, users, products = context
+        stats = service.publish_navs(
+            [{'product_id': products[0], 'net_value': Decimal("1.5000")}],
+            nav_date=date(2025, 1, 2)
+        )
+        assert stats['users'] == 2
+        assert stats['positions'] == 3
+        assert stats['fund_asset_rows'] == 2
+        assert stats['total_asset_rows'] == 2
+        
+        # 批次外的产品按净值日期当日或之前最近的净值计价
+        snapshot = service.repo.get_latest_user_total_asset(users[1])
+        assert snapshot.calc_date == date(2025, 1, 2)
+        assert snapshot.total_fund_asset == Decimal("6500.0000")
+        assert snapshot.total_balance == Decimal("5000")
+        assert snapshot.total_asset == Decimal("11500.0000")
+        
+        # 快照与增量维护的资产一致
+        assert service.get_user_assets(users[0])['total_fund_asset'] == 1500.0
+        assert service.get_user_assets(users[1])['total_fund_asset'] == 6500.0
+    
+    def test_publish_navs_unknown_product(self, context):
+        """测试批次中包含不存在的产品时整批拒绝"""
+        service, users, products = context
+        with pytest.raises(ValueError):
+            service.publish_navs([
+                {'product_id': products[0], 'net_value': Decimal("1.5000")},
+                {'product_id': "PROD_404", 'net_value': Decimal("1.0000")},
+            ], nav_date=date(2025, 1, 2))
+        assert service.get_latest_nav(products[0]).net_value == Decimal("1.0000")
+    
+    @pytest.mark.parametrize("second", [
+        {'net_value': Decimal("1.6000")},
+        {'net_value': Decimal("-1")},
+    ])
+    def test_publish_navs_invalid_batch_writes_nothing(self, context, second):
+        """测试批次内同一产品重复或后面的净值不合法时整批拒绝，前面的净值也不写入"""
+        service, users, products = context
+        with pytest.raises(ValueError):
+            service.publish_navs([
+                {'product_id': products[1], 'net_value': Decimal("3.0000")},
+                {'product_id': products[1], **second},
+            ], nav_date=date(2025, 1, 2))
+        assert service.get_latest_nav(products[1]).nav_date == date(2025, 1, 1)
+        assert service.get_user_assets(users[1])['total_fund_asset'] == 5000.0
+    
+    def test_publish_navs_existing_date(self, context):
+        """测试批次中的净值与已有净值日期相同时整批拒绝"""
+        service, users, products = context
+        service.create_fund_nav(product_id=products[1], net_value=Decimal("3.0000"), nav_date=date(2025, 1, 2))
+        with pytest.raises(ValueError, match="已存在"):
+            service.publish_navs([
+                {'product_id': products[0], 'net_value': Decimal("1.5000")},
+                {'product_id': products[1], 'net_value': Decimal("3.0000")},
+            ], nav_date=date(2025, 1, 2))
+        assert service.get_latest_nav(products[0]).nav_date == date(2025, 1, 1)
+    
+    def test_publish_navs_partial_write_revalued(self, context, monkeypatch):
+        """测试写入中途失败时已写入的净值仍被重估"""
+        service, users, products = context
+        create = service.repo.create_fund_net_value
+        
+        def fail_second(nav):
+            if nav.product_id == products[1]:
+                raise RuntimeError("存储写入失败")
+            return create(nav)
+        
+        monkeypatch.setattr(service.repo, "create_fund_net_value", fail_second)
+        with pytest.raises(RuntimeError):
+            service.publish_navs([
+                {'product_id': products[0], 'net_value': Decimal("1.5000")},
+                {'product_id': products[1], 'net_value': Decimal("3.0000")},
+            ], nav_date=date(2025, 1, 2))
+        snapshot = service.repo.get_latest_user_total_asset(users[0])
+        assert snapshot.calc_date == date(2025, 1, 2)
+        assert snapshot.total_fund_asset == Decimal("1500.0000")
+
+
+class TestBatchOrders:
+    """测试批量申购/赎回"""
+    
+    @pytest.fixture
+    def context(self):
+        """创建有余额、账户和产品净值的用户"""
+        service = FundService(Repository())
+        user = service.create_user(user_name="测试用户")
+        balance = service.repo.get_user_balance(user.user_id)
+        balance.available_balance = Decimal("10000")
+        service.repo.update_user_balance(balance)
+        account = service.open_fund_account(user.user_id)
+        product = service.create_fund_product(product_code="001234", product_name="测试基金")
+        service.create_fund_nav(product_id=product.product_id, net_value=Decimal("2.0000"))
+        return service, user.user_id, account.fund_account_id, product.product_id
+    
+    def test_orders_applied_in_sequence(self, context):
+        """测试按顺序应用订单，同批次内赎回可见先前申购的份额"""
+        service, user_id, account_id, product_id = context
+        results = service.submit_orders([
+            {'transaction_type': "SUBSCRIBE", 'fund_account_id': account_id,
+             'product_id': product_id, 'amount': Decimal("4000")},
+            {'transaction_type': "REDEEM", 'fund_account_id': account_id,
+             'product_id': product_id, 'share': Decimal("500")},
+            {'transaction_type': "SUBSCRIBE", 'fund_account_id': account_id,
+             'product_id': product_id, 'amount': Decimal("3000")},
+        ])
+        assert [r['success'] for r in results] == [True, True, True]
+        assert results[0]['data']['share'] == 2000.0
+        assert results[1]['data']['amount'] == 1000.0
+        
+        fund_share = service.repo.get_fund_share(account_id, product_id)
+        assert fund_share.total_share == Decimal("3000")
+        assert fund_share.frozen_share == Decimal("0")
+        balance = service.repo.get_user_balance(user_id)
+        assert balance.available_balance == Decimal("4000")
+        assert balance.frozen_balance == Decimal("0")
+        assert service.get_user_assets(user_id)['total_asset'] == 10000.0
+        
+        entrust = service.repo.get_entrust(results[0]['data']['entrust_id'])
+        assert entrust.status == EntrustStatus.SUCCESS
+    
+    def test_per_order_failures(self, context):
+        """测试单笔失败不影响同批次其他订单"""
+        service, user_id, account_id, product_id = context
+        results = service.submit_orders([
+            {'transaction_type': "SUBSCRIBE", 'fund_account_id': "ACC_404",
+             'product_id': product_id, 'amount': Decimal("100")},
+            {'transaction_type': "SUBSCRIBE", 'fund_account_id': account_id,
+             'product_id': "PROD_404", 'amount': Decimal("100")},
+            {'transaction_type': "SUBSCRIBE", 'fund_account_id': account_id,
+             'product_id': product_id, 'amount': Decimal("20000")},
+            {'transaction_type': "REDEEM", 'fund_account_id': account_id,
+             'product_id': product_id, 'share': Decimal("1")},
+            {'transaction_type': "SUBSCRIBE", 'fund_account_id': account_id,
+             'product_id': product_id, 'amount': Decimal("100")},
+        ])
+        assert [r['index'] for r in results] == [0, 1, 2, 3, 4]
+        assert [r['success'] for r in results] == [False, False, False, False, True]
+        assert "基金账户不存在" in results[0]['error']
+        assert "基金产品不存在" in results[1]['error']
+        assert "余额不足" in results[2]['error']
+        assert "可用份额不足" in results[3]['error']
+        assert service.repo.get_user_balance(user_id).available_balance == Decimal("9900")
+
+
+class TestAsyncConfirmation:
+    """测试异步批量确认"""
+    
+    @pytest.fixture
+    def context(self):
+        """创建使用确认队列的服务（不启动工作线程，由测试调用 flush 确认）"""
+        confirm_queue = ConfirmationQueue(batch_size=10, autostart=False)
+        service = FundService(Repository(), confirm_queue)
+        user = service.create_user(user_name="测试用户")
+        balance = service.repo.get_user_balance(user.user_id)
+        balance.available_balance = Decimal("10000")
+        service.repo.update_user_balance(balance)
+        account = service.open_fund_account(user.user_id)
+        product = service.create_fund_product(product_code="001234", product_name="测试基金")
+        service.create_fund_nav(product_id=product.product_id, net_value=Decimal("2.0000"),
+                                nav_date=date(2025, 1, 1))
+        return service, confirm_queue, user.user_id, account.fund_account_id, product.product_id
+    
+    def test_request_only_freezes(self, context):
+        """测试请求只冻结资金并受理委托，确认后份额到账"""
+        service, confirm_queue, user_id, account_id, product_id = context
+        result = service.subscribe_fund(account_id, product_id, Decimal("4000"))
+        assert result['status'] == "PENDING"
+        
+        balance = service.repo.get_user_balance(user_id)
+        assert balance.available_balance == Decimal("6000")
+        assert balance.frozen_balance == Decimal("4000")
+        assert service.repo.get_fund_share(account_id, product_id) is None
+        assert service.get_entrust(result['entrust_id']).status == EntrustStatus.PENDING
+        
+        assert confirm_queue.flush() == 1
+        assert service.get_entrust(result['entrust_id']).status == EntrustStatus.SUCCESS
+        assert service.repo.get_fund_share(account_id, product_id).total_share == Decimal("2000")
+        assert service.repo.get_user_balance(user_id).frozen_balance == Decimal("0")
+        assert service.get_user_assets(user_id)['total_asset'] == 10000.0
+    
+    def test_confirm_uses_nav_of_order_date(self, context):
+        """测试按受理时的净值日期确认，之后发布的净值不影响"""
+        service, confirm_queue, user_id, account_id, product_id = context
+        service.subscribe_fund(account_id, product_id, Decimal("4000"))
+        service.create_fund_nav(product_id=product_id, net_value=Decimal("4.0000"), nav_date=date(2025, 1, 2))
+        confirm_queue.flush()
+        assert service.repo.get_fund_share(account_id, product_id).total_share == Decimal("2000")
+        
+        redeem = service.redeem_fund(account_id, product_id, Decimal("500"))
+        assert service.repo.get_fund_share(account_id, product_id).frozen_share == Decimal("500")
+        confirm_queue.flush()
+        assert service.get_entrust(redeem['entrust_id']).status == EntrustStatus.SUCCESS
+        assert service.repo.get_user_balance(user_id).available_balance == Decimal("8000")
+    
+    def test_failed_confirmation_unfreezes(self, context):
+        """测试确认失败时委托置为 FAILED 并解冻资金"""
+        service, confirm_queue, user_id, account_id, product_id = context
+        result = service.subscribe_fund(account_id, product_id, Decimal("1000"))
+        item = confirm_queue._queue.get_nowait()
+        item['nav_date'] = date(2024, 1, 1)
+        assert service.confirm_entrusts([item]) == {"succeeded": 0, "failed": 1}
+        
+        balance = service.repo.get_user_balance(user_id)
+        assert balance.available_balance == Decimal("10000")
+        assert balance.frozen_balance == Decimal("0")
+        entrust = service.get_entrust(result['entrust_id'])
+        assert entrust.status == EntrustStatus.FAILED
+        assert "无净值" in entrust.error_msg
+    
+    def test_unexpected_error_fails_only_that_entrust(self, context, monkeypatch):
+        """测试确认时的非业务异常只让该笔委托失败并解冻，批次中其余委托照常确认"""
+        service, confirm_queue, user_id, account_id, product_id = context
+        broken = service.subscribe_fund(account_id, product_id, Decimal("1000"))
+        ok = service.subscribe_fund(account_id, product_id, Decimal("2000"))
+        process = service._process_subscribe_confirmation
+        
+        def flaky(entrust_id, *args):
+            if entrust_id == broken['entrust_id']:
+                raise RuntimeError("存储写入失败")
+            return process(entrust_id, *args)
+        
+        monkeypatch.setattr(service, "_process_subscribe_confirmation", flaky)
+        batch = [confirm_queue._queue.get_nowait() for _ in range(2)]
+        assert service.confirm_entrusts(batch) == {"succeeded": 1, "failed": 1}
+        
+        failed = service.get_entrust(broken['entrust_id'])
+        assert failed.status == EntrustStatus.FAILED
+        assert "存储写入失败" in failed.error_msg
+        assert service.get_entrust(ok['entrust_id']).status == EntrustStatus.SUCCESS
+        balance = service.repo.get_user_balance(user_id)
+        assert balance.frozen_balance == Decimal("0")
+        assert balance.available_balance == Decimal("8000")
+    
+    def test_stopped_queue_rejects_trades(self, context):
+        """测试确认队列停止后不再受理交易，也不冻结资金"""
+        service, confirm_queue, user_id, account_id, product_id = context
+        confirm_queue.stop()
+        with pytest.raises(ValueError, match="停止"):
+            service.subscribe_fund(account_id, product_id, Decimal("1000"))
+        with pytest.raises(ValueError, match="停止"):
+            confirm_queue.put({'entrust_id': 'ENT_LATE'})
+        assert confirm_queue.pending() == 0
+        assert service.repo.get_user_balance(user_id).frozen_balance == Decimal("0")
+    
+    @pytest.mark.parametrize("transaction", ["subscribe", "redeem"])
+    def test_stopped_after_freeze_rolls_back(self, context, monkeypatch, transaction):
+        """测试冻结之后、入队之前队列停止：委托置为 FAILED，冻结的资金或份额解冻"""
+        service, confirm_queue, user_id, account_id, product_id = context
+        service.subscribe_fund(account_id, product_id, Decimal("4000"))
+        confirm_queue.flush()
+        put = confirm_queue.put
+        
+        def stop_then_put(item):
+            confirm_queue.stop()
+            put(item)
+        
+        monkeypatch.setattr(confirm_queue, "put", stop_then_put)
+        with pytest.raises(ValueError, match="停止"):
+            if transaction == "subscribe":
+                service.subscribe_fund(account_id, product_id, Decimal("1000"))
+            else:
+                service.redeem_fund(account_id, product_id, Decimal("500"))
+        
+        balance = service.repo.get_user_balance(user_id)
+        assert (balance.available_balance, balance.frozen_balance) == (Decimal("6000"), Decimal("0"))
+        share = service.repo.get_fund_share(account_id, product_id)
+        assert (share.available_share, share.frozen_share) == (Decimal("2000"), Decimal("0"))
+        entrusts, _ = service.repo.list_user_entrusts(user_id, status="FAILED")
+        assert len(entrusts) == 1 and "停止" in entrusts[0].error_msg
+        assert confirm_queue.pending() == 0
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
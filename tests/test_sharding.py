@@ -0,0 +1,163 @@
+"""
+测试按用户分片的多进程部署：分片ID与路由转发
+"""
+import os
+import sys
+import tempfile
+import zlib
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from common.ids import ID_DIGITS, MAX_WORKER_ID, SEQUENCE_BITS
+from shard_router import ShardRouter, create_app
+from sharding import ShardIdGenerator, shard_of, socket_path, start_shards, stop_shards
+
+HEADERS = {"Authorization": "Bearer demo_token_2025"}
+
+
+class TestShardIds:
+    """测试分片计算与分片ID生成"""
+
+    def test_shard_of_is_stable(self):
+        """测试分片由 crc32 决定，与进程的哈希种子无关"""
+        assert shard_of("USER_0123456789abcdef", 4) == zlib.crc32(b"USER_0123456789abcdef") % 4
+        assert shard_of("USER_0123456789abcdef", 1) == 0
+
+    def test_generated_ids_belong_to_shard(self):
+        """测试生成的ID都落在本分片，格式与单进程一致"""
+        for shard_index in range(4):
+            generate = ShardIdGenerator(shard_index, 4)
+            for _ in range(50):
+                key = generate('ACC_')
+                assert key.startswith('ACC_') and len(key) == 20
+                assert shard_of(key, 4) == shard_index
+
+    def test_invalid_shard_index(self):
+        """测试分片序号超出范围"""
+        with pytest.raises(ValueError):
+            ShardIdGenerator(2, 2)
+
+
+class TestRouterHeaders:
+    """测试路由透传的请求头与响应头"""
+
+    def test_idempotency_key_forwarded(self):
+        """测试幂等键经路由转发：重复申购只执行一次，返回重复请求响应头"""
+        import main
+        service = main.fund_service
+        user_id = service.create_user("路由幂等用户").user_id
+        service.deposit(user_id, Decimal("1000"))
+        account_id = service.open_fund_account(user_id).fund_account_id
+        product_id = service.create_fund_product(product_code="900101", product_name="路由基金").product_id
+        service.create_fund_nav(product_id, Decimal("1.0000"), nav_date=date(2025, 1, 1))
+
+        router = ShardRouter([httpx.ASGITransport(app=main.app)])
+        with TestClient(create_app(router)) as client:
+            headers = {**HEADERS, "Idempotency-Key": "router-sub-1"}
+            body = {"fund_account_id": account_id, "product_id": product_id, "amount": 100}
+            first = client.post("/api/v1/funds/subscribe", headers=headers, json=body)
+            second = client.post("/api/v1/funds/subscribe", headers=headers, json=body)
+        assert first.status_code == second.status_code == 200
+        assert first.json()["data"]["entrust_id"] == second.json()["data"]["entrust_id"]
+        assert "idempotent-replayed" not in first.headers
+        assert second.headers["idempotent-replayed"] == "true"
+        assert service.repo.get_user_balance(user_id).available_balance == 900
+
+
+class TestShardedDeployment:
+    """启动两个分片工作进程，经路由完成用户、账户、产品与交易请求"""
+
+    @pytest.fixture(scope="class")
+    def deployment(self):
+        """启动分片工作进程与路由"""
+        socket_dir = tempfile.mkdtemp(prefix="test-shards-")
+        processes = start_shards(2, socket_dir)
+        try:
+            with TestClient(create_app(ShardRouter.connect(socket_dir, 2))) as client:
+                yield client, socket_dir
+        finally:
+            stop_shards(processes)
+
+    def _shard_client(self, socket_dir, shard_index):
+        """直接访问某个分片的客户端"""
+        return httpx.Client(transport=httpx.HTTPTransport(uds=socket_path(socket_dir, shard_index)),
+                            base_url="http://shard", headers=HEADERS)
+
+    def test_health(self, deployment):
+        """测试全部分片健康"""
+        client, _ = deployment
+        assert client.get("/api/v1/health").json()["status"] == "healthy"
+        assert client.get("/").json()["shards"] == 2
+
+    def test_product_replicated(self, deployment):
+        """测试产品与净值写入全部分片，且产品ID一致"""
+        client, socket_dir = deployment
+        product_id = client.post("/api/v1/products", headers=HEADERS, json={
+            "product_code": "001234", "product_name": "测试基金"
+        }).json()["data"]["product_id"]
+        assert client.post("/api/v1/nav", headers=HEADERS, json={
+            "product_id": product_id, "net_value": 1.5, "nav_date": "2025-01-01"
+        }).status_code == 200
+
+        for shard_index in range(2):
+            with self._shard_client(socket_dir, shard_index) as shard:
+                products = shard.get("/api/v1/products").json()["data"]
+                assert [p["product_id"] for p in products] == [product_id]
+                assert products[0]["latest_nav"]["net_value"] == 1.5
+
+    def test_users_routed_to_owner(self, deployment):
+        """测试用户轮流分配到各分片，之后的请求都转发到用户所属分片"""
+        client, socket_dir = deployment
+        user_ids = [
+            client.post("/api/v1/users", headers=HEADERS, json={"user_name": f"用户{i}"}).json()["data"]["user_id"]
+            for i in range(4)
+        ]
+        assert sorted(shard_of(user_id, 2) for user_id in user_ids) == [0, 0, 1, 1]
+
+        for user_id in user_ids:
+            owner = shard_of(user_id, 2)
+            with self._shard_client(socket_dir, 1 - owner) as other:
+                assert other.get(f"/api/v1/users/{user_id}").status_code == 404
+            assert client.get(f"/api/v1/users/{user_id}", headers=HEADERS).json()["data"]["user_id"] == user_id
+
+            account_id = client.post("/api/v1/accounts/open", headers=HEADERS, json={
+                "user_id": user_id
+            }).json()["data"]["fund_account_id"]
+            assert shard_of(account_id, 2) == owner
+            # 账户在所属分片上找到，申购因产品不存在被拒绝
+            response = client.post("/api/v1/funds/subscribe", headers=HEADERS, json={
+                "fund_account_id": account_id, "product_id": "PROD_404", "amount": 100
+            })
+            assert response.status_code == 400
+            assert "基金产品不存在" in response.json()["detail"]
+            assert client.get(f"/api/v1/assets/{user_id}", headers=HEADERS).json()["data"]["total_asset"] == 0
+
+    def test_shards_use_distinct_worker_ids(self, deployment):
+        """测试各分片的ID工作进程号为分片序号，不同分片同一毫秒内生成的ID不会重复"""
+        client, _ = deployment
+        for i in range(4):
+            user_id = client.post("/api/v1/users", headers=HEADERS,
+                                  json={"user_name": f"工作进程{i}"}).json()["data"]["user_id"]
+            worker_id = int(user_id[-ID_DIGITS:], 16) >> SEQUENCE_BITS & MAX_WORKER_ID
+            assert worker_id == shard_of(user_id, 2)
+
+    def test_worker_id_range_checked(self):
+        """测试分片的工作进程号超出范围时不启动"""
+        with pytest.raises(ValueError, match="工作进程号"):
+            start_shards(2, tempfile.mkdtemp(prefix="test-shards-"), env={"ID_WORKER_ID": "1023"})
+
+    def test_missing_routing_field(self, deployment):
+        """测试缺少路由字段的请求由分片返回参数校验错误"""
+        client, _ = deployment
+        assert client.post("/api/v1/funds/subscribe", headers=HEADERS, json={}).status_code == 422
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
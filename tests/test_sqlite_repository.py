@@ -0,0 +1,315 @@
+"""
+测试由 schema.sql 生成的 SQLite 存储与仓库
+"""
+import os
+import sqlite3
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from common.schema import load_schema, sqlite_ddl
+from common.sqlite_repository import SqliteBaseRepository
+from common.sqlite_store import SqliteStore
+from models import ProductType
+from repository import Repository
+from service import FundService
+from sqlite_repository import SqliteRepository
+
+
+class TestSchema:
+    """测试解析 schema.sql 生成表结构"""
+
+    def test_all_tables_and_indexes(self):
+        """测试 14 张表及其索引都能在 SQLite 中建立"""
+        schemas = load_schema()
+        assert len(schemas) == 14
+        assert schemas['fund_share'].primary_key == 'share_id'
+        assert ('uk_account_product', ('fund_account_id', 'product_id'), True) in schemas['fund_share'].indexes
+
+        conn = sqlite3.connect(':memory:')
+        for schema in schemas.values():
+            for statement in sqlite_ddl(schema):
+                conn.execute(statement)
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert 'fund_net_value__uk_product_nav_date' in indexes
+
+
+class TestSqliteTable:
+    """测试表的编码、批量写入与约束"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        """创建数据库"""
+        store = SqliteStore(str(tmp_path / "fund.db"))
+        yield store
+        store.close()
+
+    def test_round_trip(self, store):
+        """测试各类型列写入后原样读出，多余字段存入 _extra"""
+        table = store.create_table(load_schema()['fund_product'])
+        table['P1'] = {
+            'product_id': 'P1', 'product_code': '000001', 'product_name': '测试基金',
+            'product_type': ProductType.BOND, 'issue_date': date(2025, 1, 1),
+            'create_time': datetime(2025, 1, 1, 9, 30, 0, 123456), 'memo': {'a': 1}
+        }
+        record = table['P1']
+        assert record['product_type'] == 'BOND'
+        assert record['issue_date'] == date(2025, 1, 1)
+        assert record['create_time'] == datetime(2025, 1, 1, 9, 30, 0, 123456)
+        assert record['memo'] == {'a': 1}
+        assert record['product_status'] == 'ACTIVE'
+
+        nav_table = store.create_table(load_schema()['fund_net_value'])
+        nav_table['N1'] = {'product_id': 'P1', 'net_value': Decimal('1.23456789'), 'nav_date': date(2025, 1, 1)}
+        assert nav_table['N1']['net_value'] == Decimal('1.23456789')
+
+    def test_bulk_update_and_scan(self, store):
+        """测试批量写入在一个事务中完成，分页扫描保持写入顺序"""
+        table = store.create_table(load_schema()['user'])
+        table.update((f"U{i:05d}", {'user_name': f"用户{i}"}) for i in range(2500))
+        assert len(table) == 2500
+        assert list(table)[:3] == ["U00000", "U00001", "U00002"]
+        assert sum(1 for _ in table.values()) == 2500
+        assert "U02499" in table and "U09999" not in table
+
+    def test_unique_constraint(self, store):
+        """测试唯一索引冲突抛出 ValueError，批量写入整体回滚"""
+        table = store.create_table(load_schema()['fund_account'])
+        table['A1'] = {'user_id': 'U1', 'account_no': 'F1', 'open_date': date(2025, 1, 1)}
+        with pytest.raises(ValueError):
+            table['A2'] = {'user_id': 'U2', 'account_no': 'F1', 'open_date': date(2025, 1, 1)}
+        with pytest.raises(ValueError):
+            table.update([
+                ('A3', {'user_id': 'U3', 'account_no': 'F3', 'open_date': date(2025, 1, 1)}),
+                ('A4', {'user_id': 'U4', 'account_no': 'F3', 'open_date': date(2025, 1, 1)}),
+            ])
+        assert list(table) == ['A1']
+
+    def test_not_null_constraint(self, store):
+        """测试缺少非空字段"""
+        table = store.create_table(load_schema()['fund_account'])
+        with pytest.raises(ValueError):
+            table['A1'] = {'user_id': 'U1', 'account_no': 'F1'}
+
+
+class TestSqliteRepository:
+    """测试 FundService 在 SQLite 仓库上运行"""
+
+    def _seed(self, service):
+        """创建用户、账户、产品、净值并申购"""
+        user = service.create_user(user_name="测试用户")
+        balance = service.repo.get_user_balance(user.user_id)
+        balance.available_balance = Decimal("10000")
+        service.repo.update_user_balance(balance)
+        account = service.open_fund_account(user.user_id)
+        product = service.create_fund_product(product_code="001234", product_name="测试基金")
+        service.create_fund_nav(product_id=product.product_id, net_value=Decimal("2.0000"),
+                                nav_date=date(2025, 1, 1))
+        service.subscribe_fund(account.fund_account_id, product.product_id, Decimal("4000"))
+        return user.user_id, account.fund_account_id, product.product_id
+
+    def test_trade_and_reopen(self, tmp_path):
+        """测试交易后重新打开数据库，数据、二级索引和资产聚合都恢复"""
+        path = str(tmp_path / "fund.db")
+        repo = SqliteRepository(path)
+        service = FundService(repo)
+        user_id, account_id, product_id = self._seed(service)
+        service.create_fund_nav(product_id=product_id, net_value=Decimal("2.5000"),
+                                nav_date=date(2025, 1, 2))
+        result = service.redeem_fund(account_id, product_id, Decimal("1000"))
+        expected = service.get_user_assets(user_id)
+        repo.close()
+
+        repo = SqliteRepository(path)
+        service = FundService(repo)
+        assert service.get_user_assets(user_id) == expected
+        assert repo.get_user_balance(user_id).available_balance == Decimal("8500")
+        assert repo.get_fund_share(account_id, product_id).total_share == Decimal("1000")
+        assert [a.fund_account_id for a in repo.get_user_fund_accounts(user_id)] == [account_id]
+        assert repo.get_nav_as_of(product_id, date(2025, 1, 1)).net_value == Decimal("2.0000")
+        assert repo.get_entrust(result['entrust_id']).status == "SUCCESS"
+        service.subscribe_fund(account_id, product_id, Decimal("500"))
+        repo.close()
+
+    def test_batch_orders_and_revaluation(self):
+        """测试批量下单与净值批量发布"""
+        service = FundService(SqliteRepository(':memory:'))
+        user_id, account_id, product_id = self._seed(service)
+        results = service.submit_orders([
+            {'transaction_type': 'SUBSCRIBE', 'fund_account_id': account_id,
+             'product_id': product_id, 'amount': Decimal("1000")},
+            {'transaction_type': 'REDEEM', 'fund_account_id': account_id,
+             'product_id': product_id, 'share': Decimal("100")},
+        ])
+        assert all(result['success'] for result in results)
+        service.publish_navs([{'product_id': product_id, 'net_value': Decimal("3.0")}],
+                             nav_date=date(2025, 1, 2))
+        assert service.get_user_assets(user_id)['total_fund_asset'] == 7200.0
+        assert service.repo.get_latest_user_total_asset(user_id).calc_date == date(2025, 1, 2)
+
+    def test_duplicate_nav_rejected(self):
+        """测试同一产品同一日期的净值只能有一条"""
+        service = FundService(SqliteRepository(':memory:'))
+        product = service.create_fund_product(product_code="001234", product_name="测试基金")
+        service.create_fund_nav(product_id=product.product_id, net_value=Decimal("1.0"),
+                                nav_date=date(2025, 1, 1))
+        with pytest.raises(ValueError):
+            service.create_fund_nav(product_id=product.product_id, net_value=Decimal("1.1"),
+                                    nav_date=date(2025, 1, 1))
+
+
+def _history_trades(service):
+    """两个账户、两只产品各申购两次，赎回一次，再发布一期净值"""
+    user = service.create_user(user_name="查询用户")
+    service.deposit(user.user_id, Decimal("100000"))
+    accounts = [service.open_fund_account(user.user_id).fund_account_id for _ in range(2)]
+    products = []
+    for code in ("800001", "800002"):
+        product_id = service.create_fund_product(product_code=code, product_name=f"基金{code}").product_id
+        service.create_fund_nav(product_id, Decimal("1.0000"), nav_date=date(2025, 1, 1))
+        products.append(product_id)
+    for amount in ("100", "200"):
+        for account_id in accounts:
+            for product_id in products:
+                service.subscribe_fund(account_id, product_id, Decimal(amount))
+    service.redeem_fund(accounts[0], products[0], Decimal("50"))
+    service.publish_navs([{'product_id': products[0], 'net_value': Decimal("1.2345")}],
+                         nav_date=date(2025, 1, 2))
+    return user.user_id, accounts, products
+
+
+class TestIndexedLookups:
+    """测试 SQLite 仓库按索引查询，结果与内存仓库一致，且不在内存中维护派生结构"""
+
+    @staticmethod
+    def _views(service, user_id, accounts, products):
+        """各类查询中与ID无关的结果"""
+        repo = service.repo
+        assets = service.get_user_assets(user_id)
+        entrusts = [
+            [(e.business_type, e.status, (e.request_data or {}).get('amount'))
+             for e in repo.list_user_entrusts(user_id, limit=100, **filters)[0]]
+            for filters in ({}, {'product_id': products[0]}, {'business_type': "ACCOUNT_OPEN"},
+                            {'status': "SUCCESS"})
+        ]
+        return {
+            'assets': (assets['total_asset'], assets['total_fund_asset'], assets['total_balance'],
+                       [(a['share'], a['nav'], a['value']) for a in assets['fund_assets']]),
+            'entrusts': entrusts,
+            'confirms': len(repo.list_user_confirms(user_id, limit=100)[0]),
+            'holders': list(repo.get_product_holders(products[0]).values()),
+            'holdings': sorted(repo.get_user_holdings(user_id).values()),
+            'balance': repo.get_user_total_balance(user_id),
+            'navs': [n.net_value for n in repo.list_navs_by_product(products[0])],
+            'as_of': repo.get_nav_as_of(products[0], date(2025, 1, 1)).net_value,
+            'latest': repo.get_latest_nav(products[0]).net_value,
+            'shares': [s.total_share for s in repo.get_account_shares(accounts[0])],
+            'accounts': len(repo.get_user_fund_accounts(user_id)),
+        }
+
+    def test_matches_memory_repository(self):
+        """测试各查询与内存仓库的结果相同"""
+        memory = FundService(Repository())
+        sqlite = FundService(SqliteRepository(':memory:'))
+        expected = self._views(memory, *_history_trades(memory))
+        assert self._views(sqlite, *_history_trades(sqlite)) == expected
+
+    def test_nothing_held_in_memory(self, tmp_path):
+        """测试交易与重新打开数据库都不在内存中建立净值序列、委托历史和资产聚合"""
+        path = str(tmp_path / "fund.db")
+        repo = SqliteRepository(path)
+        user_id, accounts, products = _history_trades(FundService(repo))
+        repo.close()
+
+        repo = SqliteRepository(path)
+        try:
+            service = FundService(repo)
+            service.subscribe_fund(accounts[1], products[1], Decimal("10"))
+            assert not repo._nav_series and not repo._history._entrusts
+            assert not repo._balance_by_user and not repo._accounts_by_user
+            assert not repo._share_by_account_product and not repo._asset_book.user_ids()
+            assert repo.get_user_holdings(user_id)[products[1]] == Decimal("610")
+            assert repo.list_asset_user_ids() == [user_id]
+        finally:
+            repo.close()
+
+    def test_cursor_pages(self):
+        """测试游标分页与一次取全部的顺序相同，同一时间按ID排序"""
+        service = FundService(SqliteRepository(':memory:'))
+        user_id, _, _ = _history_trades(service)
+        repo = service.repo
+        everything = [e.entrust_id for e in repo.list_user_entrusts(user_id, limit=100)[0]]
+        paged, cursor = [], None
+        while True:
+            page, cursor = repo.list_user_entrusts(user_id, cursor=cursor, limit=3)
+            paged += [e.entrust_id for e in page]
+            if cursor is None:
+                break
+        assert paged == everything and len(everything) == 11
+        confirms = [c.confirm_id for c in repo.list_user_confirms(user_id, limit=100)[0]]
+        first, cursor = repo.list_user_confirms(user_id, limit=4)
+        rest, _ = repo.list_user_confirms(user_id, cursor=cursor, limit=100)
+        assert [c.confirm_id for c in first + rest] == confirms
+        with pytest.raises(ValueError):
+            repo.list_user_entrusts(user_id, cursor="ENT_404")
+
+    def test_duplicate_share_rejected(self):
+        """测试同一账户同一产品的第二条份额由唯一索引拒绝"""
+        service = FundService(SqliteRepository(':memory:'))
+        _, accounts, products = _history_trades(service)
+        share = service.repo.get_fund_share(accounts[0], products[0])
+        share.share_id = "SHARE_DUPLICATE"
+        with pytest.raises(ValueError):
+            service.repo.create_or_update_fund_share(share)
+
+
+class TestSqliteBaseRepository:
+    """测试统一数据存储层的 SQLite 实现"""
+
+    @pytest.fixture
+    def repo(self):
+        """创建仓库实例并写入基金账户"""
+        repo = SqliteBaseRepository(':memory:')
+        for i, user_id in enumerate(["USER_001", "USER_001", "USER_002"]):
+            repo.create("fund_account", {
+                'id': f"ACC_{i}",
+                'fund_account_id': f"ACC_{i}",
+                'user_id': user_id,
+                'account_no': f"F{i}"
+            })
+        yield repo
+        repo.close()
+
+    def test_crud(self, repo):
+        """测试增删改查"""
+        assert repo.get("fund_account", "ACC_0")['id'] == "ACC_0"
+        assert repo.get("fund_account", "ACC_0")['account_status'] == "ACTIVE"
+        assert [r['id'] for r in repo.list("fund_account", {'user_id': "USER_001"})] == ["ACC_0", "ACC_1"]
+        assert repo.update("fund_account", "ACC_1", {'user_id': "USER_002"})['user_id'] == "USER_002"
+        assert [r['id'] for r in repo.list("fund_account", {'user_id': "USER_002"})] == ["ACC_1", "ACC_2"]
+        assert repo.delete("fund_account", "ACC_2")
+        assert not repo.exists("fund_account", "ACC_2")
+        assert repo.update("fund_account", "ACC_404", {'user_id': "USER_003"}) is None
+        with pytest.raises(ValueError):
+            repo.create("fund_account", {'id': "ACC_0", 'account_no': "F9"})
+
+    def test_unique_update_rolled_back(self, repo):
+        """测试违反唯一约束的更新不生效"""
+        with pytest.raises(ValueError):
+            repo.update("fund_account", "ACC_1", {'account_no': "F2"})
+        assert repo.get("fund_account", "ACC_1")['account_no'] == "F1"
+
+    def test_table_outside_schema(self, repo):
+        """测试 schema.sql 之外的表"""
+        repo.create("audit_log", {'id': "LOG_1", 'action': "login", 'user_id': "USER_001"})
+        assert repo.get("audit_log", "LOG_1") == {'id': "LOG_1", 'action': "login", 'user_id': "USER_001"}
+        assert [r['id'] for r in repo.list("audit_log", {'action': "login"})] == ["LOG_1"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,130 @@
+"""
+测试 FundService 与模块化服务共用的统一存储
+"""
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from common.persistence import Persistence
+from common.repository import BaseRepository
+from common.sqlite_repository import SqliteBaseRepository
+from service import FundService
+from unified_repository import SqliteUnifiedRepository, UnifiedRepository, create_unified_repository
+
+
+def _create_module_user(store, user_id):
+    """按模块化服务的记录格式写入用户和余额"""
+    now = datetime.now()
+    store.create("user", {
+        'id': user_id, 'user_id': user_id, 'user_name': "模块用户", 'user_type': "PERSONAL",
+        'user_status': "ACTIVE", 'identity_no': None, 'phone': None, 'email': None,
+        'create_time': now, 'update_time': now
+    })
+    store.create("user_balance", {
+        'id': f"BAL_{user_id}", 'balance_id': f"BAL_{user_id}", 'user_id': user_id,
+        'available_balance': Decimal("0"), 'frozen_balance': Decimal("0"),
+        'total_balance': Decimal("0"), 'last_update': now
+    })
+
+
+class TestUnifiedRepository:
+    """测试两套接口读写同一份记录"""
+
+    @pytest.fixture(params=["memory", "sqlite"])
+    def context(self, request):
+        """创建共用存储、服务，以及模块写入的用户和服务创建的产品"""
+        store = BaseRepository() if request.param == "memory" else SqliteBaseRepository(':memory:')
+        service = FundService(create_unified_repository(store))
+        assert isinstance(service.repo, SqliteUnifiedRepository) == (request.param == "sqlite")
+        _create_module_user(store, "USER_001")
+        store.update("user_balance", "BAL_USER_001", {
+            'available_balance': Decimal("10000"), 'total_balance': Decimal("10000")
+        })
+        product = service.create_fund_product(product_code="001234", product_name="测试基金")
+        service.create_fund_nav(product_id=product.product_id, net_value=Decimal("2.0000"),
+                                nav_date=date(2025, 1, 1))
+        yield store, service, product.product_id
+        store.close()
+
+    def test_module_writes_visible_to_service(self, context):
+        """测试模块写入的用户和余额可直接用于交易"""
+        store, service, product_id = context
+        assert service.get_user("USER_001").user_name == "模块用户"
+        account = service.open_fund_account("USER_001")
+        service.subscribe_fund(account.fund_account_id, product_id, Decimal("4000"))
+
+        assert store.get("user_balance", "BAL_USER_001")['available_balance'] == Decimal("6000")
+        assert service.get_user_assets("USER_001")['total_asset'] == 10000.0
+
+    def test_service_writes_stored_once(self, context):
+        """测试服务写入的账户和份额只存一份，模块按 schema.sql 表名读取"""
+        store, service, product_id = context
+        account = service.open_fund_account("USER_001")
+        service.subscribe_fund(account.fund_account_id, product_id, Decimal("4000"))
+
+        assert service.repo._storage['fund_accounts'] is store.table("fund_account")
+        assert store.get("fund_account", account.fund_account_id)['account_no'] == account.account_no
+        shares = store.list("fund_share", {'fund_account_id': account.fund_account_id})
+        assert [share['total_share'] for share in shares] == [Decimal("2000")]
+        assert store.list("fund_transaction_confirm") != []
+
+    def test_module_update_refreshes_assets(self, context):
+        """测试模块更新余额后服务的资产聚合同步"""
+        store, service, _ = context
+        store.update("user_balance", "BAL_USER_001", {
+            'available_balance': Decimal("500"), 'total_balance': Decimal("500")
+        })
+        assert service.get_user_assets("USER_001")['total_balance'] == 500.0
+        assert service.repo.get_user_balance("USER_001").available_balance == Decimal("500")
+
+    def test_loaded_models_are_isolated(self, context):
+        """测试读取的模型与存储的记录相互独立"""
+        store, service, _ = context
+        balance = service.repo.get_user_balance("USER_001")
+        balance.available_balance = Decimal("1")
+        assert store.get("user_balance", "BAL_USER_001")['available_balance'] == Decimal("10000")
+
+    def test_duplicate_nav_rejected(self, context):
+        """测试同一产品同一日期的净值只能有一条"""
+        _, service, product_id = context
+        with pytest.raises(ValueError):
+            service.create_fund_nav(product_id=product_id, net_value=Decimal("2.1"),
+                                    nav_date=date(2025, 1, 1))
+        assert service.get_latest_nav(product_id).net_value == Decimal("2.0000")
+
+
+class TestUnifiedRecovery:
+    """测试统一存储重启后恢复"""
+
+    def test_recover(self, tmp_path):
+        """测试从共用存储的日志恢复后派生结构重建"""
+        store = BaseRepository(persistence=Persistence(str(tmp_path), fsync=False))
+        service = FundService(UnifiedRepository(store))
+        _create_module_user(store, "USER_001")
+        store.update("user_balance", "BAL_USER_001", {
+            'available_balance': Decimal("10000"), 'total_balance': Decimal("10000")
+        })
+        account = service.open_fund_account("USER_001")
+        product = service.create_fund_product(product_code="001234", product_name="测试基金")
+        service.create_fund_nav(product_id=product.product_id, net_value=Decimal("2.0000"),
+                                nav_date=date(2025, 1, 1))
+        service.subscribe_fund(account.fund_account_id, product.product_id, Decimal("4000"))
+        expected = service.get_user_assets("USER_001")
+        store.close()
+
+        store = BaseRepository(persistence=Persistence(str(tmp_path), fsync=False))
+        service = FundService(UnifiedRepository(store))
+        assert service.get_user_assets("USER_001") == expected
+        assert service.repo.get_fund_share(account.fund_account_id, product.product_id).total_share == Decimal("2000")
+        service.redeem_fund(account.fund_account_id, product.product_id, Decimal("500"))
+        store.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,185 @@
+"""
+统一存储仓库 - FundService 与 modules/*_app.py 共用同一份按 schema.sql 组织的数据
+"""
+from typing import Any, Dict, List, Optional
+
+from common.repository import BaseRepository
+from common.sqlite_repository import SqliteBaseRepository
+from models import FundAccount, FundNetValue, UserTotalAsset
+from nav_series import NavSeries
+from repository import (
+    Repository, SCHEMA_TABLE_NAMES, STORAGE_MODE_DICT, _NESTED_FIELDS, _TABLE_MODELS
+)
+from sqlite_repository import SqliteLookupMixin
+
+# 仓库表名 -> [(字段名, 字段定义)]，读取时按模型字段投影记录
+_TABLE_FIELDS = {
+    table: list(model_cls.model_fields.items()) for table, model_cls in _TABLE_MODELS.items()
+}
+
+
+class UnifiedRepository(Repository):
+    """统一存储仓库
+    
+    不再持有自己的存储：每张表都是 BaseRepository 中以 schema.sql 表名命名的表，
+    记录为字段字典（模型字段 + BaseRepository 的主键 id），两套接口读写的是同一条记录。
+    写入经过 BaseRepository.put()，由其维护索引、记录日志并通知监听；
+    读取直接取存储的记录，按模型字段投影后构建模型，不经过校验。
+    二级索引、净值序列和资产聚合通过写入监听保持最新，modules 的写入同样生效。
+    """
+    
+    def __init__(self, store: BaseRepository):
+        """
+        初始化统一存储仓库
+        
+        Args:
+            store: 共用的 BaseRepository（内存或 SQLite）；持久化由它负责
+        """
+        super().__init__(storage_mode=STORAGE_MODE_DICT)
+        self.store = store
+        for table, schema_table in SCHEMA_TABLE_NAMES.items():
+            self._storage[table] = store.table(schema_table)
+        self._rebuild_derived()
+        store.add_listener('user_balance', self._on_balance_write)
+        store.add_listener('fund_account', self._on_account_write)
+        store.add_listener('fund_product', self._on_product_write)
+        store.add_listener('fund_net_value', self._on_nav_write)
+        store.add_listener('fund_share', self._on_share_write)
+    
+    # ==================== 读写 ====================
+    
+    def _put(self, table: str, key: str, model: Any) -> Any:
+        """写入记录：模型字段加主键 id，交给 BaseRepository 存储"""
+        record = self._copy_fields(table, model.__dict__)
+        record['id'] = key
+        return self.store.put(SCHEMA_TABLE_NAMES[table], key, record)
+    
+    def _bulk_put(self, table: str, key_field: str, models: List[Any]) -> int:
+        """批量写入记录"""
+        for model in models:
+            self._put(table, getattr(model, key_field), model)
+        return len(models)
+    
+    def _load(self, table: str, model_cls: type, row: Any) -> Any:
+        """按模型字段投影记录并构建模型，不经过校验；记录缺少的字段取模型默认值"""
+        if row is None:
+            return None
+        fields = {}
+        for name, field in _TABLE_FIELDS[table]:
+            if name in row:
+                fields[name] = row[name]
+            else:
+                fields[name] = field.get_default(call_default_factory=True)
+        for name in _NESTED_FIELDS.get(table, ()):
+            value = fields[name]
+            if value is not None:
+                fields[name] = dict(value)
+        return self._construct_model(model_cls, fields)
+    
+    # ==================== 写入监听 ====================
+    
+    def _on_balance_write(self, op: str, balance_id: str, record: Dict[str, Any]) -> None:
+        """余额写入：维护用户 -> 余额索引和资产聚合中的余额"""
+        user_id = record.get('user_id')
+        if op == 'delete':
+            if self._balance_by_user.get(user_id) == balance_id:
+                del self._balance_by_user[user_id]
+            return
+        # 每个用户仅有一条余额记录（uk_user_balance），保留最先写入的记录
+        self._balance_by_user.setdefault(user_id, balance_id)
+        self._asset_book.set_balance(user_id, record.get('total_balance'))
+    
+    def _on_account_write(self, op: str, fund_account_id: str, record: Dict[str, Any]) -> None:
+        """基金账户写入：维护用户 -> 账户索引"""
+        accounts = self._accounts_by_user.setdefault(record.get('user_id'), [])
+        if op == 'delete':
+            if fund_account_id in accounts:
+                accounts.remove(fund_account_id)
+        elif fund_account_id not in accounts:
+            accounts.append(fund_account_id)
+    
+    def _on_product_write(self, op: str, product_id: str, record: Dict[str, Any]) -> None:
+        """产品写入（含 modules 的写入）：产品列表视图失效"""
+        self._product_version += 1
+    
+    def _on_nav_write(self, op: str, nav_id: str, record: Dict[str, Any]) -> None:
+        """净值写入：新净值加入净值序列，是最新净值时更新资产聚合"""
+        if op != 'create':
+            return
+        product_id = record.get('product_id')
+        series = self._nav_series.get(product_id)
+        if series is None:
+            series = self._nav_series[product_id] = NavSeries(product_id)
+        series.add(record.get('nav_date'), record)
+        if series.latest() is record:
+            self._asset_book.set_nav(product_id, record.get('net_value'))
+            self._product_version += 1
+    
+    def _on_share_write(self, op: str, share_id: str, record: Dict[str, Any]) -> None:
+        """份额写入：维护账户/产品 -> 份额索引和资产聚合中的持仓"""
+        account_id = record.get('fund_account_id')
+        key = (account_id, record.get('product_id'))
+        if op == 'delete':
+            if self._share_by_account_product.get(key) == share_id:
+                del self._share_by_account_product[key]
+                self._shares_by_account[account_id].remove(share_id)
+            return
+        if key not in self._share_by_account_product:
+            self._share_by_account_product[key] = share_id
+            self._shares_by_account.setdefault(account_id, []).append(share_id)
+        account = self._storage['fund_accounts'].get(account_id)
+        if account is not None:
+            self._asset_book.set_position(account.get('user_id'), account_id,
+                                          key[1], record.get('total_share'))
+    
+    # ==================== 索引由写入监听维护的操作 ====================
+    
+    def create_fund_account(self, account: FundAccount) -> FundAccount:
+        """创建基金账户"""
+        if account.fund_account_id in self._storage['fund_accounts']:
+            raise ValueError(f"基金账户已存在: {account.fund_account_id}")
+        self._put('fund_accounts', account.fund_account_id, account)
+        return account
+    
+    def create_fund_net_value(self, nav: FundNetValue) -> FundNetValue:
+        """创建基金净值（同一产品同一日期的重复净值由唯一索引 uk_product_nav_date 拒绝）"""
+        self._put('fund_net_values', nav.nav_id, nav)
+        if self._catalog is not None:
+            self._catalog.publish_nav(nav)
+        return nav
+    
+    def get_latest_user_total_asset(self, user_id: str) -> Optional[UserTotalAsset]:
+        """获取用户最新总资产（按 idx_user_date 索引查询）"""
+        rows = self.store.list('user_total_asset', {'user_id': user_id})
+        if not rows:
+            return None
+        return self._load('user_total_assets', UserTotalAsset, max(rows, key=lambda row: row['calc_date']))
+
+
+class SqliteUnifiedRepository(SqliteLookupMixin, UnifiedRepository):
+    """共用 SQLite 存储的统一存储仓库
+    
+    按用户、账户、产品的查询由 SqliteLookupMixin 直接查询 SQLite 的表和索引，
+    写入监听不再维护内存中的二级索引、净值序列和资产聚合（modules 的写入同样立即可查）。
+    """
+    
+    def _on_balance_write(self, op: str, balance_id: str, record: Dict[str, Any]) -> None:
+        """余额按索引查询，不维护"""
+    
+    def _on_account_write(self, op: str, fund_account_id: str, record: Dict[str, Any]) -> None:
+        """基金账户按索引查询，不维护"""
+    
+    def _on_nav_write(self, op: str, nav_id: str, record: Dict[str, Any]) -> None:
+        """净值写入（含 modules 的写入）：产品列表视图失效"""
+        if op == 'create':
+            self._product_version += 1
+    
+    def _on_share_write(self, op: str, share_id: str, record: Dict[str, Any]) -> None:
+        """份额按索引查询，不维护"""
+
+
+def create_unified_repository(store: BaseRepository) -> UnifiedRepository:
+    """按共用存储的类型创建统一存储仓库：SQLite 存储时按索引查询，不在内存中维护派生结构"""
+    if isinstance(store, SqliteBaseRepository):
+        return SqliteUnifiedRepository(store)
+    return UnifiedRepository(store)